@@ -0,0 +1,123 @@
+
+/*
+ * Copyright Contributors to the OpenCue Project
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+
+
+package com.imageworks.spcue.dispatcher;
+
+import java.util.HashMap;
+import java.util.Map;
+import java.util.concurrent.ConcurrentHashMap;
+
+import com.imageworks.spcue.grpc.report.HostReport;
+import com.imageworks.spcue.grpc.report.RunningFrameInfo;
+
+/**
+ * Rebuilds full host reports from the delta reports sent by RQD.
+ *
+ * The last full report of every host is kept so a delta can be applied
+ * against it. A delta whose base version does not match the kept report
+ * cannot be applied and the host is asked for a full report instead.
+ */
+public class HostReportMerger {
+
+    private final ConcurrentHashMap<String, HostReport> reports =
+            new ConcurrentHashMap<String, HostReport>();
+
+    /**
+     * Returns the full report for a status report, or null if the report
+     * is a delta that cannot be applied.
+     *
+     * @param report a full or delta host report
+     * @return the full host report, or null if a full report is required
+     */
+    public HostReport merge(HostReport report) {
+        String hostName = report.getHost().getName();
+        if (report.getBaseVersion() == 0) {
+            reports.put(hostName, report);
+            return report;
+        }
+
+        HostReport base = reports.get(hostName);
+        if (base == null || base.getReportVersion() != report.getBaseVersion()) {
+            reports.remove(hostName);
+            return null;
+        }
+
+        HostReport.Builder merged = report.toBuilder()
+                .clearBaseVersion()
+                .clearUnchangedFrameIds()
+                .clearHostUnchanged()
+                .clearHostAttributesUnchanged()
+                .clearFrames();
+
+        if (report.getHostUnchanged()) {
+            merged.setHost(base.getHost());
+        } else if (report.getHostAttributesUnchanged()) {
+            merged.setHost(report.getHost().toBuilder()
+                    .putAllAttributes(base.getHost().getAttributesMap()));
+        }
+
+        Map<String, RunningFrameInfo> baseFrames = new HashMap<String, RunningFrameInfo>();
+        for (RunningFrameInfo frame : base.getFramesList()) {
+            baseFrames.put(frame.getFrameId(), frame);
+        }
+
+        for (String frameId : report.getUnchangedFrameIdsList()) {
+            RunningFrameInfo frame = baseFrames.get(frameId);
+            if (frame == null) {
+                reports.remove(hostName);
+                return null;
+            }
+            merged.addFrames(frame);
+        }
+
+        for (RunningFrameInfo frame : report.getFramesList()) {
+            if (frame.getAttributesUnchanged() || frame.getProcessesUnchanged()) {
+                RunningFrameInfo baseFrame = baseFrames.get(frame.getFrameId());
+                if (baseFrame == null) {
+                    reports.remove(hostName);
+                    return null;
+                }
+                RunningFrameInfo.Builder builder = frame.toBuilder();
+                if (frame.getAttributesUnchanged()) {
+                    builder.clearAttributesUnchanged()
+                            .putAllAttributes(baseFrame.getAttributesMap());
+                }
+                if (frame.getProcessesUnchanged()) {
+                    builder.clearProcessesUnchanged()
+                            .addAllProcesses(baseFrame.getProcessesList());
+                }
+                frame = builder.build();
+            }
+            merged.addFrames(frame);
+        }
+
+        HostReport result = merged.build();
+        reports.put(hostName, result);
+        return result;
+    }
+
+    /**
+     * Forgets the report kept for a host, its next delta will be refused.
+     *
+     * @param hostName the name of the host
+     */
+    public void forget(String hostName) {
+        reports.remove(hostName);
+    }
+}
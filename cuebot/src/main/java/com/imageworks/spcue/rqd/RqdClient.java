@@ -17,6 +17,8 @@
 
 package com.imageworks.spcue.rqd;
 
+import java.util.List;
+
 import com.imageworks.spcue.HostInterface;
 import com.imageworks.spcue.VirtualProc;
 import com.imageworks.spcue.grpc.host.LockState;
@@ -99,5 +101,14 @@ public interface RqdClient {
      * @param frameId
      */
     void killFrame(String hostName, String frameId, String message);
+
+    /**
+     * Kills several running frames on one host with a single call
+     *
+     * @param hostName
+     * @param frameIds
+     * @param message
+     */
+    void killFrames(String hostName, List<String> frameIds, String message);
 }
 
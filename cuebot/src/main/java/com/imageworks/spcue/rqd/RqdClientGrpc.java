@@ -17,11 +17,13 @@
 
 package com.imageworks.spcue.rqd;
 
+import java.util.List;
 import java.util.concurrent.ExecutionException;
 import java.util.concurrent.TimeUnit;
 
 import io.grpc.ManagedChannel;
 import io.grpc.ManagedChannelBuilder;
+import io.grpc.Status;
 import io.grpc.StatusRuntimeException;
 import org.apache.log4j.Logger;
 
@@ -38,6 +40,7 @@ import com.imageworks.spcue.grpc.rqd.RqdInterfaceGrpc;
 import com.imageworks.spcue.grpc.rqd.RqdStaticGetRunFrameRequest;
 import com.imageworks.spcue.grpc.rqd.RqdStaticGetRunFrameResponse;
 import com.imageworks.spcue.grpc.rqd.RqdStaticKillRunningFrameRequest;
+import com.imageworks.spcue.grpc.rqd.RqdStaticKillRunningFramesRequest;
 import com.imageworks.spcue.grpc.rqd.RqdStaticLockAllRequest;
 import com.imageworks.spcue.grpc.rqd.RqdStaticUnlockAllRequest;
 import com.imageworks.spcue.grpc.rqd.RqdStaticLaunchFrameRequest;
@@ -182,6 +185,33 @@ public final class RqdClientGrpc implements RqdClient {
         }
     }
 
+    public void killFrames(String host, List<String> frameIds, String message) {
+        RqdStaticKillRunningFramesRequest request =
+                RqdStaticKillRunningFramesRequest.newBuilder()
+                .addAllFrameIds(frameIds)
+                .setMessage(message)
+                .build();
+
+        if (testMode) {
+            return;
+        }
+
+        try {
+            logger.info("killing " + frameIds.size() + " frames on " + host + ", source: " + message);
+            getStub(host).killRunningFrames(request);
+        } catch(StatusRuntimeException e) {
+            if (e.getStatus().getCode() != Status.Code.UNIMPLEMENTED) {
+                throw new RqdClientException("failed to kill frames " + frameIds, e);
+            }
+            // Older rqd, kill the frames one at a time
+            for (String frameId : frameIds) {
+                killFrame(host, frameId, message);
+            }
+        } catch(ExecutionException e) {
+            throw new RqdClientException("failed to kill frames " + frameIds, e);
+        }
+    }
+
     public RunningFrameInfo getFrameStatus(VirtualProc proc) {
         try {
             RqdStaticGetRunFrameResponse getRunFrameResponse =
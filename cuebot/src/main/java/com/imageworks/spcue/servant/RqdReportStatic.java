@@ -6,6 +6,8 @@ import io.grpc.stub.StreamObserver;
 
 import com.imageworks.spcue.dispatcher.FrameCompleteHandler;
 import com.imageworks.spcue.dispatcher.HostReportHandler;
+import com.imageworks.spcue.dispatcher.HostReportMerger;
+import com.imageworks.spcue.grpc.report.HostReport;
 import com.imageworks.spcue.grpc.report.RqdReportInterfaceGrpc;
 import com.imageworks.spcue.grpc.report.RqdReportRqdStartupRequest;
 import com.imageworks.spcue.grpc.report.RqdReportRqdStartupResponse;
@@ -19,12 +21,14 @@ public class RqdReportStatic extends RqdReportInterfaceGrpc.RqdReportInterfaceIm
 
     private FrameCompleteHandler frameCompleteHandler;
     private HostReportHandler hostReportHandler;
+    private final HostReportMerger hostReportMerger = new HostReportMerger();
 
     @SuppressWarnings("unused")
 
     @Override
     public void reportRqdStartup(RqdReportRqdStartupRequest request,
                                  StreamObserver<RqdReportRqdStartupResponse> responseObserver) {
+        hostReportMerger.forget(request.getBootReport().getHost().getName());
         hostReportHandler.queueBootReport(request.getBootReport());
         responseObserver.onNext(RqdReportRqdStartupResponse.newBuilder().build());
         responseObserver.onCompleted();
@@ -40,8 +44,16 @@ public class RqdReportStatic extends RqdReportInterfaceGrpc.RqdReportInterfaceIm
 
     @Override
     public void reportStatus(RqdReportStatusRequest request, StreamObserver<RqdReportStatusResponse> responseObserver) {
-        hostReportHandler.queueHostReport(request.getHostReport());
-        responseObserver.onNext(RqdReportStatusResponse.newBuilder().build());
+        HostReport report = hostReportMerger.merge(request.getHostReport());
+        RqdReportStatusResponse.Builder response = RqdReportStatusResponse.newBuilder();
+        if (report == null) {
+            // The delta was built against a report we do not hold
+            response.setRequestFullReport(true);
+        } else {
+            hostReportHandler.queueHostReport(report);
+            response.setAcknowledgedVersion(report.getReportVersion());
+        }
+        responseObserver.onNext(response.build());
         responseObserver.onCompleted();
     }
 
@@ -19,8 +19,11 @@
 
 package com.imageworks.spcue.service;
 
+import java.util.ArrayList;
 import java.util.Collection;
+import java.util.LinkedHashMap;
 import java.util.List;
+import java.util.Map;
 
 import org.apache.log4j.Logger;
 import org.springframework.dao.DataAccessException;
@@ -255,13 +258,30 @@ public class JobManagerSupport {
      * @param source
      */
     public void kill(Collection<VirtualProc> procs, Source source) {
+        // One call per host, so rqd can signal the frames together
+        Map<String, List<VirtualProc>> procsByHost = new LinkedHashMap<String, List<VirtualProc>>();
         for (VirtualProc p: procs) {
+            List<VirtualProc> hostProcs = procsByHost.get(p.hostName);
+            if (hostProcs == null) {
+                hostProcs = new ArrayList<VirtualProc>();
+                procsByHost.put(p.hostName, hostProcs);
+            }
+            hostProcs.add(p);
+        }
+
+        for (Map.Entry<String, List<VirtualProc>> entry: procsByHost.entrySet()) {
+            List<String> frameIds = new ArrayList<String>(entry.getValue().size());
+            for (VirtualProc p: entry.getValue()) {
+                frameIds.add(p.frameId);
+            }
             try {
-                rqdClient.killFrame(p, source.toString());
+                rqdClient.killFrames(entry.getKey(), frameIds, source.toString());
             }
             catch (java.lang.Throwable e) {
-                dispatchSupport.lostProc(p, "clearing due to failed kill," +
-                        p.getName() + "," + e, Dispatcher.EXIT_STATUS_FAILED_KILL);
+                for (VirtualProc p: entry.getValue()) {
+                    dispatchSupport.lostProc(p, "clearing due to failed kill," +
+                            p.getName() + "," + e, Dispatcher.EXIT_STATUS_FAILED_KILL);
+                }
             }
         }
     }
@@ -325,9 +345,7 @@ public class JobManagerSupport {
             hostManager.unbookVirtualProcs(procs);
         }
 
-        for (VirtualProc proc: procs) {
-            kill(proc, source);
-        }
+        kill(procs, source);
     }
 
     /**
@@ -349,9 +367,7 @@ public class JobManagerSupport {
             hostManager.unbookVirtualProcs(procs);
         }
 
-        for (VirtualProc proc: procs) {
-            kill(proc, source);
-        }
+        kill(procs, source);
     }
 
     /**
@@ -367,9 +383,7 @@ public class JobManagerSupport {
             hostManager.unbookVirtualProcs(procs);
         }
 
-        for (VirtualProc proc: procs) {
-            kill(proc, source);
-        }
+        kill(procs, source);
     }
 
     /**
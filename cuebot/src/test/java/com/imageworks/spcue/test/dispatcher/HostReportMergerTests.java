@@ -0,0 +1,159 @@
+
+/*
+ * Copyright Contributors to the OpenCue Project
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *   http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+
+
+package com.imageworks.spcue.test.dispatcher;
+
+import junit.framework.TestCase;
+import org.junit.Before;
+
+import com.imageworks.spcue.dispatcher.HostReportMerger;
+import com.imageworks.spcue.grpc.report.HostReport;
+import com.imageworks.spcue.grpc.report.ProcessInfo;
+import com.imageworks.spcue.grpc.report.RenderHost;
+import com.imageworks.spcue.grpc.report.RunningFrameInfo;
+
+public class HostReportMergerTests extends TestCase {
+
+    HostReportMerger merger;
+    HostReport full;
+
+    @Before
+    public void setUp() throws Exception {
+        merger = new HostReportMerger();
+        full = HostReport.newBuilder()
+                .setReportVersion(1)
+                .setHost(RenderHost.newBuilder()
+                        .setName("render01")
+                        .setFreeMem(4000000)
+                        .putAttributes("SP_OS", "Linux"))
+                .addFrames(RunningFrameInfo.newBuilder()
+                        .setFrameId("frame1")
+                        .setRss(1000)
+                        .putAttributes("pcpu", "1.0")
+                        .addProcesses(ProcessInfo.newBuilder()
+                                .setPid(100)
+                                .setCmd("render")))
+                .addFrames(RunningFrameInfo.newBuilder()
+                        .setFrameId("frame2")
+                        .setRss(2000)
+                        .putAttributes("pcpu", "2.0"))
+                .build();
+    }
+
+    public void testFullReport() {
+        assertEquals(full, merger.merge(full));
+    }
+
+    public void testUnchangedDelta() {
+        merger.merge(full);
+        HostReport delta = HostReport.newBuilder()
+                .setReportVersion(2)
+                .setBaseVersion(1)
+                .setHost(RenderHost.newBuilder().setName("render01"))
+                .setHostUnchanged(true)
+                .addUnchangedFrameIds("frame1")
+                .addUnchangedFrameIds("frame2")
+                .build();
+
+        HostReport merged = merger.merge(delta);
+
+        assertEquals(2, merged.getReportVersion());
+        assertEquals(0, merged.getBaseVersion());
+        assertEquals(full.getHost(), merged.getHost());
+        assertEquals(full.getFramesList(), merged.getFramesList());
+    }
+
+    public void testChangedFrameWithoutAttributes() {
+        merger.merge(full);
+        HostReport delta = HostReport.newBuilder()
+                .setReportVersion(2)
+                .setBaseVersion(1)
+                .setHost(RenderHost.newBuilder().setName("render01").setFreeMem(1000))
+                .setHostAttributesUnchanged(true)
+                .addUnchangedFrameIds("frame2")
+                .addFrames(RunningFrameInfo.newBuilder()
+                        .setFrameId("frame1")
+                        .setRss(5000)
+                        .setAttributesUnchanged(true))
+                .build();
+
+        HostReport merged = merger.merge(delta);
+
+        assertEquals(1000, merged.getHost().getFreeMem());
+        assertEquals("Linux", merged.getHost().getAttributesMap().get("SP_OS"));
+        assertEquals(2, merged.getFramesCount());
+        for (RunningFrameInfo frame : merged.getFramesList()) {
+            assertFalse(frame.getAttributesUnchanged());
+            if (frame.getFrameId().equals("frame1")) {
+                assertEquals(5000, frame.getRss());
+                assertEquals("1.0", frame.getAttributesMap().get("pcpu"));
+            }
+        }
+    }
+
+    public void testUnchangedProcessTree() {
+        merger.merge(full);
+        HostReport delta = HostReport.newBuilder()
+                .setReportVersion(2)
+                .setBaseVersion(1)
+                .setHost(RenderHost.newBuilder().setName("render01"))
+                .setHostUnchanged(true)
+                .addUnchangedFrameIds("frame2")
+                .addFrames(RunningFrameInfo.newBuilder()
+                        .setFrameId("frame1")
+                        .setRss(5000)
+                        .putAttributes("pcpu", "3.0")
+                        .setProcessesUnchanged(true))
+                .build();
+
+        HostReport merged = merger.merge(delta);
+
+        RunningFrameInfo frame = merged.getFrames(1);
+        assertEquals("frame1", frame.getFrameId());
+        assertFalse(frame.getProcessesUnchanged());
+        assertEquals("3.0", frame.getAttributesMap().get("pcpu"));
+        assertEquals(1, frame.getProcessesCount());
+        assertEquals("render", frame.getProcesses(0).getCmd());
+    }
+
+    public void testDeltaAgainstUnknownVersion() {
+        merger.merge(full);
+        HostReport delta = HostReport.newBuilder()
+                .setReportVersion(3)
+                .setBaseVersion(2)
+                .setHost(RenderHost.newBuilder().setName("render01"))
+                .setHostUnchanged(true)
+                .build();
+
+        assertNull(merger.merge(delta));
+    }
+
+    public void testDeltaAfterForget() {
+        merger.merge(full);
+        merger.forget("render01");
+        HostReport delta = HostReport.newBuilder()
+                .setReportVersion(2)
+                .setBaseVersion(1)
+                .setHost(RenderHost.newBuilder().setName("render01"))
+                .setHostUnchanged(true)
+                .build();
+
+        assertNull(merger.merge(delta));
+    }
+}
@@ -26,7 +26,6 @@ from builtins import str
 from builtins import map
 from builtins import object
 import datetime
-import glob
 import os
 import re
 import time
@@ -297,14 +296,8 @@ class FrameMonitorTree(cuegui.AbstractTreeWidget.AbstractTreeWidget):
         @param item: The item single clicked on
         @type  col: int
         @param col: Column number single clicked on"""
-        current_log_file = cuegui.Utils.getFrameLogFile(self.__job, item.rpcObject)
-        try:
-            old_log_files = sorted(glob.glob('%s.*' % current_log_file),
-                                   key=lambda l: int(l.split('rqlog.')[-1]),
-                                   reverse=True)
-        except ValueError:
-            pass
-        QtGui.qApp.display_log_file_content.emit([current_log_file] + old_log_files)
+        QtGui.qApp.display_log_file_content.emit(
+            cuegui.Utils.getFrameLogFiles(self.__job, item.rpcObject))
 
     def __itemDoubleClickedViewLog(self, item, col):
         """Called when a frame is double clicked, views the frame log in a popup
@@ -25,6 +25,7 @@ from __future__ import division
 from builtins import str
 from builtins import map
 import getpass
+import glob
 import os
 import platform
 import re
@@ -412,6 +413,28 @@ def getFrameLogFile(job, frame):
     return os.path.join(job.data.log_dir, "%s.%s.rqlog" % (job.data.name, frame.data.name))
 
 
+def getFrameLogFiles(job, frame):
+    """Returns the frame's current log followed by its rotated logs, newest
+    first. rqd lists the rotated logs, oldest first, in <log>.index. Logs
+    rotated before rqd wrote the index are found by their generation
+    number."""
+    currentLogFile = getFrameLogFile(job, frame)
+    logDir = os.path.dirname(currentLogFile)
+    try:
+        with open(currentLogFile + '.index', 'r') as indexFile:
+            oldLogFiles = [os.path.join(logDir, line.strip())
+                           for line in indexFile if line.strip()]
+        oldLogFiles.reverse()
+    except (IOError, OSError):
+        generations = []
+        for logFile in glob.glob('%s.*' % currentLogFile):
+            match = re.match(r'\.(\d+)(\.gz)?$', logFile[len(currentLogFile):])
+            if match:
+                generations.append((int(match.group(1)), logFile))
+        oldLogFiles = [logFile for _, logFile in sorted(generations, reverse=True)]
+    return [currentLogFile] + oldLogFiles
+
+
 def getFrameLLU(job, frame):
     __now = time.time()
     if __now - getattr(frame, "getFrameLLUTime", 0) >= 5:
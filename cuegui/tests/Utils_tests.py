@@ -14,9 +14,13 @@
 
 
 import mock
+import os
+import shutil
+import tempfile
 import unittest
 
 import opencue.compiled_proto.job_pb2
+import opencue.wrappers.frame
 import opencue.wrappers.job
 import cuegui.Utils
 
@@ -66,5 +70,38 @@ class UtilsTests(unittest.TestCase):
         self.assertIsNone(cuegui.Utils.findJob(jobName))
 
 
+class FrameLogFilesTests(unittest.TestCase):
+    def setUp(self):
+        self.logDir = tempfile.mkdtemp()
+        self.job = opencue.wrappers.job.Job(
+            opencue.compiled_proto.job_pb2.Job(name='job', log_dir=self.logDir))
+        self.frame = opencue.wrappers.frame.Frame(
+            opencue.compiled_proto.job_pb2.Frame(name='0001-frame'))
+        self.logFile = os.path.join(self.logDir, 'job.0001-frame.rqlog')
+
+    def tearDown(self):
+        shutil.rmtree(self.logDir)
+
+    def __createLogs(self, *suffixes):
+        for suffix in suffixes:
+            open(self.logFile + suffix, 'w').close()
+
+    def test_shouldListRotatedLogsFromIndex(self):
+        self.__createLogs('', '.3', '.10.gz')
+        with open(self.logFile + '.index', 'w') as indexFile:
+            indexFile.write('job.0001-frame.rqlog.3\njob.0001-frame.rqlog.10.gz\n')
+
+        self.assertEqual(
+            [self.logFile, self.logFile + '.10.gz', self.logFile + '.3'],
+            cuegui.Utils.getFrameLogFiles(self.job, self.frame))
+
+    def test_shouldListRotatedLogsWithoutIndex(self):
+        self.__createLogs('', '.1', '.2', '.10', '.old')
+
+        self.assertEqual(
+            [self.logFile, self.logFile + '.10', self.logFile + '.2', self.logFile + '.1'],
+            cuegui.Utils.getFrameLogFiles(self.job, self.frame))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Benchmarks viewers polling the tail of running frames' logs, read from the
+log files versus served by rqd with TailFrameLog.
+
+A local rqd gRPC server serves frames whose output is written both to log
+files and to rqd's in-memory log buffers, as rqd does. Viewer threads poll
+the last lines of random frames through opencue.framelog.FrameLog, from
+the files and then from rqd. The log files read are counted, rqd falls
+back to them when it is too busy to answer. Point --log-dir at an NFS mount
+to see the load each puts on the filer, with nfsstat -c before and after
+each run.
+Needs rqd on the path:
+
+    PYTHONPATH=.:../rqd python benchmarks/framelog_benchmark.py --viewers 50
+"""
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import argparse
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+import rqd.rqlogwriter
+import rqd.rqnetwork
+
+import opencue.framelog
+from opencue.compiled_proto import job_pb2
+
+
+class Frame(object):
+    """A running frame known to the fake rqd."""
+
+    def __init__(self, logBuffer):
+        self.logBuffer = logBuffer
+
+
+class FakeCore(object):
+    """Serves the frames' log buffers, in place of rqd.rqcore.RqCore."""
+
+    def __init__(self):
+        self.frames = {}
+
+    def getRunningFrame(self, frameId):
+        return self.frames.get(frameId)
+
+
+class Wrapper(object):
+    """Stands in for a job or frame wrapper, FrameLog only reads .data"""
+
+    def __init__(self, data):
+        self.data = data
+
+
+class OpenCounter(object):
+    """Counts the log files FrameLog opens, each a read from the log
+    directory's filer"""
+
+    def __init__(self):
+        self.count = 0
+        self.__lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self.__lock:
+            self.count += 1
+        return open(*args, **kwargs)
+
+
+def writeFrames(frames, stop, lineBytes, linesPerSecond):
+    """Appends output to every frame's log file and buffer until stopped"""
+    line = b'x' * (lineBytes - 1) + b'\n'
+    while not stop.is_set():
+        for logFile, logBuffer in frames:
+            logFile.write(line)
+            logFile.flush()
+            logBuffer.append(line)
+        stop.wait(1 / linesPerSecond)
+
+
+def poll(frameLogs, viewers, lines, seconds):
+    """Polls the tail of random frames from a number of viewer threads for
+    some seconds, returns the number of polls and their total time"""
+    results = []
+    deadline = time.time() + seconds
+
+    def viewer():
+        count = 0
+        elapsed = 0.0
+        while time.time() < deadline:
+            frameLog = random.choice(frameLogs)
+            start = time.time()
+            frameLog.tail(lines)
+            elapsed += time.time() - start
+            count += 1
+        results.append((count, elapsed))
+
+    threads = [threading.Thread(target=viewer) for _ in range(viewers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(count for count, _ in results), sum(elapsed for _, elapsed in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--viewers', type=int, default=20)
+    parser.add_argument('--lines', type=int, default=100,
+                        help='Lines fetched by each poll')
+    parser.add_argument('--log-size', type=int, default=16 * 1024 * 1024,
+                        help='Bytes already in each log')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--log-dir', default=None,
+                        help='Directory the logs are written in, a temporary one by default')
+    args = parser.parse_args()
+
+    logDir = tempfile.mkdtemp(dir=args.log_dir)
+    core = FakeCore()
+    server = rqd.rqnetwork.GrpcServer(core, address='localhost:0')
+    server.addServicers()
+    server.server.start()
+
+    job = Wrapper(job_pb2.Job(name='job', log_dir=logDir))
+    frames = []
+    rqdLogs = []
+    fileLogs = []
+    stop = threading.Event()
+    try:
+        for index in range(args.frames):
+            frame = Wrapper(job_pb2.Frame(id='frame%d' % index, name='%04d-frame' % index,
+                                          state=job_pb2.RUNNING))
+            logBuffer = rqd.rqlogwriter.LogBuffer(1024 * 1024)
+            core.frames[frame.data.id] = Frame(logBuffer)
+            logFile = open(opencue.util.logPath(job, frame), 'wb')
+            chunk = (b'x' * 119 + b'\n') * 1024
+            for _ in range(args.log_size // len(chunk)):
+                logFile.write(chunk)
+                logBuffer.append(chunk)
+            frames.append((logFile, logBuffer))
+            rqdLogs.append(opencue.framelog.FrameLog(job, frame, host='localhost',
+                                                     port=server.port))
+            fileLogs.append(opencue.framelog.FrameLog(job, frame, host=''))
+
+        writer = threading.Thread(target=writeFrames, args=(frames, stop, 120, 100))
+        writer.start()
+
+        results = {}
+        for name, frameLogs in (('file', fileLogs), ('rqd', rqdLogs)):
+            counter = OpenCounter()
+            opencue.framelog.open = counter
+            try:
+                polls, elapsed = poll(frameLogs, args.viewers, args.lines, args.seconds)
+            finally:
+                del opencue.framelog.open
+            results[name] = (polls, elapsed, counter.count)
+    finally:
+        stop.set()
+        server.shutdown()
+        for logFile, _ in frames:
+            logFile.close()
+        for frameLog in rqdLogs:
+            frameLog.close()
+        shutil.rmtree(logDir)
+
+    print('%d frames, %d viewers, %d lines per poll, %d byte logs' % (
+        args.frames, args.viewers, args.lines, args.log_size))
+    for name in ('file', 'rqd'):
+        polls, elapsed, opened = results[name]
+        print('%-5s %8d polls  %7.0f polls/s  %7.2f ms/poll  %8d log files read' % (
+            name, polls, polls / args.seconds, 1000 * elapsed / max(polls, 1), opened))
+
+
+if __name__ == '__main__':
+    main()
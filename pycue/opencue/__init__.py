@@ -21,6 +21,7 @@ import logging
 
 from .cuebot import Cuebot
 from . import api
+from . import framelog
 from . import wrappers
 from . import search
 
@@ -0,0 +1,189 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Project: opencue Library
+
+Module: framelog.py - Reads frame logs from the rqd running the frame
+
+While a frame runs, rqd keeps the end of its log in memory and serves it
+with the TailFrameLog and StreamFrameLog calls, so reading it does not load
+the log directory's file server. A frame that is not running, or whose rqd
+can not serve its log, is read from the log file instead.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+from builtins import range
+import logging
+import os
+
+import grpc
+
+from opencue.compiled_proto import job_pb2
+from opencue.compiled_proto import rqd_pb2
+from opencue.compiled_proto import rqd_pb2_grpc
+from opencue.cuebot import config
+import opencue.util
+
+
+logger = logging.getLogger("opencue")
+
+DEFAULT_RQD_GRPC_PORT = 8444
+DEFAULT_RQD_TIMEOUT = 10
+
+# Errors after which the log file is read instead: the frame is not running
+# on the host any more, rqd is down or busy, or predates the log calls
+FALLBACK_CODES = (grpc.StatusCode.NOT_FOUND,
+                  grpc.StatusCode.UNAVAILABLE,
+                  grpc.StatusCode.UNIMPLEMENTED,
+                  grpc.StatusCode.RESOURCE_EXHAUSTED,
+                  grpc.StatusCode.DEADLINE_EXCEEDED)
+# Of those, the errors after which rqd is not asked again
+FINAL_CODES = (grpc.StatusCode.NOT_FOUND, grpc.StatusCode.UNIMPLEMENTED)
+
+READ_SIZE = 64 * 1024
+
+
+class FrameLog(object):
+    """The log of a frame, read from the frame's rqd while it runs and from
+    the log file otherwise."""
+
+    def __init__(self, job, frame, host=None, port=None, timeout=None):
+        """FrameLog class initialization
+        @type  job: opencue.wrappers.job.Job
+        @param job: The frame's job
+        @type  frame: opencue.wrappers.frame.Frame
+        @param frame: The frame
+        @type  host: str
+        @param host: rqd host, defaults to the host of a running frame
+        @type  port: int
+        @param port: rqd port, defaults to rqd.grpc_port in the config
+        @type  timeout: float
+        @param timeout: Seconds to wait for a TailFrameLog reply"""
+        self.path = opencue.util.logPath(job, frame)
+        self.frameId = frame.data.id
+        if host is None and frame.data.state == job_pb2.RUNNING:
+            host = frame.data.last_resource.split('/')[0] or None
+        self.host = host
+        self.port = port or config.get('rqd.grpc_port', DEFAULT_RQD_GRPC_PORT)
+        self.timeout = timeout or config.get('rqd.timeout', DEFAULT_RQD_TIMEOUT)
+        self.__channel = None
+        self.__stub = None
+
+    def __getStub(self):
+        if self.__stub is None:
+            self.__channel = grpc.insecure_channel('%s:%s' % (self.host, self.port))
+            self.__stub = rqd_pb2_grpc.RqdInterfaceStub(self.__channel)
+        return self.__stub
+
+    def close(self):
+        """Closes the connection to rqd"""
+        if self.__channel is not None:
+            self.__channel.close()
+            self.__channel = None
+            self.__stub = None
+
+    def tail(self, lines=100):
+        """Returns the last lines of the log
+        @type  lines: int
+        @param lines: Number of lines
+        @rtype:  bytes
+        @return: The lines, fewer if the log has fewer"""
+        if self.host:
+            try:
+                return self.__getStub().TailFrameLog(
+                    rqd_pb2.RqdStaticTailFrameLogRequest(frame_id=self.frameId, lines=lines),
+                    timeout=self.timeout).data
+            except grpc.RpcError as e:
+                self.__checkFallback(e)
+        return self.__tailFile(lines)
+
+    def follow(self, offset=0):
+        """Yields the log's content from an offset as it is written, until
+        the frame's output ends. A frame that is not running yields the rest
+        of its log file.
+        @type  offset: int
+        @param offset: Offset in the log to start from
+        @rtype:  generator
+        @return: Chunks of the log, as bytes"""
+        if self.host:
+            try:
+                while True:
+                    for response in self.__getStub().StreamFrameLog(
+                            rqd_pb2.RqdStaticStreamFrameLogRequest(
+                                frame_id=self.frameId, offset=offset)):
+                        if response.offset > offset:
+                            # Not buffered by rqd any more, already in the file
+                            for chunk in self.__readFile(offset, response.offset):
+                                yield chunk
+                        if response.data:
+                            yield response.data
+                        offset = response.offset + len(response.data)
+                        if response.finished:
+                            return
+                    # Closed by rqd after its time limit, resume from offset
+            except grpc.RpcError as e:
+                self.__checkFallback(e)
+        for chunk in self.__readFile(offset):
+            yield chunk
+
+    def __checkFallback(self, error):
+        if error.code() not in FALLBACK_CODES:
+            raise error
+        logger.debug('Reading %s from the log file: %s', self.frameId, error.details())
+        if error.code() in FINAL_CODES:
+            self.host = None
+
+    def __readFile(self, offset, end=None):
+        with open(self.path, 'rb') as logFile:
+            logFile.seek(offset)
+            while end is None or offset < end:
+                size = READ_SIZE if end is None else min(READ_SIZE, end - offset)
+                data = logFile.read(size)
+                if not data:
+                    return
+                offset += len(data)
+                yield data
+
+    def __tailFile(self, lines):
+        with open(self.path, 'rb') as logFile:
+            logFile.seek(0, os.SEEK_END)
+            end = logFile.tell()
+            data = b''
+            start = end
+            # Read back until there are enough newlines, one more than lines
+            # as the log ends with one
+            while start > 0 and data.count(b'\n') <= lines:
+                readStart = max(start - READ_SIZE, 0)
+                logFile.seek(readStart)
+                data = logFile.read(start - readStart) + data
+                start = readStart
+        if lines <= 0:
+            return b''
+        search = len(data) - 1 if data.endswith(b'\n') else len(data)
+        begin = 0
+        for _ in range(lines):
+            newline = data.rfind(b'\n', 0, search)
+            if newline < 0:
+                begin = 0
+                break
+            begin = newline + 1
+            search = newline
+        return data[begin:]
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""Tests for `opencue.framelog`."""
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+import grpc
+
+import opencue
+from opencue.compiled_proto import job_pb2
+from opencue.compiled_proto import rqd_pb2
+
+
+TEST_FRAME_ID = 'arbitrary-frame-id'
+
+
+class FakeRpcError(grpc.RpcError):
+    def __init__(self, code):
+        super(FakeRpcError, self).__init__()
+        self.__code = code
+
+    def code(self):
+        return self.__code
+
+    def details(self):
+        return 'fake error'
+
+
+@mock.patch('opencue.framelog.rqd_pb2_grpc.RqdInterfaceStub')
+class FrameLogTests(unittest.TestCase):
+
+    def setUp(self):
+        getStubPatcher = mock.patch('opencue.cuebot.Cuebot.getStub')
+        getStubPatcher.start()
+        self.addCleanup(getStubPatcher.stop)
+        self.logDir = tempfile.mkdtemp()
+        self.job = opencue.wrappers.job.Job(job_pb2.Job(name='job', log_dir=self.logDir))
+        with open(os.path.join(self.logDir, 'job.0001-frame.rqlog'), 'wb') as logFile:
+            logFile.write(b'line 1\nline 2\nline 3\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.logDir)
+
+    def __frameLog(self, state=job_pb2.RUNNING):
+        return opencue.framelog.FrameLog(self.job, opencue.wrappers.frame.Frame(
+            job_pb2.Frame(id=TEST_FRAME_ID, name='0001-frame', state=state,
+                          last_resource='host1/4.00')))
+
+    def testTailFromRqd(self, stubMock):
+        stubMock.return_value.TailFrameLog.return_value = \
+            rqd_pb2.RqdStaticTailFrameLogResponse(data=b'buffered\n')
+
+        frameLog = self.__frameLog()
+
+        self.assertEqual('host1', frameLog.host)
+        self.assertEqual(b'buffered\n', frameLog.tail(5))
+        stubMock.return_value.TailFrameLog.assert_called_with(
+            rqd_pb2.RqdStaticTailFrameLogRequest(frame_id=TEST_FRAME_ID, lines=5),
+            timeout=mock.ANY)
+
+    def testTailFromFile(self, stubMock):
+        stubMock.return_value.TailFrameLog.side_effect = \
+            FakeRpcError(grpc.StatusCode.NOT_FOUND)
+
+        frameLog = self.__frameLog()
+
+        self.assertEqual(b'line 2\nline 3\n', frameLog.tail(2))
+        self.assertIsNone(frameLog.host)
+        self.assertEqual(b'line 1\nline 2\nline 3\n', frameLog.tail(10))
+
+    def testTailOfFinishedFrame(self, stubMock):
+        frameLog = self.__frameLog(state=job_pb2.SUCCEEDED)
+
+        self.assertEqual(b'line 3\n', frameLog.tail(1))
+        stubMock.return_value.TailFrameLog.assert_not_called()
+
+    def testTailRaisesOtherErrors(self, stubMock):
+        stubMock.return_value.TailFrameLog.side_effect = \
+            FakeRpcError(grpc.StatusCode.PERMISSION_DENIED)
+
+        self.assertRaises(grpc.RpcError, self.__frameLog().tail)
+
+    def testFollow(self, stubMock):
+        stubMock.return_value.StreamFrameLog.side_effect = [
+            # No longer buffered from offset 0 to 7, then closed by rqd
+            iter([rqd_pb2.RqdStaticStreamFrameLogResponse(data=b'line 2\n', offset=7)]),
+            iter([rqd_pb2.RqdStaticStreamFrameLogResponse(data=b'line 3\n', offset=14),
+                  rqd_pb2.RqdStaticStreamFrameLogResponse(offset=21, finished=True)]),
+        ]
+
+        chunks = list(self.__frameLog().follow())
+
+        self.assertEqual(b'line 1\nline 2\nline 3\n', b''.join(chunks))
+        stubMock.return_value.StreamFrameLog.assert_called_with(
+            rqd_pb2.RqdStaticStreamFrameLogRequest(frame_id=TEST_FRAME_ID, offset=14))
+
+    def testFollowOfFinishedFrame(self, stubMock):
+        stubMock.return_value.StreamFrameLog.side_effect = \
+            FakeRpcError(grpc.StatusCode.NOT_FOUND)
+
+        self.assertEqual(b'line 2\nline 3\n', b''.join(self.__frameLog().follow(7)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Benchmarks launching many frames at once, with and without the launch broker.
+
+Starts the given number of launches together from separate threads, the way
+simultaneous LaunchFrame calls do. Each launch performs the privileged steps
+of FrameAttendantThread: open the log as the frame user, then start the
+command through su. Without the broker these switch the daemon's effective
+uid under rqd.rqutil's permission lock; with it they run in broker handlers.
+Reports the time until each launch returned and until each frame's command
+started. Must be run as root.
+
+    sudo python benchmarks/rqbroker_benchmark.py --launches 50 --user nobody
+"""
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import argparse
+import os
+import pwd
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import rqd.compiled_proto.rqd_pb2
+import rqd.rqbroker
+import rqd.rqconstants
+import rqd.rqutil
+
+
+def directLaunch(runFrame, command):
+    """The steps FrameAttendantThread.run and runLinux take without a broker"""
+    rqd.rqutil.permissionsUser(runFrame.uid, runFrame.gid)
+    try:
+        if not os.access(runFrame.log_dir, os.F_OK):
+            os.makedirs(runFrame.log_dir)
+        rqlog = open(runFrame.log_dir_file, 'w', 1)
+    finally:
+        rqd.rqutil.permissionsLow()
+    rqd.rqutil.permissionsHigh()
+    try:
+        process = subprocess.Popen(command, env={'PATH': '/bin:/usr/bin'}, cwd='/tmp',
+                                   stdin=subprocess.PIPE, stdout=rqlog, stderr=rqlog,
+                                   close_fds=True, preexec_fn=os.setsid)
+    finally:
+        rqd.rqutil.permissionsLow()
+    return process, rqlog
+
+
+def brokerLaunch(broker, runFrame, command):
+    session = broker.openSession()
+    rqlog = session.openLog(runFrame)
+    return session.spawn(command, {'PATH': '/bin:/usr/bin'}, '/tmp', rqlog), rqlog
+
+
+def run(numLaunches, user, useBroker):
+    workDir = tempfile.mkdtemp()
+    os.chmod(workDir, 0o777)
+    broker = None
+    if useBroker:
+        broker = rqd.rqbroker.LaunchBroker()
+        broker.start()
+    rqd.rqutil.permissionsLow()
+
+    userInfo = pwd.getpwnam(user)
+    launched = [None] * numLaunches
+    processes = [None] * numLaunches
+    barrier = threading.Barrier(numLaunches)
+    starts = [None] * numLaunches
+
+    def launch(index):
+        logDir = os.path.join(workDir, 'logs%d' % (index % 5))
+        runFrame = rqd.compiled_proto.rqd_pb2.RunFrame(
+            frame_id='frame%d' % index, user_name=user, uid=userInfo.pw_uid,
+            gid=userInfo.pw_gid, log_dir=logDir,
+            log_dir_file=os.path.join(logDir, 'frame%d.rqlog' % index))
+        stampFile = os.path.join(workDir, 'stamp%d' % index)
+        command = ['/bin/su', user, '-s', '/bin/sh', '-c',
+                   'date +%%s.%%N > %s' % stampFile]
+        barrier.wait()
+        starts[index] = time.time()
+        if broker is None:
+            processes[index] = directLaunch(runFrame, command)
+        else:
+            processes[index] = brokerLaunch(broker, runFrame, command)
+        launched[index] = time.time()
+
+    threads = [threading.Thread(target=launch, args=(i,)) for i in range(numLaunches)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for process, rqlog in processes:
+        process.wait()
+        rqlog.close()
+
+    frameStarts = []
+    for index in range(numLaunches):
+        with open(os.path.join(workDir, 'stamp%d' % index)) as stampFile:
+            frameStarts.append(float(stampFile.read()))
+
+    rqd.rqutil.permissionsHigh()
+    rqd.rqutil.permissionsLow()
+    if broker is not None:
+        broker.stop()
+    shutil.rmtree(workDir, ignore_errors=True)
+
+    first = min(starts)
+    return ([launched[i] - starts[i] for i in range(numLaunches)],
+            [frameStarts[i] - starts[i] for i in range(numLaunches)],
+            max(frameStarts) - first)
+
+
+def summarize(label, values):
+    values = sorted(values)
+    print('  %-16s p50 %7.1f ms  p95 %7.1f ms  max %7.1f ms' % (
+        label, values[len(values) // 2] * 1000, values[int(len(values) * 0.95)] * 1000,
+        values[-1] * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--launches', type=int, default=50)
+    parser.add_argument('--user', default='nobody')
+    args = parser.parse_args()
+
+    if os.getuid() != 0:
+        print('This benchmark must be run as root', file=sys.stderr)
+        sys.exit(1)
+
+    for label, useBroker in (('direct', False), ('broker', True)):
+        launchTimes, frameTimes, wall = run(args.launches, args.user, useBroker)
+        print('%s: %d simultaneous launches, all frames started in %.1f ms' % (
+            label, args.launches, wall * 1000))
+        summarize('launch returned', launchTimes)
+        summarize('frame started', frameTimes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Benchmarks log writes per frame, output written straight to the log versus
+through the batched log writer.
+
+Each frame is a process writing lines and flushing after every one, as a
+chatty renderer does. Written straight to the log, the writes are counted
+from the frame's /proc/self/io. Through the log writer they are the writes
+rqd makes to the log. Point --log-dir at an NFS mount to see the effect on
+write RPCs, with nfsstat -c before and after each run.
+
+    python benchmarks/rqlogwriter_benchmark.py --frames 8 --lines 20000
+"""
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import rqd.rqlogwriter
+
+
+FRAME_SCRIPT = '''
+import sys
+for i in range(%d):
+    sys.stdout.write('frame %%d rendering bucket %%d of %d\\n' %% (%d, i))
+    sys.stdout.flush()
+with open('/proc/self/io') as io:
+    syscw = [line.split()[1] for line in io if line.startswith('syscw')][0]
+with open(%r, 'w') as out:
+    out.write(syscw)
+'''
+
+
+def runFrames(numFrames, numLines, logDir, writer):
+    """Runs the frames and returns the writes made to their logs and the
+    seconds taken"""
+    frames = []
+    start = time.time()
+    for index in range(numFrames):
+        logPath = os.path.join(logDir, 'frame%d.rqlog' % index)
+        countPath = os.path.join(logDir, 'frame%d.syscw' % index)
+        logFile = open(logPath, 'w', 1)
+        if writer is not None:
+            logFile = writer.open(logFile, logPath, maxBytes=0)
+        script = FRAME_SCRIPT % (numLines, numLines, index, countPath)
+        proc = subprocess.Popen([sys.executable, '-c', script],
+                                stdout=logFile, stderr=logFile)
+        frames.append((proc, logFile, countPath))
+
+    writes = 0
+    for proc, logFile, countPath in frames:
+        proc.wait()
+        logFile.close()
+        if writer is not None:
+            writes += logFile.writes
+        else:
+            with open(countPath) as countFile:
+                writes += int(countFile.read())
+    return writes, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--frames', type=int, default=8)
+    parser.add_argument('--lines', type=int, default=20000)
+    parser.add_argument('--log-dir', default=None,
+                        help='Directory the logs are written in, a temporary one by default')
+    args = parser.parse_args()
+
+    logDir = tempfile.mkdtemp(dir=args.log_dir)
+    writer = rqd.rqlogwriter.FrameLogWriter()
+    writer.start()
+    try:
+        directWrites, directTime = runFrames(args.frames, args.lines, logDir, None)
+        batchedWrites, batchedTime = runFrames(args.frames, args.lines, logDir, writer)
+    finally:
+        writer.stop()
+        shutil.rmtree(logDir)
+
+    print('%d frames, %d lines each' % (args.frames, args.lines))
+    print('direct:  %8.1f writes/frame  %6.2f s' % (directWrites / args.frames, directTime))
+    print('batched: %8.1f writes/frame  %6.2f s' % (batchedWrites / args.frames, batchedTime))
+    print('write reduction: %.0fx' % (directWrites / max(batchedWrites, 1)))
+
+
+if __name__ == '__main__':
+    main()
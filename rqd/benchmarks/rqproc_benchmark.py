@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Benchmarks the /proc scan used by rqd's rss updates.
+
+Builds a synthetic /proc tree and compares the legacy per-frame scan of
+every pid against rqd.rqproc.ProcScanner, and measures what sampling the
+frame processes' /proc/<pid>/io adds to a scan.
+
+    python benchmarks/rqproc_benchmark.py --pids 10000 --frames 32
+"""
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import rqd.rqproc
+
+
+def buildProcTree(root, numPids, numFrames):
+    """Writes numPids stat files, a third of which belong to frame sessions."""
+    sessions = list(range(1000, 1000 + numFrames))
+    for i in range(numPids):
+        pid = 1000 + i
+        if i % 3 == 0 and numFrames:
+            session = sessions[i % numFrames]
+        else:
+            session = 1
+        os.makedirs(os.path.join(root, str(pid)))
+        with open(os.path.join(root, str(pid), 'stat'), 'w') as statFile:
+            statFile.write(
+                '%d (proc-%d) S 1 %d %d 0 -1 4210688 317 0 1 0 31 13 0 0 20 0 1 0 17385159 '
+                '4460544 154 18446744073709551615 4194304 4204692 140725890735264 0 0 0 0 '
+                '16781318 0 0 0 0 17 4 0 0 0 0 0\n' % (pid, pid, session, session))
+        with open(os.path.join(root, str(pid), 'io'), 'w') as ioFile:
+            ioFile.write(
+                'rchar: %d\nwchar: %d\nsyscr: 120\nsyscw: 40\nread_bytes: %d\n'
+                'write_bytes: %d\ncancelled_write_bytes: 0\n' % (
+                    pid * 4096, pid * 1024, pid * 2048, pid * 512))
+    return sessions
+
+
+def legacyScan(root, sessions):
+    """The pre-rqproc algorithm: a dict of strings per pid and a nested loop."""
+    pids = {}
+    for pid in os.listdir(root):
+        if pid.isdigit():
+            with open(os.path.join(root, pid, 'stat'), 'r') as statFile:
+                statFields = statFile.read().split()
+            pids[pid] = {
+                'session': statFields[5], 'vsize': statFields[22], 'rss': statFields[23],
+                'utime': statFields[13], 'stime': statFields[14],
+                'cutime': statFields[15], 'cstime': statFields[16],
+                'start_time': statFields[21]}
+    totals = {}
+    for session in sessions:
+        rss = 0
+        for data in pids.values():
+            if data['session'] == str(session):
+                rss += int(data['rss'])
+        totals[session] = rss
+    return totals
+
+
+def scannerScan(scanner, sessions):
+    totals = {}
+    for session, procs in scanner.scan(sessions).items():
+        totals[session] = sum(proc.rss for proc in procs)
+    return totals
+
+
+def scannerScanWithIo(scanner, sessions, accounting):
+    """The scan rssUpdate does, with the I/O of each frame's processes."""
+    totals = {}
+    now = time.time()
+    for session, procs in scanner.scan(sessions).items():
+        totals[session] = sum(proc.rss for proc in procs)
+        accounting[session].update(scanner.readIoOf(proc.pid for proc in procs), now)
+        accounting[session].attributes()
+    return totals
+
+
+def timeIt(func, iterations):
+    start = time.time()
+    for _ in range(iterations):
+        result = func()
+    return (time.time() - start) / iterations, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pids', type=int, default=10000)
+    parser.add_argument('--frames', type=int, default=32)
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='rqproc-bench-')
+    try:
+        sessions = buildProcTree(root, args.pids, args.frames)
+        scanner = rqd.rqproc.ProcScanner(root)
+
+        legacyTime, legacyResult = timeIt(lambda: legacyScan(root, sessions), args.iterations)
+        scanTime, scanResult = timeIt(lambda: scannerScan(scanner, sessions), args.iterations)
+        accounting = dict((session, rqd.rqproc.IoAccounting()) for session in sessions)
+        ioTime, ioResult = timeIt(
+            lambda: scannerScanWithIo(scanner, sessions, accounting), args.iterations)
+        assert legacyResult == scanResult == ioResult
+
+        print('pids=%d frames=%d iterations=%d' % (args.pids, args.frames, args.iterations))
+        print('legacy  %8.2f ms/scan' % (legacyTime * 1000))
+        print('rqproc  %8.2f ms/scan' % (scanTime * 1000))
+        print('speedup %8.2fx' % (legacyTime / scanTime))
+        frameProcs = sum(len(procs) for procs in scanner.scan(sessions).values())
+        print('with io %8.2f ms/scan, %.1f us per frame process' % (
+            ioTime * 1000, (ioTime - scanTime) * 1e6 / max(frameProcs, 1)))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Benchmarks status report size and build time, full versus delta encoded.
+
+Simulates a host running a number of frames whose memory drifts a little
+every interval, a few of which change by more than the report threshold.
+Each frame's pcpu and io rates are resampled every interval with a relative
+jitter, and its io totals grow at those rates, as rssUpdate reports them.
+
+    python benchmarks/rqreport_benchmark.py --frames 100 --reports 200 --jitter 0.005
+"""
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import argparse
+import random
+import time
+
+import rqd.compiled_proto.report_pb2
+import rqd.rqproc
+import rqd.rqreport
+
+# Seconds between reports, the io totals grow by this many seconds of their rate
+INTERVAL = 10
+
+
+def sampleAttributes(frame, jitter):
+    """Resamples a frame's pcpu and io rates, and grows its io totals"""
+    attributes = {'CPU_LIST': frame['cpus'],
+                  'pcpu': str(frame['pcpu'] * random.gauss(1, jitter))}
+    for field, name in rqd.rqproc.IO_ATTRIBUTES:
+        rate = frame['io'][field] * max(random.gauss(1, jitter), 0)
+        frame['ioTotals'][field] += int(rate * INTERVAL)
+        attributes[name] = str(frame['ioTotals'][field])
+        attributes[name + '_per_sec'] = str(int(rate))
+    return attributes
+
+
+def buildReport(frames, tick, jitter):
+    """Builds a full report the way Machine.getHostReport does."""
+    report = rqd.compiled_proto.report_pb2.HostReport()
+    report.host.name = 'render01'
+    report.host.total_mem = 256 * 1024 * 1024
+    report.host.free_mem = 128 * 1024 * 1024 + random.randint(0, 1024)
+    report.host.load = 3200
+    report.host.tags.extend(['general', 'desktop'])
+    report.host.attributes['SP_OS'] = 'Linux'
+    report.host.attributes['hyperthreadingMultiplier'] = '2'
+    report.core_info.total_cores = 6400
+    for index, frame in enumerate(frames):
+        # One frame in twenty grows by more than the threshold each tick
+        if index % 20 == tick % 20:
+            frame['rss'] = int(frame['rss'] * 1.05)
+        else:
+            frame['rss'] += random.randint(0, 64)
+        info = rqd.compiled_proto.report_pb2.RunningFrameInfo(
+            resource_id='resource-%d' % index, job_id='job-id', job_name='show-shot-job',
+            frame_id=frame['id'], frame_name='%04d-layer' % index, layer_id='layer-id',
+            num_cores=100, start_time=1600000000, max_rss=frame['rss'], rss=frame['rss'],
+            max_vsize=frame['rss'] * 2, vsize=frame['rss'] * 2,
+            attributes=sampleAttributes(frame, jitter))
+        report.frames.extend([info])
+    return report
+
+
+def newFrame(index):
+    """A frame with an hour of io behind it"""
+    io = dict((field, random.choice((1, 10, 100)) * 1024 * 1024)
+              for field, _ in rqd.rqproc.IO_ATTRIBUTES)
+    io['syscr'] = io['syscw'] = 2000
+    return {'id': 'frame-%04d' % index, 'rss': 1024 * 1024, 'cpus': str(index),
+            'pcpu': random.uniform(90, 100), 'io': io,
+            'ioTotals': dict((field, rate * 3600) for field, rate in io.items())}
+
+
+def run(numFrames, numReports, delta, jitter):
+    random.seed(0)
+    frames = [newFrame(index) for index in range(numFrames)]
+    encoder = rqd.rqreport.HostReportEncoder()
+    totalBytes = 0
+    start = time.time()
+    for tick in range(numReports):
+        report = buildReport(frames, tick, jitter)
+        if delta:
+            report = encoder.encode(report)
+            response = rqd.compiled_proto.report_pb2.RqdReportStatusResponse(
+                acknowledged_version=report.report_version)
+            encoder.acknowledge(report.report_version, response)
+        totalBytes += len(report.SerializeToString())
+    elapsed = time.time() - start
+    return totalBytes / numReports, elapsed * 1000 / numReports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--reports', type=int, default=200)
+    parser.add_argument('--jitter', type=float, default=0.005,
+                        help='Relative standard deviation of the pcpu and io rate samples')
+    args = parser.parse_args()
+
+    fullSize, fullTime = run(args.frames, args.reports, False, args.jitter)
+    deltaSize, deltaTime = run(args.frames, args.reports, True, args.jitter)
+
+    print('%d frames, %d reports, %.1f%% jitter' % (args.frames, args.reports,
+                                                   args.jitter * 100))
+    print('full:  %8.0f bytes/report  %6.2f ms/report' % (fullSize, fullTime))
+    print('delta: %8.0f bytes/report  %6.2f ms/report' % (deltaSize, deltaTime))
+    print('size reduction: %.1fx' % (fullSize / deltaSize))
+
+
+if __name__ == '__main__':
+    main()
@@ -40,6 +40,8 @@ OVERRIDE_NIMBY = False
 GPU = True
 # True will force 256mb gpu memory
 PLAYBLAST = True
+# 'cgroup' accounts frame resources through per-frame cgroup v2 leaves
+RQD_ACCOUNTING_BACKEND = proc
 """
 
 
@@ -30,6 +30,7 @@ import os
 import random
 import re
 import sys
+import time
 
 import grpc
 
@@ -50,6 +51,11 @@ class RqdHost(object):
     def status(self):
         return self.stub.ReportStatus(rqd.compiled_proto.rqd_pb2.RqdStaticReportStatusRequest())
 
+    def getMachineHistory(self, startTime=0, endTime=0, metrics=None):
+        return self.stub.GetMachineHistory(
+            rqd.compiled_proto.rqd_pb2.RqdStaticGetMachineHistoryRequest(
+                start_time=startTime, end_time=endTime, metrics=metrics))
+
     def getRunningFrame(self, frameId):
         return self.stub.GetRunFrame(
             rqd.compiled_proto.rqd_pb2.RqdStaticGetRunFrameRequest(frame_id=frameId))
@@ -113,6 +119,11 @@ class RqdHost(object):
         runFrame = self.getRunningFrame(frameId)
         self.frameStub.Kill(run_frame=runFrame, message=message)
 
+    def killFrames(self, frameIds, message):
+        return self.stub.KillRunningFrames(
+            rqd.compiled_proto.rqd_pb2.RqdStaticKillRunningFramesRequest(
+                frame_ids=frameIds, message=message))
+
 
 def main():
     parser = argparse.ArgumentParser()
@@ -120,6 +131,7 @@ def main():
     parser.add_argument('host', nargs='?', default='localhost', help='RQD hostname (defaults to localhost)')
     parser.add_argument('-s', action='store_true', help='Print RQD status')
     parser.add_argument('-v', action='store_true', help='Print RQD version')
+    parser.add_argument('--history', metavar='seconds', type=int, help="Print the host's and running frames' resource use over the last seconds")
     parser.add_argument('--lp', metavar='coreID', nargs='+', help='Lock the specified cores')
     parser.add_argument('--ulp', metavar='coreID', nargs='+', help='Unlock the specified cores')
     parser.add_argument('--lh', action='store_true', help='Lock all cores for the specified host')
@@ -151,6 +163,9 @@ def main():
             if tag.startswith(tagPrefix):
                 print("version =", tag[len(tagPrefix):])
                 
+    if args.history is not None:
+        print(rqdHost.getMachineHistory(startTime=time.time() - args.history))
+
     if args.nimbyoff:
         rqdHost.nimbyOff()
         
@@ -0,0 +1,489 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Privileged launch broker for Linux.
+
+Switching the effective uid is process wide, so launching frames from rqd's
+threads with rqd.rqutil.permissionsHigh/permissionsUser serializes every
+launch on one lock. The broker is forked from rqd at startup, before any
+gRPC thread exists, and keeps the saved root uid. For every launch rqd
+hands the broker one end of a new socket pair and the broker forks a
+handler for it. The handler is free to change its own uid while it creates
+the user and log directory, opens the log, and forks the frame, so launches
+run in parallel.
+
+The frame is a grandchild of the broker. rqd marks itself a child
+subreaper, so when the handler exits the frame is reparented to rqd, which
+waits on it like any other child. Processes a frame leaves behind when it
+exits are reparented to rqd too, rqd reaps them with reapOrphans.
+
+Messages are JSON over SOCK_SEQPACKET, file descriptors travel as
+SCM_RIGHTS.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import array
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import json
+import logging as log
+import os
+import platform
+import signal
+import socket
+import threading
+import time
+
+import rqd.rqconstants
+import rqd.rqlogrotate
+import rqd.rqtopology
+import rqd.rqutil
+
+try:
+    import grp
+    import pwd
+except ImportError:
+    pass
+
+
+PR_SET_CHILD_SUBREAPER = 36
+MAX_MESSAGE_SIZE = 1024 * 1024
+MAX_FDS = 4
+# Signals rqd or the broker ignore, restored to their defaults for frames
+RESET_SIGNALS = (signal.SIGCHLD, signal.SIGINT, signal.SIGTERM, signal.SIGPIPE, signal.SIGXFSZ)
+
+
+def setChildSubreaper():
+    """Makes orphaned descendants of this process its children"""
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    if libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) != 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+
+
+def getParentPid(pid):
+    """Returns the parent of a process from /proc"""
+    with open('/proc/%d/stat' % pid) as statFile:
+        stat = statFile.read()
+    # The command name may contain spaces and parentheses
+    return int(stat[stat.rindex(')') + 2:].split()[1])
+
+
+def getZombieChildren(pid):
+    """Returns the children of a process that have exited and not been
+    waited on, from /proc"""
+    zombies = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/%s/stat' % entry) as statFile:
+                stat = statFile.read()
+        except (IOError, OSError):
+            continue
+        fields = stat[stat.rindex(')') + 2:].split()
+        if fields[0] == 'Z' and int(fields[1]) == pid:
+            zombies.append(int(entry))
+    return zombies
+
+
+def awaitReparent(pid):
+    """Waits until a frame launched by the broker has become a child of this
+    process. The handler's socket is closed as it exits, shortly before its
+    children are reparented."""
+    deadline = time.time() + rqd.rqconstants.RQD_LAUNCH_BROKER_TIMEOUT_SEC
+    polls = 0
+    while getParentPid(pid) != os.getpid():
+        if time.time() > deadline:
+            raise RuntimeError('Frame %d was not reparented to rqd' % pid)
+        # Normally a matter of microseconds, yield before sleeping
+        polls += 1
+        time.sleep(0 if polls < 100 else 0.001)
+
+
+def sendMessage(sock, message, fds=()):
+    """Sends a JSON message and optional file descriptors as one packet"""
+    ancillary = []
+    if fds:
+        ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))]
+    sock.sendmsg([json.dumps(message).encode('utf-8')], ancillary)
+
+
+def recvMessage(sock):
+    """Receives a packet sent by sendMessage.
+    @rtype:  tuple<dict, list<int>>
+    @return: The message, None once the peer has closed, and any received
+             file descriptors"""
+    fdSize = array.array('i').itemsize * MAX_FDS
+    data, ancillary, _, _ = sock.recvmsg(MAX_MESSAGE_SIZE, socket.CMSG_SPACE(fdSize))
+    fds = array.array('i')
+    for level, kind, payload in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(payload[:len(payload) - len(payload) % fds.itemsize])
+    if not data:
+        return None, list(fds)
+    return json.loads(data.decode('utf-8')), list(fds)
+
+
+class BrokeredProcess(object):
+    """A frame spawned by the broker and reparented to rqd. Provides the
+    parts of subprocess.Popen that rqd uses."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+
+    def wait(self):
+        """Waits for the frame to exit and returns its return code"""
+        while self.returncode is None:
+            try:
+                _, status = os.waitpid(self.pid, 0)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if os.WIFSIGNALED(status):
+                self.returncode = -os.WTERMSIG(status)
+            else:
+                self.returncode = os.WEXITSTATUS(status)
+        return self.returncode
+
+
+class LaunchSession(object):
+    """One frame launch, served by its own handler in the broker."""
+
+    def __init__(self, sock):
+        self.__sock = sock
+        self.__sock.settimeout(rqd.rqconstants.RQD_LAUNCH_BROKER_TIMEOUT_SEC)
+
+    def openLog(self, runFrame):
+        """Creates the frame user if needed and opens the frame's log as
+        that user, rotating any previous log.
+        @type  runFrame: RunFrame
+        @param runFrame: rqd_pb2.RunFrame with log_dir and log_dir_file set
+        @rtype:  file
+        @return: The log, line buffered"""
+        createUser = (rqd.rqconstants.RQD_CREATE_USER_IF_NOT_EXISTS
+                      and not rqd.rqutil.isKnownUser(runFrame.user_name))
+        request = {
+            'op': 'openLog',
+            'userName': runFrame.user_name,
+            'createUser': createUser,
+            'logDir': runFrame.log_dir,
+            'logDirFile': runFrame.log_dir_file,
+            'maxLogFiles': rqd.rqconstants.MAX_LOG_FILES,
+        }
+        if runFrame.HasField('uid'):
+            request['uid'] = runFrame.uid
+            request['gid'] = runFrame.gid
+        _, fds = self.__call(request)
+        if createUser:
+            rqd.rqutil.markKnownUser(runFrame.user_name)
+        return os.fdopen(fds[0], 'w', 1)
+
+    def spawn(self, command, env, cwd, logFile, cgroupProcs=None, cpus=None, niceness=0,
+              numaNodes=None):
+        """Starts the frame in a new session with its output going to the log.
+        @type  command: list<str>
+        @param command: Arguments of the frame's command
+        @type  env: dict
+        @param env: Environment of the frame
+        @type  cwd: str
+        @param cwd: Working directory of the frame
+        @type  logFile: file
+        @param logFile: The log returned by openLog
+        @type  cgroupProcs: str
+        @param cgroupProcs: cgroup.procs file the frame is moved into
+        @type  cpus: set<int>
+        @param cpus: Cpus the frame is bound to, None for all
+        @type  niceness: int
+        @param niceness: Increment to the frame's niceness
+        @type  numaNodes: set<int>
+        @param numaNodes: Numa nodes the frame's memory is allocated from
+        @rtype:  BrokeredProcess
+        @return: The running frame"""
+        logFile.flush()
+        request = {
+            'op': 'spawn',
+            'command': command,
+            'env': env,
+            'cwd': cwd,
+            'cgroupProcs': cgroupProcs,
+            'cpus': sorted(cpus) if cpus else None,
+            'niceness': niceness,
+            'numaNodes': sorted(numaNodes) if numaNodes else None,
+        }
+        reply, _ = self.__call(request, [logFile.fileno()])
+        message, _ = recvMessage(self.__sock)
+        if message is not None:
+            raise RuntimeError('Unexpected message from launch broker: %s' % message)
+        self.close()
+        awaitReparent(reply['pid'])
+        return BrokeredProcess(reply['pid'])
+
+    def close(self):
+        self.__sock.close()
+
+    def __call(self, request, fds=()):
+        sendMessage(self.__sock, request, fds)
+        reply, receivedFds = recvMessage(self.__sock)
+        if reply is None:
+            raise RuntimeError('Launch broker closed the session')
+        if 'error' in reply:
+            for fd in receivedFds:
+                os.close(fd)
+            raise RuntimeError(reply['error'])
+        return reply, receivedFds
+
+
+class LaunchBroker(object):
+    """Client side of the launch broker, owned by RqCore."""
+
+    def __init__(self):
+        self.pid = None
+        self.__control = None
+        self.__lock = threading.Lock()
+        self.__zombies = set()
+
+    @staticmethod
+    def isSupported():
+        """Returns True if the broker can run on this host"""
+        return (platform.system() == 'Linux'
+                and hasattr(socket, 'SOCK_SEQPACKET')
+                and hasattr(socket.socket, 'sendmsg')
+                and hasattr(os, 'posix_spawnp'))
+
+    def start(self):
+        """Forks the broker. Must be called before rqd starts threads that
+        could hold locks the broker would inherit."""
+        setChildSubreaper()
+        control, brokerEnd = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                control.close()
+                _serveBroker(brokerEnd)
+            finally:
+                os._exit(0)
+        brokerEnd.close()
+        self.__control = control
+        self.pid = pid
+
+    def stop(self):
+        """Stops the broker, frames already launched keep running"""
+        with self.__lock:
+            if self.__control is None:
+                return
+            self.__control.close()
+            self.__control = None
+        try:
+            os.waitpid(self.pid, 0)
+        except OSError:
+            pass
+
+    def reapOrphans(self, framePids):
+        """Reaps the exited processes rqd adopted as child subreaper, the
+        background processes of frames that have exited. Only zombies already
+        seen by the previous call are reaped, so a frame or a subprocess of
+        rqd that has only just exited is left to whoever waits on it.
+        @type  framePids: set<int>
+        @param framePids: Pids of the running frames, never reaped here
+        @rtype:  int
+        @return: The number of processes reaped"""
+        zombies = set(getZombieChildren(os.getpid())) - set(framePids) - set([self.pid])
+        reaped = set()
+        for pid in zombies & self.__zombies:
+            try:
+                if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                    reaped.add(pid)
+            except OSError:
+                # Reaped by its owner in the meantime
+                pass
+        self.__zombies = zombies - reaped
+        if reaped:
+            log.info('Reaped %d orphaned processes of exited frames: %s' % (
+                len(reaped), ', '.join(str(pid) for pid in sorted(reaped))))
+        return len(reaped)
+
+    def openSession(self):
+        """Starts a launch with its own handler in the broker
+        @rtype:  LaunchSession
+        @return: The session the launch is made through"""
+        session, handlerEnd = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            with self.__lock:
+                if self.__control is None:
+                    raise RuntimeError('Launch broker is not running')
+                sendMessage(self.__control, {'op': 'session'}, [handlerEnd.fileno()])
+        except Exception:
+            session.close()
+            raise
+        finally:
+            handlerEnd.close()
+        return LaunchSession(session)
+
+
+def _serveBroker(control):
+    """Main loop of the broker process, forks a handler per session until rqd
+    closes the control socket"""
+    # Handlers are reaped automatically, rqd stops the broker by closing the
+    # control socket rather than with a signal
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    while True:
+        try:
+            message, fds = recvMessage(control)
+        except (IOError, OSError) as e:
+            if e.errno == errno.EINTR:
+                continue
+            return
+        if message is None:
+            return
+        for fd in fds:
+            if os.fork() == 0:
+                try:
+                    control.close()
+                    _serveSession(socket.socket(fileno=fd))
+                finally:
+                    os._exit(0)
+            os.close(fd)
+
+
+def _serveSession(sock):
+    """Handles the requests of one launch"""
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    pruned = []
+    while True:
+        request, fds = recvMessage(sock)
+        if request is None:
+            return
+        try:
+            if request['op'] == 'openLog':
+                logFd, pruned = _openLog(request)
+                sendMessage(sock, {}, [logFd])
+            elif request['op'] == 'spawn':
+                sendMessage(sock, {'pid': _spawn(request, fds[0])})
+                # Logs rotated out are deleted once the frame has started
+                rqd.rqlogrotate.prune(pruned)
+                return
+            else:
+                raise RuntimeError('Unknown launch broker request %s' % request['op'])
+        except Exception as e:
+            sendMessage(sock, {'error': str(e)})
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+
+def _becomeRoot():
+    if os.geteuid() != os.getuid():
+        os.seteuid(os.getuid())
+    os.setegid(os.getgid())
+
+
+def _becomeUser(uid, gid):
+    try:
+        username = pwd.getpwuid(uid).pw_name
+        groups = [20] + [g.gr_gid for g in grp.getgrall() if username in g.gr_mem]
+        os.setgroups(groups)
+    except Exception:
+        pass
+    os.setegid(gid)
+    os.seteuid(uid)
+
+
+def _openLog(request):
+    """Creates the log directory and opens the rotated log as the frame user.
+    Mirrors what FrameAttendantThread.run does without a broker."""
+    _becomeRoot()
+    if request['createUser']:
+        rqd.rqutil.checkAndCreateUser(request['userName'])
+    if 'uid' in request:
+        _becomeUser(request['uid'], request['gid'])
+
+    logDir = request['logDir']
+    logDirFile = request['logDirFile']
+    if not os.access(logDir, os.F_OK):
+        msg = "No Error"
+        try:
+            os.makedirs(logDir)
+            os.chmod(logDir, 0o777)
+        except Exception as e:
+            msg = e
+        if not os.access(logDir, os.F_OK):
+            raise RuntimeError("Unable to see log directory: %s, mkdir failed with: %s" % (
+                logDir, msg))
+    if not os.access(logDir, os.W_OK):
+        raise RuntimeError("Unable to write to log directory %s" % logDir)
+
+    try:
+        pruned = rqd.rqlogrotate.rotate(logDirFile, request['maxLogFiles'])
+    except Exception as e:
+        raise RuntimeError("Unable to rotate previous log file due to %s" % e)
+
+    try:
+        fd = os.open(logDirFile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    except Exception as e:
+        raise RuntimeError("Unable to write to %s due to %s" % (logDirFile, e))
+    try:
+        os.chmod(logDirFile, 0o666)
+    except OSError:
+        pass
+    return fd, pruned
+
+
+def _spawn(request, logFd):
+    """Starts the frame with posix_spawn, which avoids copying the handler.
+    The handler moves itself into the frame's cgroup first so the frame
+    starts there, and likewise sets the niceness, cpu affinity and memory
+    policy the frame inherits. It exits once the frame is running."""
+    _becomeRoot()
+    if request['cgroupProcs']:
+        with open(request['cgroupProcs'], 'w') as procsFile:
+            procsFile.write(str(os.getpid()))
+    if request.get('niceness'):
+        os.nice(request['niceness'])
+    if request.get('cpus'):
+        os.sched_setaffinity(0, request['cpus'])
+    if request.get('numaNodes'):
+        rqd.rqtopology.setMemoryPolicy(request['numaNodes'])
+    os.chdir(request['cwd'])
+    for fd in os.listdir('/proc/self/fd'):
+        fd = int(fd)
+        if fd > 2:
+            try:
+                fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+            except (IOError, OSError):
+                pass
+    fileActions = [
+        (os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0),
+        (os.POSIX_SPAWN_DUP2, logFd, 1),
+        (os.POSIX_SPAWN_DUP2, logFd, 2),
+    ]
+    command = request['command']
+    try:
+        return os.posix_spawnp(command[0], command, request['env'], file_actions=fileActions,
+                               setsid=True, setsigdef=RESET_SIGNALS)
+    except OSError as e:
+        raise RuntimeError('Unable to launch frame: %s' % e)
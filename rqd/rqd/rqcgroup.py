@@ -0,0 +1,248 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+cgroup v2 based per-frame resource accounting.
+
+Every frame is placed in its own leaf cgroup below RQD_CGROUP_NAME so its
+memory, cpu and io usage can be read with a constant number of file reads,
+regardless of how many processes the frame forks.
+
+A frame's rss is the anonymous and mapped file memory of memory.stat, so
+like the /proc backend it leaves out page cache the frame only read or
+wrote. memory.current and memory.peak, which include that cache, are kept
+separately as memoryCurrent and memoryPeak.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import collections
+import errno
+import logging as log
+import os
+import signal
+
+import rqd.rqconstants
+
+
+CONTROLLERS = ('memory', 'cpu', 'io')
+
+# Memory values are in kB, cpu times in microseconds and io in bytes.
+CgroupStats = collections.namedtuple(
+    'CgroupStats',
+    ['rss', 'maxRss', 'memoryCurrent', 'memoryPeak', 'usageUsec', 'userUsec', 'systemUsec',
+     'readBytes', 'writeBytes'])
+
+# memory.stat entries counted as a frame's rss
+RSS_MEMORY_STATS = ('anon', 'file_mapped')
+
+
+def joinCgroup(procsPath):
+    """Returns a function for subprocess.Popen's preexec_fn that starts a new
+    session and moves the child into the given cgroup before exec.
+    @type  procsPath: str
+    @param procsPath: Path of the frame cgroup's cgroup.procs file
+    @rtype:  function
+    @return: The preexec function"""
+    def preexec():
+        os.setsid()
+        with open(procsPath, 'w') as procsFile:
+            procsFile.write(str(os.getpid()))
+    return preexec
+
+
+def freezeCgroup(procsPath, frozen):
+    """Freezes or thaws every process in a frame's cgroup
+    @type  procsPath: str
+    @param procsPath: Path of the frame cgroup's cgroup.procs file
+    @type  frozen: bool
+    @param frozen: True to freeze, False to thaw"""
+    freezePath = os.path.join(os.path.dirname(procsPath), 'cgroup.freeze')
+    with open(freezePath, 'w') as freezeFile:
+        freezeFile.write('1' if frozen else '0')
+
+
+def signalCgroup(procsPath, signum):
+    """Sends a signal to every process in a frame's cgroup, including
+    processes that left the frame's process group. SIGKILL is sent with
+    cgroup.kill where the kernel has it.
+    @type  procsPath: str
+    @param procsPath: Path of the frame cgroup's cgroup.procs file
+    @type  signum: int
+    @param signum: The signal"""
+    killPath = os.path.join(os.path.dirname(procsPath), 'cgroup.kill')
+    if signum == signal.SIGKILL and os.path.isfile(killPath):
+        with open(killPath, 'w') as killFile:
+            killFile.write('1')
+        return
+    with open(procsPath, 'r') as procsFile:
+        pids = procsFile.read().split()
+    for pid in pids:
+        try:
+            os.kill(int(pid), signum)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+
+
+class CgroupManager(object):
+    """Creates, reads and removes per-frame cgroup v2 leaves."""
+
+    def __init__(self, root=None, name=None):
+        """CgroupManager class initialization
+        @type  root: str
+        @param root: Mount point of the cgroup2 filesystem
+        @type  name: str
+        @param name: Name of the parent cgroup holding all frame cgroups"""
+        self.root = root or rqd.rqconstants.PATH_CGROUP
+        self.parent = os.path.join(self.root, name or rqd.rqconstants.RQD_CGROUP_NAME)
+        self.__maxRss = {}
+
+    def isAvailable(self):
+        """Returns True if a cgroup v2 hierarchy is mounted at the root"""
+        return os.path.isfile(os.path.join(self.root, 'cgroup.controllers'))
+
+    def setup(self):
+        """Creates the parent cgroup and delegates the needed controllers to it.
+        @rtype:  bool
+        @return: True if frame cgroups can be used"""
+        if not self.isAvailable():
+            log.warning('cgroup v2 is not mounted at %s' % self.root)
+            return False
+        try:
+            if not os.path.isdir(self.parent):
+                os.mkdir(self.parent)
+            enable = ' '.join('+%s' % controller for controller in CONTROLLERS)
+            for path in (self.root, self.parent):
+                with open(os.path.join(path, 'cgroup.subtree_control'), 'w') as controlFile:
+                    controlFile.write(enable)
+        except (IOError, OSError) as e:
+            log.warning('Unable to set up cgroup %s: %s' % (self.parent, e))
+            return False
+        return True
+
+    def framePath(self, frameId):
+        """Returns the cgroup directory used by a frame"""
+        return os.path.join(self.parent, 'frame-%s' % frameId)
+
+    def framePids(self, frameId):
+        """Returns the pids in a frame's cgroup, empty if it has none
+        @type  frameId: str
+        @param frameId: The frame's unique id
+        @rtype:  list<str>
+        @return: The pids"""
+        try:
+            return self.__readPids(self.framePath(frameId))
+        except (IOError, OSError):
+            return []
+
+    def createFrameGroup(self, frameId):
+        """Creates the leaf cgroup for a frame.
+        @type  frameId: str
+        @param frameId: The frame's unique id
+        @rtype:  str
+        @return: Path of the cgroup.procs file to join"""
+        path = self.framePath(frameId)
+        if not os.path.isdir(path):
+            os.mkdir(path)
+        self.__maxRss[frameId] = 0
+        return os.path.join(path, 'cgroup.procs')
+
+    def readFrameStats(self, frameId):
+        """Reads the current accounting values for a frame.
+        @type  frameId: str
+        @param frameId: The frame's unique id
+        @rtype:  CgroupStats
+        @return: The frame's usage"""
+        path = self.framePath(frameId)
+
+        memoryCurrent = self.__readInt(os.path.join(path, 'memory.current')) // 1024
+        peakPath = os.path.join(path, 'memory.peak')
+        if os.path.isfile(peakPath):
+            # memory.peak is only available on kernels >= 5.19
+            memoryPeak = self.__readInt(peakPath) // 1024
+        else:
+            memoryPeak = memoryCurrent
+
+        memoryStat = self.__readKeyed(os.path.join(path, 'memory.stat'))
+        rss = sum(memoryStat.get(name, 0) for name in RSS_MEMORY_STATS) // 1024
+        # The peak of the sampled rss, memory.peak includes page cache
+        maxRss = max(rss, self.__maxRss.get(frameId, 0))
+        self.__maxRss[frameId] = maxRss
+
+        cpu = self.__readKeyed(os.path.join(path, 'cpu.stat'))
+
+        readBytes = writeBytes = 0
+        ioPath = os.path.join(path, 'io.stat')
+        if os.path.isfile(ioPath):
+            with open(ioPath, 'r') as ioFile:
+                # 8:0 rbytes=1 wbytes=2 rios=3 wios=4 dbytes=0 dios=0
+                for line in ioFile:
+                    for field in line.split()[1:]:
+                        key, _, value = field.partition('=')
+                        if key == 'rbytes':
+                            readBytes += int(value)
+                        elif key == 'wbytes':
+                            writeBytes += int(value)
+
+        return CgroupStats(
+            rss=rss,
+            maxRss=maxRss,
+            memoryCurrent=memoryCurrent,
+            memoryPeak=memoryPeak,
+            usageUsec=cpu.get('usage_usec', 0),
+            userUsec=cpu.get('user_usec', 0),
+            systemUsec=cpu.get('system_usec', 0),
+            readBytes=readBytes,
+            writeBytes=writeBytes)
+
+    def removeFrameGroup(self, frameId):
+        """Removes a frame's cgroup, killing any processes left behind."""
+        path = self.framePath(frameId)
+        self.__maxRss.pop(frameId, None)
+        if not os.path.isdir(path):
+            return
+        killPath = os.path.join(path, 'cgroup.kill')
+        try:
+            if os.path.isfile(killPath) and self.__readPids(path):
+                with open(killPath, 'w') as killFile:
+                    killFile.write('1')
+            os.rmdir(path)
+        except (IOError, OSError) as e:
+            log.warning('Unable to remove cgroup %s: %s' % (path, e))
+
+    @staticmethod
+    def __readPids(path):
+        with open(os.path.join(path, 'cgroup.procs'), 'r') as procsFile:
+            return procsFile.read().split()
+
+    @staticmethod
+    def __readInt(path):
+        with open(path, 'r') as valueFile:
+            return int(valueFile.read().strip())
+
+    @staticmethod
+    def __readKeyed(path):
+        values = {}
+        with open(path, 'r') as keyedFile:
+            for line in keyedFile:
+                key, _, value = line.partition(' ')
+                if value:
+                    values[key] = int(value)
+        return values
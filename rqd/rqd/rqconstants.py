@@ -31,6 +31,7 @@ import platform
 import re
 import subprocess
 import sys
+import tempfile
 import traceback
 
 if platform.system() == 'Linux':
@@ -50,25 +51,150 @@ DEFAULT_FACILITY = 'cloud'
 
 # GRPC VALUES
 RQD_GRPC_MAX_WORKERS = 10
+# RqdInterface calls served at once, for calls changing the host and for
+# queries, and the calls accepted at once including those waiting for them.
+# Calls changing the host over their limit wait for a slot, the cuebot does
+# not retry them.
+RQD_GRPC_MAX_CONTROL_CALLS = 6
+RQD_GRPC_MAX_QUEUED_CONTROL_CALLS = 20
+RQD_GRPC_CONTROL_CALL_WAIT_SEC = 60
+RQD_GRPC_MAX_QUERY_CALLS = 4
+RQD_GRPC_MAX_CONCURRENT_RPCS = 100
 RQD_GRPC_PORT = 8444
 RQD_GRPC_SLEEP_SEC = 60 * 60 * 24
 RQD_GRPC_CONNECTION_ATTEMPT_SLEEP_SEC = 15
 RQD_GRPC_RETRY_CONNECTION = True
 CUEBOT_GRPC_PORT = 8443
+# cuebot's gRPC server keeps grpc-java's default keepalive policy, which
+# answers pings more often than every 5 minutes, or pings while no call is in
+# progress, with GOAWAY too_many_pings and drops the channel
+RQD_GRPC_KEEPALIVE_TIME_MS = 5 * 60 * 1000
+RQD_GRPC_KEEPALIVE_TIMEOUT_MS = 10000
+RQD_GRPC_FAILOVER_BACKOFF_BASE_SEC = 1
+RQD_GRPC_FAILOVER_BACKOFF_MAX_SEC = 60
 
 # RQD behavior:
 RSS_UPDATE_INTERVAL = 10
 RQD_MIN_PING_INTERVAL_SEC = 5
 RQD_MAX_PING_INTERVAL_SEC = 30
 MAX_LOG_FILES = 15
+# Logs rotated out are deleted this long after the frame was launched
+RQD_LOG_PRUNE_DELAY_SEC = 5
 CORE_VALUE = 100
 LAUNCH_FRAME_USER_GID = 20
 RQD_RETRY_STARTUP_CONNECT_DELAY = 30
 RQD_RETRY_CRITICAL_REPORT_DELAY = 30
 RQD_USE_IP_AS_HOSTNAME = True
 RQD_CREATE_USER_IF_NOT_EXISTS = True
+# Wait on frames with a single pidfd/epoll reaper thread when supported
+RQD_USE_FRAME_REAPER = True
+RQD_REAPER_WORKERS = 4
+# Worker threads for blocking scheduled jobs (status reports, nimby)
+RQD_SCHEDULER_WORKERS = 4
+# Log a warning when a scheduled job starts this many seconds late
+RQD_SCHEDULER_MAX_DRIFT_SEC = 5
+# Send status reports as deltas against the last report the cuebot acknowledged
+RQD_USE_DELTA_REPORTS = True
+RQD_DELTA_REPORTS_BETWEEN_FULL = 20
+# Relative change below which memory and load figures are not re-reported
+RQD_REPORT_CHANGE_THRESHOLD = 0.01
+# Frame completion reports are spooled here until the cuebot has them
+RQD_USE_REPORT_SPOOL = True
+RQD_SPOOL_PATH = os.path.join(
+    '/var/tmp' if platform.system() == 'Linux' else tempfile.gettempdir(),
+    'opencue-rqd', 'frame-complete.spool')
+RQD_SPOOL_MAX_BYTES = 16 * 1024 * 1024
+RQD_SPOOL_DRAIN_BATCH = 50
+# Status reports: events arriving within the coalesce window share one report,
+# a quiet host backs off from the min toward the max ping interval
+RQD_REPORT_COALESCE_SEC = 1
+RQD_REPORT_BACKOFF_FACTOR = 1.5
+# Launch frames through a privileged fork server instead of switching the
+# effective uid of the whole daemon, Linux only
+RQD_USE_LAUNCH_BROKER = False
+RQD_LAUNCH_BROKER_TIMEOUT_SEC = 60
+# Seconds between sweeps for exited orphans of frames adopted by rqd
+RQD_ORPHAN_REAP_INTERVAL_SEC = 60
+# How long launches trust cached users and host environment values
+RQD_USER_CACHE_TTL_SEC = 300
+RQD_STATIC_ENV_TTL_SEC = 60
+# Frames on desktops run at this niceness
+RQD_DESKTOP_FRAME_NICENESS = 10
+# NUMA memory policy of pinned frames: 'preferred' allocates from the frame's
+# node while it has free memory, 'bind' only from the frame's nodes, 'none'
+# leaves the default policy
+RQD_NUMA_MEMORY_POLICY = 'preferred'
+# Suspend frames when nimby locks the host instead of killing them, and
+# resume them once it unlocks. Frames suspended for longer are killed.
+RQD_NIMBY_SUSPEND = False
+RQD_NIMBY_MAX_SUSPEND_SEC = 4 * 60 * 60
+# Input activity is timestamped to this many seconds, the input watcher
+# sleeps this long after seeing activity rather than waking for every event
+RQD_INPUT_ACTIVITY_RESOLUTION_SEC = 1.0
+# Memory pressure admission control, Linux only. Launches are refused once
+# pressure has been high for RQD_PRESSURE_SUSTAIN_SEC. Under critical
+# pressure the frame furthest over its reservation is killed, at most once
+# per cooldown. PSI values are avg10 percentages of /proc/pressure/memory.
+RQD_USE_MEMORY_PRESSURE = True
+RQD_PRESSURE_SAMPLE_SEC = 2
+RQD_PRESSURE_SUSTAIN_SEC = 10
+RQD_PRESSURE_HIGH_SOME_AVG10 = 20.0
+RQD_PRESSURE_HIGH_AVAILABLE_PERCENT = 5.0
+RQD_PRESSURE_CRITICAL_FULL_AVG10 = 20.0
+RQD_PRESSURE_CRITICAL_AVAILABLE_PERCENT = 2.0
+RQD_PRESSURE_PREEMPT_COOLDOWN_SEC = 30
+# Per-job scratch directories kept between frames of a job, Linux only, see
+# rqd.rqscratch. RQD_SCRATCH_PATH defaults to rqd-scratch in the mcp path,
+# and must be a directory owned by root with mode 0755 if it already exists.
+RQD_USE_SCRATCH_CACHE = True
+RQD_SCRATCH_PATH = None
+RQD_SCRATCH_MAX_BYTES = 50 * 1024 * 1024 * 1024
+RQD_SCRATCH_MAX_AGE_SEC = 6 * 60 * 60
+RQD_SCRATCH_MIN_FREE_KB = 10 * 1024 * 1024
+RQD_SCRATCH_EVICT_INTERVAL_SEC = 60
+# Frame output goes through a pipe to one writer thread that writes each log
+# in batches, Linux only, see rqd.rqlogwriter. RQD_LOG_MAX_BYTES of 0 leaves
+# logs uncapped. The last RQD_LOG_MAX_TAIL_BYTES of a capped log's output are
+# held in memory until the frame ends.
+RQD_USE_LOG_WRITER = True
+RQD_LOG_WRITER_BATCH_BYTES = 256 * 1024
+RQD_LOG_WRITER_FLUSH_SEC = 1.0
+RQD_LOG_MAX_BYTES = 1024 * 1024 * 1024
+RQD_LOG_MAX_TAIL_BYTES = 4 * 1024 * 1024
+RQD_LOG_TIMESTAMPS = False
+RQD_LOG_STRIP_ANSI = False
+RQD_LOG_COMPRESS = False
+# The end of each running frame's log is kept in memory for TailFrameLog and
+# StreamFrameLog, 0 to serve neither. A stream is closed after
+# RQD_LOG_STREAM_MAX_SEC, for the client to resume, so it holds a worker for
+# a bounded time. Both are limited apart from the cuebot's calls.
+RQD_LOG_BUFFER_BYTES = 1024 * 1024
+RQD_LOG_TAIL_LINES = 100
+RQD_LOG_STREAM_CHUNK_BYTES = 64 * 1024
+RQD_LOG_STREAM_MAX_SEC = 300
+RQD_GRPC_MAX_LOG_TAILS = 4
+RQD_GRPC_MAX_LOG_STREAMS = 8
+# rqd's metrics, see rqd.rqmetrics, are served over plain HTTP at /metrics on
+# RQD_METRICS_PORT, 0 to not serve them, and/or written every interval to
+# RQD_METRICS_TEXTFILE for node_exporter's textfile collector.
+RQD_METRICS_PORT = 0
+RQD_METRICS_ADDRESS = ''
+RQD_METRICS_TEXTFILE = None
+RQD_METRICS_TEXTFILE_INTERVAL_SEC = 15
+# The host's metrics and running frames' rss are kept in ring buffers for
+# GetMachineHistory, see rqd.rqhistory, RQD_HISTORY_INTERVAL_SEC of 0 to keep
+# none. The defaults keep 24 hours for the host, in 138 KB, and the last 6
+# hours of each running frame, in 11.5 KB per frame.
+RQD_HISTORY_INTERVAL_SEC = 30
+RQD_HISTORY_SAMPLES = 2880
+RQD_HISTORY_FRAME_SAMPLES = 720
 
 KILL_SIGNAL = 9
+# Killed frames get SIGTERM, and KILL_SIGNAL if still running after the grace
+# period. Frames still launching when killed are signalled again after the
+# retry interval.
+RQD_KILL_GRACE_SEC = 10
+RQD_KILL_RETRY_SEC = 1
 if platform.system() == 'Linux':
     RQD_UID = pwd.getpwnam("daemon")[2]
     RQD_GID = pwd.getpwnam("daemon")[3]
@@ -76,12 +202,20 @@ else:
     RQD_UID = 0
     RQD_GID = 0
 
-# ptree reporting is not actually used, and could be slow
+# Per-frame resource accounting backend, 'proc' or 'cgroup'.
+# 'cgroup' places every frame in its own cgroup v2 leaf and falls back to
+# 'proc' when cgroup v2 is not available.
+RQD_ACCOUNTING_BACKEND = 'proc'
+RQD_CGROUP_NAME = 'opencue-rqd'
+
+# Report the process tree of each frame. Host reports only carry a frame's
+# tree when its processes changed, GetRunningFrameStatus always does.
 ENABLE_PTREE = False
 
 # Nimby behavior:
 CHECK_INTERVAL_LOCKED = 60  # = seconds to wait before checking if the user has become idle
 MINIMUM_IDLE = 900          # seconds of idle time required before nimby unlocks
+CHECK_INTERVAL_RESOURCES = 5  # seconds between checks that memory allows running jobs
 MINIMUM_MEM = 524288        # If available memory drops below this amount, lock nimby (need to take into account cache)
 MINIMUM_SWAP = 1048576
 MAXIMUM_LOAD = 75           # If (machine load * 100 / cores) goes over this amount, don't unlock nimby
@@ -89,6 +223,9 @@ MAXIMUM_LOAD = 75           # If (machine load * 100 / cores) goes over this amo
 
 EXITSTATUS_FOR_FAILED_LAUNCH = 256
 EXITSTATUS_FOR_NIMBY_KILL = 286
+# Frames killed to relieve memory pressure. The cuebot treats this status as a
+# memory failure, raising the layer's memory reservation and retrying.
+EXITSTATUS_FOR_MEMORY_PREEMPT = 33
 
 PATH_CPUINFO = "/proc/cpuinfo"
 PATH_INITTAB = "/etc/inittab" # spinux1
@@ -96,6 +233,12 @@ PATH_INIT_TARGET = '/lib/systemd/system/default.target' # rhel7
 PATH_LOADAVG = "/proc/loadavg"
 PATH_STAT = "/proc/stat"
 PATH_MEMINFO = "/proc/meminfo"
+PATH_PRESSURE_MEMORY = "/proc/pressure/memory"
+PATH_PROC = "/proc"
+PATH_CGROUP = "/sys/fs/cgroup"
+PATH_SYS_CPU = "/sys/devices/system/cpu"
+PATH_SYS_NODE = "/sys/devices/system/node"
+PATH_DEV_INPUT = "/dev/input"
 
 if platform.system() == 'Linux':
     SYS_HERTZ = os.sysconf('SC_CLK_TCK')
@@ -186,6 +329,103 @@ try:
             DEFAULT_FACILITY = config.get(__section, "DEFAULT_FACILITY")
         if config.has_option(__section, "LAUNCH_FRAME_USER_GID"):
             LAUNCH_FRAME_USER_GID = config.getint(__section, "LAUNCH_FRAME_USER_GID")
+        if config.has_option(__section, "RQD_ACCOUNTING_BACKEND"):
+            RQD_ACCOUNTING_BACKEND = config.get(__section, "RQD_ACCOUNTING_BACKEND")
+        if config.has_option(__section, "RQD_SPOOL_PATH"):
+            RQD_SPOOL_PATH = config.get(__section, "RQD_SPOOL_PATH")
+        if config.has_option(__section, "RQD_USE_DELTA_REPORTS"):
+            RQD_USE_DELTA_REPORTS = config.getboolean(__section, "RQD_USE_DELTA_REPORTS")
+        if config.has_option(__section, "RQD_USE_MEMORY_PRESSURE"):
+            RQD_USE_MEMORY_PRESSURE = config.getboolean(__section, "RQD_USE_MEMORY_PRESSURE")
+        if config.has_option(__section, "RQD_PRESSURE_SUSTAIN_SEC"):
+            RQD_PRESSURE_SUSTAIN_SEC = config.getint(__section, "RQD_PRESSURE_SUSTAIN_SEC")
+        if config.has_option(__section, "RQD_PRESSURE_HIGH_SOME_AVG10"):
+            RQD_PRESSURE_HIGH_SOME_AVG10 = config.getfloat(
+                __section, "RQD_PRESSURE_HIGH_SOME_AVG10")
+        if config.has_option(__section, "RQD_PRESSURE_HIGH_AVAILABLE_PERCENT"):
+            RQD_PRESSURE_HIGH_AVAILABLE_PERCENT = config.getfloat(
+                __section, "RQD_PRESSURE_HIGH_AVAILABLE_PERCENT")
+        if config.has_option(__section, "RQD_PRESSURE_CRITICAL_FULL_AVG10"):
+            RQD_PRESSURE_CRITICAL_FULL_AVG10 = config.getfloat(
+                __section, "RQD_PRESSURE_CRITICAL_FULL_AVG10")
+        if config.has_option(__section, "RQD_PRESSURE_CRITICAL_AVAILABLE_PERCENT"):
+            RQD_PRESSURE_CRITICAL_AVAILABLE_PERCENT = config.getfloat(
+                __section, "RQD_PRESSURE_CRITICAL_AVAILABLE_PERCENT")
+        if config.has_option(__section, "RQD_NIMBY_SUSPEND"):
+            RQD_NIMBY_SUSPEND = config.getboolean(__section, "RQD_NIMBY_SUSPEND")
+        if config.has_option(__section, "RQD_NIMBY_MAX_SUSPEND_SEC"):
+            RQD_NIMBY_MAX_SUSPEND_SEC = config.getint(__section, "RQD_NIMBY_MAX_SUSPEND_SEC")
+        if config.has_option(__section, "RQD_INPUT_ACTIVITY_RESOLUTION_SEC"):
+            RQD_INPUT_ACTIVITY_RESOLUTION_SEC = config.getfloat(
+                __section, "RQD_INPUT_ACTIVITY_RESOLUTION_SEC")
+        if config.has_option(__section, "RQD_NUMA_MEMORY_POLICY"):
+            RQD_NUMA_MEMORY_POLICY = config.get(__section, "RQD_NUMA_MEMORY_POLICY")
+        if config.has_option(__section, "RQD_USE_LAUNCH_BROKER"):
+            RQD_USE_LAUNCH_BROKER = config.getboolean(__section, "RQD_USE_LAUNCH_BROKER")
+        if config.has_option(__section, "RQD_GRPC_MAX_CONTROL_CALLS"):
+            RQD_GRPC_MAX_CONTROL_CALLS = config.getint(__section, "RQD_GRPC_MAX_CONTROL_CALLS")
+        if config.has_option(__section, "RQD_GRPC_MAX_QUEUED_CONTROL_CALLS"):
+            RQD_GRPC_MAX_QUEUED_CONTROL_CALLS = config.getint(
+                __section, "RQD_GRPC_MAX_QUEUED_CONTROL_CALLS")
+        if config.has_option(__section, "RQD_GRPC_CONTROL_CALL_WAIT_SEC"):
+            RQD_GRPC_CONTROL_CALL_WAIT_SEC = config.getfloat(
+                __section, "RQD_GRPC_CONTROL_CALL_WAIT_SEC")
+        if config.has_option(__section, "RQD_GRPC_MAX_QUERY_CALLS"):
+            RQD_GRPC_MAX_QUERY_CALLS = config.getint(__section, "RQD_GRPC_MAX_QUERY_CALLS")
+        if config.has_option(__section, "RQD_GRPC_MAX_CONCURRENT_RPCS"):
+            RQD_GRPC_MAX_CONCURRENT_RPCS = config.getint(
+                __section, "RQD_GRPC_MAX_CONCURRENT_RPCS")
+        if config.has_option(__section, "RQD_KILL_GRACE_SEC"):
+            RQD_KILL_GRACE_SEC = config.getint(__section, "RQD_KILL_GRACE_SEC")
+        if config.has_option(__section, "RQD_USE_SCRATCH_CACHE"):
+            RQD_USE_SCRATCH_CACHE = config.getboolean(__section, "RQD_USE_SCRATCH_CACHE")
+        if config.has_option(__section, "RQD_SCRATCH_PATH"):
+            RQD_SCRATCH_PATH = config.get(__section, "RQD_SCRATCH_PATH")
+        if config.has_option(__section, "RQD_SCRATCH_MAX_BYTES"):
+            RQD_SCRATCH_MAX_BYTES = config.getint(__section, "RQD_SCRATCH_MAX_BYTES")
+        if config.has_option(__section, "RQD_SCRATCH_MAX_AGE_SEC"):
+            RQD_SCRATCH_MAX_AGE_SEC = config.getint(__section, "RQD_SCRATCH_MAX_AGE_SEC")
+        if config.has_option(__section, "RQD_SCRATCH_MIN_FREE_KB"):
+            RQD_SCRATCH_MIN_FREE_KB = config.getint(__section, "RQD_SCRATCH_MIN_FREE_KB")
+        if config.has_option(__section, "RQD_USE_LOG_WRITER"):
+            RQD_USE_LOG_WRITER = config.getboolean(__section, "RQD_USE_LOG_WRITER")
+        if config.has_option(__section, "RQD_LOG_WRITER_BATCH_BYTES"):
+            RQD_LOG_WRITER_BATCH_BYTES = config.getint(__section, "RQD_LOG_WRITER_BATCH_BYTES")
+        if config.has_option(__section, "RQD_LOG_WRITER_FLUSH_SEC"):
+            RQD_LOG_WRITER_FLUSH_SEC = config.getfloat(__section, "RQD_LOG_WRITER_FLUSH_SEC")
+        if config.has_option(__section, "RQD_LOG_MAX_BYTES"):
+            RQD_LOG_MAX_BYTES = config.getint(__section, "RQD_LOG_MAX_BYTES")
+        if config.has_option(__section, "RQD_LOG_MAX_TAIL_BYTES"):
+            RQD_LOG_MAX_TAIL_BYTES = config.getint(__section, "RQD_LOG_MAX_TAIL_BYTES")
+        if config.has_option(__section, "RQD_LOG_TIMESTAMPS"):
+            RQD_LOG_TIMESTAMPS = config.getboolean(__section, "RQD_LOG_TIMESTAMPS")
+        if config.has_option(__section, "RQD_LOG_STRIP_ANSI"):
+            RQD_LOG_STRIP_ANSI = config.getboolean(__section, "RQD_LOG_STRIP_ANSI")
+        if config.has_option(__section, "RQD_LOG_COMPRESS"):
+            RQD_LOG_COMPRESS = config.getboolean(__section, "RQD_LOG_COMPRESS")
+        if config.has_option(__section, "RQD_LOG_BUFFER_BYTES"):
+            RQD_LOG_BUFFER_BYTES = config.getint(__section, "RQD_LOG_BUFFER_BYTES")
+        if config.has_option(__section, "RQD_LOG_STREAM_MAX_SEC"):
+            RQD_LOG_STREAM_MAX_SEC = config.getint(__section, "RQD_LOG_STREAM_MAX_SEC")
+        if config.has_option(__section, "RQD_GRPC_MAX_LOG_TAILS"):
+            RQD_GRPC_MAX_LOG_TAILS = config.getint(__section, "RQD_GRPC_MAX_LOG_TAILS")
+        if config.has_option(__section, "RQD_GRPC_MAX_LOG_STREAMS"):
+            RQD_GRPC_MAX_LOG_STREAMS = config.getint(__section, "RQD_GRPC_MAX_LOG_STREAMS")
+        if config.has_option(__section, "RQD_METRICS_PORT"):
+            RQD_METRICS_PORT = config.getint(__section, "RQD_METRICS_PORT")
+        if config.has_option(__section, "RQD_METRICS_ADDRESS"):
+            RQD_METRICS_ADDRESS = config.get(__section, "RQD_METRICS_ADDRESS")
+        if config.has_option(__section, "RQD_METRICS_TEXTFILE"):
+            RQD_METRICS_TEXTFILE = config.get(__section, "RQD_METRICS_TEXTFILE")
+        if config.has_option(__section, "RQD_METRICS_TEXTFILE_INTERVAL_SEC"):
+            RQD_METRICS_TEXTFILE_INTERVAL_SEC = config.getint(
+                __section, "RQD_METRICS_TEXTFILE_INTERVAL_SEC")
+        if config.has_option(__section, "RQD_HISTORY_INTERVAL_SEC"):
+            RQD_HISTORY_INTERVAL_SEC = config.getint(__section, "RQD_HISTORY_INTERVAL_SEC")
+        if config.has_option(__section, "RQD_HISTORY_SAMPLES"):
+            RQD_HISTORY_SAMPLES = config.getint(__section, "RQD_HISTORY_SAMPLES")
+        if config.has_option(__section, "RQD_HISTORY_FRAME_SAMPLES"):
+            RQD_HISTORY_FRAME_SAMPLES = config.getint(__section, "RQD_HISTORY_FRAME_SAMPLES")
 except Exception as e:
     logging.warning("Failed to read values from config file %s due to %s at %s" % (CONFIG_FILE, e, traceback.extract_tb(sys.exc_info()[2])))
 
@@ -27,7 +27,6 @@ from builtins import object
 import logging as log
 import os
 import platform
-import random
 import signal
 import subprocess
 import sys
@@ -38,14 +37,37 @@ import traceback
 
 import rqd.compiled_proto.host_pb2
 import rqd.compiled_proto.report_pb2
+import rqd.rqbroker
+import rqd.rqcgroup
 import rqd.rqconstants
 import rqd.rqexceptions
+import rqd.rqlogrotate
+import rqd.rqlogwriter
+import rqd.rqexporter
+import rqd.rqhistory
 import rqd.rqmachine
+import rqd.rqmetrics
 import rqd.rqnetwork
 import rqd.rqnimby
+import rqd.rqpressure
+import rqd.rqreaper
+import rqd.rqreport
+import rqd.rqreporter
+import rqd.rqscheduler
+import rqd.rqscratch
+import rqd.rqspool
+import rqd.rqteardown
+import rqd.rqtopology
 import rqd.rqutil
 
 
+monotonic = getattr(time, 'monotonic', time.time)
+
+LAUNCH_STAGE_TIME = rqd.rqmetrics.histogram(
+    'rqd_launch_stage_seconds', 'Time taken by each stage of a frame launch, by stage',
+    labelName='stage')
+
+
 class FrameAttendantThread(threading.Thread):
     """Once a frame has been received and checked by RQD, this class handles
        the launching, waiting on, and cleanup work related to running the
@@ -67,42 +89,66 @@ class FrameAttendantThread(threading.Thread):
         self.endTime = 0
         self.frameInfo = frameInfo
         self._tempLocations = []
+        self.__launchTimings = []
+        self.__awaitingExit = False
+        self.__launchSession = None
+        self.__scratchPath = None
         self.rqlog = None
 
+    def isAlive(self):
+        """Returns True while the frame is running, including after the wait
+        on it has been handed over to the reaper"""
+        return self.__awaitingExit or self.is_alive()
+
+    def __createHostEnv(self):
+        """Returns the variables that are the same for every frame on the host,
+        cached on RqCore for RQD_STATIC_ENV_TTL_SEC"""
+        return {
+            "PATH": self.rqCore.machine.getPathEnv(),
+            "TERM": "unknown",
+            "TZ": self.rqCore.machine.getTimezone(),
+            "mcp": "1",
+            "jobhost": self.rqCore.machine.getHostname(),
+            "maxframetime": "0",
+            "minspace": "200",
+            "CUE3": "True",
+            "CUE_GPU_MEMORY": str(self.rqCore.machine.getGpuMemory()),
+            "SP_NOMYCSHRC": "1",
+        }
+
     def __createEnvVariables(self):
         """Define the environmental variables for the frame"""
         # If linux specific, they need to move into self.runLinux()
-        self.frameEnv = {}
-        self.frameEnv["PATH"] = self.rqCore.machine.getPathEnv()
-        self.frameEnv["TERM"] = "unknown"
-        self.frameEnv["TZ"] = self.rqCore.machine.getTimezone()
+        self.frameEnv = dict(self.rqCore.staticEnv.getOrCompute('host', self.__createHostEnv))
         self.frameEnv["USER"] = self.runFrame.user_name
         self.frameEnv["LOGNAME"] = self.runFrame.user_name
         self.frameEnv["MAIL"] = "/usr/mail/%s" % self.runFrame.user_name
         self.frameEnv["HOME"] = "/net/homedirs/%s" % self.runFrame.user_name
-        self.frameEnv["mcp"] = "1"
         self.frameEnv["show"] = self.runFrame.show
         self.frameEnv["shot"] = self.runFrame.shot
         self.frameEnv["jobid"] = self.runFrame.job_name
-        self.frameEnv["jobhost"] = self.rqCore.machine.getHostname()
         self.frameEnv["frame"] = self.runFrame.frame_name
         self.frameEnv["zframe"] = self.runFrame.frame_name
         self.frameEnv["logfile"] = self.runFrame.log_file
-        self.frameEnv["maxframetime"] = "0"
-        self.frameEnv["minspace"] = "200"
-        self.frameEnv["CUE3"] = "True"
-        self.frameEnv["CUE_GPU_MEMORY"] = str(self.rqCore.machine.getGpuMemory())
-        self.frameEnv["SP_NOMYCSHRC"] = "1"
+
+        if self.rqCore.scratch is not None:
+            try:
+                self.__scratchPath = self.rqCore.scratch.acquire(self.runFrame)
+                self.frameEnv["CUE_SCRATCH_DIR"] = self.__scratchPath
+            except (IOError, OSError, KeyError) as e:
+                log.warning("Unable to create the scratch directory of jobId=%s: %s" % (
+                    self.runFrame.job_id, e))
 
         for key in self.runFrame.environment:
             self.frameEnv[key] = self.runFrame.environment[key]
 
         # Add threads to use all assigned hyper-threading cores
-        if 'CPU_LIST' in self.runFrame.attributes and 'CUE_THREADS' in self.frameEnv:
-            self.frameEnv['CUE_THREADS'] = str(max(
-                int(self.frameEnv['CUE_THREADS']),
-                len(self.runFrame.attributes['CPU_LIST'].split(','))))
-            self.frameEnv['CUE_HT'] = "True"
+        if 'CPU_LIST' in self.runFrame.attributes and 'CUE_THREADS' in self.frameEnv \
+                and self.runFrame.environment.get('CUE_THREADABLE') == '1':
+            numCpus = len(self.runFrame.attributes['CPU_LIST'].split(','))
+            self.frameEnv['CUE_THREADS'] = str(max(int(self.frameEnv['CUE_THREADS']), numCpus))
+            if numCpus > self.runFrame.num_cores // rqd.rqconstants.CORE_VALUE:
+                self.frameEnv['CUE_HT'] = "True"
 
     def _createCommandFile(self, command):
         """Creates a file that subprocess. Popen then executes.
@@ -125,6 +171,15 @@ class FrameAttendantThread(threading.Thread):
             else:
                 commandFile = os.path.join(tempfile.gettempdir(),
                                            'rqd-cmd-%s-%s' % (self.runFrame.frame_id, time.time()))
+                fd = os.open(commandFile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o777)
+                self._tempLocations.append(commandFile)
+                try:
+                    os.write(fd, command.encode())
+                    # The umask may have masked the mode given to open
+                    os.fchmod(fd, 0o777)
+                finally:
+                    os.close(fd)
+                return commandFile
             rqexe = open(commandFile, "w")
             self._tempLocations.append(commandFile)
             rqexe.write(command)
@@ -161,7 +216,15 @@ class FrameAttendantThread(threading.Thread):
             print("="*59, file=self.rqlog)
 
             if 'CPU_LIST' in self.runFrame.attributes:
-                print('Hyper-threading enabled', file=self.rqlog)
+                print("%-21s%s" % ("cpuList", self.runFrame.attributes['CPU_LIST']),
+                      file=self.rqlog)
+            if 'NUMA_NODES' in self.runFrame.attributes:
+                print("%-21s%s" % ("numaNodes", self.runFrame.attributes['NUMA_NODES']),
+                      file=self.rqlog)
+            if self.__launchTimings:
+                print("%-21s%s" % ("launchStages", " ".join(
+                    "%s=%.1fms" % (name, seconds * 1000)
+                    for name, seconds in self.__launchTimings)), file=self.rqlog)
 
         except Exception as e:
             log.critical("Unable to write header to rqlog: "
@@ -174,6 +237,7 @@ class FrameAttendantThread(threading.Thread):
 
         self.endTime = time.time()
         self.frameInfo.runTime = int(self.endTime - self.startTime)
+        self.rqCore.teardown.onExit(self.frameInfo)
         try:
             print("\n", "="*59, file=self.rqlog)
             print("RenderQ Job Complete\n", file=self.rqlog)
@@ -181,6 +245,8 @@ class FrameAttendantThread(threading.Thread):
             print("%-20s%s" % ("exitSignal", self.frameInfo.exitSignal), file=self.rqlog)
             if self.frameInfo.killMessage:
                 print("%-20s%s" % ("killMessage", self.frameInfo.killMessage), file=self.rqlog)
+            if self.frameInfo.killSeconds is not None:
+                print("%-20s%.2f" % ("killSeconds", self.frameInfo.killSeconds), file=self.rqlog)
             print("%-20s%s" % ("startTime",
                                          time.ctime(self.startTime)), file=self.rqlog)
             print("%-20s%s" % ("endTime",
@@ -188,6 +254,10 @@ class FrameAttendantThread(threading.Thread):
             print("%-20s%s" % ("maxrss", self.frameInfo.maxRss), file=self.rqlog)
             print("%-20s%s" % ("utime", self.frameInfo.utime), file=self.rqlog)
             print("%-20s%s" % ("stime", self.frameInfo.stime), file=self.rqlog)
+            print("%-20s%s" % ("readBytes", self.frameInfo.io.totals.readBytes),
+                  file=self.rqlog)
+            print("%-20s%s" % ("writeBytes", self.frameInfo.io.totals.writeBytes),
+                  file=self.rqlog)
             print("%-20s%s" % ("renderhost", self.rqCore.machine.getHostname()), file=self.rqlog)
             print("="*59, file=self.rqlog)
         except Exception as e:
@@ -214,11 +284,20 @@ class FrameAttendantThread(threading.Thread):
         if self.rqCore.nimby.locked and not self.runFrame.ignore_nimby:
             report.exit_status = rqd.rqconstants.EXITSTATUS_FOR_NIMBY_KILL
 
-        self.rqCore.network.reportRunningFrameCompletion(report)
+        if self.frameInfo.killExitStatus is not None:
+            report.exit_status = self.frameInfo.killExitStatus
+
+        if self.frameInfo.killSeconds is not None:
+            report.kill_seconds = self.frameInfo.killSeconds
+
+        self.rqCore.sendFrameCompleteReport(report)
 
     def __cleanup(self):
         """Cleans up temporary files"""
-        rqd.rqutil.permissionsHigh()
+        # Files of brokered launches belong to rqd, others may belong to root
+        useRoot = self.__launchSession is None
+        if useRoot:
+            rqd.rqutil.permissionsHigh()
         try:
             for location in self._tempLocations:
                 if os.path.isfile(location):
@@ -228,7 +307,8 @@ class FrameAttendantThread(threading.Thread):
                         log.warning("Unable to delete file: %s due to %s at %s" % (
                             location, e, traceback.extract_tb(sys.exc_info()[2])))
         finally:
-            rqd.rqutil.permissionsLow()
+            if useRoot:
+                rqd.rqutil.permissionsLow()
 
         # Close log file
         try:
@@ -238,57 +318,156 @@ class FrameAttendantThread(threading.Thread):
                 self.runFrame.log_file, e, traceback.extract_tb(sys.exc_info()[2])))
 
     def runLinux(self):
-        """The steps required to handle a frame under linux"""
+        """The steps required to handle a frame under linux
+        @rtype:  bool
+        @return: True if waiting on the frame was handed to the reaper"""
         frameInfo = self.frameInfo
         runFrame = self.runFrame
 
+        stageStart = monotonic()
         self.__createEnvVariables()
-        self.__writeHeader()
-        if rqd.rqconstants.RQD_CREATE_USER_IF_NOT_EXISTS:
+        stageStart = self.__endStage('env', stageStart)
+
+        # The launch broker creates the user while opening the log
+        if rqd.rqconstants.RQD_CREATE_USER_IF_NOT_EXISTS and self.__launchSession is None \
+                and not rqd.rqutil.isKnownUser(runFrame.user_name):
             rqd.rqutil.permissionsHigh()
-            rqd.rqutil.checkAndCreateUser(runFrame.user_name)
-            rqd.rqutil.permissionsLow()
+            try:
+                rqd.rqutil.checkAndCreateUser(runFrame.user_name)
+            finally:
+                rqd.rqutil.permissionsLow()
+        stageStart = self.__endStage('user', stageStart)
 
-        tempStatFile = "%srqd-stat-%s-%s" % (self.rqCore.machine.getTempPath(),
-                                             frameInfo.frameId,
-                                             time.time())
-        self._tempLocations.append(tempStatFile)
-        tempCommand = []
-        if self.rqCore.machine.isDesktop():
-            tempCommand += ["/bin/nice"]
-        tempCommand += ["/usr/bin/time", "-p", "-o", tempStatFile]
+        tempCommand = ["/bin/su", runFrame.user_name, rqd.rqconstants.SU_ARGUEMENT,
+                       '"' + self._createCommandFile(runFrame.command) + '"']
+        stageStart = self.__endStage('commandFile', stageStart)
 
+        # Niceness and affinity are applied to the child before exec rather
+        # than through the nice and taskset commands, and rusage comes from
+        # wait4 rather than /usr/bin/time
+        niceness = 0
+        if self.rqCore.machine.isDesktop():
+            niceness = rqd.rqconstants.RQD_DESKTOP_FRAME_NICENESS
+        cpus = None
         if 'CPU_LIST' in runFrame.attributes:
-            tempCommand += ['taskset', '-c', runFrame.attributes['CPU_LIST']]
+            if hasattr(os, 'sched_setaffinity'):
+                cpus = rqd.rqutil.parseCpuList(runFrame.attributes['CPU_LIST'])
+            else:
+                # Python 2 has no sched_setaffinity
+                tempCommand = ['taskset', '-c', runFrame.attributes['CPU_LIST']] + tempCommand
+        numaNodes = None
+        if 'NUMA_NODES' in runFrame.attributes:
+            numaNodes = rqd.rqutil.parseCpuList(runFrame.attributes['NUMA_NODES'])
 
-        rqd.rqutil.permissionsHigh()
-        try:
-            tempCommand += ["/bin/su", runFrame.user_name, rqd.rqconstants.SU_ARGUEMENT,
-                            '"' + self._createCommandFile(runFrame.command) + '"']
+        cgroupProcs = self.rqCore.machine.createFrameCgroup(frameInfo.frameId)
+        stageStart = self.__endStage('cgroup', stageStart)
 
-            # Actual cwd is set by /shots/SHOW/home/perl/etc/qwrap.cuerun
-            frameInfo.forkedCommand = subprocess.Popen(tempCommand,
-                                                       env=self.frameEnv,
-                                                       cwd=self.rqCore.machine.getTempPath(),
-                                                       stdin=subprocess.PIPE,
-                                                       stdout=self.rqlog,
-                                                       stderr=self.rqlog,
-                                                       close_fds=True,
-                                                       preexec_fn=os.setsid)
-        finally:
-            rqd.rqutil.permissionsLow()
+        self.__writeHeader()
 
-        frameInfo.pid = frameInfo.forkedCommand.pid
+        if self.__launchSession is not None:
+            frameInfo.forkedCommand = self.__launchSession.spawn(
+                tempCommand, self.frameEnv, self.rqCore.machine.getTempPath(), self.rqlog,
+                cgroupProcs, cpus, niceness, numaNodes)
+        else:
+            rqd.rqutil.permissionsHigh()
+            try:
+                # Actual cwd is set by /shots/SHOW/home/perl/etc/qwrap.cuerun
+                frameInfo.forkedCommand = subprocess.Popen(tempCommand,
+                                                           env=self.frameEnv,
+                                                           cwd=self.rqCore.machine.getTempPath(),
+                                                           stdin=subprocess.PIPE,
+                                                           stdout=self.rqlog,
+                                                           stderr=self.rqlog,
+                                                           close_fds=True,
+                                                           preexec_fn=self.__linuxPreexec(
+                                                               cgroupProcs, cpus, niceness,
+                                                               numaNodes))
+            finally:
+                rqd.rqutil.permissionsLow()
+        self.__endStage('spawn', stageStart)
+        log.info("Launched frameId=%s in %.1fms", frameInfo.frameId,
+                 sum(seconds for _, seconds in self.__launchTimings) * 1000)
 
-        if not self.rqCore.updateRssThread.isAlive():
-            self.rqCore.updateRssThread = threading.Timer(rqd.rqconstants.RSS_UPDATE_INTERVAL,
-                                                           self.rqCore.updateRss)
-            self.rqCore.updateRssThread.start()
+        frameInfo.cgroup = cgroupProcs
+        frameInfo.pid = frameInfo.forkedCommand.pid
 
-        returncode = frameInfo.forkedCommand.wait()
+        if self.rqCore.reaper is not None:
+            self.__awaitingExit = True
+            try:
+                self.rqCore.reaper.register(frameInfo.pid, self.__onReaped)
+                return True
+            except (IOError, OSError) as e:
+                self.__awaitingExit = False
+                log.warning("Unable to register frame %s with the reaper, waiting "
+                            "in thread: %s" % (frameInfo.frameId, e))
+
+        _, status, rusage = os.wait4(frameInfo.pid, 0)
+        returncode = rqd.rqreaper.exitCode(status)
+        frameInfo.forkedCommand.returncode = returncode
+        self.__onLinuxExit(returncode, rusage)
+        return False
+
+    @staticmethod
+    def __linuxPreexec(cgroupProcs, cpus, niceness, numaNodes):
+        """Returns the function run in the frame's process before exec
+        @type  cgroupProcs: str
+        @param cgroupProcs: cgroup.procs file to join, None to start a new session
+        @type  cpus: set<int>
+        @param cpus: Cpus the frame is bound to, None for all
+        @type  niceness: int
+        @param niceness: Increment to the frame's niceness
+        @type  numaNodes: set<int>
+        @param numaNodes: Numa nodes the frame's memory is allocated from"""
+        if cgroupProcs:
+            join = rqd.rqcgroup.joinCgroup(cgroupProcs)
+        else:
+            join = os.setsid
+        setMemoryPolicy = None
+        if numaNodes:
+            setMemoryPolicy = rqd.rqtopology.memoryPolicy(numaNodes)
+
+        def preexec():
+            join()
+            if niceness:
+                os.nice(niceness)
+            if cpus:
+                os.sched_setaffinity(0, cpus)
+            if setMemoryPolicy is not None:
+                setMemoryPolicy()
+        return preexec
+
+    def __endStage(self, name, start):
+        """Records how long a launch stage took and returns the time it ended"""
+        now = monotonic()
+        self.__launchTimings.append((name, now - start))
+        LAUNCH_STAGE_TIME.observe(now - start, label=name)
+        return now
+
+    def __onReaped(self, returncode, rusage):
+        """Called by the reaper's worker pool once the frame has exited"""
+        try:
+            self.frameInfo.forkedCommand.returncode = returncode
+            self.__onLinuxExit(returncode, rusage)
+        except Exception:
+            log.critical("Failed frame completion: For %s due to: \n%s" % (
+                self.runFrame.frame_id,
+                ''.join(traceback.format_exception(*sys.exc_info()))))
+        finally:
+            self.__finishFrame()
+
+    def __onLinuxExit(self, returncode, rusage=None):
+        """Collects the exit status and usage of a frame under linux
+        @type  returncode: int
+        @param returncode: Return code of the frame, negative if it was signaled
+        @type  rusage: resource.struct_rusage
+        @param rusage: Resource usage from wait4 when known"""
+        frameInfo = self.frameInfo
 
         # Find exitStatus and exitSignal
-        if returncode < 0:
+        if returncode is None:
+            frameInfo.exitStatus = None
+            frameInfo.exitSignal = 0
+        elif returncode < 0:
             # Exited with a signal
             frameInfo.exitStatus = 1
             frameInfo.exitSignal = -returncode
@@ -296,14 +475,17 @@ class FrameAttendantThread(threading.Thread):
             frameInfo.exitStatus = returncode
             frameInfo.exitSignal = 0
 
-        try:
-            statFile  = open(tempStatFile,"r")
-            frameInfo.realtime = statFile.readline().split()[1]
-            frameInfo.utime = statFile.readline().split()[1]
-            frameInfo.stime = statFile.readline().split()[1]
-            statFile.close()
-        except Exception:
-            pass # This happens when frames are killed
+        frameInfo.realtime = "%.2f" % (time.time() - self.startTime)
+        if rusage is not None:
+            frameInfo.utime = "%.2f" % rusage.ru_utime
+            frameInfo.stime = "%.2f" % rusage.ru_stime
+            frameInfo.maxRss = max(frameInfo.maxRss, rusage.ru_maxrss)
+            # Blocks are 512 bytes, as in /proc/<pid>/io
+            frameInfo.io.addExited(rusage.ru_inblock * 512, rusage.ru_oublock * 512)
+            self.runFrame.attributes.update(frameInfo.io.attributes())
+
+        if frameInfo.cgroup:
+            self.rqCore.machine.finishFrameCgroup(frameInfo)
 
         self.__writeFooter()
         self.__cleanup()
@@ -330,11 +512,6 @@ class FrameAttendantThread(threading.Thread):
 
         frameInfo.pid = frameInfo.forkedCommand.pid
 
-        if not self.rqCore.updateRssThread.isAlive():
-            self.rqCore.updateRssThread = threading.Timer(rqd.rqconstants.RSS_UPDATE_INTERVAL,
-                                                          self.rqCore.updateRss)
-            self.rqCore.updateRssThread.start()
-
         frameInfo.forkedCommand.wait()
 
         # Find exitStatus and exitSignal
@@ -373,11 +550,6 @@ class FrameAttendantThread(threading.Thread):
 
         frameInfo.pid = frameInfo.forkedCommand.pid
 
-        if not self.rqCore.updateRssThread.isAlive():
-            self.rqCore.updateRssThread = threading.Timer(rqd.rqconstants.RSS_UPDATE_INTERVAL,
-                                                          self.rqCore.updateRss)
-            self.rqCore.updateRssThread.start()
-
         frameInfo.forkedCommand.wait()
 
         # Find exitStatus and exitSignal
@@ -402,6 +574,83 @@ class FrameAttendantThread(threading.Thread):
                 time.sleep(0.5 * tries)
         raise IOError("Failed to create %s" % filepath)
 
+    def __openLog(self):
+        """Creates the log directory and opens the frame's log as the frame
+        user, rotating any previous log"""
+        runFrame = self.runFrame
+
+        # Change to frame user if needed:
+        if runFrame.HasField("uid"):
+            # Do everything as launching user:
+            rqd.rqutil.permissionsUser(runFrame.uid, runFrame.gid)
+
+        try:
+            #
+            # Setup proc to allow launching of frame
+            #
+
+            if not os.access(runFrame.log_dir, os.F_OK):
+                # Attempting mkdir for missing logdir
+                msg = "No Error"
+                try:
+                    os.makedirs(runFrame.log_dir)
+                    os.chmod(runFrame.log_dir, 0o777)
+                except Exception as e:
+                    # This is expected to fail when called in abq
+                    # But the directory should now be visible
+                    msg = e
+
+                if not os.access(runFrame.log_dir, os.F_OK):
+                    err = "Unable to see log directory: %s, mkdir failed with: %s" % (
+                        runFrame.log_dir, msg)
+                    raise RuntimeError(err)
+
+            if not os.access(runFrame.log_dir, os.W_OK):
+                err = "Unable to write to log directory %s" % runFrame.log_dir
+                raise RuntimeError(err)
+
+            try:
+                # Rotate any old logs to a max of MAX_LOG_FILES, the oldest
+                # are deleted once the frame has started
+                pruned = rqd.rqlogrotate.rotate(runFrame.log_dir_file,
+                                                rqd.rqconstants.MAX_LOG_FILES)
+                if pruned:
+                    self.rqCore.scheduler.scheduleOnce(
+                        'pruneLogs', rqd.rqconstants.RQD_LOG_PRUNE_DELAY_SEC,
+                        lambda: self.__pruneLogs(pruned), blocking=True)
+            except Exception as e:
+                err = "Unable to rotate previous log file due to %s" % e
+                # Windows might fail while trying to rotate logs for checking if file is
+                # being used by another process. Frame execution doesn't need to
+                # be halted for this.
+                if platform.system() == "Windows":
+                    log.warning(err)
+                else:
+                    raise RuntimeError(err)
+            try:
+                self.rqlog = open(runFrame.log_dir_file, "w", 1)
+                self.waitForFile(runFrame.log_dir_file)
+            except Exception as e:
+                err = "Unable to write to %s due to %s" % (runFrame.log_dir_file, e)
+                raise RuntimeError(err)
+            try:
+                os.chmod(runFrame.log_dir_file, 0o666)
+            except Exception as e:
+                err = "Failed to chmod log file! %s due to %s" % (runFrame.log_dir_file, e)
+                log.warning(err)
+
+        finally:
+            rqd.rqutil.permissionsLow()
+
+    @staticmethod
+    def __pruneLogs(paths):
+        """Deletes the logs rotated out by __openLog"""
+        rqd.rqutil.permissionsHigh()
+        try:
+            rqd.rqlogrotate.prune(paths)
+        finally:
+            rqd.rqutil.permissionsLow()
+
     def runUnknown(self):
         """The steps required to handle a frame under an unknown OS"""
         pass
@@ -411,6 +660,7 @@ class FrameAttendantThread(threading.Thread):
         log.info("Monitor frame started for frameId=%s", self.frameId)
 
         runFrame = self.runFrame
+        deferred = False
 
         try:
             runFrame.job_temp_dir = os.path.join(self.rqCore.machine.getTempPath(),
@@ -423,75 +673,25 @@ class FrameAttendantThread(threading.Thread):
 
             try:  # Exception block for all exceptions
 
-                # Change to frame user if needed:
                 if runFrame.HasField("uid"):
-                    # Do everything as launching user:
                     runFrame.gid = rqd.rqconstants.LAUNCH_FRAME_USER_GID
-                    rqd.rqutil.permissionsUser(runFrame.uid, runFrame.gid)
-
-                try:
-                    #
-                    # Setup proc to allow launching of frame
-                    #
-
-                    if not os.access(runFrame.log_dir, os.F_OK):
-                        # Attempting mkdir for missing logdir
-                        msg = "No Error"
-                        try:
-                            os.makedirs(runFrame.log_dir)
-                            os.chmod(runFrame.log_dir, 0o777)
-                        except Exception as e:
-                            # This is expected to fail when called in abq
-                            # But the directory should now be visible
-                            msg = e
-
-                        if not os.access(runFrame.log_dir, os.F_OK):
-                            err = "Unable to see log directory: %s, mkdir failed with: %s" % (
-                                runFrame.log_dir, msg)
-                            raise RuntimeError(err)
-
-                    if not os.access(runFrame.log_dir, os.W_OK):
-                        err = "Unable to write to log directory %s" % runFrame.log_dir
-                        raise RuntimeError(err)
 
-                    try:
-                        # Rotate any old logs to a max of MAX_LOG_FILES:
-                        if os.path.isfile(runFrame.log_dir_file):
-                            rotateCount = 1
-                            while (os.path.isfile("%s.%s" % (runFrame.log_dir_file, rotateCount))
-                                   and rotateCount < rqd.rqconstants.MAX_LOG_FILES):
-                                rotateCount += 1
-                            os.rename(runFrame.log_dir_file,
-                                      "%s.%s" % (runFrame.log_dir_file, rotateCount))
-                    except Exception as e:
-                        err = "Unable to rotate previous log file due to %s" % e
-                        # Windows might fail while trying to rotate logs for checking if file is
-                        # being used by another process. Frame execution doesn't need to
-                        # be halted for this.
-                        if platform.system() == "Windows":
-                            log.warning(err)
-                        else:
-                            raise RuntimeError(err)
-                    try:
-                        self.rqlog = open(runFrame.log_dir_file, "w", 1)
-                        self.waitForFile(runFrame.log_dir_file)
-                    except Exception as e:
-                        err = "Unable to write to %s due to %s" % (runFrame.log_dir_file, e)
-                        raise RuntimeError(err)
-                    try:
-                        os.chmod(runFrame.log_dir_file, 0o666)
-                    except Exception as e:
-                        err = "Failed to chmod log file! %s due to %s" % (runFrame.log_dir_file, e)
-                        log.warning(err)
-
-                finally:
-                    rqd.rqutil.permissionsLow()
+                stageStart = monotonic()
+                if self.rqCore.launchBroker is not None:
+                    self.__launchSession = self.rqCore.launchBroker.openSession()
+                    self.rqlog = self.__launchSession.openLog(runFrame)
+                else:
+                    self.__openLog()
+                if self.rqCore.logWriter is not None:
+                    self.rqlog = self.rqCore.logWriter.open(self.rqlog, runFrame.log_dir_file)
+                    self.frameInfo.logBuffer = self.rqlog.buffer
+                self.__endStage('log', stageStart)
 
                 # Store frame in cache and register servant
                 self.rqCore.storeFrame(runFrame.frame_id, self.frameInfo)
 
                 if platform.system() == "Linux":
-                    self.runLinux()
+                    deferred = self.runLinux()
                 elif platform.system() == "Windows":
                     self.runWindows()
                 elif platform.system() == "Darwin":
@@ -508,18 +708,32 @@ class FrameAttendantThread(threading.Thread):
                 # Delay keeps the cuebot from spamming failing booking requests
                 time.sleep(10)
         finally:
-            self.rqCore.releaseCores(self.runFrame.num_cores, runFrame.attributes.get('CPU_LIST'))
+            if self.__launchSession is not None:
+                self.__launchSession.close()
+            if not deferred:
+                self.__finishFrame()
+
+    def __finishFrame(self):
+        """Releases the frame's resources and reports its completion"""
+        try:
+            if self.__scratchPath is not None:
+                self.rqCore.scratch.release(self.runFrame.job_id)
+
+            self.rqCore.releaseCores(self.runFrame.num_cores,
+                                     self.runFrame.attributes.get('CPU_LIST'))
 
             self.rqCore.deleteFrame(self.runFrame.frame_id)
 
             self.__sendFrameCompleteReport()
-            time_till_next = (self.rqCore.intervalStartTime + self.rqCore.intervalSleepTime) - time.time()
-            if time_till_next > (2 * rqd.rqconstants.RQD_MIN_PING_INTERVAL_SEC):
-                self.rqCore.onIntervalThread.cancel()
-                self.rqCore.onInterval(rqd.rqconstants.RQD_MIN_PING_INTERVAL_SEC)
+            self.rqCore.statusReporter.notify(rqd.rqreporter.REASON_FRAME_EXIT)
+        finally:
+            self.__awaitingExit = False
+            # Left open when the launch failed
+            if self.rqlog is not None and not self.rqlog.closed:
+                self.rqlog.close()
 
-            log.info("Monitor frame ended for frameId=%s",
-                     self.runFrame.frame_id)
+        log.info("Monitor frame ended for frameId=%s",
+                 self.runFrame.frame_id)
 
 
 class RqCore(object):
@@ -542,18 +756,78 @@ class RqCore(object):
             booked_cores=0,
         )
 
+        self.scheduler = rqd.rqscheduler.Scheduler()
+
+        # Opened once the machine's mcp path is known
+        self.scratch = None
+
         self.nimby = rqd.rqnimby.Nimby(self)
 
         self.machine = rqd.rqmachine.Machine(self, self.cores)
 
         self.network = rqd.rqnetwork.Network(self)
+        self.hostReportEncoder = rqd.rqreport.HostReportEncoder()
+        self.statusReporter = rqd.rqreporter.StatusReporter(self.scheduler, self.onInterval)
+
+        self.reportSpool = None
+        if rqd.rqconstants.RQD_USE_REPORT_SPOOL:
+            try:
+                self.reportSpool = rqd.rqspool.ReportSpool(
+                    rqd.rqconstants.RQD_SPOOL_PATH,
+                    rqd.compiled_proto.report_pb2.FrameCompleteReport,
+                    rqd.rqconstants.RQD_SPOOL_MAX_BYTES)
+            except (IOError, OSError) as e:
+                log.warning('Unable to open report spool %s, completion reports will not '
+                            'be retried: %s' % (rqd.rqconstants.RQD_SPOOL_PATH, e))
+
+        if rqd.rqconstants.RQD_USE_SCRATCH_CACHE and platform.system() == 'Linux':
+            scratchPath = rqd.rqconstants.RQD_SCRATCH_PATH or \
+                os.path.join(self.machine.getTempPath(), 'rqd-scratch')
+            try:
+                self.scratch = rqd.rqscratch.ScratchCache(scratchPath)
+            except (IOError, OSError) as e:
+                log.warning('Unable to open the scratch cache %s, frames will not get '
+                            'a job scratch directory: %s' % (scratchPath, e))
         self.__threadLock = threading.Lock()
+        # Notified whenever a frame leaves the cache
+        self.__frameExited = threading.Condition(self.__threadLock)
         self.__cache = {}
+        self.__suspendTimeoutJob = None
+
+        rqd.rqmetrics.gauge('rqd_running_frames', 'Frames running on the host',
+                            func=lambda: len(self.__cache))
+        rqd.rqmetrics.gauge('rqd_threads', 'Threads in the rqd process',
+                            func=threading.active_count)
+        self.history = None
+        if rqd.rqconstants.RQD_HISTORY_INTERVAL_SEC:
+            self.history = rqd.rqhistory.MachineHistory()
+
+        self.metricsExporter = None
+        if rqd.rqexporter.MetricsExporter.isConfigured():
+            self.metricsExporter = rqd.rqexporter.MetricsExporter(self.scheduler)
+
+        self.teardown = rqd.rqteardown.FrameTeardown(self.scheduler)
+
+        self.reaper = None
+        if rqd.rqconstants.RQD_USE_FRAME_REAPER and rqd.rqreaper.FrameReaper.isSupported():
+            self.reaper = rqd.rqreaper.FrameReaper()
+
+        self.logWriter = None
+        if rqd.rqconstants.RQD_USE_LOG_WRITER and rqd.rqlogwriter.FrameLogWriter.isSupported():
+            self.logWriter = rqd.rqlogwriter.FrameLogWriter(self.scheduler)
+
+        self.updateRssJob = None
+
+        self.staticEnv = rqd.rqutil.TtlCache(rqd.rqconstants.RQD_STATIC_ENV_TTL_SEC)
 
-        self.updateRssThread = None
-        self.onIntervalThread = None
-        self.intervalStartTime = None
-        self.intervalSleepTime = rqd.rqconstants.RQD_MIN_PING_INTERVAL_SEC
+        self.memoryPressure = None
+        if rqd.rqconstants.RQD_USE_MEMORY_PRESSURE and platform.system() == 'Linux':
+            self.memoryPressure = rqd.rqpressure.MemoryPressureMonitor(
+                self.scheduler, self.preemptForMemory)
+
+        self.launchBroker = None
+        if rqd.rqconstants.RQD_USE_LAUNCH_BROKER and rqd.rqbroker.LaunchBroker.isSupported():
+            self.launchBroker = rqd.rqbroker.LaunchBroker()
 
         self.__cluster = None
         self.__session = None
@@ -564,6 +838,38 @@ class RqCore(object):
 
     def start(self):
         """Called by main to start the rqd service"""
+        if self.launchBroker is not None:
+            # Forked before any other thread is started
+            try:
+                self.launchBroker.start()
+            except (IOError, OSError) as e:
+                log.warning('Unable to start the launch broker, launching frames '
+                            'directly: %s' % e)
+                self.launchBroker = None
+        self.scheduler.start()
+        if self.launchBroker is not None:
+            self.scheduler.schedulePeriodic(
+                'reapOrphans', rqd.rqconstants.RQD_ORPHAN_REAP_INTERVAL_SEC, self.reapOrphans)
+        if self.reaper is not None:
+            self.reaper.start()
+        if self.logWriter is not None:
+            self.logWriter.start()
+        if self.memoryPressure is not None:
+            self.memoryPressure.start()
+        if self.history is not None:
+            self.scheduler.schedulePeriodic(
+                'machineHistory', rqd.rqconstants.RQD_HISTORY_INTERVAL_SEC,
+                self.recordHistory, initialDelay=0, blocking=True)
+        if self.metricsExporter is not None:
+            try:
+                self.metricsExporter.start()
+            except (IOError, OSError) as e:
+                log.warning('Unable to serve metrics on port %d: %s' % (
+                    self.metricsExporter.port, e))
+        if self.scratch is not None:
+            self.scheduler.schedulePeriodic(
+                'scratchEviction', rqd.rqconstants.RQD_SCRATCH_EVICT_INTERVAL_SEC,
+                self.scratch.evict, initialDelay=0, blocking=True)
         if self.machine.isDesktop():
             if self.__optNimbyoff:
                 log.warning('Nimby startup has been disabled via --nimbyoff')
@@ -582,33 +888,19 @@ class RqCore(object):
     def grpcConnected(self):
         """After gRPC connects to the cuebot, this function is called"""
         self.network.reportRqdStartup(self.machine.getBootReport())
+        self.hostReportEncoder.reset()
+        self.drainReportSpoolSoon()
 
-        self.updateRssThread = threading.Timer(rqd.rqconstants.RSS_UPDATE_INTERVAL, self.updateRss)
-        self.updateRssThread.start()
+        self.updateRssJob = self.scheduler.schedulePeriodic(
+            'updateRss', rqd.rqconstants.RSS_UPDATE_INTERVAL, self.updateRss)
 
-        self.onIntervalThread = threading.Timer(self.intervalSleepTime, self.onInterval)
-        self.intervalStartTime = time.time()
-        self.onIntervalThread.start()
+        self.statusReporter.start()
 
         log.warning('RQD Started')
 
-    def onInterval(self, sleepTime=None):
-
-        """This is called by self.grpcConnected as a timer thread to execute
-           every interval"""
-        if sleepTime is None:
-            self.intervalSleepTime = random.randint(
-                rqd.rqconstants.RQD_MIN_PING_INTERVAL_SEC,
-                rqd.rqconstants.RQD_MAX_PING_INTERVAL_SEC)
-        else:
-            self.intervalSleepTime = sleepTime
-        try:
-            self.onIntervalThread = threading.Timer(self.intervalSleepTime, self.onInterval)
-            self.intervalStartTime = time.time()
-            self.onIntervalThread.start()
-        except Exception as e:
-            log.critical('Unable to schedule a ping due to {0} at {1}'.format(e, traceback.extract_tb(sys.exc_info()[2])))
-
+    def onInterval(self):
+        """Sends a status report, called by the status reporter every ping
+        interval and after significant events"""
         try:
             if self.__whenIdle and not self.__cache:
                 if not self.machine.isUserLoggedIn():
@@ -619,19 +911,13 @@ class RqCore(object):
         except Exception as e:
             log.warning('Unable to shutdown due to {0} at {1}'.format(e, traceback.extract_tb(sys.exc_info()[2])))
 
-        try:
-            self.sendStatusReport()
-        except Exception as e:
-            log.critical('Unable to send status report due to {0} at {1}'.format(e, traceback.extract_tb(sys.exc_info()[2])))
+        self.sendStatusReport()
 
     def updateRss(self):
-        """Triggers and schedules the updating of rss information"""
+        """Triggers the updating of rss information, scheduled every
+        RSS_UPDATE_INTERVAL by self.grpcConnected"""
         if self.__cache:
-            try:
-                self.machine.rssUpdate(self.__cache)
-            finally:
-                self.updateRssThread = threading.Timer(rqd.rqconstants.RSS_UPDATE_INTERVAL, self.updateRss)
-                self.updateRssThread.start()
+            self.machine.rssUpdate(self.__cache)
 
     def getFrame(self, frameId):
         """Gets a frame from the cache based on frameId
@@ -669,11 +955,12 @@ class RqCore(object):
         try:
             if frameId in self.__cache:
                 del self.__cache[frameId]
+                self.__frameExited.notify_all()
         finally:
             self.__threadLock.release()
 
     def killAllFrame(self, reason):
-        """Will execute .kill() on every frame in cache until no frames remain
+        """Kills every frame in cache and waits until no frames remain
         @type  reason: string
         @param reason: Reason for requesting all frames to be killed"""
 
@@ -683,25 +970,78 @@ class RqCore(object):
         while self.__cache:
             if reason.startswith("NIMBY"):
                 # Since this is a nimby kill, ignore any frames that are ignoreNimby
-                frameKeys = [frame.frameId for frame in list(self.__cache.values()) if not frame.ignoreNimby]
+                frames = [frame for frame in list(self.__cache.values()) if not frame.ignoreNimby]
             else:
-                frameKeys = list(self.__cache.keys())
+                frames = list(self.__cache.values())
 
-            if not frameKeys:
+            if not frames:
                 # No frames left to kill
                 return
 
-            for frameKey in frameKeys:
-                try:
-                    self.__cache[frameKey].kill(reason)
-                except KeyError:
-                    pass
-            time.sleep(1)
-
-    def releaseCores(self, reqRelease, releaseHT=None):
+            self.teardown.kill(frames, reason)
+
+            # Returns as soon as the frames have exited. Frames that were
+            # still launching are signalled on the next pass.
+            frameIds = set(frame.frameId for frame in frames)
+            deadline = monotonic() + rqd.rqconstants.RQD_KILL_RETRY_SEC
+            with self.__frameExited:
+                while frameIds.intersection(self.__cache) and monotonic() < deadline:
+                    self.__frameExited.wait(deadline - monotonic())
+
+    def killFrames(self, frameIds, message):
+        """Kills several frames at once, see rqd.rqteardown
+        @type  frameIds: list<str>
+        @param frameIds: Ids of the frames to kill
+        @type  message: str
+        @param message: Reason written to the frames' logs
+        @rtype:  list<str>
+        @return: Ids of the frames being killed"""
+        frames = [self.__cache[frameId] for frameId in frameIds if frameId in self.__cache]
+        return [frame.frameId for frame in self.teardown.kill(frames, message)]
+
+    def reapOrphans(self):
+        """Reaps the exited processes left behind by frames, which rqd adopts
+        as the launch broker's child subreaper"""
+        framePids = set(frame.pid for frame in list(self.__cache.values()) if frame.pid)
+        self.launchBroker.reapOrphans(framePids)
+
+    def preemptForMemory(self):
+        """Kills the frame furthest over its memory reservation, called by
+        the memory pressure monitor under critical pressure. Frames within
+        their reservation, or without one, are left running.
+        @rtype:  bool
+        @return: True if a frame was killed"""
+        victim = None
+        overage = 0
+        for frame in list(self.__cache.values()):
+            if frame.killExitStatus is not None:
+                continue
+            try:
+                reserved = int(frame.runFrame.environment.get('CUE_MEMORY') or 0)
+            except ValueError:
+                reserved = 0
+            if reserved <= 0:
+                continue
+            frameOverage = frame.rss - reserved
+            if frameOverage > overage:
+                victim = frame
+                overage = frameOverage
+        if victim is None:
+            return False
+
+        reason = "Killed to relieve memory pressure, using %dkB over its %skB reservation" % (
+            overage, victim.runFrame.environment.get('CUE_MEMORY', 0))
+        log.warning("Preempting frameId=%s: %s" % (victim.frameId, reason))
+        # Without a grace period, the host is already short of memory
+        victim.kill(reason, rqd.rqconstants.EXITSTATUS_FOR_MEMORY_PREEMPT, immediate=True)
+        return True
+
+    def releaseCores(self, reqRelease, cpuList=None):
         """The requested number of cores are released
         @type  reqRelease: int
-        @param reqRelease: Number of cores to release, 100 = 1 physical core"""
+        @param reqRelease: Number of cores to release, 100 = 1 physical core
+        @type  cpuList: str
+        @param cpuList: The cpus the frame was pinned to"""
         self.__threadLock.acquire()
         try:
             self.cores.booked_cores -= reqRelease
@@ -713,8 +1053,8 @@ class RqCore(object):
             if maxRelease > 0:
                 self.cores.idle_cores += min(maxRelease, reqRelease)
 
-            if releaseHT:
-                self.machine.releaseHT(releaseHT)
+            if cpuList:
+                self.machine.releaseCpus(cpuList)
 
         finally:
             self.__threadLock.release()
@@ -733,10 +1073,15 @@ class RqCore(object):
         """Shuts down all rqd systems,
            will call respawn or reboot if requested"""
         self.nimbyOff()
-        if self.onIntervalThread is not None:
-            self.onIntervalThread.cancel()
-        if self.updateRssThread is not None:
-            self.updateRssThread.cancel()
+        self.statusReporter.stop()
+        if self.updateRssJob is not None:
+            self.updateRssJob.cancel()
+        if self.memoryPressure is not None:
+            self.memoryPressure.stop()
+        if self.launchBroker is not None:
+            self.launchBroker.stop()
+        if self.metricsExporter is not None:
+            self.metricsExporter.stop()
         if self.__respawn:
             log.warning("Respawning RQD by request")
             self.respawn_rqd()
@@ -780,6 +1125,12 @@ class RqCore(object):
             log.info(err)
             raise rqd.rqexceptions.CoreReservationFailureException(err)
 
+        if self.memoryPressure is not None and not self.memoryPressure.isLaunchAllowed():
+            err = "Not launching, host is under memory pressure"
+            log.warning(err)
+            rqd.rqpressure.REFUSED_LAUNCHES.inc()
+            raise rqd.rqexceptions.CoreReservationFailureException(err)
+
         if runFrame.frame_id in self.__cache:
             err = "Not launching, frame is already running on this proc %s" % runFrame.frame_id
             log.critical(err)
@@ -803,10 +1154,11 @@ class RqCore(object):
                 log.critical(err)
                 raise rqd.rqexceptions.CoreReservationFailureException(err)
 
-            if runFrame.environment.get('CUE_THREADABLE') == '1':
-                reserveHT = self.machine.reserveHT(runFrame.num_cores)
-                if reserveHT:
-                    runFrame.attributes['CPU_LIST'] = reserveHT
+            allocation = self.machine.reserveCpus(runFrame.num_cores)
+            if allocation:
+                runFrame.attributes['CPU_LIST'] = rqd.rqtopology.formatCpuList(allocation.cpus)
+                runFrame.attributes['NUMA_NODES'] = ','.join(
+                    str(node) for node in allocation.nodes)
 
             # They must be available at this point, reserve them
             self.cores.idle_cores -= runFrame.num_cores
@@ -818,6 +1170,14 @@ class RqCore(object):
         runningFrame.frameAttendantThread = FrameAttendantThread(self, runFrame, runningFrame)
         runningFrame.frameAttendantThread.start()
 
+    def recordHistory(self):
+        """Adds a sample of the host's and running frames' resource use to
+        the history"""
+        with self.__threadLock:
+            frames = list(self.__cache.items())
+        self.history.record(time.time(), self.machine.getHistorySample(),
+                            dict((frameId, {'rss': frame.rss}) for frameId, frame in frames))
+
     def getRunningFrame(self, frameId):
         try:
             return self.__cache[frameId]
@@ -908,16 +1268,49 @@ class RqCore(object):
 
     def onNimbyLock(self):
         """This is called by nimby when it locks the machine.
-           All running frames are killed.
-           A new report is sent to the cuebot."""
-        self.killAllFrame("NIMBY Triggered")
-        self.sendStatusReport()
+           All running frames are killed, or suspended if RQD_NIMBY_SUSPEND
+           is set. A new report is sent to the cuebot."""
+        if rqd.rqconstants.RQD_NIMBY_SUSPEND:
+            self.suspendAllFrames()
+        else:
+            self.killAllFrame("NIMBY Triggered")
+        self.statusReporter.notify(rqd.rqreporter.REASON_NIMBY_LOCK)
 
     def onNimbyUnlock(self, asOf=None):
         """This is called by nimby when it unlocks the machine due to sufficent
-           idle. A new report is sent to the cuebot.
+           idle. Suspended frames are resumed. A new report is sent to the cuebot.
         @param asOf: Time when idle state began, if known."""
-        self.sendStatusReport()
+        self.resumeAllFrames()
+        self.statusReporter.notify(rqd.rqreporter.REASON_NIMBY_UNLOCK)
+
+    def suspendAllFrames(self):
+        """Suspends every frame that does not ignore nimby. Frames still
+        suspended after RQD_NIMBY_MAX_SUSPEND_SEC are killed."""
+        suspended = [frame.frameId for frame in list(self.__cache.values())
+                     if not frame.ignoreNimby and frame.suspend()]
+        if suspended:
+            log.warning("Suspended frames for nimby: %s" % ",".join(suspended))
+        with self.__threadLock:
+            if self.__suspendTimeoutJob is None:
+                self.__suspendTimeoutJob = self.scheduler.scheduleOnce(
+                    'nimbySuspendTimeout', rqd.rqconstants.RQD_NIMBY_MAX_SUSPEND_SEC,
+                    self.__onSuspendTimeout, blocking=True)
+
+    def resumeAllFrames(self):
+        """Resumes the frames suspended by suspendAllFrames"""
+        with self.__threadLock:
+            if self.__suspendTimeoutJob is not None:
+                self.__suspendTimeoutJob.cancel()
+                self.__suspendTimeoutJob = None
+        for frame in list(self.__cache.values()):
+            frame.resume()
+
+    def __onSuspendTimeout(self):
+        with self.__threadLock:
+            self.__suspendTimeoutJob = None
+        if self.nimby.locked:
+            self.killAllFrame("NIMBY Triggered, frames suspended for over %d seconds" %
+                              rqd.rqconstants.RQD_NIMBY_MAX_SUSPEND_SEC)
 
     def lock(self, reqLock):
         """Locks the requested core.
@@ -939,7 +1332,7 @@ class RqCore(object):
         log.debug(self.cores)
 
         if sendUpdate:
-            self.sendStatusReport()
+            self.statusReporter.notify(rqd.rqreporter.REASON_CORES_LOCKED)
 
     def lockAll(self):
         """"Locks all cores on the machine.
@@ -957,7 +1350,7 @@ class RqCore(object):
         log.debug(self.cores)
 
         if sendUpdate:
-            self.sendStatusReport()
+            self.statusReporter.notify(rqd.rqreporter.REASON_CORES_LOCKED)
 
     def unlock(self, reqUnlock):
         """Unlocks the requested number of cores.
@@ -989,7 +1382,7 @@ class RqCore(object):
         log.debug(self.cores)
 
         if sendUpdate:
-            self.sendStatusReport()
+            self.statusReporter.notify(rqd.rqreporter.REASON_CORES_UNLOCKED)
 
     def unlockAll(self):
         """"Unlocks all cores on the machine.
@@ -1019,10 +1412,67 @@ class RqCore(object):
         log.debug(self.cores)
 
         if sendUpdate:
-            self.sendStatusReport()
+            self.statusReporter.notify(rqd.rqreporter.REASON_CORES_UNLOCKED)
 
     def sendStatusReport(self):
-        self.network.reportStatus(self.machine.getHostReport())
+        report = self.hostReportEncoder.encode(self.machine.getHostReport())
+        try:
+            response = self.network.reportStatus(report)
+        except Exception:
+            self.hostReportEncoder.reset()
+            raise
+        self.hostReportEncoder.acknowledge(report.report_version, response)
+        self.drainReportSpoolSoon()
+
+    def sendFrameCompleteReport(self, report):
+        """Durably spools and sends a frame completion report. If the cuebot
+        cannot be reached the report is retried in the background.
+        @type  report: rqd.compiled_proto.report_pb2.FrameCompleteReport
+        @param report: The frame completion report"""
+        if self.reportSpool is None:
+            self.network.reportRunningFrameCompletion(report)
+            return
+
+        seq = self.reportSpool.append(report, inFlight=True)
+        try:
+            self.network.reportRunningFrameCompletion(report)
+        except Exception as e:
+            self.reportSpool.release([seq])
+            log.warning('Unable to send completion report for frameId=%s, spooled for '
+                        'retry: %s' % (report.frame.frame_id, e))
+            self.drainReportSpoolSoon(rqd.rqconstants.RQD_RETRY_CRITICAL_REPORT_DELAY)
+            return
+        self.reportSpool.acknowledge([seq])
+
+    def drainReportSpoolSoon(self, delay=0):
+        """Schedules a replay of the spooled completion reports
+        @type  delay: int
+        @param delay: Seconds to wait before replaying"""
+        if self.reportSpool is not None and self.reportSpool.pendingCount():
+            self.scheduler.runSoon('drainReportSpool', self.drainReportSpool,
+                                   delay=delay, blocking=True)
+
+    def drainReportSpool(self):
+        """Replays spooled completion reports in batches until the spool is
+        empty or the cuebot cannot be reached"""
+        while True:
+            batch = self.reportSpool.claim(rqd.rqconstants.RQD_SPOOL_DRAIN_BATCH)
+            if not batch:
+                return
+            delivered = []
+            try:
+                for seq, report in batch:
+                    self.network.reportRunningFrameCompletion(report)
+                    delivered.append(seq)
+            except Exception as e:
+                log.warning('Unable to replay spooled completion reports, %d left: %s' % (
+                    self.reportSpool.pendingCount() - len(delivered), e))
+                self.reportSpool.release([seq for seq, _ in batch if seq not in delivered])
+                self.reportSpool.acknowledge(delivered)
+                self.drainReportSpoolSoon(rqd.rqconstants.RQD_RETRY_CRITICAL_REPORT_DELAY)
+                return
+            self.reportSpool.acknowledge(delivered)
+            log.info('Replayed %d spooled completion reports' % len(delivered))
 
     def isWaitingForIdle(self):
         return self.__whenIdle
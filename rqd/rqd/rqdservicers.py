@@ -23,6 +23,8 @@ import grpc
 
 import rqd.compiled_proto.rqd_pb2
 import rqd.compiled_proto.rqd_pb2_grpc
+import rqd.rqconstants
+import rqd.rqscheduler
 
 
 class RqdInterfaceServicer(rqd.compiled_proto.rqd_pb2_grpc.RqdInterfaceServicer):
@@ -45,16 +47,76 @@ class RqdInterfaceServicer(rqd.compiled_proto.rqd_pb2_grpc.RqdInterfaceServicer)
     def GetRunningFrameStatus(self, request, context):
         """RPC call to return the frame info for the given frame id"""
         log.info("Request received: getRunningFrameStatus")
-        frame = self.rqCore.getRunningFrame(request.frameId)
+        frame = self.rqCore.getRunningFrame(request.frame_id)
         if frame:
             return rqd.compiled_proto.rqd_pb2.RqdStaticGetRunningFrameStatusResponse(
                 running_frame_info=frame.runningFrameInfo())
         else:
             context.set_details(
-                "The requested frame was not found. frameId: {}".format(request.frameId))
+                "The requested frame was not found. frameId: {}".format(request.frame_id))
             context.set_code(grpc.StatusCode.NOT_FOUND)
             return rqd.compiled_proto.rqd_pb2.RqdStaticGetRunningFrameStatusResponse()
 
+    def GetMachineHistory(self, request, context):
+        """RPC call that returns the recent history of the host's and running
+        frames' resource use"""
+        log.debug("Request received: getMachineHistory")
+        response = rqd.compiled_proto.rqd_pb2.RqdStaticGetMachineHistoryResponse(
+            interval=rqd.rqconstants.RQD_HISTORY_INTERVAL_SEC)
+        if self.rqCore.history is None:
+            return response
+        for name, frameId, times, values in self.rqCore.history.query(
+                request.start_time, request.end_time, list(request.metrics)):
+            response.histories.add(name=name, frame_id=frameId, times=times, values=values)
+        return response
+
+    def TailFrameLog(self, request, context):
+        """RPC call that returns the last lines of a running frame's log"""
+        log.debug("Request received: tailFrameLog")
+        logBuffer = self.__getLogBuffer(request.frame_id, context)
+        if logBuffer is None:
+            return rqd.compiled_proto.rqd_pb2.RqdStaticTailFrameLogResponse()
+        offset, data = logBuffer.tail(request.lines or rqd.rqconstants.RQD_LOG_TAIL_LINES)
+        return rqd.compiled_proto.rqd_pb2.RqdStaticTailFrameLogResponse(
+            data=data, offset=offset, log_size=logBuffer.size())
+
+    def StreamFrameLog(self, request, context):
+        """RPC call that streams a running frame's output from an offset as it
+        is written, until the frame's output ends or RQD_LOG_STREAM_MAX_SEC"""
+        log.info("Request received: streamFrameLog")
+        logBuffer = self.__getLogBuffer(request.frame_id, context)
+        if logBuffer is None:
+            return
+        offset = request.offset
+        deadline = rqd.rqscheduler.monotonic() + rqd.rqconstants.RQD_LOG_STREAM_MAX_SEC
+        while context.is_active():
+            # Read after checking for the end, so no output is missed
+            finished = logBuffer.closed
+            offset, data = logBuffer.read(offset, rqd.rqconstants.RQD_LOG_STREAM_CHUNK_BYTES)
+            if data or finished:
+                yield rqd.compiled_proto.rqd_pb2.RqdStaticStreamFrameLogResponse(
+                    data=data, offset=offset, log_size=logBuffer.size(),
+                    finished=finished and not data)
+                if finished and not data:
+                    return
+                offset += len(data)
+                continue
+            remaining = deadline - rqd.rqscheduler.monotonic()
+            if remaining <= 0:
+                return
+            logBuffer.wait(offset, min(remaining, 1.0))
+
+    def __getLogBuffer(self, frameId, context):
+        """Returns the log buffer of a running frame, setting NOT_FOUND on
+        the call if there is none, so the caller reads the log file"""
+        frame = self.rqCore.getRunningFrame(frameId)
+        if frame is None or frame.logBuffer is None:
+            context.set_details(
+                "The requested frame's log is not buffered. frameId: {}".format(frameId))
+            context.set_code(grpc.StatusCode.NOT_FOUND)
+            return None
+        return frame.logBuffer
+
     def KillRunningFrame(self, request, context):
         """RPC call that kills the running frame with the given id"""
         log.info("Request received: killRunningFrame")
@@ -63,6 +125,15 @@ class RqdInterfaceServicer(rqd.compiled_proto.rqd_pb2_grpc.RqdInterfaceServicer)
             frame.kill(message=request.message)
         return rqd.compiled_proto.rqd_pb2.RqdStaticKillRunningFrameResponse()
 
+    def KillRunningFrames(self, request, context):
+        """RPC call that kills the running frames with the given ids at once"""
+        log.info("Request received: killRunningFrames for %d frames" % len(request.frame_ids))
+        killed = self.rqCore.killFrames(list(request.frame_ids), request.message)
+        return rqd.compiled_proto.rqd_pb2.RqdStaticKillRunningFramesResponse(
+            killed_frame_ids=killed,
+            not_killed_frame_ids=[
+                frameId for frameId in request.frame_ids if frameId not in killed])
+
     def ShutdownRqdNow(self, request, context):
         """RPC call that kills all running frames and shuts down rqd"""
         log.info("Request received: shutdownRqdNow")
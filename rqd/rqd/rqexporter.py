@@ -0,0 +1,151 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Publishes rqd's metrics for Prometheus.
+
+The metrics are served over plain HTTP at /metrics, for Prometheus to scrape
+each rqd, and/or written periodically to a file for node_exporter's textfile
+collector, for sites that already run node_exporter on their hosts. Both use
+the text exposition format, see rqd.rqmetrics.render.
+
+Neither is started unless configured, see RQD_METRICS_PORT and
+RQD_METRICS_TEXTFILE, and the metrics that cost more than a count to take
+are only measured once one is.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import logging as log
+import os
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import rqd.rqconstants
+import rqd.rqmetrics
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRICS_PATH = '/metrics'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the metrics of the server's registry at /metrics"""
+
+    def do_GET(self):
+        if self.path.split('?')[0] != METRICS_PATH:
+            self.send_error(404)
+            return
+        body = rqd.rqmetrics.render(self.server.registry).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug('Metrics request from %s: %s' % (self.address_string(), format % args))
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    """HTTP server for MetricsHandler, one thread per scrape"""
+
+    daemon_threads = True
+
+    def __init__(self, address, registry):
+        HTTPServer.__init__(self, address, MetricsHandler)
+        self.registry = registry
+
+
+class MetricsExporter(object):
+    """Serves the metrics over HTTP and/or writes them to a textfile."""
+
+    def __init__(self, scheduler, port=None, address=None, textfile=None, interval=None,
+                 registry=None):
+        """MetricsExporter class initialization
+        @type  scheduler: rqd.rqscheduler.Scheduler
+        @param scheduler: Scheduler the textfile is written from
+        @type  port: int
+        @param port: HTTP port, defaults to RQD_METRICS_PORT, 0 to not serve
+        @type  address: str
+        @param address: Address to listen on, defaults to RQD_METRICS_ADDRESS
+        @type  textfile: str
+        @param textfile: File to write, defaults to RQD_METRICS_TEXTFILE
+        @type  interval: float
+        @param interval: Seconds between textfile writes
+        @type  registry: rqd.rqmetrics.Registry
+        @param registry: The metrics, the default registry if not given"""
+        self.__scheduler = scheduler
+        self.port = rqd.rqconstants.RQD_METRICS_PORT if port is None else port
+        self.address = rqd.rqconstants.RQD_METRICS_ADDRESS if address is None else address
+        self.textfile = textfile or rqd.rqconstants.RQD_METRICS_TEXTFILE
+        self.interval = interval or rqd.rqconstants.RQD_METRICS_TEXTFILE_INTERVAL_SEC
+        self.registry = registry or rqd.rqmetrics.REGISTRY
+        self.server = None
+        self.__job = None
+
+    @staticmethod
+    def isConfigured():
+        """Returns True if rqd is configured to publish its metrics"""
+        return bool(rqd.rqconstants.RQD_METRICS_PORT or rqd.rqconstants.RQD_METRICS_TEXTFILE)
+
+    def start(self):
+        """Starts serving and/or writing the metrics
+        @raise socket.error: The port could not be listened on"""
+        rqd.rqmetrics.setEnabled(True)
+        if self.port:
+            self.server = MetricsServer((self.address, self.port), self.registry)
+            # The port actually bound, when asked for any
+            self.port = self.server.server_address[1]
+            thread = threading.Thread(target=self.server.serve_forever, name='MetricsServer')
+            thread.daemon = True
+            thread.start()
+            log.info('Serving metrics on port %d' % self.port)
+        if self.textfile:
+            self.__job = self.__scheduler.schedulePeriodic(
+                'metricsTextfile', self.interval, self.writeTextfile, initialDelay=0,
+                blocking=True)
+
+    def stop(self):
+        """Stops publishing the metrics"""
+        if self.__job is not None:
+            self.__job.cancel()
+            self.__job = None
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        rqd.rqmetrics.setEnabled(False)
+
+    def writeTextfile(self):
+        """Writes the metrics to the textfile. The file is replaced with a
+        rename so node_exporter never reads a partial one."""
+        tmpPath = '%s.%d.tmp' % (self.textfile, os.getpid())
+        try:
+            with open(tmpPath, 'w') as tmpFile:
+                tmpFile.write(rqd.rqmetrics.render(self.registry))
+            os.rename(tmpPath, self.textfile)
+        except (IOError, OSError) as e:
+            log.warning('Unable to write metrics to %s: %s' % (self.textfile, e))
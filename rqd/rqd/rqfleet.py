@@ -0,0 +1,850 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Simulated render hosts for cuebot and client scale testing.
+
+A virtual fleet runs many simulated hosts in one process. Each host serves
+the RqdInterface on its own address and sends boot, status and frame
+completion reports the way rqd does, but its frames are scripted rather
+than run. A frame's script is read from its environment:
+
+    SIM_DURATION_SEC   seconds the frame runs
+    SIM_RSS_KB         peak rss in kB
+    SIM_RAMP_SEC       seconds taken to grow linearly to the peak rss
+    SIM_EXIT_STATUS    exit status reported when the frame completes
+
+with the fleet's defaults, jittered per frame, for anything not set.
+
+The hosts share one scheduler, one gRPC worker pool and one channel pool to
+the cuebot, so a host costs a listening socket, the gRPC server's polling
+thread and a few scheduled jobs. Hosts take consecutive loopback addresses
+on the rqd port (127.1.0.1, 127.1.0.2, ...) and are named by their address,
+so a cuebot reaches them as it would real hosts. They can instead listen on
+consecutive ports of one address.
+
+StandInCuebot accepts the reports in place of a cuebot and keeps every host
+busy with synthetic frames, to measure the fleet and the report path alone:
+
+    python -m rqd.rqfleet --hosts 1000 --cores 16 --memory-gb 64 --stand-in 0
+    python -m rqd.rqfleet --hosts 5000 --cuebot cuebot1 --tags general,sim
+
+Raise the open files limit (ulimit -n) when running more than a few hundred
+hosts.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+from concurrent import futures
+import argparse
+import collections
+import itertools
+import logging as log
+import random
+import signal
+import socket
+import struct
+import threading
+import time
+
+import grpc
+
+import rqd.compiled_proto.host_pb2
+import rqd.compiled_proto.report_pb2
+import rqd.compiled_proto.report_pb2_grpc
+import rqd.compiled_proto.rqd_pb2
+import rqd.compiled_proto.rqd_pb2_grpc
+import rqd.rqconstants
+import rqd.rqexceptions
+import rqd.rqmetrics
+import rqd.rqnetwork
+import rqd.rqreport
+import rqd.rqreporter
+import rqd.rqscheduler
+
+
+# RenderHost attribute holding the address a simulated host listens on
+ADDRESS_ATTRIBUTE = 'SIM_RQD_ADDRESS'
+
+ENV_DURATION = 'SIM_DURATION_SEC'
+ENV_RSS = 'SIM_RSS_KB'
+ENV_RAMP = 'SIM_RAMP_SEC'
+ENV_EXIT_STATUS = 'SIM_EXIT_STATUS'
+
+# Memory of a simulated host not available to frames, in kB
+RESERVED_MEMORY = 2 * 1024 * 1024
+
+# How a synthetic frame runs: seconds, peak rss in kB, seconds to reach the
+# peak and the exit status reported at completion
+FrameScript = collections.namedtuple(
+    'FrameScript', ['duration', 'rssKb', 'rampSeconds', 'exitStatus'])
+
+DEFAULT_SCRIPT = FrameScript(60.0, 1024 * 1024, 10.0, 0)
+
+FRAMES_LAUNCHED = rqd.rqmetrics.counter(
+    'rqd_fleet_frames_launched_total', 'Synthetic frames launched on simulated hosts')
+FRAMES_COMPLETED = rqd.rqmetrics.counter(
+    'rqd_fleet_frames_completed_total', 'Synthetic frames completed, by how they ended')
+REPORT_FAILURES = rqd.rqmetrics.counter(
+    'rqd_fleet_report_failures_total', 'Boot and completion reports that could not be sent')
+
+STANDIN_REPORTS = rqd.rqmetrics.counter(
+    'rqd_fleet_standin_reports_total', 'Reports received by the stand-in cuebot, by type')
+STANDIN_REPORT_BYTES = rqd.rqmetrics.counter(
+    'rqd_fleet_standin_report_bytes_total', 'Serialized size of the status reports received')
+STANDIN_LAUNCHES = rqd.rqmetrics.counter(
+    'rqd_fleet_standin_launches_total', 'Frames dispatched by the stand-in cuebot, by result')
+STANDIN_LAUNCH_TIME = rqd.rqmetrics.histogram(
+    'rqd_fleet_standin_launch_seconds', 'Time taken by a LaunchFrame call to a simulated host')
+
+
+def rssAt(script, elapsed):
+    """Returns a frame's rss after it has run for elapsed seconds
+    @type  script: FrameScript
+    @param script: The frame's script
+    @type  elapsed: float
+    @param elapsed: Seconds since the frame started
+    @rtype:  int
+    @return: The rss in kB"""
+    if script.rampSeconds <= 0 or elapsed >= script.rampSeconds:
+        return script.rssKb
+    return int(script.rssKb * max(elapsed, 0) / script.rampSeconds)
+
+
+def hostAddress(first, index):
+    """Returns the address index places after first
+    @type  first: str
+    @param first: The first host's IPv4 address
+    @type  index: int
+    @param index: Position of the host in the fleet
+    @rtype:  str
+    @return: The host's IPv4 address"""
+    value = struct.unpack('!I', socket.inet_aton(first))[0] + index
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+class SimulatedFrame(object):
+    """A frame on a simulated host, following its script until completed or
+    killed."""
+
+    def __init__(self, host, runFrame, script):
+        """SimulatedFrame class initialization
+        @type  host: SimulatedHost
+        @param host: The host running the frame
+        @type  runFrame: rqd.compiled_proto.rqd_pb2.RunFrame
+        @param runFrame: The launched frame
+        @type  script: FrameScript
+        @param script: How the frame runs"""
+        self.host = host
+        self.runFrame = runFrame
+        self.frameId = runFrame.frame_id
+        self.script = script
+        self.startTime = rqd.rqscheduler.monotonic()
+        self.maxRss = 0
+        # Simulated frames have no output to serve
+        self.logBuffer = None
+        self.job = None
+
+    def elapsed(self):
+        return rqd.rqscheduler.monotonic() - self.startTime
+
+    def runningFrameInfo(self):
+        """Returns the RunningFrameInfo object"""
+        rss = rssAt(self.script, self.elapsed())
+        self.maxRss = max(self.maxRss, rss)
+        info = rqd.compiled_proto.report_pb2.RunningFrameInfo(
+            resource_id=self.runFrame.resource_id,
+            job_id=self.runFrame.job_id,
+            job_name=self.runFrame.job_name,
+            frame_id=self.runFrame.frame_id,
+            frame_name=self.runFrame.frame_name,
+            layer_id=self.runFrame.layer_id,
+            num_cores=self.runFrame.num_cores,
+            start_time=self.runFrame.start_time,
+            max_rss=self.maxRss,
+            rss=rss,
+            max_vsize=self.maxRss,
+            vsize=rss,
+            attributes=self.runFrame.attributes)
+        # Busy on every reserved core, in the jiffies per second rqd reports
+        info.attributes['pcpu'] = str(float(self.runFrame.num_cores) *
+                                      rqd.rqconstants.SYS_HERTZ / rqd.rqconstants.CORE_VALUE)
+        return info
+
+    def status(self):
+        """Returns the status of the frame"""
+        return self.runningFrameInfo()
+
+    def kill(self, message="", exitStatus=None):
+        """Ends the frame as if its processes were killed
+        @type  message: str
+        @param message: Reason for the kill
+        @type  exitStatus: int
+        @param exitStatus: Exit status reported for the frame"""
+        log.info("Killing simulated frameId=%s: %s" % (self.frameId, message))
+        if self.job is not None:
+            self.job.cancel()
+        self.host.completeFrame(
+            self.frameId, 1 if exitStatus is None else exitStatus,
+            rqd.rqconstants.KILL_SIGNAL)
+
+
+class SimulatedHost(object):
+    """A render host whose frames are scripted. Implements the calls the
+    RqdInterfaceServicer makes on RqCore, and reports to the cuebot through
+    the fleet's network."""
+
+    def __init__(self, fleet, name, address, cores, memoryKb, tags=(), facility=None):
+        """SimulatedHost class initialization
+        @type  fleet: VirtualFleet
+        @param fleet: Provides the scheduler, network and frame scripts
+        @type  name: str
+        @param name: Host name reported to the cuebot
+        @type  address: str
+        @param address: host:port the RqdInterface listens on
+        @type  cores: int
+        @param cores: Number of physical cores
+        @type  memoryKb: int
+        @param memoryKb: Total memory in kB
+        @type  tags: list<str>
+        @param tags: Host tags
+        @type  facility: str
+        @param facility: Facility of the host, defaults to FACILITY"""
+        self.fleet = fleet
+        self.name = name
+        self.address = address
+        self.grpcServer = None
+
+        self.cores = rqd.compiled_proto.report_pb2.CoreDetail(
+            total_cores=cores * rqd.rqconstants.CORE_VALUE,
+            idle_cores=cores * rqd.rqconstants.CORE_VALUE,
+            locked_cores=0,
+            booked_cores=0)
+        self.renderHost = rqd.compiled_proto.report_pb2.RenderHost(
+            name=name,
+            nimby_enabled=False,
+            nimby_locked=False,
+            facility=facility or rqd.rqconstants.FACILITY,
+            num_procs=1,
+            cores_per_proc=cores * rqd.rqconstants.CORE_VALUE,
+            total_swap=0,
+            total_mem=memoryKb,
+            total_mcp=memoryKb,
+            free_swap=0,
+            free_mem=memoryKb - RESERVED_MEMORY,
+            free_mcp=memoryKb,
+            load=0,
+            boot_time=int(time.time()),
+            tags=list(tags),
+            state=rqd.compiled_proto.host_pb2.UP,
+            attributes={'SP_OS': rqd.rqconstants.SP_OS, ADDRESS_ATTRIBUTE: address})
+
+        self.hostReportEncoder = rqd.rqreport.HostReportEncoder()
+        self.statusReporter = rqd.rqreporter.StatusReporter(
+            fleet.scheduler, self.sendStatusReport)
+        # Simulated hosts keep no machine history, GetMachineHistory returns
+        # an empty response like it does with RQD_HISTORY_ENABLED off
+        self.history = None
+
+        self.__threadLock = threading.Lock()
+        self.__frames = {}
+        # Run once the last frame has exited, set by the *Idle requests
+        self.__whenIdle = None
+
+    def serve(self):
+        """Starts listening for RqdInterface calls"""
+        self.grpcServer = rqd.rqnetwork.GrpcServer(self, self.address, self.fleet.executor)
+        self.grpcServer.addServicers()
+        self.grpcServer.server.start()
+
+    def boot(self):
+        """Sends the boot report and starts reporting status, retried until
+        the cuebot accepts it"""
+        try:
+            self.fleet.network.reportRqdStartup(self.getBootReport())
+        except Exception as e:
+            REPORT_FAILURES.inc(label='boot')
+            log.warning('Unable to boot simulated host %s, retrying: %s' % (self.name, e))
+            self.fleet.scheduler.scheduleOnce(
+                'simulatedBoot', rqd.rqconstants.RQD_RETRY_STARTUP_CONNECT_DELAY, self.boot,
+                blocking=True)
+            return
+        self.hostReportEncoder.reset()
+        self.statusReporter.start()
+
+    def stop(self):
+        """Stops reporting and serving, dropping the running frames"""
+        self.statusReporter.stop()
+        with self.__threadLock:
+            frames = list(self.__frames.values())
+            self.__frames.clear()
+        for frame in frames:
+            if frame.job is not None:
+                frame.job.cancel()
+        if self.grpcServer is not None:
+            self.grpcServer.server.stop(0)
+            self.grpcServer = None
+
+    def getCoreInfo(self):
+        with self.__threadLock:
+            coreInfo = rqd.compiled_proto.report_pb2.CoreDetail()
+            coreInfo.CopyFrom(self.cores)
+            return coreInfo
+
+    def getFrameKeys(self):
+        with self.__threadLock:
+            return list(self.__frames)
+
+    def getRunningFrame(self, frameId):
+        return self.__frames.get(frameId)
+
+    def getHostInfo(self, frameInfos=None):
+        """Returns the renderHost struct, with memory and load following the
+        running frames
+        @type  frameInfos: list<RunningFrameInfo>
+        @param frameInfos: Infos of the running frames, when already built"""
+        if frameInfos is None:
+            with self.__threadLock:
+                frames = list(self.__frames.values())
+            frameInfos = [frame.runningFrameInfo() for frame in frames]
+        renderHost = rqd.compiled_proto.report_pb2.RenderHost()
+        renderHost.CopyFrom(self.renderHost)
+        renderHost.free_mem = max(
+            self.renderHost.total_mem - RESERVED_MEMORY - sum(info.rss for info in frameInfos),
+            0)
+        # The load average times 100, one per busy core
+        renderHost.load = sum(info.num_cores for info in frameInfos)
+        return renderHost
+
+    def getHostReport(self):
+        """Returns a full host report"""
+        with self.__threadLock:
+            frames = list(self.__frames.values())
+        frameInfos = [frame.runningFrameInfo() for frame in frames]
+        return rqd.compiled_proto.report_pb2.HostReport(
+            host=self.getHostInfo(frameInfos),
+            frames=frameInfos,
+            core_info=self.getCoreInfo())
+
+    def getBootReport(self):
+        return rqd.compiled_proto.report_pb2.BootReport(
+            host=self.getHostInfo(), core_info=self.getCoreInfo())
+
+    def reportStatus(self, current=None):
+        """Returns the host report the RqdInterface's ReportStatus replies with"""
+        return self.getHostReport()
+
+    def sendStatusReport(self):
+        report = self.hostReportEncoder.encode(self.getHostReport())
+        try:
+            response = self.fleet.network.reportStatus(report)
+        except Exception:
+            self.hostReportEncoder.reset()
+            raise
+        self.hostReportEncoder.acknowledge(report.report_version, response)
+
+    def launchFrame(self, runFrame):
+        """Starts a synthetic frame, refusing it for the reasons RqCore would
+        @type  runFrame: rqd.compiled_proto.rqd_pb2.RunFrame
+        @param runFrame: The frame to run"""
+        if self.renderHost.state != rqd.compiled_proto.host_pb2.UP:
+            raise rqd.rqexceptions.CoreReservationFailureException(
+                "Not launching, rqd HardwareState is not Up")
+        if self.__whenIdle is not None:
+            raise rqd.rqexceptions.CoreReservationFailureException(
+                "Not launching, rqd is waiting for idle to shutdown")
+        if runFrame.num_cores <= 0:
+            raise rqd.rqexceptions.CoreReservationFailureException(
+                "Not launching, numCores must be > 0")
+
+        frame = SimulatedFrame(self, runFrame, self.fleet.frameScript(runFrame))
+        with self.__threadLock:
+            if runFrame.frame_id in self.__frames:
+                raise rqd.rqexceptions.DuplicateFrameViolationException(
+                    "Not launching, frame is already running on this proc %s"
+                    % runFrame.frame_id)
+            if self.cores.idle_cores < runFrame.num_cores:
+                raise rqd.rqexceptions.CoreReservationFailureException(
+                    "Not launching, insufficient idle cores")
+            self.cores.idle_cores -= runFrame.num_cores
+            self.cores.booked_cores += runFrame.num_cores
+            self.__frames[frame.frameId] = frame
+            frame.job = self.fleet.scheduler.scheduleOnce(
+                'simulatedFrame', frame.script.duration,
+                lambda: self.completeFrame(frame.frameId, frame.script.exitStatus, 0),
+                blocking=True)
+        FRAMES_LAUNCHED.inc()
+
+    def completeFrame(self, frameId, exitStatus, exitSignal):
+        """Ends a frame, releases its cores and reports its completion
+        @type  frameId: str
+        @param frameId: The frame's id
+        @type  exitStatus: int
+        @param exitStatus: Exit status to report
+        @type  exitSignal: int
+        @param exitSignal: Signal the frame was killed with, 0 if it exited"""
+        with self.__threadLock:
+            frame = self.__frames.pop(frameId, None)
+            if frame is None:
+                return
+            self.cores.booked_cores -= frame.runFrame.num_cores
+            maxRelease = (self.cores.total_cores - self.cores.locked_cores -
+                          self.cores.idle_cores - self.cores.booked_cores)
+            if maxRelease > 0:
+                self.cores.idle_cores += min(maxRelease, frame.runFrame.num_cores)
+            whenIdle = self.__whenIdle if not self.__frames else None
+
+        info = frame.runningFrameInfo()
+        report = rqd.compiled_proto.report_pb2.FrameCompleteReport(
+            host=self.getHostInfo(),
+            frame=info,
+            exit_status=exitStatus,
+            exit_signal=exitSignal,
+            run_time=int(frame.elapsed()))
+        try:
+            self.fleet.network.reportRunningFrameCompletion(report)
+        except Exception as e:
+            REPORT_FAILURES.inc(label='completion')
+            log.warning('Unable to report completion of frameId=%s on %s: %s' % (
+                frameId, self.name, e))
+        FRAMES_COMPLETED.inc(label='killed' if exitSignal else 'exited')
+        self.statusReporter.notify(rqd.rqreporter.REASON_FRAME_EXIT)
+
+        if whenIdle is not None:
+            whenIdle()
+
+    def killFrames(self, frameIds, message):
+        """Kills the given frames
+        @type  frameIds: list<str>
+        @param frameIds: Ids of the frames to kill
+        @type  message: str
+        @param message: Reason for the kill
+        @rtype:  list<str>
+        @return: Ids of the frames killed"""
+        frames = [frame for frame in (self.getRunningFrame(frameId) for frameId in frameIds)
+                  if frame is not None]
+        for frame in frames:
+            frame.kill(message=message)
+        return [frame.frameId for frame in frames]
+
+    def killAllFrame(self, reason):
+        """Kills every running frame
+        @type  reason: str
+        @param reason: Reason for the kill"""
+        with self.__threadLock:
+            frames = list(self.__frames.values())
+        for frame in frames:
+            frame.kill(message=reason)
+
+    def __whenIdleOrNow(self, action):
+        with self.__threadLock:
+            if self.__frames:
+                self.__whenIdle = action
+                return
+        action()
+
+    def shutdown(self):
+        """Takes the host down until the fleet is restarted"""
+        log.warning('Simulated host %s shutting down' % self.name)
+        self.renderHost.state = rqd.compiled_proto.host_pb2.DOWN
+        self.__whenIdle = None
+        try:
+            self.sendStatusReport()
+        except Exception as e:
+            log.warning('Unable to send the final report of %s: %s' % (self.name, e))
+        self.statusReporter.stop()
+
+    def restart(self):
+        """Boots the host again, with its cores unlocked"""
+        log.warning('Simulated host %s restarting' % self.name)
+        self.statusReporter.stop()
+        with self.__threadLock:
+            self.__whenIdle = None
+            self.cores.locked_cores = 0
+            self.cores.idle_cores = self.cores.total_cores - self.cores.booked_cores
+        self.renderHost.state = rqd.compiled_proto.host_pb2.UP
+        self.renderHost.boot_time = int(time.time())
+        self.fleet.scheduler.runSoon('simulatedBoot', self.boot, blocking=True)
+
+    def shutdownRqdNow(self):
+        self.lockAll()
+        self.killAllFrame("shutdownRqdNow Command")
+        self.__whenIdleOrNow(self.shutdown)
+
+    def shutdownRqdIdle(self):
+        self.lockAll()
+        self.__whenIdleOrNow(self.shutdown)
+
+    def restartRqdNow(self):
+        self.lockAll()
+        self.killAllFrame("restartRqdNow Command")
+        self.__whenIdleOrNow(self.restart)
+
+    def restartRqdIdle(self):
+        self.lockAll()
+        self.__whenIdleOrNow(self.restart)
+
+    def rebootNow(self):
+        self.lockAll()
+        self.killAllFrame("rebootNow Command")
+        self.__whenIdleOrNow(self.restart)
+
+    def rebootIdle(self):
+        self.lockAll()
+        self.__whenIdleOrNow(self.restart)
+
+    def nimbyOn(self):
+        self.renderHost.nimby_enabled = True
+
+    def nimbyOff(self):
+        self.renderHost.nimby_enabled = False
+
+    def lock(self, reqLock):
+        """Locks the requested number of cores
+        @type  reqLock: int
+        @param reqLock: Number of cores to lock, 100 = 1 physical core"""
+        with self.__threadLock:
+            numLock = min(self.cores.total_cores - self.cores.locked_cores, reqLock)
+            if numLock <= 0:
+                return
+            self.cores.locked_cores += numLock
+            self.cores.idle_cores -= min(numLock, self.cores.idle_cores)
+        self.statusReporter.notify(rqd.rqreporter.REASON_CORES_LOCKED)
+
+    def lockAll(self):
+        with self.__threadLock:
+            if self.cores.locked_cores >= self.cores.total_cores:
+                return
+            self.cores.locked_cores = self.cores.total_cores
+            self.cores.idle_cores = 0
+        self.statusReporter.notify(rqd.rqreporter.REASON_CORES_LOCKED)
+
+    def unlock(self, reqUnlock):
+        """Unlocks the requested number of cores, cancelling any pending
+        shutdown, restart or reboot
+        @type  reqUnlock: int
+        @param reqUnlock: Number of cores to unlock, 100 = 1 physical core"""
+        with self.__threadLock:
+            self.__whenIdle = None
+            numUnlock = min(self.cores.locked_cores, reqUnlock)
+            if numUnlock > 0:
+                self.cores.locked_cores -= numUnlock
+                self.cores.idle_cores += numUnlock
+        self.renderHost.state = rqd.compiled_proto.host_pb2.UP
+        self.statusReporter.notify(rqd.rqreporter.REASON_CORES_UNLOCKED)
+
+    def unlockAll(self):
+        with self.__threadLock:
+            self.__whenIdle = None
+            self.cores.idle_cores += self.cores.locked_cores
+            self.cores.locked_cores = 0
+        self.renderHost.state = rqd.compiled_proto.host_pb2.UP
+        self.statusReporter.notify(rqd.rqreporter.REASON_CORES_UNLOCKED)
+
+
+class VirtualFleet(object):
+    """Simulated hosts sharing one scheduler, gRPC worker pool and cuebot
+    channel pool."""
+
+    def __init__(self, numHosts, cores=16, memoryKb=64 * 1024 * 1024, tags=(), facility=None,
+                 address='127.1.0.1', port=None, portPerHost=False, cuebotHostnames=None,
+                 cuebotPort=None, script=DEFAULT_SCRIPT, jitter=0.1, maxWorkers=64, seed=None):
+        """VirtualFleet class initialization
+        @type  numHosts: int
+        @param numHosts: Number of simulated hosts
+        @type  cores: int
+        @param cores: Physical cores of each host
+        @type  memoryKb: int
+        @param memoryKb: Memory of each host in kB
+        @type  tags: list<str>
+        @param tags: Tags of every host
+        @type  facility: str
+        @param facility: Facility of the hosts
+        @type  address: str
+        @param address: IPv4 address of the first host
+        @type  port: int
+        @param port: Port of the first host, defaults to RQD_GRPC_PORT, 0 picks free ports
+        @type  portPerHost: bool
+        @param portPerHost: Hosts share the address on consecutive ports, rather than
+                            taking consecutive addresses on the same port
+        @type  cuebotHostnames: list<str>
+        @param cuebotHostnames: Cuebots to report to, defaults to CUEBOT_HOSTNAME
+        @type  cuebotPort: int
+        @param cuebotPort: Their gRPC port, defaults to CUEBOT_GRPC_PORT
+        @type  script: FrameScript
+        @param script: How frames run when their environment does not say
+        @type  jitter: float
+        @param jitter: Fraction the default duration and rss vary by between frames
+        @type  maxWorkers: int
+        @param maxWorkers: Threads serving the RqdInterface calls and the scheduled jobs
+        @type  seed: int
+        @param seed: Seed of the jitter, for repeatable runs"""
+        self.script = script
+        self.jitter = jitter
+        self.__random = random.Random(seed)
+        self.scheduler = rqd.rqscheduler.Scheduler(maxWorkers=maxWorkers)
+        self.executor = futures.ThreadPoolExecutor(max_workers=maxWorkers)
+        self.network = rqd.rqnetwork.Network(None, cuebotHostnames, cuebotPort)
+
+        port = rqd.rqconstants.RQD_GRPC_PORT if port is None else port
+        self.hosts = []
+        for index in range(numHosts):
+            if portPerHost:
+                ip, hostPort = address, port + index if port else 0
+                name = '%s-%d' % (address, index)
+            else:
+                ip, hostPort = hostAddress(address, index), port
+                name = ip
+            self.hosts.append(SimulatedHost(
+                self, name, '%s:%d' % (ip, hostPort), cores, memoryKb, tags, facility))
+
+    def frameScript(self, runFrame):
+        """Returns how a frame runs, from its environment or the defaults
+        @type  runFrame: rqd.compiled_proto.rqd_pb2.RunFrame
+        @param runFrame: The launched frame
+        @rtype:  FrameScript
+        @return: The frame's script"""
+        environment = runFrame.environment
+        scale = 1.0 + self.__random.uniform(-self.jitter, self.jitter)
+        return FrameScript(
+            float(environment.get(ENV_DURATION, self.script.duration * scale)),
+            int(environment.get(ENV_RSS, self.script.rssKb * scale)),
+            float(environment.get(ENV_RAMP, self.script.rampSeconds)),
+            int(environment.get(ENV_EXIT_STATUS, self.script.exitStatus)))
+
+    def start(self, rampSeconds=0.0):
+        """Starts serving every host and boots them over rampSeconds
+        @type  rampSeconds: float
+        @param rampSeconds: Time over which the boot reports are spread"""
+        self.scheduler.start()
+        for index, host in enumerate(self.hosts):
+            host.serve()
+            if host.address.endswith(':0'):
+                host.address = '%s:%d' % (host.address.rsplit(':', 1)[0],
+                                          host.grpcServer.port)
+                host.renderHost.attributes[ADDRESS_ATTRIBUTE] = host.address
+            self.scheduler.scheduleOnce(
+                'simulatedBoot', rampSeconds * index / max(len(self.hosts), 1), host.boot,
+                blocking=True)
+        log.warning('Started %d simulated hosts' % len(self.hosts))
+
+    def stop(self):
+        for host in self.hosts:
+            host.stop()
+        self.scheduler.stop()
+        self.executor.shutdown(wait=False)
+        self.network.closeChannel()
+
+
+class StandInCuebot(rqd.compiled_proto.report_pb2_grpc.RqdReportInterfaceServicer):
+    """Takes a cuebot's place for a virtual fleet. Acknowledges every report
+    so hosts send deltas, and keeps every booted host's cores busy by
+    launching a frame in place of each one that completes."""
+
+    def __init__(self, port=0, frameCores=rqd.rqconstants.CORE_VALUE, dispatch=True,
+                 maxWorkers=64):
+        """StandInCuebot class initialization
+        @type  port: int
+        @param port: Port to listen on, 0 picks a free port
+        @type  frameCores: int
+        @param frameCores: Cores of each dispatched frame, 100 = 1 physical core
+        @type  dispatch: bool
+        @param dispatch: Whether frames are dispatched to the hosts
+        @type  maxWorkers: int
+        @param maxWorkers: Threads serving reports and dispatching frames"""
+        self.frameCores = frameCores
+        self.dispatch = dispatch
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=maxWorkers))
+        rqd.compiled_proto.report_pb2_grpc.add_RqdReportInterfaceServicer_to_server(
+            self, self.server)
+        self.port = self.server.add_insecure_port('127.0.0.1:%d' % port)
+        self.__dispatcher = futures.ThreadPoolExecutor(max_workers=maxWorkers)
+        self.__lock = threading.Lock()
+        self.__stubs = {}
+        self.__channels = []
+        self.__frameIds = itertools.count(1)
+
+    def start(self):
+        self.server.start()
+
+    def stop(self):
+        self.server.stop(0)
+        self.__dispatcher.shutdown(wait=False)
+        with self.__lock:
+            for channel in self.__channels:
+                channel.close()
+            self.__channels = []
+            self.__stubs.clear()
+
+    def hostCount(self):
+        with self.__lock:
+            return len(self.__stubs)
+
+    def ReportRqdStartup(self, request, context):
+        """RPC call a host makes when it boots"""
+        STANDIN_REPORTS.inc(label='boot')
+        host = request.boot_report.host
+        address = host.attributes.get(ADDRESS_ATTRIBUTE)
+        if address:
+            with self.__lock:
+                if host.name not in self.__stubs:
+                    channel = grpc.insecure_channel(address)
+                    self.__channels.append(channel)
+                    self.__stubs[host.name] = rqd.compiled_proto.rqd_pb2_grpc.RqdInterfaceStub(
+                        channel)
+            if self.dispatch:
+                for _ in range(request.boot_report.core_info.idle_cores // self.frameCores):
+                    self.__dispatcher.submit(self.launchFrame, host.name)
+        return rqd.compiled_proto.report_pb2.RqdReportRqdStartupResponse()
+
+    def ReportStatus(self, request, context):
+        """RPC call a host makes for each status report"""
+        report = request.host_report
+        STANDIN_REPORTS.inc(label='delta' if report.base_version else 'full')
+        STANDIN_REPORT_BYTES.inc(report.ByteSize())
+        return rqd.compiled_proto.report_pb2.RqdReportStatusResponse(
+            acknowledged_version=report.report_version)
+
+    def ReportRunningFrameCompletion(self, request, context):
+        """RPC call a host makes when a frame completes"""
+        STANDIN_REPORTS.inc(label='completion')
+        report = request.frame_complete_report
+        if self.dispatch and report.host.state == rqd.compiled_proto.host_pb2.UP:
+            self.__dispatcher.submit(self.launchFrame, report.host.name)
+        return rqd.compiled_proto.report_pb2.RqdReportRunningFrameCompletionResponse()
+
+    def launchFrame(self, hostName):
+        """Launches a synthetic frame on a host
+        @type  hostName: str
+        @param hostName: Name the host booted with
+        @rtype:  bool
+        @return: True if the host accepted the frame"""
+        with self.__lock:
+            stub = self.__stubs.get(hostName)
+        if stub is None:
+            return False
+        frameNumber = next(self.__frameIds)
+        runFrame = rqd.compiled_proto.rqd_pb2.RunFrame(
+            resource_id='standin-%d' % frameNumber,
+            job_id='standin-job',
+            job_name='standin-fleet-job',
+            frame_id='standin-frame-%d' % frameNumber,
+            frame_name='%04d-standin' % frameNumber,
+            layer_id='standin-layer',
+            num_cores=self.frameCores,
+            start_time=int(time.time() * 1000))
+        start = rqd.rqscheduler.monotonic()
+        try:
+            stub.LaunchFrame(rqd.compiled_proto.rqd_pb2.RqdStaticLaunchFrameRequest(
+                run_frame=runFrame), timeout=rqd.rqconstants.RQD_TIMEOUT)
+        except grpc.RpcError as e:
+            STANDIN_LAUNCHES.inc(label='refused')
+            log.info('%s refused frame %s: %s' % (hostName, runFrame.frame_id, e))
+            return False
+        STANDIN_LAUNCH_TIME.observe(rqd.rqscheduler.monotonic() - start)
+        STANDIN_LAUNCHES.inc(label='launched')
+        return True
+
+
+def main(argv=None):
+    """Runs a virtual fleet until interrupted, printing its throughput"""
+    parser = argparse.ArgumentParser(
+        description='Runs simulated rqd hosts for cuebot scale testing')
+    parser.add_argument('--hosts', type=int, default=100, help='number of simulated hosts')
+    parser.add_argument('--cores', type=int, default=16, help='physical cores per host')
+    parser.add_argument('--memory-gb', type=int, default=64, help='memory per host')
+    parser.add_argument('--tags', default='', help='comma separated host tags')
+    parser.add_argument('--facility', default=None, help='facility of the hosts')
+    parser.add_argument('--address', default='127.1.0.1', help='address of the first host')
+    parser.add_argument('--port', type=int, default=rqd.rqconstants.RQD_GRPC_PORT,
+                        help='port the hosts listen on, or the first port with --port-per-host')
+    parser.add_argument('--port-per-host', action='store_true',
+                        help='listen on consecutive ports of --address')
+    parser.add_argument('--cuebot', default=None, help='space separated cuebot hostnames')
+    parser.add_argument('--cuebot-port', type=int, default=None, help='cuebot gRPC port')
+    parser.add_argument('--stand-in', type=int, default=None, metavar='PORT',
+                        help='report to a stand-in cuebot on this port, 0 picks one')
+    parser.add_argument('--frame-duration', type=float, default=DEFAULT_SCRIPT.duration,
+                        help='default frame run time in seconds')
+    parser.add_argument('--frame-rss-kb', type=int, default=DEFAULT_SCRIPT.rssKb,
+                        help='default peak frame rss in kB')
+    parser.add_argument('--frame-ramp', type=float, default=DEFAULT_SCRIPT.rampSeconds,
+                        help='default seconds for a frame to reach its peak rss')
+    parser.add_argument('--frame-cores', type=int, default=1,
+                        help='cores of the frames the stand-in dispatches')
+    parser.add_argument('--workers', type=int, default=64, help='worker threads')
+    parser.add_argument('--ramp-sec', type=float, default=10.0,
+                        help='seconds over which the hosts boot')
+    parser.add_argument('--stats-sec', type=float, default=10.0,
+                        help='seconds between throughput lines')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the frame jitter')
+    args = parser.parse_args(argv)
+
+    log.basicConfig(level=log.WARNING, format='%(asctime)s %(levelname)s %(message)s')
+
+    standIn = None
+    cuebotHostnames = args.cuebot.split() if args.cuebot else None
+    cuebotPort = args.cuebot_port
+    if args.stand_in is not None:
+        standIn = StandInCuebot(args.stand_in, args.frame_cores * rqd.rqconstants.CORE_VALUE,
+                                maxWorkers=args.workers)
+        standIn.start()
+        cuebotHostnames = ['127.0.0.1']
+        cuebotPort = standIn.port
+        print('Stand-in cuebot listening on 127.0.0.1:%d' % standIn.port)
+
+    fleet = VirtualFleet(
+        args.hosts, args.cores, args.memory_gb * 1024 * 1024,
+        [tag for tag in args.tags.split(',') if tag], args.facility, args.address, args.port,
+        args.port_per_host, cuebotHostnames, cuebotPort,
+        FrameScript(args.frame_duration, args.frame_rss_kb, args.frame_ramp, 0),
+        maxWorkers=args.workers, seed=args.seed)
+    fleet.start(args.ramp_sec)
+
+    stopEvent = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stopEvent.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopEvent.set())
+
+    last = (rqd.rqscheduler.monotonic(), 0, 0, 0, 0)
+    while not stopEvent.wait(args.stats_sec):
+        now = rqd.rqscheduler.monotonic()
+        current = (now,
+                   sum(rqd.rqreporter.REPORTS_SENT.values().values()),
+                   FRAMES_LAUNCHED.value(),
+                   sum(FRAMES_COMPLETED.values().values()),
+                   sum(REPORT_FAILURES.values().values()))
+        seconds = now - last[0]
+        line = ('status reports %.1f/s, launches %.1f/s, completions %.1f/s, '
+                'failed reports %d' % (
+                    (current[1] - last[1]) / seconds, (current[2] - last[2]) / seconds,
+                    (current[3] - last[3]) / seconds, current[4]))
+        if standIn is not None and STANDIN_LAUNCH_TIME.count():
+            line += ', booted %d, mean launch %.1f ms' % (
+                standIn.hostCount(),
+                1000.0 * STANDIN_LAUNCH_TIME.sum() / STANDIN_LAUNCH_TIME.count())
+        print(line)
+        last = current
+
+    fleet.stop()
+    if standIn is not None:
+        standIn.stop()
+
+
+if __name__ == '__main__':
+    main()
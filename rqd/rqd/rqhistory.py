@@ -0,0 +1,186 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Recent history of the host's resource use, served by GetMachineHistory.
+
+The host metrics are sampled every RQD_HISTORY_INTERVAL_SEC into ring
+buffers of RQD_HISTORY_SAMPLES, and the rss of each running frame into ring
+buffers of RQD_HISTORY_FRAME_SAMPLES, the oldest sample overwritten first.
+The buffers are arrays of doubles allocated up front, so the memory used is
+fixed: 8 bytes per sample time plus 8 per metric, 48 bytes per host sample
+and 16 bytes per frame sample. With the defaults that is 138 KB for the
+host and 11.5 KB per running frame. A frame's history is dropped once it is
+no longer running.
+
+Host metrics, as in the host report:
+    free_mem    kB of free and cached memory
+    free_swap   kB of free swap
+    free_mcp    kB free in the temp directory
+    load        1 minute load average times 100
+    pgout_rate  recent rate of pages written to swap
+Frame metrics:
+    rss         kB of resident memory of the frame's processes
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import array
+import math
+import threading
+
+import rqd.rqconstants
+
+
+HOST_METRICS = ('free_mem', 'free_swap', 'free_mcp', 'load', 'pgout_rate')
+FRAME_METRICS = ('rss',)
+
+
+class RingBuffer(object):
+    """A fixed number of samples of one or more metrics taken together, the
+    oldest overwritten first."""
+
+    def __init__(self, capacity, metrics):
+        """RingBuffer class initialization
+        @type  capacity: int
+        @param capacity: Number of samples kept
+        @type  metrics: tuple<str>
+        @param metrics: Names of the metrics sampled"""
+        self.capacity = capacity
+        self.metrics = tuple(metrics)
+        self.__lock = threading.Lock()
+        self.__times = array.array('d', [0.0]) * capacity
+        self.__values = dict((metric, array.array('d', [0.0]) * capacity)
+                             for metric in self.metrics)
+        self.__next = 0
+        self.__size = 0
+
+    def __len__(self):
+        return self.__size
+
+    def nbytes(self):
+        """Returns the bytes used by the samples"""
+        return self.__times.itemsize * self.capacity * (1 + len(self.metrics))
+
+    def append(self, timestamp, values):
+        """Adds a sample, overwriting the oldest if the buffer is full
+        @type  timestamp: float
+        @param timestamp: Time of the sample, in seconds since the epoch
+        @type  values: dict
+        @param values: The value of each metric, a metric missing from it
+                       has no value for this sample"""
+        with self.__lock:
+            index = self.__next
+            self.__times[index] = timestamp
+            for metric, series in self.__values.items():
+                value = values.get(metric)
+                series[index] = float('nan') if value is None else value
+            self.__next = (index + 1) % self.capacity
+            self.__size = min(self.__size + 1, self.capacity)
+
+    def query(self, start=None, end=None):
+        """Returns the samples taken in a time range, oldest first
+        @type  start: float
+        @param start: Earliest sample time, in seconds since the epoch
+        @type  end: float
+        @param end: Latest sample time
+        @rtype:  dict
+        @return: (times, values) lists for each metric, samples without a
+                 value for the metric left out"""
+        with self.__lock:
+            first = (self.__next - self.__size) % self.capacity
+
+            def ordered(series):
+                return (series[first:] + series[:first])[:self.__size]
+
+            times = ordered(self.__times)
+            values = dict((metric, ordered(series)) for metric, series in self.__values.items())
+
+        indexes = [index for index, timestamp in enumerate(times)
+                   if (not start or timestamp >= start) and (not end or timestamp <= end)]
+        result = {}
+        for metric in self.metrics:
+            series = values[metric]
+            kept = [index for index in indexes if not math.isnan(series[index])]
+            result[metric] = ([times[index] for index in kept], [series[index] for index in kept])
+        return result
+
+
+class MachineHistory(object):
+    """Ring buffers of the host's metrics and of each running frame's."""
+
+    def __init__(self, capacity=None, frameCapacity=None):
+        """MachineHistory class initialization
+        @type  capacity: int
+        @param capacity: Host samples kept, defaults to RQD_HISTORY_SAMPLES
+        @type  frameCapacity: int
+        @param frameCapacity: Samples kept for each running frame, defaults
+                              to RQD_HISTORY_FRAME_SAMPLES"""
+        self.frameCapacity = frameCapacity or rqd.rqconstants.RQD_HISTORY_FRAME_SAMPLES
+        self.host = RingBuffer(capacity or rqd.rqconstants.RQD_HISTORY_SAMPLES, HOST_METRICS)
+        self.__lock = threading.Lock()
+        self.__frames = {}
+
+    def record(self, timestamp, hostValues, frameValues):
+        """Adds a sample of the host and of its running frames
+        @type  timestamp: float
+        @param timestamp: Time of the sample, in seconds since the epoch
+        @type  hostValues: dict
+        @param hostValues: Value of each host metric
+        @type  frameValues: dict
+        @param frameValues: Values of the frame metrics, by frame id, of every
+                            running frame"""
+        self.host.append(timestamp, hostValues)
+        with self.__lock:
+            for frameId in set(self.__frames) - set(frameValues):
+                del self.__frames[frameId]
+            for frameId in frameValues:
+                if frameId not in self.__frames:
+                    self.__frames[frameId] = RingBuffer(self.frameCapacity, FRAME_METRICS)
+            frames = dict(self.__frames)
+        for frameId, values in frameValues.items():
+            frames[frameId].append(timestamp, values)
+
+    def nbytes(self):
+        """Returns the bytes used by the samples"""
+        with self.__lock:
+            frames = list(self.__frames.values())
+        return self.host.nbytes() + sum(frame.nbytes() for frame in frames)
+
+    def query(self, start=None, end=None, metrics=None):
+        """Returns the samples taken in a time range
+        @type  start: float
+        @param start: Earliest sample time, in seconds since the epoch
+        @type  end: float
+        @param end: Latest sample time
+        @type  metrics: list<str>
+        @param metrics: Metrics to return, all of them if empty
+        @rtype:  list
+        @return: (metric, frameId, times, values) of each series, frameId
+                 empty for the host metrics"""
+        with self.__lock:
+            frames = sorted(self.__frames.items())
+        result = []
+        for frameId, ring in [('', self.host)] + frames:
+            if metrics and not set(metrics) & set(ring.metrics):
+                continue
+            for metric, (times, values) in sorted(ring.query(start, end).items()):
+                if not metrics or metric in metrics:
+                    result.append((metric, frameId, times, values))
+        return result
@@ -0,0 +1,285 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Keyboard and mouse activity watcher.
+
+The /dev/input event devices are opened once and kept in a single epoll set.
+Devices plugged in or removed later are picked up through inotify on
+/dev/input. The watcher thread drains device events and records the time of
+the last activity, so idle time is a clock comparison rather than a wait on
+the devices.
+
+After activity is seen the thread pauses for
+RQD_INPUT_ACTIVITY_RESOLUTION_SEC before draining again, so a user moving
+the mouse wakes it about once a second rather than once per event.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import ctypes
+import ctypes.util
+import errno
+import logging as log
+import os
+import platform
+import select
+import struct
+import threading
+
+import rqd.rqconstants
+import rqd.rqscheduler
+import rqd.rqutil
+
+
+IN_ATTRIB = 0x00000004
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event: wd, mask, cookie, len, followed by len bytes of name
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def isInputDevice(name):
+    """Returns True for the /dev/input entries nimby watches"""
+    return name.startswith('event') or name.startswith('mice')
+
+
+def _libc():
+    return ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+
+def parseInotifyEvents(data):
+    """Splits a read from an inotify fd into its events
+    @type  data: bytes
+    @param data: Bytes read from the inotify fd
+    @rtype:  list<tuple>
+    @return: (mask, name) of each event"""
+    events = []
+    offset = 0
+    while offset + INOTIFY_EVENT.size <= len(data):
+        _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+        offset += INOTIFY_EVENT.size
+        name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+        offset += length
+        events.append((mask, name))
+    return events
+
+
+class InputWatcher(threading.Thread):
+    """Watches the host's input devices and timestamps the last activity."""
+
+    def __init__(self, callback=None, path=None):
+        """InputWatcher class initialization
+        @type  callback: function
+        @param callback: Called from the watcher thread when activity is seen
+        @type  path: str
+        @param path: Directory of the input devices"""
+        threading.Thread.__init__(self, name='InputWatcher')
+        self.daemon = True
+        self.__callback = callback
+        self.__path = path or rqd.rqconstants.PATH_DEV_INPUT
+        self.__lock = threading.Lock()
+        self.__active = False
+        self.__devices = {}
+        self.__inotifyFd = None
+        self.__epoll = select.epoll()
+        self.__wakeRead, self.__wakeWrite = os.pipe()
+        self.__epoll.register(self.__wakeRead, select.EPOLLIN)
+        self.lastActivity = rqd.rqscheduler.monotonic()
+
+    @staticmethod
+    def isSupported():
+        """Returns True if epoll is available on this host"""
+        return platform.system() == 'Linux' and hasattr(select, 'epoll')
+
+    def idleSeconds(self):
+        """Returns the seconds since input activity was last seen"""
+        return rqd.rqscheduler.monotonic() - self.lastActivity
+
+    def deviceCount(self):
+        """Returns the number of open input devices"""
+        with self.__lock:
+            return len(self.__devices)
+
+    def open(self):
+        """Opens the input devices and starts watching for new ones"""
+        self.__inotifyFd = self.__addInotifyWatch()
+        if self.__inotifyFd is not None:
+            self.__epoll.register(self.__inotifyFd, select.EPOLLIN)
+        try:
+            names = os.listdir(self.__path)
+        except OSError as e:
+            log.warning('Unable to list input devices in %s: %s' % (self.__path, e))
+            names = []
+        for name in sorted(names):
+            if isInputDevice(name):
+                self.__openDevice(name)
+
+    def run(self):
+        """Watcher loop, runs until stop() is called"""
+        self.__active = True
+        while self.__active:
+            try:
+                events = self.__epoll.poll()
+            except (IOError, OSError) as e:
+                # Interrupted by a signal
+                log.debug('Input watcher poll interrupted: %s' % e)
+                continue
+            self.handleEvents(events)
+
+    def handleEvents(self, events):
+        """Handles one batch of epoll events
+        @type  events: list<tuple>
+        @param events: (fd, eventmask) pairs from epoll"""
+        activity = False
+        for fd, eventMask in events:
+            if fd == self.__wakeRead:
+                os.read(self.__wakeRead, 64)
+            elif fd == self.__inotifyFd:
+                self.__readInotify()
+            elif self.__drainDevice(fd, eventMask):
+                activity = True
+
+        if activity and self.__active:
+            self.lastActivity = rqd.rqscheduler.monotonic()
+            if self.__callback is not None:
+                try:
+                    self.__callback()
+                except Exception as e:
+                    log.exception('Input activity handling failed: %s' % e)
+            # Let further events queue in the devices rather than waking for
+            # each of them
+            select.select([self.__wakeRead], [], [],
+                          rqd.rqconstants.RQD_INPUT_ACTIVITY_RESOLUTION_SEC)
+
+    def stop(self):
+        """Stops the watcher loop and closes the devices"""
+        if self.__epoll.closed:
+            return
+        self.__active = False
+        os.write(self.__wakeWrite, b'x')
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+        with self.__lock:
+            fds = list(self.__devices)
+            self.__devices.clear()
+        for fd in fds:
+            self.__close(fd)
+        if self.__inotifyFd is not None:
+            self.__close(self.__inotifyFd)
+            self.__inotifyFd = None
+        if not self.is_alive():
+            self.__epoll.close()
+            os.close(self.__wakeRead)
+            os.close(self.__wakeWrite)
+
+    def __addInotifyWatch(self):
+        """Returns an inotify fd watching the device directory, or None if
+        hot-plugged devices can not be followed"""
+        try:
+            libc = _libc()
+            inotifyFd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if inotifyFd < 0:
+                raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+            if libc.inotify_add_watch(inotifyFd, self.__path.encode('utf-8'),
+                                      IN_CREATE | IN_ATTRIB | IN_DELETE) < 0:
+                err = ctypes.get_errno()
+                os.close(inotifyFd)
+                raise OSError(err, 'inotify_add_watch failed')
+        except (AttributeError, OSError) as e:
+            log.warning('Not following hot-plugged input devices: %s' % e)
+            return None
+        return inotifyFd
+
+    def __readInotify(self):
+        try:
+            data = os.read(self.__inotifyFd, 4096)
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                log.warning('Unable to read input device changes: %s' % e)
+            return
+        for mask, name in parseInotifyEvents(data):
+            if not isInputDevice(name):
+                continue
+            if mask & IN_DELETE:
+                self.__closeDevice(name)
+            elif mask & (IN_CREATE | IN_ATTRIB):
+                # udev sets the permissions after creating the node
+                self.__openDevice(name)
+
+    def __openDevice(self, name):
+        with self.__lock:
+            if name in self.__devices.values():
+                return
+        devicePath = os.path.join(self.__path, name)
+        rqd.rqutil.permissionsHigh()
+        try:
+            fd = os.open(devicePath, os.O_RDONLY | os.O_NONBLOCK)
+        except OSError as e:
+            # Bad device found
+            log.debug('Failed to open %s, %s' % (devicePath, e))
+            return
+        finally:
+            rqd.rqutil.permissionsLow()
+        log.debug('Watching input device: %s' % name)
+        with self.__lock:
+            self.__devices[fd] = name
+        self.__epoll.register(fd, select.EPOLLIN)
+
+    def __closeDevice(self, name):
+        with self.__lock:
+            fds = [fd for fd, device in self.__devices.items() if device == name]
+            for fd in fds:
+                del self.__devices[fd]
+        for fd in fds:
+            log.debug('Input device removed: %s' % name)
+            self.__close(fd)
+
+    def __drainDevice(self, fd, eventMask):
+        """Reads all pending events of a device
+        @rtype:  bool
+        @return: True if the device had events"""
+        activity = False
+        while True:
+            try:
+                data = os.read(fd, 4096)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    break
+                # ENODEV once the device has been unplugged
+                self.__closeDevice(self.__devices.get(fd))
+                return activity
+            if not data:
+                break
+            activity = True
+        if eventMask & (select.EPOLLHUP | select.EPOLLERR):
+            self.__closeDevice(self.__devices.get(fd))
+        return activity
+
+    def __close(self, fd):
+        try:
+            self.__epoll.unregister(fd)
+        except (IOError, OSError, ValueError):
+            pass
+        try:
+            os.close(fd)
+        except OSError:
+            pass
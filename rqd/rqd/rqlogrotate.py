@@ -0,0 +1,192 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Rotation of frame logs with an index.
+
+Each rotation renames the log to the next generation, <log>.<n>, so a
+rotated log keeps its name and the highest number is the newest. The names
+of the rotated logs still kept are listed, oldest first, one per line, in
+<log>.index. Rotating renames the log aside first, so the first launch of
+a frame, which has no log to rotate, costs a failed rename per log suffix
+and nothing else. Otherwise it reads the index, renames the log to its
+generation and rewrites the index, rather than probing for every
+generation. The generations past
+MAX_LOG_FILES are returned for the caller to delete after the frame has
+started.
+
+Logs rotated before there was an index are found once with a directory
+listing, the first time they are rotated again. A log gzipped by the log
+writer is rotated as <log>.<n>.gz.
+
+cuegui reads the index to list a frame's logs, see
+cuegui.Utils.getFrameLogFiles. The log directory is writable by everyone
+and the generations past MAX_LOG_FILES are deleted as root, so only index
+entries naming a generation of the log itself are used, and the index is
+replaced with a rename rather than rewritten in place.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+import errno
+import logging as log
+import os
+import re
+
+
+INDEX_SUFFIX = '.index'
+
+# Suffixes a current log can have, in the order they are looked for
+LOG_SUFFIXES = ('', '.gz')
+
+GENERATION_RE = re.compile(r'\.(\d+)(\.gz)?$')
+
+# Suffix of a log renamed aside while its generation is worked out
+ROTATING_SUFFIX = '.rotating'
+
+
+def isGeneration(base, name):
+    """Returns True if name is a rotated generation of the log named base,
+    <base>.<n> or <base>.<n>.gz"""
+    return (name.startswith(base + '.') and os.sep not in name
+            and GENERATION_RE.match(name[len(base):]) is not None)
+
+
+def indexPath(path):
+    """Returns the path of a log's rotation index"""
+    return path + INDEX_SUFFIX
+
+
+def readIndex(path):
+    """Returns the names of a log's rotated generations, oldest first
+    @type  path: str
+    @param path: Path of the log
+    @rtype:  list<str>
+    @return: The rotated logs' file names, None if the log has no index"""
+    base = os.path.basename(path)
+    try:
+        with open(indexPath(path), 'r') as indexFile:
+            names = [line.strip() for line in indexFile if line.strip()]
+    except (IOError, OSError) as e:
+        if e.errno == errno.ENOENT:
+            return None
+        raise
+    invalid = [name for name in names if not isGeneration(base, name)]
+    if invalid:
+        log.warning('Ignoring entries of %s that are not generations of the log: %s' % (
+            indexPath(path), ', '.join(repr(name) for name in invalid)))
+    return [name for name in names if isGeneration(base, name)]
+
+
+def writeIndex(path, names):
+    """Writes a log's rotation index
+    @type  path: str
+    @param path: Path of the log
+    @type  names: list<str>
+    @param names: The rotated logs' file names, oldest first"""
+    tmpPath = '%s.%d.tmp' % (indexPath(path), os.getpid())
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_NOFOLLOW', 0)
+    try:
+        fd = os.open(tmpPath, flags, 0o644)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+        # Left by an earlier run, or planted
+        os.remove(tmpPath)
+        fd = os.open(tmpPath, flags, 0o644)
+    try:
+        with os.fdopen(fd, 'w') as indexFile:
+            indexFile.write(''.join('%s\n' % name for name in names))
+        os.rename(tmpPath, indexPath(path))
+    except Exception:
+        try:
+            os.remove(tmpPath)
+        except OSError:
+            pass
+        raise
+
+
+def generation(name):
+    """Returns the generation number of a rotated log's name, or None"""
+    match = GENERATION_RE.search(name)
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def findGenerations(path):
+    """Lists the rotated generations of a log without an index
+    @type  path: str
+    @param path: Path of the log
+    @rtype:  list<str>
+    @return: The rotated logs' file names, oldest first"""
+    directory, base = os.path.split(path)
+    names = []
+    for name in os.listdir(directory or '.'):
+        if isGeneration(base, name):
+            names.append(name)
+    return sorted(names, key=lambda name: generation(name[len(base):]))
+
+
+def rotate(path, maxFiles):
+    """Renames a log to its next generation, keeping maxFiles generations
+    @type  path: str
+    @param path: Path of the log
+    @type  maxFiles: int
+    @param maxFiles: Number of rotated logs to keep
+    @rtype:  list<str>
+    @return: Paths of the generations to delete"""
+    directory, base = os.path.split(path)
+    for suffix in LOG_SUFFIXES:
+        rotatingPath = path + ROTATING_SUFFIX + suffix
+        try:
+            os.rename(path + suffix, rotatingPath)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                continue
+            raise
+        break
+    else:
+        # First run of the frame, or its last launch never opened the log
+        return []
+
+    names = readIndex(path)
+    if names is None:
+        names = findGenerations(path)
+    generations = [generation(name[len(base):]) for name in names]
+    nextGeneration = max([number for number in generations if number is not None] or [0]) + 1
+    rotatedName = '%s.%d%s' % (base, nextGeneration, suffix)
+    os.rename(rotatingPath, os.path.join(directory, rotatedName))
+    names.append(rotatedName)
+
+    pruned = names[:-maxFiles] if maxFiles > 0 else names
+    names = names[len(pruned):]
+    writeIndex(path, names)
+    return [os.path.join(directory, name) for name in pruned]
+
+
+def prune(paths):
+    """Deletes rotated logs
+    @type  paths: list<str>
+    @param paths: The logs returned by rotate"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                log.warning('Unable to delete old log %s: %s' % (path, e))
@@ -0,0 +1,572 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Batched writer of frame logs.
+
+A frame's stdout and stderr go to a pipe rather than to its log file. One
+thread reads the pipes of every frame through epoll and buffers the output,
+writing a frame's log once RQD_LOG_WRITER_BATCH_BYTES have built up or the
+oldest buffered output is RQD_LOG_WRITER_FLUSH_SEC old. A chatty frame
+costs one large write per batch instead of one per line, which on an NFS
+log directory is one write RPC per batch.
+
+Lines can be prefixed with the time they were read and have terminal escape
+sequences removed. A log is capped at RQD_LOG_MAX_BYTES: output past the
+cap less RQD_LOG_MAX_TAIL_BYTES is kept in memory in a ring of the last
+RQD_LOG_MAX_TAIL_BYTES, or of half the cap if that is smaller, written with
+a note of what was dropped when the frame ends. With RQD_LOG_COMPRESS a
+finished log is gzipped to <log>.gz on the scheduler's worker pool, as the
+log's owner, so only that frame's log waits for it.
+
+The header and footer rqd writes go through the same buffer, so they stay
+in order with the frame's output.
+
+The last RQD_LOG_BUFFER_BYTES of each log are also kept in memory, in a
+LogBuffer served by the TailFrameLog and StreamFrameLog calls, so viewing a
+running frame's log does not read it back from the log directory.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+from builtins import range
+import collections
+import errno
+import fcntl
+import gzip
+import logging as log
+import os
+import platform
+import re
+import select
+import shutil
+import threading
+import time
+
+import rqd.rqconstants
+import rqd.rqmetrics
+import rqd.rqscheduler
+import rqd.rqutil
+
+
+# CSI and OSC sequences, and two character escapes
+ANSI_ESCAPE_RE = re.compile(
+    br'\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[@-Z\\-_])')
+
+F_SETPIPE_SZ = getattr(fcntl, 'F_SETPIPE_SZ', 1031)
+
+# An incomplete line is written out anyway once it is this long
+MAX_PARTIAL_LINE = 64 * 1024
+
+LOG_WRITES = rqd.rqmetrics.histogram(
+    'rqd_log_writes_per_frame', 'Writes made to a frame log over the life of the frame',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 1000, 10000))
+LOG_BYTES = rqd.rqmetrics.counter(
+    'rqd_log_bytes_total', 'Bytes of frame output, by whether they were written or dropped',
+    labelName='result')
+
+
+class LogBuffer(object):
+    """The last bytes of a frame's output, kept in memory.
+
+    Offsets count the bytes of output since the log was opened, which is the
+    offset in the log file unless output was dropped at RQD_LOG_MAX_BYTES."""
+
+    def __init__(self, capacity):
+        """LogBuffer class initialization
+        @type  capacity: int
+        @param capacity: Bytes of output kept"""
+        self.capacity = capacity
+        self.closed = False
+        self.__condition = threading.Condition()
+        self.__data = bytearray()
+        # Offset of the first byte held
+        self.__start = 0
+
+    def append(self, data):
+        """Adds output to the buffer, dropping the oldest past its capacity"""
+        with self.__condition:
+            self.__data += data
+            excess = len(self.__data) - self.capacity
+            if excess > 0:
+                del self.__data[:excess]
+                self.__start += excess
+            self.__condition.notify_all()
+
+    def close(self):
+        """Marks the end of the frame's output"""
+        with self.__condition:
+            self.closed = True
+            self.__condition.notify_all()
+
+    def size(self):
+        """Returns the bytes of output so far"""
+        with self.__condition:
+            return self.__start + len(self.__data)
+
+    def read(self, offset, maxBytes):
+        """Returns the output buffered from an offset
+        @type  offset: int
+        @param offset: Offset to read from
+        @type  maxBytes: int
+        @param maxBytes: Most bytes returned
+        @rtype:  tuple
+        @return: (offset, data), the offset is moved past output no longer
+                 buffered"""
+        with self.__condition:
+            offset = min(max(offset, self.__start), self.__start + len(self.__data))
+            begin = offset - self.__start
+            return offset, bytes(self.__data[begin:begin + maxBytes])
+
+    def tail(self, lines):
+        """Returns the last lines buffered, fewer if the buffer holds fewer
+        @type  lines: int
+        @param lines: Number of lines
+        @rtype:  tuple
+        @return: (offset, data)"""
+        with self.__condition:
+            end = len(self.__data)
+            begin = end
+            # A last line without its newline yet counts as a line
+            search = end - 1 if self.__data.endswith(b'\n') else end
+            for _ in range(lines):
+                newline = self.__data.rfind(b'\n', 0, search)
+                if newline < 0:
+                    begin = 0
+                    break
+                begin = newline + 1
+                search = newline
+            return self.__start + begin, bytes(self.__data[begin:end])
+
+    def wait(self, offset, timeout):
+        """Waits for output past an offset or the end of the output
+        @type  offset: int
+        @param offset: Offset already read
+        @type  timeout: float
+        @param timeout: Most seconds to wait"""
+        with self.__condition:
+            if not self.closed and self.__start + len(self.__data) <= offset:
+                self.__condition.wait(timeout)
+
+
+class LogStream(object):
+    """A frame's log, fed by the frame's output pipe and by rqd.
+
+    Passed to subprocess.Popen as the frame's stdout and stderr, its fileno()
+    is the write end of the pipe. write() takes rqd's own text."""
+
+    def __init__(self, writer, logFile, path, maxBytes=None, timestamps=None, stripAnsi=None,
+                 bufferBytes=None, tailBytes=None):
+        """LogStream class initialization
+        @type  writer: FrameLogWriter
+        @param writer: The writer reading the pipe
+        @type  logFile: file
+        @param logFile: The open log, the stream takes it over
+        @type  path: str
+        @param path: Path of the log
+        @type  maxBytes: int
+        @param maxBytes: Size the log is capped at, 0 for no cap
+        @type  timestamps: bool
+        @param timestamps: Prefix lines of frame output with the time
+        @type  stripAnsi: bool
+        @param stripAnsi: Remove terminal escape sequences from frame output
+        @type  bufferBytes: int
+        @param bufferBytes: Bytes of output kept in memory, 0 for none
+        @type  tailBytes: int
+        @param tailBytes: Most bytes of the end of a capped log kept in memory
+                          until the frame ends"""
+        self.path = path
+        self.maxBytes = rqd.rqconstants.RQD_LOG_MAX_BYTES if maxBytes is None else maxBytes
+        tailBytes = rqd.rqconstants.RQD_LOG_MAX_TAIL_BYTES if tailBytes is None else tailBytes
+        self.tailBytes = min(tailBytes, self.maxBytes // 2)
+        self.timestamps = rqd.rqconstants.RQD_LOG_TIMESTAMPS if timestamps is None \
+            else timestamps
+        self.stripAnsi = rqd.rqconstants.RQD_LOG_STRIP_ANSI if stripAnsi is None \
+            else stripAnsi
+        bufferBytes = rqd.rqconstants.RQD_LOG_BUFFER_BYTES if bufferBytes is None \
+            else bufferBytes
+        self.buffer = LogBuffer(bufferBytes) if bufferBytes else None
+        self.__writer = writer
+        self.__lock = threading.Lock()
+        logFile.flush()
+        self.__fd = os.dup(logFile.fileno())
+        logFile.close()
+        self.readFd, self.__writeFd = os.pipe()
+        fcntl.fcntl(self.readFd, fcntl.F_SETFL,
+                    fcntl.fcntl(self.readFd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        try:
+            # Room for a batch in the pipe, so a frame does not block on its
+            # output while another frame's log is being written
+            fcntl.fcntl(self.readFd, F_SETPIPE_SZ, rqd.rqconstants.RQD_LOG_WRITER_BATCH_BYTES)
+        except (IOError, OSError) as e:
+            log.debug('Unable to resize the output pipe of %s: %s' % (path, e))
+        self.__pending = []
+        self.__pendingBytes = 0
+        self.__pendingSince = None
+        self.__partial = b''
+        self.__tail = collections.deque()
+        self.__tailBytes = 0
+        self.written = 0
+        self.dropped = 0
+        self.writes = 0
+        self.closed = False
+
+    def fileno(self):
+        """Returns the write end of the pipe, for the frame's stdout and stderr"""
+        return self.__writeFd
+
+    def write(self, text):
+        """Adds rqd's text to the log after the output read so far"""
+        if not isinstance(text, bytes):
+            text = text.encode('utf-8', 'replace')
+        with self.__lock:
+            self.__drain()
+            self.__append(text)
+
+    def flush(self):
+        """Writes everything buffered so far to the log"""
+        with self.__lock:
+            self.__drain()
+            self.__flush()
+
+    def close(self):
+        """Writes the rest of the output and closes the log"""
+        self.__writer.close(self)
+
+    def readAvailable(self):
+        """Reads the output waiting in the pipe, called by the writer thread
+        @rtype:  bool
+        @return: False once every writer of the pipe has closed it"""
+        with self.__lock:
+            return self.__drain()
+
+    def flushDue(self):
+        """Returns the time the buffered output is due to be written, or None"""
+        with self.__lock:
+            if self.__pendingSince is None:
+                return None
+            return self.__pendingSince + rqd.rqconstants.RQD_LOG_WRITER_FLUSH_SEC
+
+    def flushIfDue(self, now):
+        """Writes the buffered output if it has waited long enough"""
+        with self.__lock:
+            if self.__pendingSince is not None and \
+                    now - self.__pendingSince >= rqd.rqconstants.RQD_LOG_WRITER_FLUSH_SEC:
+                self.__flush()
+
+    def finish(self):
+        """Writes out the remaining output and the kept tail, and closes the
+        log and the pipe. Called by FrameLogWriter.close()."""
+        with self.__lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.__writeFd is not None:
+                os.close(self.__writeFd)
+                self.__writeFd = None
+            self.__drain()
+            if self.__partial:
+                self.__append(self.__transform(b'', final=True))
+            if self.dropped:
+                note = b'\n[rqd: %d bytes of output dropped, the log is capped at %d bytes]\n\n' \
+                    % (self.dropped, self.maxBytes)
+                self.__pending.append(note)
+                if self.buffer is not None:
+                    self.buffer.append(note)
+            if self.__tail:
+                self.__pending.extend(self.__tail)
+                self.__pendingBytes += sum(len(chunk) for chunk in self.__tail)
+                self.__tail.clear()
+            self.__flush()
+            os.close(self.readFd)
+            os.close(self.__fd)
+            if self.buffer is not None:
+                self.buffer.close()
+        LOG_WRITES.observe(self.writes)
+        LOG_BYTES.inc(self.written, label='written')
+        LOG_BYTES.inc(self.dropped, label='dropped')
+
+    def __drain(self):
+        while True:
+            try:
+                data = os.read(self.readFd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return True
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if not data:
+                return False
+            self.__append(self.__transform(data))
+
+    def __transform(self, data, final=False):
+        """Applies the line filters to frame output, holding back an
+        incomplete last line"""
+        if not self.timestamps and not self.stripAnsi:
+            return data
+        lines = (self.__partial + data).split(b'\n')
+        self.__partial = lines.pop()
+        if self.__partial and (final or len(self.__partial) > MAX_PARTIAL_LINE):
+            lines.append(self.__partial)
+            self.__partial = b''
+        if self.stripAnsi:
+            lines = [ANSI_ESCAPE_RE.sub(b'', line) for line in lines]
+        if self.timestamps:
+            prefix = time.strftime('[%Y-%m-%d %H:%M:%S] ').encode('ascii')
+            lines = [prefix + line for line in lines]
+        return b''.join(line + b'\n' for line in lines)
+
+    def __append(self, data):
+        if not data:
+            return
+        if self.buffer is not None:
+            self.buffer.append(data)
+        if self.maxBytes:
+            headRoom = self.maxBytes - self.tailBytes - self.written - self.__pendingBytes
+            if headRoom < len(data):
+                self.__keepTail(data[max(headRoom, 0):])
+                data = data[:max(headRoom, 0)]
+                if not data:
+                    return
+        self.__pending.append(data)
+        self.__pendingBytes += len(data)
+        if self.__pendingSince is None:
+            self.__pendingSince = rqd.rqscheduler.monotonic()
+        if self.__pendingBytes >= rqd.rqconstants.RQD_LOG_WRITER_BATCH_BYTES:
+            self.__flush()
+
+    def __keepTail(self, data):
+        self.__tail.append(data)
+        self.__tailBytes += len(data)
+        while self.__tailBytes > self.tailBytes:
+            excess = self.__tailBytes - self.tailBytes
+            oldest = self.__tail[0]
+            if len(oldest) <= excess:
+                self.__tail.popleft()
+                self.__tailBytes -= len(oldest)
+                self.dropped += len(oldest)
+            else:
+                self.__tail[0] = oldest[excess:]
+                self.__tailBytes -= excess
+                self.dropped += excess
+
+    def __flush(self):
+        if not self.__pending:
+            return
+        data = b''.join(self.__pending)
+        self.__pending = []
+        self.__pendingBytes = 0
+        self.__pendingSince = None
+        view = memoryview(data)
+        try:
+            while view:
+                count = os.write(self.__fd, view)
+                self.writes += 1
+                view = view[count:]
+        except OSError as e:
+            log.warning('Unable to write to %s, %d bytes lost: %s' % (self.path, len(view), e))
+            self.dropped += len(view)
+        self.written += len(data) - len(view)
+
+
+class FrameLogWriter(threading.Thread):
+    """Reads the output pipes of all frames and writes their logs in batches."""
+
+    def __init__(self, scheduler=None):
+        """FrameLogWriter class initialization
+        @type  scheduler: rqd.rqscheduler.Scheduler
+        @param scheduler: Scheduler whose worker pool compresses finished
+                          logs, without one they are compressed by the
+                          thread closing them"""
+        threading.Thread.__init__(self, name='FrameLogWriter')
+        self.daemon = True
+        self.__scheduler = scheduler
+        self.__lock = threading.Lock()
+        self.__active = False
+        self.__streams = {}
+        self.__epoll = select.epoll()
+        self.__wakeRead, self.__wakeWrite = os.pipe()
+        self.__epoll.register(self.__wakeRead, select.EPOLLIN)
+
+    @staticmethod
+    def isSupported():
+        """Returns True if epoll is available on this host"""
+        return platform.system() == 'Linux' and hasattr(select, 'epoll')
+
+    def open(self, logFile, path, **options):
+        """Returns the stream frame output and rqd's text go through
+        @type  logFile: file
+        @param logFile: The open log, the stream takes it over
+        @type  path: str
+        @param path: Path of the log
+        @rtype:  LogStream
+        @return: The frame's log"""
+        stream = LogStream(self, logFile, path, **options)
+        with self.__lock:
+            self.__streams[stream.readFd] = stream
+        self.__epoll.register(stream.readFd, select.EPOLLIN)
+        return stream
+
+    def close(self, stream):
+        """Finishes a frame's log, compressing it afterwards if configured
+        @type  stream: LogStream
+        @param stream: The frame's log"""
+        with self.__lock:
+            if self.__streams.pop(stream.readFd, None) is None:
+                return
+        try:
+            self.__epoll.unregister(stream.readFd)
+        except (IOError, OSError, ValueError):
+            pass
+        stream.finish()
+        if rqd.rqconstants.RQD_LOG_COMPRESS:
+            if self.__scheduler is not None:
+                self.__scheduler.runSoon(
+                    'compressLog', lambda: compress(stream.path), blocking=True)
+            else:
+                compress(stream.path)
+
+    def streamCount(self):
+        """Returns the number of open frame logs"""
+        with self.__lock:
+            return len(self.__streams)
+
+    def run(self):
+        """Writer loop, runs until stop() is called"""
+        self.__active = True
+        while self.__active:
+            try:
+                events = self.__epoll.poll(self.__pollTimeout())
+            except (IOError, OSError) as e:
+                log.debug('Log writer poll interrupted: %s' % e)
+                continue
+            self.handleEvents(events)
+
+    def handleEvents(self, events):
+        """Reads the pipes with output, then writes the logs that are due
+        @type  events: list<tuple>
+        @param events: (fd, eventmask) pairs from epoll"""
+        for fd, eventMask in events:
+            if fd == self.__wakeRead:
+                os.read(self.__wakeRead, 64)
+                continue
+            with self.__lock:
+                stream = self.__streams.get(fd)
+            if stream is None:
+                continue
+            try:
+                isOpen = stream.readAvailable()
+            except (IOError, OSError) as e:
+                log.warning('Unable to read the output for %s: %s' % (stream.path, e))
+                isOpen = False
+            if not isOpen:
+                # Every process writing to the pipe has exited, the rest is
+                # written when the frame's log is closed
+                try:
+                    self.__epoll.unregister(fd)
+                except (IOError, OSError, ValueError):
+                    pass
+
+        now = rqd.rqscheduler.monotonic()
+        with self.__lock:
+            streams = list(self.__streams.values())
+        for stream in streams:
+            try:
+                stream.flushIfDue(now)
+            except (IOError, OSError, ValueError) as e:
+                log.debug('Unable to flush %s: %s' % (stream.path, e))
+
+    def stop(self):
+        """Stops the writer loop"""
+        if self.__epoll.closed:
+            return
+        self.__active = False
+        self.__wake()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+        if not self.is_alive():
+            self.__epoll.close()
+            os.close(self.__wakeRead)
+            os.close(self.__wakeWrite)
+
+    def __wake(self):
+        try:
+            os.write(self.__wakeWrite, b'x')
+        except OSError:
+            pass
+
+    def __pollTimeout(self):
+        with self.__lock:
+            streams = list(self.__streams.values())
+        due = [stream.flushDue() for stream in streams]
+        due = [when for when in due if when is not None]
+        if not due:
+            return -1
+        return max(min(due) - rqd.rqscheduler.monotonic(), 0)
+
+
+def compress(path):
+    """Gzips a finished log to path.gz and removes it. The log directory is
+    writable by everyone, so the files are opened as the log's owner,
+    without following symlinks, and path.gz must not already exist. Only
+    opening and removing the files needs the owner's permissions, the
+    copy runs without holding them.
+    @type  path: str
+    @param path: The log"""
+    noFollow = getattr(os, 'O_NOFOLLOW', 0)
+    try:
+        stat = os.lstat(path)
+    except OSError as e:
+        log.warning('Unable to compress %s: %s' % (path, e))
+        return
+    source = target = None
+    rqd.rqutil.permissionsUser(stat.st_uid, stat.st_gid)
+    try:
+        source = os.open(path, os.O_RDONLY | noFollow)
+        target = os.open(path + '.gz', os.O_WRONLY | os.O_CREAT | os.O_EXCL | noFollow,
+                         stat.st_mode & 0o777)
+        os.fchmod(target, stat.st_mode & 0o777)
+    except OSError as e:
+        log.warning('Unable to compress %s: %s' % (path, e))
+        for fd in (source, target):
+            if fd is not None:
+                os.close(fd)
+        return
+    finally:
+        rqd.rqutil.permissionsLow()
+
+    try:
+        with os.fdopen(source, 'rb') as sourceFile, os.fdopen(target, 'wb') as targetFile:
+            with gzip.GzipFile(filename=os.path.basename(path), mode='wb',
+                               fileobj=targetFile) as gzipFile:
+                shutil.copyfileobj(sourceFile, gzipFile)
+    except (IOError, OSError) as e:
+        log.warning('Unable to compress %s: %s' % (path, e))
+        removed = path + '.gz'
+    else:
+        removed = path
+
+    rqd.rqutil.permissionsUser(stat.st_uid, stat.st_gid)
+    try:
+        os.remove(removed)
+    except OSError as e:
+        log.warning('Unable to remove %s: %s' % (removed, e))
+    finally:
+        rqd.rqutil.permissionsLow()
@@ -43,21 +43,29 @@ import traceback
 
 if platform.system() in ('Linux', 'Darwin'):
     import resource
-    import yaml
 elif platform.system() == "win32":
     import win32process
     import win32api
 
 import rqd.compiled_proto.host_pb2
 import rqd.compiled_proto.report_pb2
+import rqd.rqcgroup
 import rqd.rqconstants
 import rqd.rqexceptions
+import rqd.rqmetrics
+import rqd.rqproc
 import rqd.rqswap
+import rqd.rqtopology
 import rqd.rqutil
 
 
 KILOBYTE = 1024
 
+RSS_UPDATE_TIME = rqd.rqmetrics.histogram(
+    'rqd_rss_update_seconds', 'Time taken to update the memory use of the running frames')
+HOST_REPORT_TIME = rqd.rqmetrics.histogram(
+    'rqd_host_report_build_seconds', 'Time taken to build a host report')
+
 
 class Machine(object):
     """Gathers information about the machine and resources"""
@@ -70,10 +78,10 @@ class Machine(object):
         """
         self.__rqCore = rqCore
         self.__coreInfo = coreInfo
-        self.__tasksets = set()
+        self.__topology = None
 
         if platform.system() == 'Linux':
-            self.__vmstat = rqd.rqswap.VmStat()
+            self.__vmstat = rqd.rqswap.VmStat(rqCore.scheduler)
 
         self.state = rqd.compiled_proto.host_pb2.UP
 
@@ -88,8 +96,18 @@ class Machine(object):
         self.__hostReport.core_info.CopyFrom(self.__coreInfo)
 
         self.__pidHistory = {}
+        self.__procScanner = rqd.rqproc.ProcScanner()
+
+        self.__cgroups = None
+        self.__cgroupHistory = {}
+        if platform.system() == 'Linux' and rqd.rqconstants.RQD_ACCOUNTING_BACKEND == 'cgroup':
+            cgroups = rqd.rqcgroup.CgroupManager()
+            if cgroups.setup():
+                self.__cgroups = cgroups
+            else:
+                log.warning('Falling back to /proc based frame accounting')
 
-        self.setupHT()
+        self.setupTopology()
 
     def isNimbySafeToRunJobs(self):
         """Returns False if nimby should be triggered due to resource limits"""
@@ -176,100 +194,93 @@ class Machine(object):
                     return True
         return False
 
+    @rqd.rqmetrics.timed(RSS_UPDATE_TIME)
     def rssUpdate(self, frames):
         """Updates the rss and maxrss for all running frames"""
         if platform.system() != 'Linux':
             return
 
-        pids = {}
-        for pid in os.listdir("/proc"):
-            if pid.isdigit():
-                try:
-                    with open("/proc/%s/stat" % pid, "r") as statFile:
-                        statFields = statFile.read().split()
-
-                    # See "man proc"
-                    pids[pid] = {
-                        "session": statFields[5],
-                        "vsize": statFields[22],
-                        "rss": statFields[23],
-                        # These are needed to compute the cpu used
-                        "utime": statFields[13],
-                        "stime": statFields[14],
-                        "cutime": statFields[15],
-                        "cstime": statFields[16],
-                        # The time in jiffies the process started
-                        # after system boot.
-                        "start_time": statFields[21],
-                    }
-
-                except Exception as e:
-                    log.exception('failed to read stat file for pid %s' % pid)
+        sessions = {}
+        for frame in list(frames.values()):
+            if frame.cgroup is not None:
+                self.__updateFrameFromCgroup(frame)
+                self.__updateFrameIo(frame, self.__cgroups.framePids(frame.frameId))
+            elif frame.pid is not None and frame.pid > 0:
+                sessions[frame.pid] = frame
+        if not sessions:
+            return
+
+        try:
+            procsBySession = self.__procScanner.scan(sessions)
+        except Exception as e:
+            log.exception('Failed to scan %s: %s' % (rqd.rqconstants.PATH_PROC, e))
+            return
 
         try:
             now = int(time.time())
             pidData = {"time": now}
             bootTime = self.getBootTime()
-
-            values = list(frames.values())
-
-            for frame in values:
-                if frame.pid > 0:
-                    session = str(frame.pid)
-                    rss = 0
-                    vsize = 0
-                    pcpu = 0
-                    if rqd.rqconstants.ENABLE_PTREE:
-                        ptree = []
-                    for pid, data in pids.items():
-                        if data["session"] == session:
-                            try:
-                                rss += int(data["rss"])
-                                vsize += int(data["vsize"])
-
-                                # jiffies used by this process, last two means that dead children are counted
-                                totalTime = int(data["utime"]) + \
-                                            int(data["stime"]) + \
-                                            int(data["cutime"]) + \
-                                            int(data["cstime"])
-
-                                # Seconds of process life, boot time is already in seconds
-                                seconds = now - bootTime - \
-                                          float(data["start_time"]) / rqd.rqconstants.SYS_HERTZ
-                                if seconds:
-                                    if pid in self.__pidHistory:
-                                        # Percent cpu using decaying average, 50% from 10 seconds ago, 50% from last 10 seconds:
-                                        oldTotalTime, oldSeconds, oldPidPcpu = self.__pidHistory[pid]
-                                        #checking if already updated data
-                                        if seconds != oldSeconds:
-                                            pidPcpu = (totalTime - oldTotalTime) / float(seconds - oldSeconds)
-                                            pcpu += (oldPidPcpu + pidPcpu) / 2 # %cpu
-                                            pidData[pid] = totalTime, seconds, pidPcpu
-                                    else:
-                                        pidPcpu = totalTime / seconds
-                                        pcpu += pidPcpu
-                                        pidData[pid] = totalTime, seconds, pidPcpu
-
-                                if rqd.rqconstants.ENABLE_PTREE:
-                                    ptree.append({"pid": pid, "seconds": seconds, "total_time": totalTime})
-                            except Exception as e:
-                                log.warning('Failure with pid rss update due to: %s at %s' % \
-                                            (e, traceback.extract_tb(sys.exc_info()[2])))
-
-                    rss = (rss * resource.getpagesize()) // 1024
-                    vsize = int(vsize/1024)
-
-                    frame.rss = rss
-                    frame.maxRss = max(rss, frame.maxRss)
-
-                    frame.vsize = vsize
-                    frame.maxVsize = max(vsize, frame.maxVsize)
-
-                    frame.runFrame.attributes["pcpu"] = str(pcpu)
-
-                    if rqd.rqconstants.ENABLE_PTREE:
-                        frame.runFrame.attributes["ptree"] = str(yaml.load("list: %s" % ptree,
-                                                                           Loader=yaml.SafeLoader))
+            pageSize = resource.getpagesize()
+
+            for session, frame in sessions.items():
+                rss = 0
+                vsize = 0
+                pcpu = 0
+                processes = []
+                for proc in procsBySession.get(session, ()):
+                    try:
+                        rss += proc.rss
+                        vsize += proc.vsize
+
+                        # jiffies used by this process, last two means that dead children are counted
+                        totalTime = proc.utime + proc.stime + proc.cutime + proc.cstime
+
+                        # Seconds of process life, boot time is already in seconds
+                        seconds = now - bootTime - \
+                                  float(proc.startTime) / rqd.rqconstants.SYS_HERTZ
+                        if seconds:
+                            if proc.pid in self.__pidHistory:
+                                # Percent cpu using decaying average, 50% from 10 seconds ago, 50% from last 10 seconds:
+                                oldTotalTime, oldSeconds, oldPidPcpu = self.__pidHistory[proc.pid]
+                                #checking if already updated data
+                                if seconds != oldSeconds:
+                                    pidPcpu = (totalTime - oldTotalTime) / float(seconds - oldSeconds)
+                                    pcpu += (oldPidPcpu + pidPcpu) / 2 # %cpu
+                                    pidData[proc.pid] = totalTime, seconds, pidPcpu
+                            else:
+                                pidPcpu = totalTime / seconds
+                                pcpu += pidPcpu
+                                pidData[proc.pid] = totalTime, seconds, pidPcpu
+
+                        if rqd.rqconstants.ENABLE_PTREE:
+                            processes.append(rqd.compiled_proto.report_pb2.ProcessInfo(
+                                pid=proc.pid,
+                                ppid=proc.ppid,
+                                cmd=proc.comm,
+                                rss=(proc.rss * pageSize) // 1024,
+                                cpu_seconds=float(totalTime) / rqd.rqconstants.SYS_HERTZ,
+                                start_time=int(bootTime + float(proc.startTime) /
+                                               rqd.rqconstants.SYS_HERTZ)))
+                    except Exception as e:
+                        log.warning('Failure with pid rss update due to: %s at %s' % \
+                                    (e, traceback.extract_tb(sys.exc_info()[2])))
+
+                rss = (rss * pageSize) // 1024
+                vsize = int(vsize/1024)
+
+                frame.rss = rss
+                frame.maxRss = max(rss, frame.maxRss)
+
+                frame.vsize = vsize
+                frame.maxVsize = max(vsize, frame.maxVsize)
+
+                frame.runFrame.attributes["pcpu"] = str(pcpu)
+
+                self.__updateFrameIo(
+                    frame, [proc.pid for proc in procsBySession.get(session, ())])
+
+                if rqd.rqconstants.ENABLE_PTREE:
+                    frame.processes = sorted(processes, key=lambda process: process.pid)
 
             # Store the current data for the next check
             self.__pidHistory = pidData
@@ -277,6 +288,64 @@ class Machine(object):
         except Exception as e:
             log.exception('Failure with rss update due to: {0}'.format(e))
 
+    def createFrameCgroup(self, frameId):
+        """Creates a cgroup for the frame when the cgroup backend is in use
+        @type  frameId: str
+        @param frameId: The frame's unique id
+        @rtype:  str
+        @return: The cgroup.procs path the frame should join, or None"""
+        if self.__cgroups is None:
+            return None
+        try:
+            procsPath = self.__cgroups.createFrameGroup(frameId)
+        except (IOError, OSError) as e:
+            log.warning('Unable to create cgroup for frame %s: %s' % (frameId, e))
+            return None
+        self.__cgroupHistory[frameId] = (0, time.time())
+        return procsPath
+
+    def finishFrameCgroup(self, frame):
+        """Takes the final cgroup sample of an exited frame and removes its cgroup
+        @type  frame: rqd.rqnetwork.RunningFrame
+        @param frame: The exited frame"""
+        try:
+            stats = self.__updateFrameFromCgroup(frame)
+            if stats is not None:
+                frame.utime = str(stats.userUsec / 1000000.0)
+                frame.stime = str(stats.systemUsec / 1000000.0)
+        finally:
+            self.__cgroupHistory.pop(frame.frameId, None)
+            self.__cgroups.removeFrameGroup(frame.frameId)
+
+    def __updateFrameFromCgroup(self, frame):
+        """Updates a frame's rss, maxrss and pcpu from its cgroup"""
+        try:
+            stats = self.__cgroups.readFrameStats(frame.frameId)
+        except (IOError, OSError, ValueError) as e:
+            log.warning('Unable to read cgroup for frame %s: %s' % (frame.frameId, e))
+            return None
+
+        now = time.time()
+        lastUsage, lastTime = self.__cgroupHistory.get(frame.frameId, (0, now))
+        if now > lastTime:
+            # Same unit as the /proc backend, jiffies per second
+            pcpu = (stats.usageUsec - lastUsage) / 1000000.0 * \
+                   rqd.rqconstants.SYS_HERTZ / (now - lastTime)
+            frame.runFrame.attributes["pcpu"] = str(pcpu)
+        self.__cgroupHistory[frame.frameId] = (stats.usageUsec, now)
+
+        frame.rss = stats.rss
+        frame.maxRss = max(stats.maxRss, frame.maxRss)
+        # Including page cache, not used for the frame's memory use
+        frame.runFrame.attributes["memory_current"] = str(stats.memoryCurrent)
+        frame.runFrame.attributes["memory_peak"] = str(stats.memoryPeak)
+        return stats
+
+    def __updateFrameIo(self, frame, pids):
+        """Samples the I/O counters of a frame's processes into its attributes"""
+        frame.io.update(self.__procScanner.readIoOf(pids), time.time())
+        frame.runFrame.attributes.update(frame.io.attributes())
+
     def getLoadAvg(self):
         """Returns average number of processes waiting to be served
            for the last 1 minute multiplied by 100."""
@@ -550,26 +619,15 @@ class Machine(object):
     def updateMachineStats(self):
         """Updates dynamic machine information during runtime"""
         if platform.system() == "Linux":
-            # Reads dynamic information for mcp
-            mcpStat = os.statvfs(self.getTempPath())
-            self.__renderHost.free_mcp = (mcpStat.f_bavail * mcpStat.f_bsize) // KILOBYTE
-
-            # Reads dynamic information from /proc/meminfo
-            with open(rqd.rqconstants.PATH_MEMINFO, "r") as fp:
-                for line in fp:
-                    if line.startswith("MemFree"):
-                        freeMem = int(line.split()[1])
-                    elif line.startswith("SwapFree"):
-                        freeSwapMem = int(line.split()[1])
-                    elif line.startswith("Cached"):
-                        cachedMem = int(line.split()[1])
-                    elif line.startswith("MemTotal"):
-                        self.__renderHost.total_mem = int(line.split()[1])
-
-            self.__renderHost.free_swap = freeSwapMem
-            self.__renderHost.free_mem = freeMem + cachedMem
+            self.__renderHost.free_mcp = self.__getFreeMcp()
+            memInfo = self.__readMemInfo()
+            self.__renderHost.total_mem = memInfo['MemTotal']
+            self.__renderHost.free_swap = memInfo['SwapFree']
+            self.__renderHost.free_mem = memInfo['MemFree'] + memInfo['Cached']
             self.__renderHost.attributes['freeGpu'] = str(self.getGpuMemory())
             self.__renderHost.attributes['swapout'] = self.__getSwapout()
+            if self.__rqCore.scratch is not None:
+                self.__renderHost.attributes.update(self.__rqCore.scratch.attributes())
 
         elif platform.system() == 'Darwin':
             self.updateMacMemory()
@@ -587,11 +645,51 @@ class Machine(object):
         self.__renderHost.nimby_locked = self.__rqCore.nimby.locked
         self.__renderHost.state = self.state
 
+    def __getFreeMcp(self):
+        """Returns the kB free in the temp directory"""
+        mcpStat = os.statvfs(self.getTempPath())
+        return (mcpStat.f_bavail * mcpStat.f_bsize) // KILOBYTE
+
+    @staticmethod
+    def __readMemInfo():
+        """Returns the kB of total, free and cached memory and free swap from
+        /proc/meminfo"""
+        memInfo = {}
+        with open(rqd.rqconstants.PATH_MEMINFO, "r") as fp:
+            for line in fp:
+                name = line.split(':')[0]
+                if name in ('MemTotal', 'MemFree', 'Cached', 'SwapFree'):
+                    memInfo[name] = int(line.split()[1])
+        return memInfo
+
+    def getHistorySample(self):
+        """Returns the host's metrics recorded in its history, see
+        rqd.rqhistory.HOST_METRICS. Outside of Linux they are those of the
+        last host report.
+        @rtype:  dict
+        @return: Value of each metric"""
+        if platform.system() == "Linux":
+            memInfo = self.__readMemInfo()
+            return {
+                'free_mem': memInfo['MemFree'] + memInfo['Cached'],
+                'free_swap': memInfo['SwapFree'],
+                'free_mcp': self.__getFreeMcp(),
+                'load': self.getLoadAvg(),
+                'pgout_rate': int(self.__getSwapout()),
+            }
+        return {
+            'free_mem': self.__renderHost.free_mem,
+            'free_swap': self.__renderHost.free_swap,
+            'free_mcp': self.__renderHost.free_mcp,
+            'load': self.__renderHost.load,
+        }
+
     def getHostInfo(self):
         """Updates and returns the renderHost struct"""
         self.updateMachineStats()
         return self.__renderHost
 
+    @rqd.rqmetrics.timed(HOST_REPORT_TIME)
     def getHostReport(self):
         """Updates and returns the hostReport struct"""
         self.__hostReport.host.CopyFrom(self.getHostInfo())
@@ -617,58 +715,59 @@ class Machine(object):
     def __enabledHT(self):
         return 'hyperthreadingMultiplier' in self.__renderHost.attributes
 
-    def setupHT(self):
-        """ Setup rqd for hyper-threading """
-
-        if self.__enabledHT():
-            self.__tasksets = set(range(self.__coreInfo.total_cores // 100))
-
-    def reserveHT(self, reservedCores):
-        """ Reserve cores for use by taskset
-        taskset -c 0,1,8,9 COMMAND
-        Not thread save, use with locking.
+    def setupTopology(self, pathCpuInfo=None):
+        """Reads the cpu topology frames are pinned to, Linux only
+        @type  pathCpuInfo: str
+        @param pathCpuInfo: cpuinfo file to read instead of sysfs"""
+        self.__topology = None
+        if platform.system() != 'Linux' and pathCpuInfo is None:
+            return
+        try:
+            self.__topology = rqd.rqtopology.CpuTopology.load(pathCpuInfo)
+        except (IOError, OSError, ValueError) as e:
+            log.warning('Unable to read the cpu topology, frames will not be pinned: %s' % e)
+            return
+        physicalCores = self.__coreInfo.total_cores // rqd.rqconstants.CORE_VALUE
+        if len(self.__topology.cores) != physicalCores:
+            log.warning('Topology has %d physical cores but %d are reported, '
+                        'some frames may not be pinned' % (
+                            len(self.__topology.cores), physicalCores))
+        log.info('Cpu topology: %d cores on numa nodes %s' % (
+            len(self.__topology.cores), self.__topology.numaNodes()))
+
+    def reserveCpus(self, reservedCores):
+        """Reserves whole physical cores, with their hyper-threading siblings,
+        for a frame. The cores share a cache and numa node where possible.
+        Not thread safe, use with locking.
         @type   reservedCores: int
         @param  reservedCores: The total physical cores reserved by the frame.
-        @rtype:  string
-        @return: The cpu-list for taskset -c
+        @rtype:  rqd.rqtopology.Allocation
+        @return: The reserved cpus and their numa nodes, None if not pinned
         """
-
-        if not self.__enabledHT():
+        if self.__topology is None:
             return None
 
-        if reservedCores % 100:
-            log.debug('Taskset: Can not reserveHT with fractional cores')
+        if reservedCores % rqd.rqconstants.CORE_VALUE:
+            log.debug('Taskset: Can not pin fractional cores')
             return None
 
-        log.debug('Taskset: Requesting reserve of %d' % (reservedCores // 100))
-
-        if len(self.__tasksets) < reservedCores // 100:
-            err = 'Not launching, insufficient hyperthreading cores to reserve based on reservedCores'
-            log.critical(err)
-            raise rqd.rqexceptions.CoreReservationFailureException(err)
-
-        tasksets = []
-        for x in range(reservedCores // 100):
-            core = self.__tasksets.pop()
-            tasksets.append(str(core))
-            tasksets.append(str(core + self.__coreInfo.total_cores // 100))
-
-        log.debug('Taskset: Reserving cores - %s' % ','.join(tasksets))
+        allocation = self.__topology.reserve(reservedCores // rqd.rqconstants.CORE_VALUE)
+        if allocation is None:
+            log.warning('Not pinning frame, %d of %d cores are free in the cpu topology' % (
+                self.__topology.freeCores(), reservedCores // rqd.rqconstants.CORE_VALUE))
+            return None
 
-        return ','.join(tasksets)
+        log.debug('Taskset: Reserving cpus %s on nodes %s' % (allocation.cpus, allocation.nodes))
+        return allocation
 
-    def releaseHT(self, reservedHT):
-        """ Release cores used by taskset
-        Format: 0,1,8,9
+    def releaseCpus(self, cpuList):
+        """Releases the cores reserved by reserveCpus.
         Not thread safe, use with locking.
-        @type:  string
-        @param: The cpu-list used for taskset to release. ex: '0,8,1,9'
+        @type  cpuList: str
+        @param cpuList: The frame's CPU_LIST. ex: '0,1,8,9'
         """
+        if self.__topology is None:
+            return
 
-        if not self.__enabledHT():
-            return None
-
-        log.debug('Taskset: Releasing cores - %s' % reservedHT)
-        for core in reservedHT.split(','):
-            if int(core) < self.__coreInfo.total_cores // 100:
-                self.__tasksets.add(int(core))
+        log.debug('Taskset: Releasing cpus - %s' % cpuList)
+        self.__topology.release(rqd.rqutil.parseCpuList(cpuList))
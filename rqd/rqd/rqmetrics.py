@@ -0,0 +1,331 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Lightweight in process metrics for rqd.
+
+Metrics are registered once by name and are safe to update from any thread.
+render() formats them in the Prometheus text exposition format, published
+by rqd.rqexporter.
+
+Counting is always on. Measurements that cost more than a count, such as
+timing a call or serializing a report to get its size, are only taken
+while an exporter has enabled the metrics, see isEnabled() and timed().
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import bisect
+import functools
+import logging as log
+import math
+import threading
+import time
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Name of the label values are kept under, unless a metric names it
+DEFAULT_LABEL_NAME = 'label'
+
+monotonic = getattr(time, 'monotonic', time.time)
+
+ENABLED = False
+
+
+def isEnabled():
+    """Returns True while an exporter publishes the metrics"""
+    return ENABLED
+
+
+def setEnabled(enabled):
+    """Turns the measurements taken only for an exporter on or off"""
+    global ENABLED
+    ENABLED = enabled
+
+
+def timed(histogram, label=None):
+    """Decorates a function to record its run time in a histogram while the
+    metrics are enabled
+    @type  histogram: Histogram
+    @param histogram: The histogram observing the run times
+    @type  label: str
+    @param label: Optional label value the run times are kept under"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = monotonic()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(monotonic() - start, label=label)
+        return wrapper
+    return decorator
+
+
+class Counter(object):
+    """A monotonically increasing count, optionally split by label."""
+
+    TYPE = 'counter'
+
+    def __init__(self, name, description, labelName=None):
+        self.name = name
+        self.description = description
+        self.labelName = labelName or DEFAULT_LABEL_NAME
+        self.__lock = threading.Lock()
+        self.__values = {}
+
+    def inc(self, amount=1, label=None):
+        """Increments the counter
+        @type  amount: int
+        @param amount: Amount to add
+        @type  label: str
+        @param label: Optional label value the count is kept under"""
+        with self.__lock:
+            self.__values[label] = self.__values.get(label, 0) + amount
+
+    def value(self, label=None):
+        """Returns the current count for a label"""
+        with self.__lock:
+            return self.__values.get(label, 0)
+
+    def values(self):
+        """Returns a copy of the counts keyed by label"""
+        with self.__lock:
+            return dict(self.__values)
+
+    def samples(self):
+        """Returns the (name, labels, value) samples of the counter"""
+        return [(self.name, labelPairs(self.labelName, label), value)
+                for label, value in sorted(self.values().items(), key=sortKey)]
+
+
+class Gauge(object):
+    """A value that goes up and down, optionally split by label. A gauge
+    given a function reads it each time the metrics are read instead."""
+
+    TYPE = 'gauge'
+
+    def __init__(self, name, description, labelName=None, func=None):
+        """Gauge class initialization
+        @type  func: function
+        @param func: Returns the current value, or a dict of values by label"""
+        self.name = name
+        self.description = description
+        self.labelName = labelName or DEFAULT_LABEL_NAME
+        self.func = func
+        self.__lock = threading.Lock()
+        self.__values = {}
+
+    def set(self, value, label=None):
+        """Sets the gauge's value for a label"""
+        with self.__lock:
+            self.__values[label] = value
+
+    def value(self, label=None):
+        """Returns the current value for a label"""
+        return self.values().get(label, 0)
+
+    def values(self):
+        """Returns the current values keyed by label"""
+        if self.func is not None:
+            value = self.func()
+            return dict(value) if isinstance(value, dict) else {None: value}
+        with self.__lock:
+            return dict(self.__values)
+
+    def samples(self):
+        """Returns the (name, labels, value) samples of the gauge"""
+        return [(self.name, labelPairs(self.labelName, label), value)
+                for label, value in sorted(self.values().items(), key=sortKey)]
+
+
+class Histogram(object):
+    """Counts observations into cumulative buckets, optionally split by label."""
+
+    TYPE = 'histogram'
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS, labelName=None):
+        self.name = name
+        self.description = description
+        self.labelName = labelName or DEFAULT_LABEL_NAME
+        self.buckets = tuple(sorted(buckets))
+        self.__lock = threading.Lock()
+        self.__values = {}
+
+    def observe(self, value, label=None):
+        """Records an observation
+        @type  value: float
+        @param value: The observed value
+        @type  label: str
+        @param label: Optional label value the observation is kept under"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self.__lock:
+            counts, total = self.__values.get(label, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self.__values[label] = (counts, total + value)
+
+    def count(self, label=None):
+        """Returns the number of observations for a label"""
+        with self.__lock:
+            counts, _ = self.__values.get(label, ([0], 0.0))
+            return sum(counts)
+
+    def sum(self, label=None):
+        """Returns the sum of observations for a label"""
+        with self.__lock:
+            return self.__values.get(label, ([0], 0.0))[1]
+
+    def values(self):
+        """Returns {label: (cumulativeBucketCounts, sum)}, the last bucket is +Inf"""
+        with self.__lock:
+            result = {}
+            for label, (counts, total) in self.__values.items():
+                cumulative = []
+                running = 0
+                for count in counts:
+                    running += count
+                    cumulative.append(running)
+                result[label] = (cumulative, total)
+            return result
+
+    def samples(self):
+        """Returns the (name, labels, value) samples of the histogram"""
+        samples = []
+        for label, (cumulative, total) in sorted(self.values().items(), key=sortKey):
+            labels = labelPairs(self.labelName, label)
+            for bound, count in zip(self.buckets + (float('inf'),), cumulative):
+                samples.append(('%s_bucket' % self.name, labels + [('le', bound)], count))
+            samples.append(('%s_sum' % self.name, labels, total))
+            samples.append(('%s_count' % self.name, labels, cumulative[-1]))
+        return samples
+
+
+class Registry(object):
+    """Holds every metric by name."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__metrics = {}
+
+    def __get(self, cls, name, *args):
+        with self.__lock:
+            metric = self.__metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args)
+                self.__metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError('Metric %s is already registered as a %s' % (
+                    name, type(metric).__name__))
+            return metric
+
+    def counter(self, name, description, labelName=None):
+        """Returns the counter registered under name, creating it if needed"""
+        return self.__get(Counter, name, description, labelName)
+
+    def histogram(self, name, description, buckets=DEFAULT_BUCKETS, labelName=None):
+        """Returns the histogram registered under name, creating it if needed"""
+        return self.__get(Histogram, name, description, buckets, labelName)
+
+    def gauge(self, name, description, labelName=None, func=None):
+        """Returns the gauge registered under name, creating it if needed. A
+        function given replaces the gauge's previous one."""
+        gauge = self.__get(Gauge, name, description, labelName)
+        if func is not None:
+            gauge.func = func
+        return gauge
+
+    def metrics(self):
+        """Returns every registered metric sorted by name"""
+        with self.__lock:
+            return [self.__metrics[name] for name in sorted(self.__metrics)]
+
+
+REGISTRY = Registry()
+
+
+def counter(name, description, labelName=None):
+    """Returns a counter from the default registry"""
+    return REGISTRY.counter(name, description, labelName)
+
+
+def histogram(name, description, buckets=DEFAULT_BUCKETS, labelName=None):
+    """Returns a histogram from the default registry"""
+    return REGISTRY.histogram(name, description, buckets, labelName)
+
+
+def gauge(name, description, labelName=None, func=None):
+    """Returns a gauge from the default registry"""
+    return REGISTRY.gauge(name, description, labelName, func)
+
+
+def labelPairs(labelName, label):
+    """Returns the label pairs a value kept under label is published with"""
+    return [] if label is None else [(labelName, label)]
+
+
+def sortKey(item):
+    """Orders values by label, the unlabelled one first"""
+    return (item[0] is not None, str(item[0]))
+
+
+def formatValue(value):
+    """Formats a sample value or bucket bound"""
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        if math.isnan(value):
+            return 'NaN'
+        return repr(value)
+    return str(value)
+
+
+def escape(text, quote=True):
+    """Escapes a label value, or help text without quote"""
+    text = str(text).replace('\\', '\\\\').replace('\n', '\\n')
+    return text.replace('"', '\\"') if quote else text
+
+
+def render(registry=None):
+    """Returns the metrics in the Prometheus text exposition format, 0.0.4
+    @type  registry: Registry
+    @param registry: The metrics, the default registry if not given
+    @rtype:  str
+    @return: The exposition"""
+    lines = []
+    for metric in (registry or REGISTRY).metrics():
+        try:
+            samples = metric.samples()
+        except Exception as e:
+            # A gauge's function failed, the other metrics are still published
+            log.warning('Unable to read metric %s: %s' % (metric.name, e))
+            continue
+        lines.append('# HELP %s %s' % (metric.name, escape(metric.description, quote=False)))
+        lines.append('# TYPE %s %s' % (metric.name, metric.TYPE))
+        for name, labels, value in samples:
+            if labels:
+                name = '%s{%s}' % (name, ','.join(
+                    '%s="%s"' % (labelName, escape(formatValue(labelValue)
+                                                   if labelName == 'le' else labelValue))
+                    for labelName, labelValue in labels))
+            lines.append('%s %s' % (name, formatValue(value)))
+    return '\n'.join(lines) + '\n'
+
@@ -24,24 +24,71 @@ from __future__ import division
 
 from builtins import object
 from concurrent import futures
-from random import shuffle
 import atexit
+import hashlib
 import logging as log
 import os
 import platform
-import subprocess
+import random
+import signal
+import threading
 import time
 
 import grpc
 
 import rqd.compiled_proto.report_pb2
+import rqd.rqcgroup
 import rqd.compiled_proto.report_pb2_grpc
 import rqd.compiled_proto.rqd_pb2_grpc
 import rqd.rqconstants
 import rqd.rqdservicers
+import rqd.rqmetrics
+import rqd.rqproc
 import rqd.rqutil
 
 
+monotonic = getattr(time, 'monotonic', time.time)
+
+CONNECT_TIME = rqd.rqmetrics.histogram(
+    'rqd_cuebot_connect_seconds', 'Time taken for a cuebot channel to become ready',
+    labelName='cuebot')
+FAILOVER_COUNT = rqd.rqmetrics.counter(
+    'rqd_cuebot_failovers_total', 'Reports retried on another cuebot after a failure',
+    labelName='cuebot')
+
+CUEBOT_CALL_TIME = rqd.rqmetrics.histogram(
+    'rqd_cuebot_call_seconds', 'Time taken by report calls to the cuebot, by method',
+    labelName='method')
+CUEBOT_CALL_FAILURES = rqd.rqmetrics.counter(
+    'rqd_cuebot_call_failures_total', 'Report calls to the cuebot that failed, by method',
+    labelName='method')
+HOST_REPORT_SIZE = rqd.rqmetrics.histogram(
+    'rqd_host_report_bytes', 'Serialized size of the host reports sent to the cuebot',
+    buckets=(1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+
+# Errors that mean the cuebot could not be reached rather than that it
+# rejected the request
+FAILOVER_CODES = (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED)
+
+CALL_TIME = rqd.rqmetrics.histogram(
+    'rqd_grpc_call_seconds', 'Time taken to serve an RqdInterface call, by method',
+    labelName='method')
+SHED_CALLS = rqd.rqmetrics.counter(
+    'rqd_grpc_shed_calls_total', 'RqdInterface calls refused as rqd was busy, by method',
+    labelName='method')
+QUEUED_CALLS = rqd.rqmetrics.counter(
+    'rqd_grpc_queued_calls_total', 'RqdInterface calls that waited for a free slot, by method',
+    labelName='method')
+
+# RqdInterface methods that only read the host's state. They are limited
+# separately from the calls that change it, so a burst of launches or kills
+# can not take every worker.
+QUERY_METHODS = frozenset(['ReportStatus', 'GetRunningFrameStatus', 'GetMachineHistory'])
+# Log calls made for artists viewing logs, limited separately again so they
+# can not keep the cuebot's queries waiting
+LOG_METHODS = frozenset(['TailFrameLog'])
+
+
 class RunningFrame(object):
 
     def __init__(self, rqCore, runFrame):
@@ -51,10 +98,21 @@ class RunningFrame(object):
         self.frameId = runFrame.frame_id
 
         self.killMessage = ""
+        # Reported instead of the frame's own exit status when set by kill
+        self.killExitStatus = None
+        # Time the frame was suspended by nimby, None while it runs
+        self.suspendedTime = None
+        # Monotonic time of the first kill request, and the seconds the
+        # frame took to exit after it
+        self.killTime = None
+        self.killSeconds = None
 
         self.pid = None
+        self.cgroup = None
         self.exitStatus = None
         self.frameAttendantThread = None
+        # The end of the frame's output, see rqd.rqlogwriter.LogBuffer
+        self.logBuffer = None
         self.exitSignal = 0
         self.runTime = 0
 
@@ -66,6 +124,9 @@ class RunningFrame(object):
         self.realtime = 0
         self.utime = 0
         self.stime = 0
+        self.io = rqd.rqproc.IoAccounting()
+        # ProcessInfo of the frame's processes, by pid, when ENABLE_PTREE is set
+        self.processes = []
 
     def runningFrameInfo(self):
         """Returns the RunningFrameInfo object"""
@@ -84,15 +145,58 @@ class RunningFrame(object):
             vsize=self.vsize,
             attributes=self.runFrame.attributes
         )
+        if self.suspendedTime is not None:
+            runningFrameInfo.attributes['suspended'] = str(int(self.suspendedTime))
+        runningFrameInfo.processes.extend(self.processes)
         return runningFrameInfo
 
     def status(self):
         """Returns the status of the frame"""
         return self.runningFrameInfo()
 
-    def kill(self, message=""):
-        """Kills the frame"""
-        log.info("Request recieved: kill")
+    def suspend(self):
+        """Stops the frame's processes without killing them, freezing its
+        cgroup if it has one and stopping its process group otherwise
+        @rtype:  bool
+        @return: True if the frame was suspended"""
+        if self.pid is None or self.suspendedTime is not None or platform.system() == "Windows":
+            return False
+        if not self.__signalFrame(True):
+            return False
+        self.suspendedTime = time.time()
+        log.info("Suspended frameId=%s" % self.frameId)
+        return True
+
+    def resume(self):
+        """Continues a suspended frame
+        @rtype:  bool
+        @return: True if the frame was resumed"""
+        if self.suspendedTime is None:
+            return False
+        self.__signalFrame(False)
+        log.info("Resumed frameId=%s after %d seconds" % (
+            self.frameId, time.time() - self.suspendedTime))
+        self.suspendedTime = None
+        return True
+
+    def __signalFrame(self, stop):
+        rqd.rqutil.permissionsHigh()
+        try:
+            if self.cgroup:
+                rqd.rqcgroup.freezeCgroup(self.cgroup, stop)
+            else:
+                os.killpg(self.pid, signal.SIGSTOP if stop else signal.SIGCONT)
+            return True
+        except (IOError, OSError) as e:
+            log.warning("Unable to %s frameId=%s: %s" % (
+                "suspend" if stop else "resume", self.frameId, e))
+            return False
+        finally:
+            rqd.rqutil.permissionsLow()
+
+    def isKillable(self):
+        """Returns True once the frame has processes to signal. A frame
+        whose attendant has already exited is removed from the cache."""
         if self.frameAttendantThread is None:
             log.warning("Kill requested before frameAttendantThread is created "
                         "for: %s" % self.frameId)
@@ -100,26 +204,213 @@ class RunningFrame(object):
             log.warning("Kill requested before pid is available for: %s"
                         % self.frameId)
         elif self.frameAttendantThread.isAlive():
-            try:
-                if not self.killMessage and message:
-                    self.killMessage = message
-                rqd.rqutil.permissionsHigh()
-                try:
-                    if platform.system() == "Windows":
-                        subprocess.Popen('taskkill /F /T /PID %i' % self.pid, shell=True)
-                    else:
-                        os.killpg(self.pid, rqd.rqconstants.KILL_SIGNAL)
-                finally:
-                    rqd.rqutil.permissionsLow()
-            except OSError as e:
-                log.warning("kill() tried to kill a non-existant pid for: %s "
-                            "Error: %s" % (self.frameId, e))
-            except Exception as e:
-                log.warning("kill() encountered an unknown error: %s" % e)
+            return True
         else:
             log.warning("Kill requested after frameAttendantThread has exited "
                         "for: %s" % self.frameId)
             self.rqCore.deleteFrame(self.frameId)
+        return False
+
+    def recordKill(self, message, exitStatus, now):
+        """Keeps the reason, exit status and time of the first kill request
+        @type  message: str
+        @param message: Reason written to the frame's log
+        @type  exitStatus: int
+        @param exitStatus: Exit status reported for the frame
+        @type  now: float
+        @param now: Monotonic time of the request"""
+        if not self.killMessage and message:
+            self.killMessage = message
+        if self.killExitStatus is None:
+            self.killExitStatus = exitStatus
+        if self.killTime is None:
+            self.killTime = now
+
+    def kill(self, message="", exitStatus=None, immediate=False):
+        """Kills the frame, see rqd.rqteardown
+        @type  message: str
+        @param message: Reason written to the frame's log
+        @type  exitStatus: int
+        @param exitStatus: Exit status reported for the frame
+        @type  immediate: bool
+        @param immediate: Send KILL_SIGNAL without a grace period"""
+        log.info("Request recieved: kill")
+        self.rqCore.teardown.kill([self], message, exitStatus, immediate)
+
+
+class TimedSemaphore(object):
+    """A bounded semaphore whose acquire can time out, which
+    threading.Semaphore only supports from Python 3.2"""
+
+    def __init__(self, value):
+        """TimedSemaphore class initialization
+        @type  value: int
+        @param value: Number of holders at once"""
+        self.__condition = threading.Condition(threading.Lock())
+        self.__value = value
+        self.__initialValue = value
+
+    def acquire(self, blocking=True, timeout=None):
+        """Takes a slot
+        @type  blocking: bool
+        @param blocking: Wait for a slot when none is free
+        @type  timeout: float
+        @param timeout: Seconds to wait at most, None to wait until one is free
+        @rtype:  bool
+        @return: Whether a slot was taken"""
+        with self.__condition:
+            deadline = None if timeout is None else monotonic() + timeout
+            while self.__value == 0:
+                if not blocking:
+                    return False
+                if deadline is None:
+                    self.__condition.wait()
+                    continue
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return False
+                self.__condition.wait(remaining)
+            self.__value -= 1
+            return True
+
+    def release(self):
+        """Gives a slot back"""
+        with self.__condition:
+            if self.__value >= self.__initialValue:
+                raise ValueError('TimedSemaphore released too many times')
+            self.__value += 1
+            self.__condition.notify()
+
+
+class CallLimiter(grpc.ServerInterceptor):
+    """Bounds the RqdInterface calls served at once, separately for queries,
+    for the calls that change the host, for log tails and for log streams,
+    and times each call by method. A query or stream over its limit fails straight away
+    with RESOURCE_EXHAUSTED, for the caller to retry, rather than holding a
+    worker. The cuebot does not retry the calls that change the host, a
+    lost kill leaves the frame running, so those wait for a slot instead,
+    up to RQD_GRPC_MAX_QUEUED_CONTROL_CALLS of them for at most
+    RQD_GRPC_CONTROL_CALL_WAIT_SEC."""
+
+    def __init__(self, maxControlCalls=None, maxQueryCalls=None, maxStreams=None,
+                 maxQueuedControlCalls=None, controlCallWait=None, maxLogTails=None):
+        """CallLimiter class initialization
+        @type  maxControlCalls: int
+        @param maxControlCalls: Calls changing the host served at once,
+                                defaults to RQD_GRPC_MAX_CONTROL_CALLS
+        @type  maxQueryCalls: int
+        @param maxQueryCalls: Queries served at once, defaults to RQD_GRPC_MAX_QUERY_CALLS
+        @type  maxStreams: int
+        @param maxStreams: Streaming calls served at once, defaults to
+                           RQD_GRPC_MAX_LOG_STREAMS
+        @type  maxQueuedControlCalls: int
+        @param maxQueuedControlCalls: Calls changing the host waiting for a
+                                      slot at once, defaults to
+                                      RQD_GRPC_MAX_QUEUED_CONTROL_CALLS
+        @type  controlCallWait: float
+        @param controlCallWait: Seconds a call changing the host waits for a
+                                slot, defaults to RQD_GRPC_CONTROL_CALL_WAIT_SEC
+        @type  maxLogTails: int
+        @param maxLogTails: Log tails served at once, defaults to
+                            RQD_GRPC_MAX_LOG_TAILS"""
+        maxControlCalls = maxControlCalls or rqd.rqconstants.RQD_GRPC_MAX_CONTROL_CALLS
+        maxQueuedControlCalls = rqd.rqconstants.RQD_GRPC_MAX_QUEUED_CONTROL_CALLS \
+            if maxQueuedControlCalls is None else maxQueuedControlCalls
+        self.__slots = {
+            False: TimedSemaphore(maxControlCalls),
+            True: threading.BoundedSemaphore(
+                maxQueryCalls or rqd.rqconstants.RQD_GRPC_MAX_QUERY_CALLS),
+        }
+        self.__logSlots = threading.BoundedSemaphore(
+            maxLogTails or rqd.rqconstants.RQD_GRPC_MAX_LOG_TAILS)
+        # Calls changing the host either served or waiting
+        self.__controlAdmission = threading.BoundedSemaphore(
+            maxControlCalls + maxQueuedControlCalls)
+        self.__controlCallWait = rqd.rqconstants.RQD_GRPC_CONTROL_CALL_WAIT_SEC \
+            if controlCallWait is None else controlCallWait
+        self.__streamSlots = threading.BoundedSemaphore(
+            maxStreams or rqd.rqconstants.RQD_GRPC_MAX_LOG_STREAMS)
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return handler
+        method = handler_call_details.method.rsplit('/', 1)[-1]
+        if handler.unary_stream is not None:
+            return grpc.unary_stream_rpc_method_handler(
+                self.__limitStream(method, self.__streamSlots, handler.unary_stream),
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer)
+        if handler.unary_unary is None:
+            return handler
+        if method in QUERY_METHODS:
+            limited = self.__limit(method, self.__slots[True], handler.unary_unary)
+        elif method in LOG_METHODS:
+            limited = self.__limit(method, self.__logSlots, handler.unary_unary)
+        else:
+            limited = self.__queue(method, self.__slots[False], handler.unary_unary)
+        return grpc.unary_unary_rpc_method_handler(
+            limited,
+            request_deserializer=handler.request_deserializer,
+            response_serializer=handler.response_serializer)
+
+    @staticmethod
+    def __limit(method, slots, behavior):
+        def limited(request, context):
+            if not slots.acquire(False):
+                SHED_CALLS.inc(label=method)
+                log.warning('Refusing %s, too many calls in progress' % method)
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                              'rqd is busy, retry %s later' % method)
+            start = monotonic()
+            try:
+                return behavior(request, context)
+            finally:
+                slots.release()
+                CALL_TIME.observe(monotonic() - start, label=method)
+        return limited
+
+    def __queue(self, method, slots, behavior):
+        admission = self.__controlAdmission
+
+        def queued(request, context):
+            admitted = admission.acquire(False)
+            if admitted and not slots.acquire(False):
+                QUEUED_CALLS.inc(label=method)
+                log.info('Queueing %s, too many calls in progress' % method)
+                if not slots.acquire(True, self.__controlCallWait):
+                    admission.release()
+                    admitted = False
+            if not admitted:
+                SHED_CALLS.inc(label=method)
+                log.warning('Refusing %s, too many calls in progress' % method)
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                              'rqd is busy, retry %s later' % method)
+            start = monotonic()
+            try:
+                return behavior(request, context)
+            finally:
+                slots.release()
+                admission.release()
+                CALL_TIME.observe(monotonic() - start, label=method)
+        return queued
+
+    @staticmethod
+    def __limitStream(method, slots, behavior):
+        def limited(request, context):
+            if not slots.acquire(False):
+                SHED_CALLS.inc(label=method)
+                log.warning('Refusing %s, too many streams in progress' % method)
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                              'rqd is busy, retry %s later' % method)
+            start = monotonic()
+            try:
+                for response in behavior(request, context):
+                    yield response
+            finally:
+                slots.release()
+                CALL_TIME.observe(monotonic() - start, label=method)
+        return limited
 
 
 class GrpcServer(object):
@@ -128,12 +419,31 @@ class GrpcServer(object):
     This is used for controlling the render host and task actions initiated by cuebot and cuegui.
     """
 
-    def __init__(self, rqCore):
+    def __init__(self, rqCore, address=None, executor=None):
+        """GrpcServer class initialization
+        @type  rqCore: RqCore
+        @param rqCore: Serves the RqdInterface calls
+        @type  address: str
+        @param address: host:port to listen on, defaults to every address on RQD_GRPC_PORT
+        @type  executor: concurrent.futures.Executor
+        @param executor: Runs the calls, several servers may share one"""
         self.rqCore = rqCore
+        # Every call admitted by the limiter, including the control calls
+        # waiting for a slot, has a worker, calls beyond
+        # RQD_GRPC_MAX_CONCURRENT_RPCS are refused before being queued
         self.server = grpc.server(
-            futures.ThreadPoolExecutor(max_workers=rqd.rqconstants.RQD_GRPC_MAX_WORKERS))
+            executor or futures.ThreadPoolExecutor(max_workers=max(
+                rqd.rqconstants.RQD_GRPC_MAX_WORKERS,
+                rqd.rqconstants.RQD_GRPC_MAX_CONTROL_CALLS +
+                rqd.rqconstants.RQD_GRPC_MAX_QUERY_CALLS) +
+                rqd.rqconstants.RQD_GRPC_MAX_QUEUED_CONTROL_CALLS +
+                rqd.rqconstants.RQD_GRPC_MAX_LOG_TAILS +
+                rqd.rqconstants.RQD_GRPC_MAX_LOG_STREAMS),
+            interceptors=(CallLimiter(),),
+            maximum_concurrent_rpcs=rqd.rqconstants.RQD_GRPC_MAX_CONCURRENT_RPCS)
         self.servicers = ['RqdInterfaceServicer']
-        self.server.add_insecure_port('[::]:{0}'.format(rqd.rqconstants.RQD_GRPC_PORT))
+        self.port = self.server.add_insecure_port(
+            address or '[::]:{0}'.format(rqd.rqconstants.RQD_GRPC_PORT))
 
     def addServicers(self):
         for servicer in self.servicers:
@@ -171,20 +481,182 @@ class GrpcServer(object):
         self.server.stop(0)
 
     def stayAlive(self):
+        """Blocks until the server is stopped"""
         try:
-            while True:
-                time.sleep(rqd.rqconstants.RQD_GRPC_SLEEP_SEC)
+            if hasattr(self.server, 'wait_for_termination'):
+                self.server.wait_for_termination()
+            else:
+                while True:
+                    time.sleep(rqd.rqconstants.RQD_GRPC_SLEEP_SEC)
         except KeyboardInterrupt:
             self.server.stop(0)
 
 
+class CuebotEndpoint(object):
+    """A persistent channel to one cuebot and its health."""
+
+    def __init__(self, hostname, port):
+        self.hostname = hostname
+        self.address = '%s:%s' % (hostname, port)
+        self.channel = None
+        self.stub = None
+        self.state = None
+        self.failures = 0
+        self.retryAt = 0
+        self.__connectStart = None
+        self.__lock = threading.Lock()
+
+    def getStub(self):
+        """Opens the channel if needed and returns its cached report stub
+        @rtype:  rqd.compiled_proto.report_pb2_grpc.RqdReportInterfaceStub
+        @return: Report stub bound to this cuebot"""
+        with self.__lock:
+            if self.channel is None:
+                options = [
+                    ('grpc.keepalive_time_ms', rqd.rqconstants.RQD_GRPC_KEEPALIVE_TIME_MS),
+                    ('grpc.keepalive_timeout_ms', rqd.rqconstants.RQD_GRPC_KEEPALIVE_TIMEOUT_MS),
+                    ('grpc.keepalive_permit_without_calls', 0),
+                ]
+                self.__connectStart = monotonic()
+                self.channel = grpc.insecure_channel(self.address, options=options)
+                self.stub = rqd.compiled_proto.report_pb2_grpc.RqdReportInterfaceStub(
+                    self.channel)
+                self.channel.subscribe(self.onStateChange, try_to_connect=True)
+            return self.stub
+
+    def onStateChange(self, state):
+        """Connectivity callback, records how long the channel took to become ready"""
+        with self.__lock:
+            self.state = state
+            if state == grpc.ChannelConnectivity.READY:
+                if self.__connectStart is not None:
+                    CONNECT_TIME.observe(monotonic() - self.__connectStart, label=self.hostname)
+                    self.__connectStart = None
+            elif self.__connectStart is None:
+                self.__connectStart = monotonic()
+
+    def isHealthy(self, now):
+        """Returns True if the endpoint is not failing or backing off"""
+        return (self.state not in (grpc.ChannelConnectivity.TRANSIENT_FAILURE,
+                                   grpc.ChannelConnectivity.SHUTDOWN)
+                and now >= self.retryAt)
+
+    def markFailed(self):
+        """Backs the endpoint off exponentially, with jitter so hosts that
+        lost the same cuebot do not all return at once"""
+        self.failures += 1
+        backoff = min(rqd.rqconstants.RQD_GRPC_FAILOVER_BACKOFF_MAX_SEC,
+                      rqd.rqconstants.RQD_GRPC_FAILOVER_BACKOFF_BASE_SEC
+                      * 2 ** (self.failures - 1))
+        self.retryAt = monotonic() + random.uniform(backoff / 2, backoff)
+
+    def markSucceeded(self):
+        self.failures = 0
+        self.retryAt = 0
+
+    def close(self):
+        with self.__lock:
+            if self.channel is not None:
+                self.channel.unsubscribe(self.onStateChange)
+                self.channel.close()
+            self.channel = None
+            self.stub = None
+            self.state = None
+
+
+class CuebotChannelPool(object):
+    """Keeps channels to every configured cuebot and fails over between them.
+
+    Each rqd ranks the cuebots by a hash of its own name and the cuebot's
+    name, so a farm spreads evenly across cuebots and a host keeps talking to
+    the same one while it is healthy."""
+
+    def __init__(self, hostnames, port, localName=None):
+        """CuebotChannelPool class initialization
+        @type  hostnames: list<str>
+        @param hostnames: Cuebot hostnames
+        @type  port: int
+        @param port: Cuebot gRPC port
+        @type  localName: str
+        @param localName: Name used to rank the cuebots, defaults to this host's name"""
+        localName = localName or platform.node()
+        ranked = sorted(
+            set(hostnames),
+            key=lambda hostname: (hashlib.md5(
+                ('%s/%s' % (localName, hostname)).encode('utf-8')).hexdigest(), hostname),
+            reverse=True)
+        self.endpoints = [CuebotEndpoint(hostname, port) for hostname in ranked]
+
+    def __candidates(self):
+        """Returns healthy endpoints in rank order followed by the failing
+        ones in the order they come out of backoff"""
+        now = monotonic()
+        healthy = [endpoint for endpoint in self.endpoints if endpoint.isHealthy(now)]
+        failing = sorted((endpoint for endpoint in self.endpoints
+                          if not endpoint.isHealthy(now)),
+                         key=lambda endpoint: endpoint.retryAt)
+        return healthy + failing
+
+    def call(self, method, request, timeout):
+        """Calls a report method, failing over to the next cuebot when one
+        cannot be reached.
+        @type  method: str
+        @param method: Name of the RqdReportInterface method
+        @type  request: protobuf message
+        @param request: The request
+        @type  timeout: int
+        @param timeout: Seconds to wait on each cuebot
+        @return: The response"""
+        start = monotonic() if rqd.rqmetrics.isEnabled() else None
+        try:
+            return self.__call(method, request, timeout)
+        except grpc.RpcError:
+            CUEBOT_CALL_FAILURES.inc(label=method)
+            raise
+        finally:
+            if start is not None:
+                CUEBOT_CALL_TIME.observe(monotonic() - start, label=method)
+
+    def __call(self, method, request, timeout):
+        lastError = None
+        candidates = self.__candidates()
+        for attempt, endpoint in enumerate(candidates):
+            stub = endpoint.getStub()
+            try:
+                response = getattr(stub, method)(request, timeout=timeout)
+            except grpc.RpcError as exc:
+                if exc.code() not in FAILOVER_CODES:
+                    raise
+                endpoint.markFailed()
+                lastError = exc
+                if attempt + 1 < len(candidates):
+                    FAILOVER_COUNT.inc(label=endpoint.hostname)
+                    log.warning('Unable to reach cuebot %s, failing over' % endpoint.address)
+                continue
+            endpoint.markSucceeded()
+            return response
+        raise lastError
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.close()
+
+
 class Network(object):
     """Handles gRPC communication"""
-    def __init__(self, rqCore):
-        """Network class initialization"""
+    def __init__(self, rqCore, cuebotHostnames=None, cuebotPort=None):
+        """Network class initialization
+        @type  cuebotHostnames: list<str>
+        @param cuebotHostnames: Cuebots to report to, defaults to CUEBOT_HOSTNAME
+        @type  cuebotPort: int
+        @param cuebotPort: Their gRPC port, defaults to CUEBOT_GRPC_PORT"""
         self.rqCore = rqCore
+        self.cuebotHostnames = cuebotHostnames
+        self.cuebotPort = cuebotPort
         self.grpcServer = None
-        self.channel = None
+        self.channelPool = None
+        self.__poolLock = threading.Lock()
+        atexit.register(self.closeChannel)
 
     def start_grpc(self):
         self.grpcServer = GrpcServer(self.rqCore)
@@ -195,40 +667,38 @@ class Network(object):
         del self.grpcServer
 
     def closeChannel(self):
-        self.channel.close()
-        del self.channel
-        self.channel = None
+        with self.__poolLock:
+            if self.channelPool is not None:
+                self.channelPool.close()
+                self.channelPool = None
 
-    def __getChannel(self):
+    def __getChannelPool(self):
         # TODO(bcipriano) Add support for the facility nameserver or drop this concept? (Issue #152)
-        if self.channel is None:
-            cuebots = rqd.rqconstants.CUEBOT_HOSTNAME.split()
-            shuffle(cuebots)
-            for cuebotHostname in cuebots:
-                self.channel = grpc.insecure_channel('%s:%s' % (cuebotHostname,
-                                                                rqd.rqconstants.CUEBOT_GRPC_PORT))
-            atexit.register(self.closeChannel)
-
-    def __getReportStub(self):
-        self.__getChannel()
-        return rqd.compiled_proto.report_pb2_grpc.RqdReportInterfaceStub(self.channel)
+        with self.__poolLock:
+            if self.channelPool is None:
+                self.channelPool = CuebotChannelPool(
+                    self.cuebotHostnames or rqd.rqconstants.CUEBOT_HOSTNAME.split(),
+                    self.cuebotPort or rqd.rqconstants.CUEBOT_GRPC_PORT)
+            return self.channelPool
 
     def reportRqdStartup(self, report):
         """Wraps the ability to send a startup report to rqd via grpc"""
-        stub = self.__getReportStub()
         request = rqd.compiled_proto.report_pb2.RqdReportRqdStartupRequest(boot_report=report)
-        stub.ReportRqdStartup(request, timeout=rqd.rqconstants.RQD_TIMEOUT)
+        self.__getChannelPool().call('ReportRqdStartup', request, rqd.rqconstants.RQD_TIMEOUT)
 
     def reportStatus(self, report):
-        """Wraps the ability to send a status report to the cuebot via grpc"""
-        stub = self.__getReportStub()
+        """Wraps the ability to send a status report to the cuebot via grpc
+        @rtype:  rqd.compiled_proto.report_pb2.RqdReportStatusResponse
+        @return: The cuebot's acknowledgement of the report"""
+        if rqd.rqmetrics.isEnabled():
+            HOST_REPORT_SIZE.observe(report.ByteSize())
         request = rqd.compiled_proto.report_pb2.RqdReportStatusRequest(host_report=report)
-        stub.ReportStatus(request, timeout=rqd.rqconstants.RQD_TIMEOUT)
+        return self.__getChannelPool().call('ReportStatus', request, rqd.rqconstants.RQD_TIMEOUT)
 
     def reportRunningFrameCompletion(self, report):
         """Wraps the ability to send a running frame completion report
            to the cuebot via grpc"""
-        stub = self.__getReportStub()
         request = rqd.compiled_proto.report_pb2.RqdReportRunningFrameCompletionRequest(
             frame_complete_report=report)
-        stub.ReportRunningFrameCompletion(request, timeout=rqd.rqconstants.RQD_TIMEOUT)
+        self.__getChannelPool().call('ReportRunningFrameCompletion', request,
+                                     rqd.rqconstants.RQD_TIMEOUT)
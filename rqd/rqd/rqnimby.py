@@ -20,39 +20,44 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
-import os
-import select
+from builtins import object
 import time
 import signal
 import threading
 import logging as log
 
 import rqd.rqconstants
-import rqd.rqutil
+import rqd.rqinput
+import rqd.rqscheduler
 
 
-class Nimby(threading.Thread):
+class Nimby(object):
     """Nimby == Not In My Back Yard.
        If enabled, nimby will lock and kill all frames running on the host if
        keyboard or mouse activity is detected. If sufficient idle time has
        passed, defined in the Constants class, nimby will then unlock the host
-       and make it available for rendering."""
+       and make it available for rendering.
+
+       Input activity is timestamped by a rqd.rqinput.InputWatcher. Activity
+       on an unlocked host locks it, and while locked a single scheduled job
+       compares the idle time against MINIMUM_IDLE, sleeping until the
+       earliest time the host could unlock."""
 
     def __init__(self, rqCore):
         """Nimby initialization
         @type    rqCore: RqCore
         @param   rqCore: Main RQD Object"""
-        threading.Thread.__init__(self)
-
         self.rqCore = rqCore
 
         self.locked = False
         self.active = False
 
-        self.fileObjList = []
-        self.results = [[]]
+        self.watcher = None
 
-        self.thread = None
+        self.__lock = threading.Lock()
+        self.__idleCheckJob = None
+        self.__resourceJob = None
+        self.__startTime = rqd.rqscheduler.monotonic()
 
         signal.signal(signal.SIGINT, self.signalHandler)
 
@@ -75,103 +80,85 @@ class Nimby(threading.Thread):
             log.info("Unlocked nimby")
             self.rqCore.onNimbyUnlock(asOf=asOf)
 
-    def _openEvents(self):
-        """Opens the /dev/input/event* files so nimby can monitor them"""
-        self._closeEvents()
-
-        rqd.rqutil.permissionsHigh()
-        try:
-            for device in os.listdir("/dev/input/"):
-                if device.startswith("event") or device.startswith("mice"):
-                    log.debug("Found device: %s" % device)
-                    try:
-                        self.fileObjList.append(open("/dev/input/%s" % device, "rb"))
-                    except IOError as e:
-                        # Bad device found
-                        log.debug("IOError: Failed to open %s, %s" % ("/dev/input/%s" % device, e))
-        finally:
-            rqd.rqutil.permissionsLow()
-
-    def _closeEvents(self):
-        """Closes the /dev/input/event* files"""
-        log.debug("_closeEvents")
-        if self.fileObjList:
-            for fileObj in self.fileObjList:
-                try:
-                    fileObj.close()
-                except:
-                    pass
-            self.fileObjList = []
+    def idleSeconds(self):
+        """Returns the seconds since the last keyboard or mouse activity"""
+        if self.watcher is not None:
+            return self.watcher.idleSeconds()
+        return rqd.rqscheduler.monotonic() - self.__startTime
+
+    def onActivity(self):
+        """Called from the input watcher thread on user activity"""
+        if self.active and not self.locked:
+            self.rqCore.scheduler.runSoon('nimbyLock', self.lockedInUse, blocking=True)
 
     def lockedInUse(self):
         """Nimby State: Machine is in use, host is locked,
                         waiting for sufficient idle time"""
-        log.debug("lockedInUse")
-        self._openEvents()
-        try:
-            self.results = select.select(self.fileObjList, [], [], 5)
-        except:
-            pass
-        if self.active and self.results[0] == []:
-            self.lockedIdle()
-        elif self.active:
-            self._closeEvents()
-            self.thread = threading.Timer(rqd.rqconstants.CHECK_INTERVAL_LOCKED,
-                                          self.lockedInUse)
-            self.thread.start()
-
-    def lockedIdle(self):
-        """Nimby State: Machine is idle,
-                        waiting for sufficient idle time to unlock"""
-        self._openEvents()
-        waitStartTime = time.time()
-        try:
-            self.results = select.select(self.fileObjList, [], [],
-                                         rqd.rqconstants.MINIMUM_IDLE)
-        except:
-            pass
-        if self.active and self.results[0] == [] and \
-           self.rqCore.machine.isNimbySafeToUnlock():
-            self._closeEvents()
-            self.unlockNimby(asOf=waitStartTime)
-            self.unlockedIdle()
-        elif self.active:
-            self._closeEvents()
-            self.thread = threading.Timer(rqd.rqconstants.CHECK_INTERVAL_LOCKED,
-                                          self.lockedInUse)
-            self.thread.start()
-
-    def unlockedIdle(self):
-        """Nimby State: Machine is idle, host is unlocked,
-                        waiting for user activity"""
-        while self.active and \
-              self.results[0] == [] and \
-              self.rqCore.machine.isNimbySafeToRunJobs():
-            try:
-                self._openEvents()
-                self.results = select.select(self.fileObjList, [], [], 5)
-            except:
-                pass
-            if not self.rqCore.machine.isNimbySafeToRunJobs():
+        with self.__lock:
+            if self.active and not self.locked:
+                self.lockNimby()
+                self.__scheduleIdleCheck(rqd.rqconstants.MINIMUM_IDLE)
+
+    def checkIdle(self):
+        """Nimby State: Host is locked, unlocks it once it has been idle for
+                        MINIMUM_IDLE and resources allow running jobs"""
+        with self.__lock:
+            if not self.active or not self.locked:
+                return
+            idle = self.idleSeconds()
+            if idle < rqd.rqconstants.MINIMUM_IDLE:
+                self.__scheduleIdleCheck(rqd.rqconstants.MINIMUM_IDLE - idle)
+            elif self.rqCore.machine.isNimbySafeToUnlock():
+                self.unlockNimby(asOf=time.time() - idle)
+            else:
+                self.__scheduleIdleCheck(rqd.rqconstants.CHECK_INTERVAL_LOCKED)
+
+    def checkResources(self):
+        """Nimby State: Host is unlocked, locks it if memory runs low"""
+        with self.__lock:
+            if self.active and not self.locked and \
+                    not self.rqCore.machine.isNimbySafeToRunJobs():
                 log.warning("memory threshold has been exceeded, locking nimby")
-                self.active = True
+                self.lockNimby()
+                self.__scheduleIdleCheck(rqd.rqconstants.CHECK_INTERVAL_LOCKED)
 
-        if self.active:
-            self._closeEvents()
-            self.lockNimby()
-            self.thread = threading.Timer(rqd.rqconstants.CHECK_INTERVAL_LOCKED,
-                                          self.lockedInUse)
-            self.thread.start()
+    def __scheduleIdleCheck(self, delay):
+        """Checks again whether the host can unlock after delay seconds"""
+        if self.__idleCheckJob is not None:
+            self.__idleCheckJob.cancel()
+        self.__idleCheckJob = self.rqCore.scheduler.scheduleOnce(
+            'nimby', delay, self.checkIdle, blocking=True)
 
     def run(self):
-        """Starts the Nimby thread"""
-        self.active = True
-        self.unlockedIdle()
+        """Starts watching for user activity, the host starts unlocked"""
+        with self.__lock:
+            if self.active:
+                return
+            self.active = True
+            self.__startTime = rqd.rqscheduler.monotonic()
+            if rqd.rqinput.InputWatcher.isSupported():
+                self.watcher = rqd.rqinput.InputWatcher(self.onActivity)
+                self.watcher.open()
+                self.watcher.start()
+                log.info("Watching %d input devices" % self.watcher.deviceCount())
+            else:
+                log.warning("Input devices can not be watched on this host, "
+                            "nimby will only lock on low memory")
+            self.__resourceJob = self.rqCore.scheduler.schedulePeriodic(
+                'nimbyResources', rqd.rqconstants.CHECK_INTERVAL_RESOURCES,
+                self.checkResources, initialDelay=0, blocking=True)
 
     def stop(self):
-        """Stops the Nimby thread"""
-        if self.thread:
-            self.thread.cancel()
-        self.active = False
-        self._closeEvents()
+        """Stops watching for user activity and unlocks the host"""
+        with self.__lock:
+            self.active = False
+            for job in (self.__idleCheckJob, self.__resourceJob):
+                if job is not None:
+                    job.cancel()
+            self.__idleCheckJob = None
+            self.__resourceJob = None
+            watcher = self.watcher
+            self.watcher = None
+        if watcher is not None:
+            watcher.stop()
         self.unlockNimby()
@@ -0,0 +1,202 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Memory pressure based admission control and preemption.
+
+The host's memory pressure is sampled from /proc/pressure/memory (PSI) and
+/proc/meminfo. While pressure stays high for RQD_PRESSURE_SUSTAIN_SEC new
+launches are refused. Under critical pressure the frame furthest over its
+memory reservation is killed and reported with
+EXITSTATUS_FOR_MEMORY_PREEMPT, before the kernel's OOM killer picks a victim
+of its own.
+
+Hosts without PSI (kernels before 4.20, or booted with psi=0) are judged on
+available memory alone.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import collections
+import logging as log
+import threading
+
+import rqd.rqconstants
+import rqd.rqmetrics
+import rqd.rqscheduler
+
+
+LEVEL_OK = 0
+LEVEL_HIGH = 1
+LEVEL_CRITICAL = 2
+
+LEVEL_NAMES = {LEVEL_OK: 'ok', LEVEL_HIGH: 'high', LEVEL_CRITICAL: 'critical'}
+
+# PSI values are the percentage of the last 10 seconds tasks were stalled on
+# memory, memory values are in kB. The psi values are None without PSI.
+PressureSample = collections.namedtuple(
+    'PressureSample', ['someAvg10', 'fullAvg10', 'memAvailable', 'memTotal'])
+
+REFUSED_LAUNCHES = rqd.rqmetrics.counter(
+    'rqd_memory_pressure_refused_launches_total', 'Launches refused under memory pressure')
+PREEMPTIONS = rqd.rqmetrics.counter(
+    'rqd_memory_pressure_preemptions_total', 'Frames killed under critical memory pressure')
+
+
+def readPsi(path=None):
+    """Reads the avg10 values of the memory pressure file
+    @type  path: str
+    @param path: Path of /proc/pressure/memory
+    @rtype:  tuple
+    @return: The some and full avg10 percentages, None if PSI is unavailable"""
+    values = {}
+    try:
+        with open(path or rqd.rqconstants.PATH_PRESSURE_MEMORY) as psiFile:
+            for line in psiFile:
+                fields = line.split()
+                if not fields:
+                    continue
+                stats = dict(field.split('=', 1) for field in fields[1:])
+                values[fields[0]] = float(stats['avg10'])
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+    if 'some' not in values:
+        return None
+    return values['some'], values.get('full', 0.0)
+
+
+def readMemInfo(path=None):
+    """Reads the available and total memory
+    @type  path: str
+    @param path: Path of /proc/meminfo
+    @rtype:  tuple
+    @return: MemAvailable and MemTotal in kB"""
+    values = {}
+    with open(path or rqd.rqconstants.PATH_MEMINFO) as meminfoFile:
+        for line in meminfoFile:
+            fields = line.split()
+            if len(fields) >= 2:
+                values[fields[0].rstrip(':')] = int(fields[1])
+    available = values.get('MemAvailable')
+    if available is None:
+        # Kernels before 3.14
+        available = values.get('MemFree', 0) + values.get('Cached', 0)
+    return available, values['MemTotal']
+
+
+def sample():
+    """Samples the host's current memory pressure
+    @rtype:  PressureSample
+    @return: The current pressure"""
+    psi = readPsi() or (None, None)
+    memAvailable, memTotal = readMemInfo()
+    return PressureSample(psi[0], psi[1], memAvailable, memTotal)
+
+
+def pressureLevel(pressure):
+    """Classifies a sample against the configured thresholds
+    @type  pressure: PressureSample
+    @param pressure: A sample of the host's pressure
+    @rtype:  int
+    @return: LEVEL_OK, LEVEL_HIGH or LEVEL_CRITICAL"""
+    availablePercent = 100.0 * pressure.memAvailable / max(pressure.memTotal, 1)
+    if availablePercent < rqd.rqconstants.RQD_PRESSURE_CRITICAL_AVAILABLE_PERCENT or (
+            pressure.fullAvg10 is not None
+            and pressure.fullAvg10 >= rqd.rqconstants.RQD_PRESSURE_CRITICAL_FULL_AVG10):
+        return LEVEL_CRITICAL
+    if availablePercent < rqd.rqconstants.RQD_PRESSURE_HIGH_AVAILABLE_PERCENT or (
+            pressure.someAvg10 is not None
+            and pressure.someAvg10 >= rqd.rqconstants.RQD_PRESSURE_HIGH_SOME_AVG10):
+        return LEVEL_HIGH
+    return LEVEL_OK
+
+
+class MemoryPressureMonitor(object):
+    """Samples memory pressure on the scheduler and decides whether frames
+    may be launched."""
+
+    def __init__(self, scheduler, preemptFunc, sampleFunc=sample):
+        """MemoryPressureMonitor class initialization
+        @type  scheduler: rqd.rqscheduler.Scheduler
+        @param scheduler: The scheduler samples run on
+        @type  preemptFunc: function
+        @param preemptFunc: Kills one frame to relieve critical pressure
+        @type  sampleFunc: function
+        @param sampleFunc: Returns the current PressureSample"""
+        self.__scheduler = scheduler
+        self.__preemptFunc = preemptFunc
+        self.__sampleFunc = sampleFunc
+        self.__lock = threading.Lock()
+        self.__job = None
+        self.__highSince = None
+        self.__lastPreempt = None
+        self.level = LEVEL_OK
+        self.pressure = None
+
+    def start(self):
+        """Starts sampling every RQD_PRESSURE_SAMPLE_SEC"""
+        self.__job = self.__scheduler.schedulePeriodic(
+            'memoryPressure', rqd.rqconstants.RQD_PRESSURE_SAMPLE_SEC, self.update,
+            initialDelay=0)
+
+    def stop(self):
+        if self.__job is not None:
+            self.__job.cancel()
+            self.__job = None
+
+    def isLaunchAllowed(self):
+        """Returns False while pressure has been high for longer than
+        RQD_PRESSURE_SUSTAIN_SEC"""
+        with self.__lock:
+            return not self.__sustainedLocked(rqd.rqscheduler.monotonic())
+
+    def update(self):
+        """Takes a sample, and preempts a frame if pressure is critical"""
+        try:
+            pressure = self.__sampleFunc()
+        except (IOError, OSError, KeyError, ValueError) as e:
+            log.warning('Unable to sample memory pressure: %s' % e)
+            return
+        level = pressureLevel(pressure)
+        now = rqd.rqscheduler.monotonic()
+
+        with self.__lock:
+            if level != self.level:
+                log.warning('Memory pressure is %s: %s' % (LEVEL_NAMES[level], pressure))
+            self.level = level
+            self.pressure = pressure
+            if level == LEVEL_OK:
+                self.__highSince = None
+            elif self.__highSince is None:
+                self.__highSince = now
+
+            preempt = level == LEVEL_CRITICAL and (
+                self.__lastPreempt is None
+                or now - self.__lastPreempt >= rqd.rqconstants.RQD_PRESSURE_PREEMPT_COOLDOWN_SEC)
+            if preempt:
+                # Wait for the killed frame's memory to be freed before
+                # choosing another
+                self.__lastPreempt = now
+
+        if preempt and self.__preemptFunc():
+            PREEMPTIONS.inc()
+
+    def __sustainedLocked(self, now):
+        return (self.__highSince is not None
+                and now - self.__highSince >= rqd.rqconstants.RQD_PRESSURE_SUSTAIN_SEC)
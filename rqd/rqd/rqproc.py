@@ -0,0 +1,264 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Single pass /proc scanner used for per-frame resource accounting.
+
+Every pid's stat line is read once per scan and only converted into a
+ProcStat record when its session belongs to a running frame, so the cost
+of a scan is O(pids) rather than O(frames * pids).
+
+The I/O counters of /proc/<pid>/io are read only for frame processes, as
+root since the file is only readable by those allowed to ptrace the
+process. They are lost when a process exits, so IoAccounting adds up the growth of every
+process it has seen to keep a frame's totals from going backwards.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import collections
+import errno
+import logging as log
+import os
+
+import rqd.rqconstants
+import rqd.rqutil
+
+
+# Fields are numeric except for comm. Times are in jiffies, vsize is in
+# bytes and rss is in pages, as documented in "man proc".
+ProcStat = collections.namedtuple(
+    'ProcStat',
+    ['pid', 'ppid', 'session', 'comm', 'utime', 'stime', 'cutime', 'cstime',
+     'startTime', 'vsize', 'rss'])
+
+# Counters of /proc/<pid>/io. The chars count every byte through read and
+# write calls, including network and cached reads, the bytes only what
+# reached the storage layer (NFS included).
+ProcIo = collections.namedtuple(
+    'ProcIo', ['readChars', 'writeChars', 'readBytes', 'writeBytes', 'syscr', 'syscw'])
+
+NO_IO = ProcIo(0, 0, 0, 0, 0, 0)
+
+IO_FIELDS = {
+    'rchar': 'readChars',
+    'wchar': 'writeChars',
+    'read_bytes': 'readBytes',
+    'write_bytes': 'writeBytes',
+    'syscr': 'syscr',
+    'syscw': 'syscw',
+}
+
+# Frame attribute names of the totals and of the per second rates
+IO_ATTRIBUTES = (
+    ('readChars', 'io_read_chars'),
+    ('writeChars', 'io_write_chars'),
+    ('readBytes', 'io_read_bytes'),
+    ('writeBytes', 'io_write_bytes'),
+    ('syscr', 'io_syscr'),
+    ('syscw', 'io_syscw'),
+)
+
+
+def parseStat(pid, line):
+    """Parses a /proc/<pid>/stat line into a ProcStat record.
+    The command name may contain spaces and parentheses so the fields are
+    located relative to the last closing parenthesis.
+    @type  pid: int
+    @param pid: The pid the stat line belongs to
+    @type  line: str
+    @param line: Contents of /proc/<pid>/stat
+    @rtype:  ProcStat
+    @return: The parsed record"""
+    commEnd = line.rfind(')')
+    fields = line[commEnd + 2:].split()
+    return ProcStat(
+        pid=pid,
+        ppid=int(fields[1]),
+        session=int(fields[3]),
+        comm=line[line.find('(') + 1:commEnd],
+        utime=int(fields[11]),
+        stime=int(fields[12]),
+        cutime=int(fields[13]),
+        cstime=int(fields[14]),
+        startTime=int(fields[19]),
+        vsize=int(fields[20]),
+        rss=int(fields[21]))
+
+
+def parseIo(text):
+    """Parses the contents of /proc/<pid>/io into a ProcIo record.
+    @type  text: str
+    @param text: Contents of /proc/<pid>/io
+    @rtype:  ProcIo
+    @return: The parsed counters"""
+    values = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(':')
+        if key in IO_FIELDS:
+            values[IO_FIELDS[key]] = int(value)
+    return NO_IO._replace(**values)
+
+
+class IoAccounting(object):
+    """A frame's I/O totals and rates, accumulated across its processes."""
+
+    def __init__(self):
+        self.totals = NO_IO
+        self.rates = NO_IO
+        self.__lastByPid = {}
+        self.__lastTime = None
+
+    def update(self, samples, now):
+        """Adds the growth of each process since its previous sample.
+        @type  samples: dict
+        @param samples: Pid to the ProcIo currently read for it
+        @type  now: float
+        @param now: Time of the samples"""
+        totals = list(self.totals)
+        for pid, io in samples.items():
+            last = self.__lastByPid.get(pid, NO_IO)
+            if any(value < lastValue for value, lastValue in zip(io, last)):
+                # The pid was reused by a new process
+                last = NO_IO
+            for i, (value, lastValue) in enumerate(zip(io, last)):
+                totals[i] += value - lastValue
+        self.__lastByPid = samples
+
+        totals = ProcIo(*totals)
+        if self.__lastTime is not None and now > self.__lastTime:
+            elapsed = now - self.__lastTime
+            self.rates = ProcIo(*[(value - lastValue) / elapsed
+                                  for value, lastValue in zip(totals, self.totals)])
+        self.totals = totals
+        self.__lastTime = now
+
+    def addExited(self, readBytes, writeBytes):
+        """Raises the storage totals to the exited frame's rusage, which
+        also counts processes that exited between samples.
+        @type  readBytes: int
+        @param readBytes: ru_inblock in bytes
+        @type  writeBytes: int
+        @param writeBytes: ru_oublock in bytes"""
+        self.totals = self.totals._replace(
+            readBytes=max(self.totals.readBytes, readBytes),
+            writeBytes=max(self.totals.writeBytes, writeBytes))
+        self.rates = NO_IO
+
+    def attributes(self):
+        """Returns the totals and per second rates as frame attributes
+        @rtype:  dict
+        @return: Attribute name to value"""
+        attributes = {}
+        for field, name in IO_ATTRIBUTES:
+            attributes[name] = str(getattr(self.totals, field))
+            attributes[name + '_per_sec'] = str(int(getattr(self.rates, field)))
+        return attributes
+
+
+class ProcScanner(object):
+    """Reads /proc once per scan and groups the processes by session id."""
+
+    def __init__(self, procPath=None):
+        """ProcScanner class initialization
+        @type  procPath: str
+        @param procPath: Root of the proc filesystem, defaults to PATH_PROC"""
+        self.procPath = procPath or rqd.rqconstants.PATH_PROC
+        self.__ioDenied = False
+
+    def listPids(self):
+        """Returns the pids currently listed in the proc filesystem
+        @rtype:  list
+        @return: List of pids as strings"""
+        return [entry for entry in os.listdir(self.procPath) if entry.isdigit()]
+
+    def readStat(self, pid):
+        """Returns the raw stat line for a pid or None if it has exited
+        @type  pid: str
+        @param pid: The pid to read
+        @rtype:  str
+        @return: Contents of /proc/<pid>/stat"""
+        try:
+            with open(os.path.join(self.procPath, pid, 'stat'), 'r') as statFile:
+                return statFile.read()
+        except (IOError, OSError):
+            # The process exited between listdir and open
+            return None
+
+    def readIo(self, pid):
+        """Returns the I/O counters of a pid or None if they can not be read
+        @type  pid: int
+        @param pid: The pid to read
+        @rtype:  ProcIo
+        @return: Contents of /proc/<pid>/io"""
+        try:
+            with open(os.path.join(self.procPath, str(pid), 'io'), 'r') as ioFile:
+                return parseIo(ioFile.read())
+        except (IOError, OSError) as e:
+            if e.errno in (errno.EACCES, errno.EPERM) and not self.__ioDenied:
+                self.__ioDenied = True
+                log.warning('Unable to read the I/O counters of frame processes, '
+                            'frame I/O will not be reported: %s' % e)
+            # Otherwise the process exited, or io accounting is not enabled
+            return None
+        except ValueError:
+            return None
+
+    def readIoOf(self, pids):
+        """Returns the I/O counters of the pids that could be read, read as
+        root as the frames belong to other users
+        @type  pids: iterable
+        @param pids: The pids to read
+        @rtype:  dict
+        @return: Pid to ProcIo"""
+        samples = {}
+        rqd.rqutil.permissionsHigh()
+        try:
+            for pid in pids:
+                io = self.readIo(pid)
+                if io is not None:
+                    samples[int(pid)] = io
+        finally:
+            rqd.rqutil.permissionsLow()
+        return samples
+
+    def scan(self, sessions):
+        """Groups the processes belonging to the given sessions.
+        @type  sessions: iterable
+        @param sessions: Session ids (the frame's pid) to collect
+        @rtype:  dict
+        @return: Dictionary of session id to a list of ProcStat records"""
+        wanted = set(sessions)
+        bySession = dict((session, []) for session in wanted)
+        if not wanted:
+            return bySession
+
+        for pid in self.listPids():
+            line = self.readStat(pid)
+            if not line:
+                continue
+            try:
+                # Cheap session check before converting every field
+                commEnd = line.rfind(')')
+                session = int(line[commEnd + 2:].split(None, 4)[3])
+                if session in wanted:
+                    bySession[session].append(parseStat(int(pid), line))
+            except (ValueError, IndexError):
+                log.warning('Failed to parse stat file for pid %s', pid)
+        return bySession
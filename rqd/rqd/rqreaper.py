@@ -0,0 +1,134 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Event driven frame reaper.
+
+A single thread waits on a pidfd per running frame with epoll. When a frame
+exits it is reaped with wait4, which also collects its rusage, and the
+completion handling is dispatched to a small worker pool. The number of
+threads therefore no longer grows with the number of running frames.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from concurrent import futures
+import logging as log
+import os
+import platform
+import select
+import sys
+import threading
+import traceback
+
+import rqd.rqconstants
+
+
+def exitCode(status):
+    """Converts a wait status into a subprocess style return code,
+    negative when the process was killed by a signal."""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class FrameReaper(threading.Thread):
+    """Waits for frame processes to exit and dispatches their completion."""
+
+    def __init__(self, maxWorkers=None):
+        """FrameReaper class initialization
+        @type  maxWorkers: int
+        @param maxWorkers: Size of the completion worker pool"""
+        threading.Thread.__init__(self, name='FrameReaper')
+        self.daemon = True
+        self.__lock = threading.Lock()
+        self.__active = True
+        self.__waiting = {}
+        self.__epoll = select.epoll()
+        self.__wakeRead, self.__wakeWrite = os.pipe()
+        self.__epoll.register(self.__wakeRead, select.EPOLLIN)
+        self.__pool = futures.ThreadPoolExecutor(
+            max_workers=maxWorkers or rqd.rqconstants.RQD_REAPER_WORKERS)
+
+    @staticmethod
+    def isSupported():
+        """Returns True if pidfds and epoll are available on this host"""
+        return (platform.system() == 'Linux'
+                and hasattr(os, 'pidfd_open')
+                and hasattr(os, 'wait4')
+                and hasattr(select, 'epoll'))
+
+    def register(self, pid, callback):
+        """Waits for a child process to exit.
+        @type  pid: int
+        @param pid: Pid of a child process of rqd that has not been waited on
+        @type  callback: function
+        @param callback: Called from the worker pool as callback(returncode, rusage)"""
+        pidfd = os.pidfd_open(pid)
+        with self.__lock:
+            self.__waiting[pidfd] = (pid, callback)
+        self.__epoll.register(pidfd, select.EPOLLIN)
+
+    def waitingCount(self):
+        """Returns the number of processes waiting to exit"""
+        with self.__lock:
+            return len(self.__waiting)
+
+    def run(self):
+        """Reaper loop, runs until stop() is called"""
+        while self.__active:
+            try:
+                events = self.__epoll.poll()
+            except (IOError, OSError) as e:
+                # Interrupted by a signal
+                log.debug('Reaper poll interrupted: %s' % e)
+                continue
+            for fd, _ in events:
+                if fd == self.__wakeRead:
+                    os.read(self.__wakeRead, 64)
+                    continue
+                self.__reap(fd)
+
+    def stop(self):
+        """Stops the reaper loop and waits for running completions"""
+        self.__active = False
+        os.write(self.__wakeWrite, b'x')
+        self.__pool.shutdown(wait=True)
+
+    def __reap(self, pidfd):
+        with self.__lock:
+            pid, callback = self.__waiting.pop(pidfd)
+        self.__epoll.unregister(pidfd)
+        os.close(pidfd)
+
+        try:
+            _, status, rusage = os.wait4(pid, 0)
+            returncode = exitCode(status)
+        except OSError as e:
+            log.warning('Unable to reap pid %d: %s' % (pid, e))
+            returncode, rusage = None, None
+
+        self.__pool.submit(self.__dispatch, callback, pid, returncode, rusage)
+
+    @staticmethod
+    def __dispatch(callback, pid, returncode, rusage):
+        try:
+            callback(returncode, rusage)
+        except Exception as e:
+            log.critical('Completion handling failed for pid %d due to %s at %s' % (
+                pid, e, traceback.extract_tb(sys.exc_info()[2])))
@@ -0,0 +1,258 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Delta encoding of host status reports.
+
+Each status report carries a version. Once the cuebot acknowledges a
+version, later reports only carry what changed since that version: a
+RenderHost or frame that did not move meaningfully is replaced by a
+reference to the acknowledged copy, and unchanged attribute maps and process
+trees are left out. Numeric attributes sampled on every update, such as a
+frame's pcpu and io counters, are compared with the same threshold as the
+memory and load fields, the others must match exactly. A cuebot that does
+not understand deltas never acknowledges a version, so it keeps receiving
+full reports.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import threading
+
+import rqd.compiled_proto.report_pb2
+import rqd.rqconstants
+
+
+# Fields that move on every sample; changes smaller than
+# RQD_REPORT_CHANGE_THRESHOLD of their value are not reported
+HOST_VOLATILE_FIELDS = frozenset(['free_swap', 'free_mem', 'free_mcp', 'load'])
+FRAME_VOLATILE_FIELDS = frozenset(['rss', 'max_rss', 'vsize', 'max_vsize'])
+# Prefixes of the attributes that move on every sample, compared the same way
+HOST_VOLATILE_ATTRIBUTES = ('swapout', 'freeGpu')
+FRAME_VOLATILE_ATTRIBUTES = ('pcpu', 'io_', 'memory_current', 'memory_peak')
+DELTA_FIELDS = frozenset(
+    ['attributes', 'attributes_unchanged', 'processes', 'processes_unchanged'])
+
+
+def _isRepeated(field):
+    if hasattr(field, 'is_repeated'):
+        return field.is_repeated
+    return field.label == field.LABEL_REPEATED
+
+
+_COMPARED_FIELDS = {}
+
+
+def _comparedFields(descriptor, volatileFields):
+    """Returns the (name, repeated, volatile) fields compared for a message type"""
+    fields = _COMPARED_FIELDS.get(descriptor.full_name)
+    if fields is None:
+        fields = tuple((field.name, _isRepeated(field), field.name in volatileFields)
+                       for field in descriptor.fields if field.name not in DELTA_FIELDS)
+        _COMPARED_FIELDS[descriptor.full_name] = fields
+    return fields
+
+
+def processTree(frame):
+    """Returns what identifies a frame's process tree, the rss and cpu time
+    of its processes move on every sample and are left out
+    @type  frame: rqd.compiled_proto.report_pb2.RunningFrameInfo
+    @rtype:  tuple"""
+    return tuple((process.pid, process.ppid, process.cmd) for process in frame.processes)
+
+
+def messageChanged(old, new, volatileFields):
+    """Returns True if any field other than the attributes map and process
+    tree moved meaningfully between two messages of the same type.
+    @type  old: protobuf message
+    @param old: The acknowledged message
+    @type  new: protobuf message
+    @param new: The current message
+    @type  volatileFields: frozenset
+    @param volatileFields: Numeric fields compared with a threshold
+    @rtype:  bool"""
+    for name, repeated, volatile in _comparedFields(new.DESCRIPTOR, volatileFields):
+        oldValue = getattr(old, name)
+        newValue = getattr(new, name)
+        if repeated:
+            if list(oldValue) != list(newValue):
+                return True
+        elif volatile:
+            if isMeaningfulChange(oldValue, newValue):
+                return True
+        elif oldValue != newValue:
+            return True
+    return False
+
+
+def isMeaningfulChange(oldValue, newValue):
+    """Returns True if a value moved by more than RQD_REPORT_CHANGE_THRESHOLD
+    of its previous value"""
+    threshold = rqd.rqconstants.RQD_REPORT_CHANGE_THRESHOLD
+    return abs(newValue - oldValue) > threshold * max(abs(oldValue), 1)
+
+
+def attributesChanged(old, new, volatileAttributes):
+    """Returns True if an attribute was added, removed or moved meaningfully
+    between two attribute maps.
+    @type  old: dict
+    @param old: The acknowledged attributes
+    @type  new: dict
+    @param new: The current attributes
+    @type  volatileAttributes: tuple
+    @param volatileAttributes: Prefixes of the numeric attributes compared
+                               with a threshold
+    @rtype:  bool"""
+    if len(old) != len(new):
+        return True
+    for name, value in new.items():
+        if name not in old:
+            return True
+        oldValue = old[name]
+        if oldValue == value:
+            continue
+        if not name.startswith(volatileAttributes):
+            return True
+        try:
+            if isMeaningfulChange(float(oldValue), float(value)):
+                return True
+        except ValueError:
+            return True
+    return False
+
+
+class HostReportEncoder(object):
+    """Versions host reports and encodes them against the last report the
+    cuebot acknowledged."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__version = 0
+        self.__acked = None
+        self.__ackedVersion = 0
+        self.__pending = {}
+        self.__deltasSinceFull = 0
+
+    def reset(self):
+        """Forgets the acknowledged report so the next report is full, used
+        after a reconnect or a failed send"""
+        with self.__lock:
+            self.__acked = None
+            self.__ackedVersion = 0
+            self.__pending.clear()
+
+    def encode(self, report):
+        """Versions a full host report and returns the report to send.
+        @type  report: rqd.compiled_proto.report_pb2.HostReport
+        @param report: The full host report, it is not modified
+        @rtype:  rqd.compiled_proto.report_pb2.HostReport
+        @return: A full report or a delta against the acknowledged report"""
+        with self.__lock:
+            self.__version += 1
+            full = rqd.compiled_proto.report_pb2.HostReport()
+            full.CopyFrom(report)
+            full.report_version = self.__version
+
+            if (not rqd.rqconstants.RQD_USE_DELTA_REPORTS
+                    or self.__acked is None
+                    or self.__deltasSinceFull >= rqd.rqconstants.RQD_DELTA_REPORTS_BETWEEN_FULL):
+                self.__deltasSinceFull = 0
+                self.__pending[self.__version] = full
+                return full
+
+            delta, merged = self.__diff(self.__acked, full)
+            self.__deltasSinceFull += 1
+            self.__pending[self.__version] = merged
+            return delta
+
+    def acknowledge(self, version, response):
+        """Handles the cuebot's response to a status report.
+        @type  version: int
+        @param version: report_version of the report that was sent
+        @type  response: rqd.compiled_proto.report_pb2.RqdReportStatusResponse
+        @param response: The cuebot's response"""
+        with self.__lock:
+            merged = self.__pending.pop(version, None)
+            for pendingVersion in [v for v in self.__pending if v < version]:
+                del self.__pending[pendingVersion]
+
+            if response is None or response.request_full_report \
+                    or response.acknowledged_version != version or merged is None:
+                # Older cuebots never acknowledge, they keep getting full reports
+                self.__acked = None
+                self.__ackedVersion = 0
+                return
+
+            self.__acked = merged
+            self.__ackedVersion = version
+
+    def __diff(self, base, full):
+        """Returns the delta to send and the full report the cuebot will hold
+        once it has applied the delta"""
+        delta = rqd.compiled_proto.report_pb2.HostReport(
+            report_version=full.report_version,
+            base_version=self.__ackedVersion)
+        delta.core_info.CopyFrom(full.core_info)
+        merged = rqd.compiled_proto.report_pb2.HostReport()
+        merged.CopyFrom(full)
+
+        hostAttributesChanged = attributesChanged(
+            base.host.attributes, full.host.attributes, HOST_VOLATILE_ATTRIBUTES)
+        if hostAttributesChanged or \
+                messageChanged(base.host, full.host, HOST_VOLATILE_FIELDS):
+            delta.host.CopyFrom(full.host)
+            if not hostAttributesChanged:
+                delta.host.ClearField('attributes')
+                delta.host_attributes_unchanged = True
+                # The cuebot keeps the attributes it holds
+                merged.host.attributes.clear()
+                merged.host.attributes.update(base.host.attributes)
+        else:
+            delta.host.name = full.host.name
+            delta.host_unchanged = True
+            merged.host.CopyFrom(base.host)
+
+        baseFrames = dict((frame.frame_id, frame) for frame in base.frames)
+        for frame, mergedFrame in zip(full.frames, merged.frames):
+            old = baseFrames.get(frame.frame_id)
+            if old is None:
+                delta.frames.add().CopyFrom(frame)
+                continue
+            frameAttributesChanged = attributesChanged(
+                old.attributes, frame.attributes, FRAME_VOLATILE_ATTRIBUTES)
+            treeChanged = processTree(old) != processTree(frame)
+            if not frameAttributesChanged and not treeChanged and \
+                    not messageChanged(old, frame, FRAME_VOLATILE_FIELDS):
+                delta.unchanged_frame_ids.append(frame.frame_id)
+                mergedFrame.CopyFrom(old)
+                continue
+            changed = delta.frames.add()
+            changed.CopyFrom(frame)
+            if not frameAttributesChanged:
+                changed.ClearField('attributes')
+                changed.attributes_unchanged = True
+                mergedFrame.attributes.clear()
+                mergedFrame.attributes.update(old.attributes)
+            if not treeChanged and frame.processes:
+                changed.ClearField('processes')
+                changed.processes_unchanged = True
+                del mergedFrame.processes[:]
+                mergedFrame.processes.extend(old.processes)
+
+        return delta, merged
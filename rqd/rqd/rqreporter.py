@@ -0,0 +1,155 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Decides when rqd sends its status report to the cuebot.
+
+Significant events (a frame exiting and releasing its cores, cores being
+locked or unlocked, nimby locking the host) push a report right away. Events arriving within
+RQD_REPORT_COALESCE_SEC of the last report are held and sent together once
+the window has passed. Without events the interval grows from
+RQD_MIN_PING_INTERVAL_SEC toward RQD_MAX_PING_INTERVAL_SEC.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import logging as log
+import random
+import sys
+import threading
+import traceback
+
+import rqd.rqconstants
+import rqd.rqmetrics
+import rqd.rqscheduler
+
+
+REASON_INTERVAL = 'interval'
+REASON_FRAME_EXIT = 'frameExit'
+REASON_CORES_LOCKED = 'coresLocked'
+REASON_CORES_UNLOCKED = 'coresUnlocked'
+REASON_NIMBY_LOCK = 'nimbyLock'
+REASON_NIMBY_UNLOCK = 'nimbyUnlock'
+
+# Fraction of the interval removed at random so hosts do not report in step
+JITTER = 0.1
+
+REPORTS_SENT = rqd.rqmetrics.counter(
+    'rqd_status_reports_total', 'Status reports sent, by the event that triggered them',
+    labelName='trigger')
+REPORT_EVENTS = rqd.rqmetrics.counter(
+    'rqd_status_report_events_total', 'Events that requested a status report, by reason',
+    labelName='reason')
+REPORT_FAILURES = rqd.rqmetrics.counter(
+    'rqd_status_report_failures_total', 'Status reports that could not be sent')
+
+
+class StatusReporter(object):
+    """Schedules status reports on the shared scheduler."""
+
+    def __init__(self, scheduler, sendFunc):
+        """StatusReporter class initialization
+        @type  scheduler: rqd.rqscheduler.Scheduler
+        @param scheduler: The scheduler the reports run on
+        @type  sendFunc: function
+        @param sendFunc: Sends one status report, raises on failure"""
+        self.__scheduler = scheduler
+        self.__sendFunc = sendFunc
+        self.__lock = threading.Lock()
+        self.__reasons = []
+        self.__job = None
+        self.__lastSent = None
+        self.__sending = False
+        self.interval = rqd.rqconstants.RQD_MIN_PING_INTERVAL_SEC
+
+    def start(self):
+        """Schedules the first report, sent after the minimum interval"""
+        with self.__lock:
+            self.interval = rqd.rqconstants.RQD_MIN_PING_INTERVAL_SEC
+            if self.__job is None:
+                self.__job = self.__scheduler.scheduleOnce(
+                    'statusReport', self.__delayLocked(), self.__report, blocking=True)
+            else:
+                self.__scheduler.reschedule(self.__job, self.__delayLocked())
+
+    def stop(self):
+        """Cancels the pending report"""
+        with self.__lock:
+            if self.__job is not None:
+                self.__job.cancel()
+                self.__job = None
+
+    def notify(self, reason):
+        """Requests a report because of an event. The report is sent at once
+        unless one was sent within the coalesce window.
+        @type  reason: str
+        @param reason: One of the REASON_* values"""
+        REPORT_EVENTS.inc(label=reason)
+        with self.__lock:
+            self.__reasons.append(reason)
+            self.interval = rqd.rqconstants.RQD_MIN_PING_INTERVAL_SEC
+            if self.__job is None or self.__sending:
+                # Picked up when started or when the running report finishes
+                return
+            delay = self.__coalesceDelayLocked()
+            if self.__job.timeUntilDue() > delay:
+                self.__scheduler.reschedule(self.__job, delay)
+
+    def pendingReasons(self):
+        """Returns the reasons waiting for the next report"""
+        with self.__lock:
+            return list(self.__reasons)
+
+    def __coalesceDelayLocked(self):
+        if self.__lastSent is None:
+            return 0
+        sinceLast = rqd.rqscheduler.monotonic() - self.__lastSent
+        return max(0, rqd.rqconstants.RQD_REPORT_COALESCE_SEC - sinceLast)
+
+    def __delayLocked(self):
+        if self.__reasons:
+            return self.__coalesceDelayLocked()
+        return self.interval * random.uniform(1 - JITTER, 1)
+
+    def __report(self):
+        with self.__lock:
+            reasons = self.__reasons
+            self.__reasons = []
+            self.__lastSent = rqd.rqscheduler.monotonic()
+            self.__sending = True
+
+        trigger = reasons[0] if reasons else REASON_INTERVAL
+        try:
+            self.__sendFunc()
+            REPORTS_SENT.inc(label=trigger)
+            log.debug('Sent status report for %s, %d events coalesced' % (trigger, len(reasons)))
+        except Exception as e:
+            REPORT_FAILURES.inc()
+            reasons = None
+            log.critical('Unable to send status report due to {0} at {1}'.format(
+                e, traceback.extract_tb(sys.exc_info()[2])))
+
+        with self.__lock:
+            self.__sending = False
+            if not reasons:
+                # Quiet host or failed report, back off toward the max interval
+                self.interval = min(self.interval * rqd.rqconstants.RQD_REPORT_BACKOFF_FACTOR,
+                                    rqd.rqconstants.RQD_MAX_PING_INTERVAL_SEC)
+            if self.__job is not None:
+                self.__scheduler.reschedule(self.__job, self.__delayLocked())
@@ -0,0 +1,272 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Monotonic clock scheduler for rqd's periodic and deferred work.
+
+All jobs are kept in a single timer heap serviced by one thread. Short jobs
+run on the scheduler thread; jobs that may block (network calls, nimby
+waits) are flagged as blocking and run on a small worker pool, and a
+blocking periodic job never overlaps itself.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+from concurrent import futures
+import heapq
+import itertools
+import logging as log
+import sys
+import threading
+import time
+import traceback
+
+import rqd.rqconstants
+import rqd.rqmetrics
+
+
+monotonic = getattr(time, 'monotonic', time.time)
+
+JOB_DRIFT = rqd.rqmetrics.histogram(
+    'rqd_scheduler_drift_seconds', 'Time scheduled jobs started after they were due, by job',
+    labelName='job')
+JOB_RUN_TIME = rqd.rqmetrics.histogram(
+    'rqd_scheduler_run_seconds', 'Time taken by scheduled jobs, by job', labelName='job')
+
+
+class Job(object):
+    """A scheduled unit of work and its timing statistics."""
+
+    def __init__(self, scheduler, name, func, interval, blocking):
+        self.__scheduler = scheduler
+        self.name = name
+        self.func = func
+        # None for one-shot jobs, a number or a function returning the
+        # next interval for periodic jobs
+        self.interval = interval
+        self.blocking = blocking
+        self.dueTime = 0
+        self.seq = None
+        self.cancelled = False
+        self.running = False
+
+        self.runs = 0
+        self.skipped = 0
+        self.lastDrift = 0.0
+        self.maxDrift = 0.0
+        self.lastRunTime = 0.0
+        self.maxRunTime = 0.0
+
+    def isPeriodic(self):
+        return self.interval is not None
+
+    def nextInterval(self):
+        if callable(self.interval):
+            return self.interval()
+        return self.interval
+
+    def timeUntilDue(self):
+        """Returns the seconds until the job next runs"""
+        return self.dueTime - monotonic()
+
+    def cancel(self):
+        """Cancels the job, it will not run again"""
+        self.__scheduler.cancel(self)
+
+    def stats(self):
+        """Returns the job's timing statistics as a dictionary"""
+        return {
+            'name': self.name,
+            'runs': self.runs,
+            'skipped': self.skipped,
+            'lastDrift': self.lastDrift,
+            'maxDrift': self.maxDrift,
+            'lastRunTime': self.lastRunTime,
+            'maxRunTime': self.maxRunTime,
+        }
+
+
+class Scheduler(threading.Thread):
+    """Runs jobs from a timer heap on a single thread."""
+
+    def __init__(self, maxWorkers=None):
+        """Scheduler class initialization
+        @type  maxWorkers: int
+        @param maxWorkers: Size of the pool running blocking jobs"""
+        threading.Thread.__init__(self, name='Scheduler')
+        self.daemon = True
+        self.__condition = threading.Condition()
+        self.__heap = []
+        self.__counter = itertools.count()
+        self.__jobs = set()
+        self.__soon = {}
+        self.__active = True
+        self.__pool = futures.ThreadPoolExecutor(
+            max_workers=maxWorkers or rqd.rqconstants.RQD_SCHEDULER_WORKERS)
+
+    def schedulePeriodic(self, name, interval, func, initialDelay=None, blocking=False):
+        """Runs func every interval seconds.
+        @type  name: str
+        @param name: Name used in logs and statistics
+        @type  interval: float or function
+        @param interval: Seconds between runs, or a function returning them
+        @type  func: function
+        @param func: The work to run
+        @type  initialDelay: float
+        @param initialDelay: Seconds until the first run, defaults to interval
+        @type  blocking: bool
+        @param blocking: Run on the worker pool instead of the scheduler thread
+        @rtype:  Job
+        @return: The scheduled job"""
+        job = Job(self, name, func, interval, blocking)
+        if initialDelay is None:
+            initialDelay = job.nextInterval()
+        self.__push(job, monotonic() + initialDelay)
+        return job
+
+    def scheduleOnce(self, name, delay, func, blocking=False):
+        """Runs func once after delay seconds.
+        @rtype:  Job
+        @return: The scheduled job"""
+        job = Job(self, name, func, None, blocking)
+        self.__push(job, monotonic() + delay)
+        return job
+
+    def runSoon(self, name, func, delay=0, blocking=False):
+        """Runs func after delay seconds, coalescing with a pending request
+        of the same name that has not started yet.
+        @rtype:  Job
+        @return: The pending job"""
+        with self.__condition:
+            job = self.__soon.get(name)
+            if job is not None and not job.cancelled and job.runs == 0 and not job.running:
+                return job
+            job = Job(self, name, func, None, blocking)
+            self.__soon[name] = job
+            self.__pushLocked(job, monotonic() + delay)
+            return job
+
+    def reschedule(self, job, delay):
+        """Moves the next run of a job to delay seconds from now"""
+        with self.__condition:
+            if not job.cancelled:
+                self.__pushLocked(job, monotonic() + delay)
+
+    def cancel(self, job):
+        """Cancels a job. A job that is already running is allowed to finish."""
+        with self.__condition:
+            job.cancelled = True
+            job.seq = None
+            self.__jobs.discard(job)
+            if self.__soon.get(job.name) is job:
+                del self.__soon[job.name]
+            self.__condition.notify()
+
+    def getStats(self):
+        """Returns the timing statistics of every scheduled job"""
+        with self.__condition:
+            return sorted((job.stats() for job in self.__jobs), key=lambda stat: stat['name'])
+
+    def stop(self):
+        """Stops the scheduler, pending jobs are discarded"""
+        with self.__condition:
+            self.__active = False
+            self.__condition.notify()
+        self.__pool.shutdown(wait=False)
+
+    def run(self):
+        """Scheduler loop, runs until stop() is called"""
+        while True:
+            with self.__condition:
+                job = None
+                while self.__active and job is None:
+                    if not self.__heap:
+                        self.__condition.wait()
+                        continue
+                    dueTime, seq, candidate = self.__heap[0]
+                    if candidate.seq != seq:
+                        # Cancelled or rescheduled
+                        heapq.heappop(self.__heap)
+                        continue
+                    now = monotonic()
+                    if dueTime > now:
+                        self.__condition.wait(dueTime - now)
+                        continue
+                    heapq.heappop(self.__heap)
+                    job = candidate
+                    job.seq = None
+                    if not job.isPeriodic():
+                        self.__jobs.discard(job)
+                if not self.__active:
+                    return
+            self.__dispatch(job, dueTime)
+
+    def __push(self, job, dueTime):
+        with self.__condition:
+            self.__pushLocked(job, dueTime)
+
+    def __pushLocked(self, job, dueTime):
+        job.dueTime = dueTime
+        job.seq = next(self.__counter)
+        self.__jobs.add(job)
+        heapq.heappush(self.__heap, (dueTime, job.seq, job))
+        self.__condition.notify()
+
+    def __dispatch(self, job, dueTime):
+        now = monotonic()
+        job.lastDrift = now - dueTime
+        job.maxDrift = max(job.maxDrift, job.lastDrift)
+        JOB_DRIFT.observe(job.lastDrift, label=job.name)
+        if job.lastDrift > rqd.rqconstants.RQD_SCHEDULER_MAX_DRIFT_SEC:
+            log.warning('Scheduled job %s started %.2f seconds late' % (job.name, job.lastDrift))
+
+        if job.running:
+            # The previous run of a blocking job has not finished yet
+            job.skipped += 1
+            log.warning('Skipping %s, previous run is still in progress' % job.name)
+        elif job.blocking:
+            job.running = True
+            self.__pool.submit(self.__runJob, job)
+        else:
+            job.running = True
+            self.__runJob(job)
+
+        if job.isPeriodic():
+            with self.__condition:
+                if not job.cancelled and job.seq is None:
+                    # Keep the original cadence unless we have fallen a full
+                    # interval behind
+                    interval = job.nextInterval()
+                    nextDue = max(dueTime + interval, monotonic())
+                    self.__pushLocked(job, nextDue)
+
+    @staticmethod
+    def __runJob(job):
+        start = monotonic()
+        try:
+            job.func()
+        except Exception as e:
+            log.critical('Scheduled job %s failed due to %s at %s' % (
+                job.name, e, traceback.extract_tb(sys.exc_info()[2])))
+        finally:
+            job.lastRunTime = monotonic() - start
+            job.maxRunTime = max(job.maxRunTime, job.lastRunTime)
+            JOB_RUN_TIME.observe(job.lastRunTime, label=job.name)
+            job.runs += 1
+            job.running = False
@@ -0,0 +1,321 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Per-job scratch cache shared by the frames of a job on this host.
+
+Each job gets a directory under RQD_SCRATCH_PATH, handed to its frames in
+CUE_SCRATCH_DIR and owned by the job's user. The directory outlives the
+frame, so the next frame of the job on this host finds the inputs the last
+one copied there instead of reading them from the network again. A frame
+that finds its job's directory already there is a hit.
+
+Directories not in use by a running frame are evicted least recently used
+first: any idle for RQD_SCRATCH_MAX_AGE_SEC, then as many as needed to keep
+the cache under RQD_SCRATCH_MAX_BYTES and the filesystem's free space, the
+free_mcp of the host report, above RQD_SCRATCH_MIN_FREE_KB. A directory's
+modification time records its last use, so the order survives a restart.
+
+The job directories are only accessible to their users, so they are sized,
+touched and removed as root. rqd only uses a cache root that is a directory
+owned by root with mode 0755, so no user can put a job directory, or a
+symlink in place of one, in front of it.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import errno
+import logging as log
+import os
+import pwd
+import shutil
+import stat
+import threading
+import time
+
+import rqd.rqconstants
+import rqd.rqmetrics
+import rqd.rqutil
+
+
+KILOBYTE = 1024
+
+# Prefix of directories renamed for deletion
+EVICTING_PREFIX = '.evicting-'
+
+SCRATCH_LOOKUPS = rqd.rqmetrics.counter(
+    'rqd_scratch_lookups_total', 'Frames given a job scratch directory, by hit or miss',
+    labelName='result')
+SCRATCH_EVICTIONS = rqd.rqmetrics.counter(
+    'rqd_scratch_evictions_total', 'Job scratch directories evicted, by reason',
+    labelName='reason')
+SCRATCH_EVICTED_BYTES = rqd.rqmetrics.counter(
+    'rqd_scratch_evicted_bytes_total', 'Bytes freed by evicting job scratch directories')
+
+
+def directorySize(path):
+    """Returns the disk space used by a directory tree
+    @type  path: str
+    @param path: The directory
+    @rtype:  int
+    @return: Bytes allocated to the files under path"""
+    total = 0
+    for dirPath, dirNames, fileNames in os.walk(path):
+        for name in dirNames + fileNames:
+            try:
+                fileStat = os.lstat(os.path.join(dirPath, name))
+            except OSError:
+                continue
+            total += getattr(fileStat, 'st_blocks', 0) * 512 or fileStat.st_size
+    return total
+
+
+def checkRoot(path):
+    """Raises OSError unless path is a directory, not a symlink, owned by
+    root with mode 0755
+    @type  path: str
+    @param path: The cache root"""
+    rootStat = os.lstat(path)
+    if not stat.S_ISDIR(rootStat.st_mode):
+        raise OSError(errno.ENOTDIR, 'Not a directory', path)
+    if rootStat.st_uid != 0 or stat.S_IMODE(rootStat.st_mode) != 0o755:
+        raise OSError(errno.EPERM, 'Not owned by root with mode 0755', path)
+
+
+def freeKb(path):
+    """Returns the free space available to users on path's filesystem, in kB"""
+    fsStat = os.statvfs(path)
+    return (fsStat.f_bavail * fsStat.f_bsize) // KILOBYTE
+
+
+class ScratchEntry(object):
+    """A job's scratch directory."""
+
+    def __init__(self, jobId, path, lastUsed, size=0):
+        self.jobId = jobId
+        self.path = path
+        self.lastUsed = lastUsed
+        self.size = size
+        # Running frames of the job using the directory
+        self.users = 0
+
+
+class ScratchCache(object):
+    """Job scratch directories, kept between frames and evicted least
+    recently used first."""
+
+    def __init__(self, root, maxBytes=None, maxAgeSeconds=None, minFreeKb=None):
+        """ScratchCache class initialization
+        @type  root: str
+        @param root: Directory holding the job directories, created if needed
+        @type  maxBytes: int
+        @param maxBytes: Size the cache is evicted down to
+        @type  maxAgeSeconds: int
+        @param maxAgeSeconds: Seconds a job directory is kept unused
+        @type  minFreeKb: int
+        @param minFreeKb: Free space the cache is evicted to keep, in kB"""
+        self.root = root
+        self.maxBytes = maxBytes if maxBytes is not None \
+            else rqd.rqconstants.RQD_SCRATCH_MAX_BYTES
+        self.maxAgeSeconds = maxAgeSeconds if maxAgeSeconds is not None \
+            else rqd.rqconstants.RQD_SCRATCH_MAX_AGE_SEC
+        self.minFreeKb = minFreeKb if minFreeKb is not None \
+            else rqd.rqconstants.RQD_SCRATCH_MIN_FREE_KB
+        self.__lock = threading.Lock()
+        self.__entries = {}
+        self.__hits = 0
+        self.__misses = 0
+        self.__reusedBytes = 0
+        self.__evictions = 0
+        self.__evictedBytes = 0
+
+        rqd.rqutil.permissionsHigh()
+        try:
+            if not os.path.lexists(root):
+                os.makedirs(root, 0o755)
+                # Whatever the umask
+                if not os.path.islink(root):
+                    os.chmod(root, 0o755)
+        finally:
+            rqd.rqutil.permissionsLow()
+        checkRoot(root)
+        self.__load()
+
+    def __load(self):
+        """Picks up the job directories left by the last run of rqd"""
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(EVICTING_PREFIX):
+                self.__remove(path)
+            elif os.path.isdir(path):
+                rqd.rqutil.permissionsHigh()
+                try:
+                    size = directorySize(path)
+                finally:
+                    rqd.rqutil.permissionsLow()
+                self.__entries[name] = ScratchEntry(name, path, os.path.getmtime(path), size)
+        if self.__entries:
+            log.info('Found %d job scratch directories in %s' % (
+                len(self.__entries), self.root))
+
+    def acquire(self, runFrame):
+        """Returns the scratch directory of a frame's job, creating it if
+        needed. The directory is kept until release() is called for the frame.
+        @type  runFrame: rqd.compiled_proto.rqd_pb2.RunFrame
+        @param runFrame: The frame being launched
+        @rtype:  str
+        @return: Path of the job's scratch directory"""
+        with self.__lock:
+            entry = self.__entries.get(runFrame.job_id)
+            hit = entry is not None
+            if not hit:
+                # Created under the lock so other frames of the job never see
+                # the entry before the directory
+                path = os.path.join(self.root, runFrame.job_id)
+                self.__create(path, runFrame)
+                entry = ScratchEntry(runFrame.job_id, path, time.time())
+                self.__entries[runFrame.job_id] = entry
+                self.__misses += 1
+            else:
+                self.__hits += 1
+                self.__reusedBytes += entry.size
+            entry.users += 1
+            entry.lastUsed = time.time()
+
+        SCRATCH_LOOKUPS.inc(label='hit' if hit else 'miss')
+        return entry.path
+
+    def __create(self, path, runFrame):
+        rqd.rqutil.permissionsHigh()
+        try:
+            if not os.path.lexists(path):
+                os.mkdir(path, 0o700)
+            if not stat.S_ISDIR(os.lstat(path).st_mode):
+                raise OSError(errno.ENOTDIR, 'Not a directory', path)
+            # Owned by the user the frame runs as
+            if runFrame.HasField('uid'):
+                os.lchown(path, runFrame.uid, runFrame.gid)
+            else:
+                user = pwd.getpwnam(runFrame.user_name)
+                os.lchown(path, user.pw_uid, user.pw_gid)
+        finally:
+            rqd.rqutil.permissionsLow()
+
+    def release(self, jobId):
+        """Marks a frame of the job as done with its scratch directory
+        @type  jobId: str
+        @param jobId: The frame's job id"""
+        with self.__lock:
+            entry = self.__entries.get(jobId)
+            if entry is None:
+                return
+            entry.users = max(entry.users - 1, 0)
+            entry.lastUsed = time.time()
+            path = entry.path
+        rqd.rqutil.permissionsHigh()
+        try:
+            size = directorySize(path)
+            os.utime(path, None)
+        except OSError as e:
+            log.debug('Unable to touch %s: %s' % (path, e))
+        finally:
+            rqd.rqutil.permissionsLow()
+        with self.__lock:
+            entry.size = size
+
+    def evict(self, now=None):
+        """Evicts the directories of jobs idle for too long, then the least
+        recently used until the cache fits its size and free space limits.
+        Called every RQD_SCRATCH_EVICT_INTERVAL_SEC, off the scheduler thread
+        as removing large directories takes a while.
+        @type  now: float
+        @param now: Current time, for tests"""
+        now = time.time() if now is None else now
+        try:
+            available = freeKb(self.root)
+        except OSError as e:
+            log.warning('Unable to read the free space of %s: %s' % (self.root, e))
+            available = None
+
+        evicted = []
+        with self.__lock:
+            total = sum(entry.size for entry in self.__entries.values())
+            idle = sorted((entry for entry in self.__entries.values() if entry.users == 0),
+                          key=lambda entry: entry.lastUsed)
+            for entry in idle:
+                if now - entry.lastUsed > self.maxAgeSeconds:
+                    reason = 'age'
+                elif total > self.maxBytes:
+                    reason = 'size'
+                elif available is not None and available < self.minFreeKb:
+                    reason = 'free_space'
+                else:
+                    break
+                # Renamed under the lock so a frame of the job launched once
+                # the entry is gone creates a new directory
+                evictingPath = os.path.join(self.root, EVICTING_PREFIX + entry.jobId)
+                rqd.rqutil.permissionsHigh()
+                try:
+                    os.rename(entry.path, evictingPath)
+                except OSError as e:
+                    log.warning('Unable to evict %s: %s' % (entry.path, e))
+                    continue
+                finally:
+                    rqd.rqutil.permissionsLow()
+                del self.__entries[entry.jobId]
+                total -= entry.size
+                if available is not None:
+                    available += entry.size // KILOBYTE
+                evicted.append((entry, evictingPath, reason))
+
+        for entry, evictingPath, reason in evicted:
+            log.info('Evicted job scratch directory %s, %d bytes, by %s' % (
+                entry.path, entry.size, reason))
+            self.__remove(evictingPath)
+            SCRATCH_EVICTIONS.inc(label=reason)
+            SCRATCH_EVICTED_BYTES.inc(entry.size)
+            with self.__lock:
+                self.__evictions += 1
+                self.__evictedBytes += entry.size
+
+    @staticmethod
+    def __remove(path):
+        # Files of the cache belong to the frames' users
+        rqd.rqutil.permissionsHigh()
+        try:
+            shutil.rmtree(path)
+        except OSError as e:
+            log.warning('Unable to remove %s: %s' % (path, e))
+        finally:
+            rqd.rqutil.permissionsLow()
+
+    def attributes(self):
+        """Returns the cache statistics sent as host attributes
+        @rtype:  dict
+        @return: Attribute name: value"""
+        with self.__lock:
+            return {
+                'scratchJobs': str(len(self.__entries)),
+                'scratchBytes': str(sum(entry.size for entry in self.__entries.values())),
+                'scratchHits': str(self.__hits),
+                'scratchMisses': str(self.__misses),
+                'scratchReusedBytes': str(self.__reusedBytes),
+                'scratchEvictions': str(self.__evictions),
+                'scratchEvictedBytes': str(self.__evictedBytes),
+            }
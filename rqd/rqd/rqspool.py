@@ -0,0 +1,202 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Write-ahead spool for reports that must reach the cuebot.
+
+Every report is appended to a local log and fsync'd before it is sent.
+Delivered reports are acknowledged in the same log, and the log is
+compacted down to the undelivered reports once it has grown. Whatever is
+left undelivered when rqd stops is replayed when it starts again.
+
+Each record is a fixed header followed by its payload:
+
+    type (1 byte) | crc32 (4) | sequence (8) | payload length (4) | payload
+
+A truncated or corrupt record at the end of the log, left by a crash while
+appending, is discarded.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import collections
+import logging as log
+import os
+import struct
+import threading
+import zlib
+
+
+RECORD_HEADER = struct.Struct('>cIQI')
+RECORD_REPORT = b'R'
+RECORD_ACK = b'A'
+
+
+class ReportSpool(object):
+    """An fsync'd log of serialized reports awaiting delivery."""
+
+    def __init__(self, path, messageClass, maxBytes):
+        """ReportSpool class initialization
+        @type  path: str
+        @param path: Path of the spool file, its directory is created if needed
+        @type  messageClass: protobuf message class
+        @param messageClass: Type of the spooled reports
+        @type  maxBytes: int
+        @param maxBytes: Size the spool is kept under, the oldest reports are
+                         dropped when undelivered reports exceed it"""
+        self.path = path
+        self.__messageClass = messageClass
+        self.__maxBytes = maxBytes
+        self.__lock = threading.Lock()
+        self.__pending = collections.OrderedDict()
+        self.__inFlight = set()
+        self.__nextSeq = 1
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.__load()
+        self.__file = open(self.path, 'ab')
+        if self.__pending:
+            log.warning('Spool %s holds %d undelivered reports' % (path, len(self.__pending)))
+
+    def append(self, report, inFlight=False):
+        """Durably appends a report.
+        @type  report: protobuf message
+        @param report: The report to spool
+        @type  inFlight: bool
+        @param inFlight: The caller is sending the report itself, it is not
+                         handed out by claim() until released
+        @rtype:  int
+        @return: The sequence number of the report"""
+        payload = report.SerializeToString()
+        recordSize = RECORD_HEADER.size + len(payload)
+        with self.__lock:
+            if self.__file.tell() + recordSize > self.__maxBytes:
+                self.__compact(reserve=recordSize)
+            seq = self.__nextSeq
+            self.__nextSeq += 1
+            self.__pending[seq] = payload
+            if inFlight:
+                self.__inFlight.add(seq)
+            self.__write(RECORD_REPORT, seq, payload)
+            self.__sync()
+        return seq
+
+    def claim(self, limit):
+        """Returns up to limit undelivered reports, oldest first, and marks
+        them in flight.
+        @rtype:  list<tuple<int, protobuf message>>
+        @return: (sequence number, report) pairs"""
+        claimed = []
+        with self.__lock:
+            for seq, payload in self.__pending.items():
+                if len(claimed) >= limit:
+                    break
+                if seq in self.__inFlight:
+                    continue
+                self.__inFlight.add(seq)
+                claimed.append((seq, payload))
+        return [(seq, self.__messageClass.FromString(payload)) for seq, payload in claimed]
+
+    def release(self, seqs):
+        """Returns undelivered in flight reports to the spool"""
+        with self.__lock:
+            self.__inFlight.difference_update(seqs)
+
+    def acknowledge(self, seqs):
+        """Records that reports were delivered, compacting the log once no
+        report is left undelivered"""
+        with self.__lock:
+            for seq in seqs:
+                self.__inFlight.discard(seq)
+                if self.__pending.pop(seq, None) is not None:
+                    self.__write(RECORD_ACK, seq, b'')
+            if not self.__pending:
+                # Everything was delivered, nothing in the log is needed
+                self.__file.seek(0)
+                self.__file.truncate()
+            self.__sync()
+
+    def pendingCount(self):
+        """Returns the number of undelivered reports"""
+        with self.__lock:
+            return len(self.__pending)
+
+    def close(self):
+        with self.__lock:
+            self.__file.close()
+
+    def __write(self, recordType, seq, payload):
+        self.__file.write(RECORD_HEADER.pack(recordType, zlib.crc32(payload) & 0xffffffff,
+                                             seq, len(payload)))
+        self.__file.write(payload)
+
+    def __sync(self):
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+
+    def __load(self):
+        """Reads undelivered reports left by a previous run"""
+        if not os.path.exists(self.path):
+            return
+        validLength = 0
+        with open(self.path, 'rb') as spoolFile:
+            data = spoolFile.read()
+        while validLength + RECORD_HEADER.size <= len(data):
+            recordType, crc, seq, length = RECORD_HEADER.unpack_from(data, validLength)
+            start = validLength + RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) != length or zlib.crc32(payload) & 0xffffffff != crc \
+                    or recordType not in (RECORD_REPORT, RECORD_ACK):
+                break
+            if recordType == RECORD_REPORT:
+                self.__pending[seq] = payload
+            else:
+                self.__pending.pop(seq, None)
+            self.__nextSeq = max(self.__nextSeq, seq + 1)
+            validLength = start + length
+        if validLength != len(data):
+            log.warning('Discarding %d bytes of incomplete records from spool %s' % (
+                len(data) - validLength, self.path))
+            with open(self.path, 'r+b') as spoolFile:
+                spoolFile.truncate(validLength)
+
+    def __compact(self, reserve=0):
+        """Rewrites the log with only the undelivered reports, dropping the
+        oldest ones if they and the reserved space exceed the size limit"""
+        size = sum(RECORD_HEADER.size + len(payload) for payload in self.__pending.values())
+        while size + reserve > self.__maxBytes and self.__pending:
+            seq, payload = self.__pending.popitem(last=False)
+            self.__inFlight.discard(seq)
+            size -= RECORD_HEADER.size + len(payload)
+            log.warning('Spool %s is full, dropping report %d' % (self.path, seq))
+
+        tempPath = self.path + '.compact'
+        with open(tempPath, 'wb') as tempFile:
+            for seq, payload in self.__pending.items():
+                tempFile.write(RECORD_HEADER.pack(RECORD_REPORT,
+                                                  zlib.crc32(payload) & 0xffffffff,
+                                                  seq, len(payload)))
+                tempFile.write(payload)
+            tempFile.flush()
+            os.fsync(tempFile.fileno())
+        os.rename(tempPath, self.path)
+        self.__file.close()
+        self.__file = open(self.path, 'ab')
@@ -77,55 +77,22 @@ class SampleData(object):
         return self.__pgpgout
 
 
-class RepeatedTimer(threading.Thread):
-    """
-    A repeated timer.
-    """
-
-    def __init__(self, interval, function, *args, **kwargs):
-        threading.Thread.__init__(self)
-        self.__interval = interval
-        self.__callable = function
-        self.__args = args
-        self.__kwargs = kwargs
-        self.__event = threading.Event()
-        self.__event.set()
-
-    def run(self):
-        while self.__event.is_set():
-            try:
-                timer = threading.Timer(self.__interval,
-                                        self.__callable,
-                                        self.__args,
-                                        self.__kwargs)
-                timer.start()
-                timer.join()
-            except Exception:
-                # Catch all exceptions here.
-                pass
-
-    def cancel(self):
-        """
-        Cancel the repeated timer.
-        """
-        self.__event.clear()
-
-
 class VmStat(object):
     """
     A simple class to return pgpgout number from /proc/vmstat.
     """
 
-    def __init__(self):
+    def __init__(self, scheduler):
+        """
+        @type  scheduler: rqd.rqscheduler.Scheduler
+        @param scheduler: Scheduler that samples /proc/vmstat every interval
+        """
         self.__interval = 15
         self.__sampleSize = 10
         self.__lock = threading.Lock()
         self.__sampleData = []
-        self.__repeatedTimer = RepeatedTimer(
-            self.__interval,
-            self.__getPgoutNum)
-        self.__repeatedTimer.setDaemon(True)
-        self.__repeatedTimer.start()
+        self.__sampleJob = scheduler.schedulePeriodic(
+            'vmstat', self.__interval, self.__getPgoutNum)
 
     def __getSampleDataCopy(self):
         with self.__lock:
@@ -172,8 +139,8 @@ class VmStat(object):
                     currentTime - self.__sampleSize * self.__interval - 2):
                 continue
             weightedSum += \
-                   weight * (currentSampleData[i].getPgoutNumber() - currentSampleData[i - 1].getPgoutNumber()) / \
-                   (currentSampleData[i].getEpochTime() - currentSampleData[i - 1].getEpochTime())
+                   weight * (currentSampleData[i].get_pgout_number() - currentSampleData[i - 1].get_pgout_number()) / \
+                   (currentSampleData[i].get_epoch_time() - currentSampleData[i - 1].get_epoch_time())
             totalWeight += weight
             weight += 1
 
@@ -186,14 +153,14 @@ class VmStat(object):
             return 0
 
         index = sampleDataLen - 1
-        return ((currentSampleData[index].getPgoutNumber() -
-                 currentSampleData[index - 1].getPgoutNumber()) /
-                (currentSampleData[index].getEpochTime() -
-                 currentSampleData[index - 1].getEpochTime()) /
+        return ((currentSampleData[index].get_pgout_number() -
+                 currentSampleData[index - 1].get_pgout_number()) /
+                (currentSampleData[index].get_epoch_time() -
+                 currentSampleData[index - 1].get_epoch_time()) /
                 self.__interval)
 
     def stopSample(self):
         """
-        Stop the repeated timer.
+        Stop sampling.
         """
-        self.__repeatedTimer.cancel()
+        self.__sampleJob.cancel()
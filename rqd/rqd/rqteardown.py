@@ -0,0 +1,180 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Teardown of killed frames.
+
+The frames of a kill request are all signalled together: SIGTERM goes to
+every process of a frame's cgroup, or to its process group when it has no
+cgroup. Frames that have not exited RQD_KILL_GRACE_SEC later get
+KILL_SIGNAL. A kill can ask for KILL_SIGNAL straight away instead, as
+preempting a frame for memory does. A frame suspended by nimby is resumed
+first, a stopped or frozen process would not act on SIGTERM. A frame is
+known to have exited when its completion runs, which with the reaper is as
+soon as its process is reaped, so nothing polls or sleeps. The completion
+report carries the time from the first kill request to the exit.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import errno
+import logging as log
+import os
+import platform
+import signal
+import subprocess
+import threading
+
+import rqd.rqcgroup
+import rqd.rqconstants
+import rqd.rqmetrics
+import rqd.rqscheduler
+import rqd.rqutil
+
+
+KILLED_FRAMES = rqd.rqmetrics.counter(
+    'rqd_killed_frames_total', 'Killed frames, by the signal that ended them',
+    labelName='signal')
+KILL_TIME = rqd.rqmetrics.histogram(
+    'rqd_kill_seconds', 'Time from a frame kill request to the frame exiting',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0, 60.0))
+
+
+def signalFrame(frame, signum):
+    """Sends a signal to every process of a frame
+    @type  frame: rqd.rqnetwork.RunningFrame
+    @param frame: The frame to signal
+    @type  signum: int
+    @param signum: The signal
+    @rtype:  bool
+    @return: True if the frame's processes were signalled"""
+    rqd.rqutil.permissionsHigh()
+    try:
+        if platform.system() == 'Windows':
+            subprocess.Popen('taskkill /F /T /PID %i' % frame.pid, shell=True)
+        elif frame.cgroup:
+            rqd.rqcgroup.signalCgroup(frame.cgroup, signum)
+        else:
+            os.killpg(frame.pid, signum)
+        return True
+    except (IOError, OSError) as e:
+        # ENOENT once the frame's cgroup has been removed
+        if e.errno not in (errno.ESRCH, errno.ENOENT):
+            log.warning('Unable to signal frameId=%s with %d: %s' % (frame.frameId, signum, e))
+        return False
+    finally:
+        rqd.rqutil.permissionsLow()
+
+
+class FrameTeardown(object):
+    """Signals killed frames, escalates to KILL_SIGNAL after the grace
+    period and times how long they take to exit."""
+
+    def __init__(self, scheduler):
+        """FrameTeardown class initialization
+        @type  scheduler: rqd.rqscheduler.Scheduler
+        @param scheduler: The scheduler escalations run on"""
+        self.__scheduler = scheduler
+        self.__lock = threading.Lock()
+        # frameId: (frame, signal last sent) of frames signalled and not exited
+        self.__pending = {}
+
+    def pendingCount(self):
+        """Returns the number of signalled frames that have not exited"""
+        with self.__lock:
+            return len(self.__pending)
+
+    def kill(self, frames, message="", exitStatus=None, immediate=False):
+        """Signals the frames to exit, escalating after RQD_KILL_GRACE_SEC
+        @type  frames: list<rqd.rqnetwork.RunningFrame>
+        @param frames: The frames to kill
+        @type  message: str
+        @param message: Reason written to the frames' logs
+        @type  exitStatus: int
+        @param exitStatus: Exit status reported for the frames
+        @type  immediate: bool
+        @param immediate: Send KILL_SIGNAL without a grace period, also to
+                          frames already in theirs
+        @rtype:  list<rqd.rqnetwork.RunningFrame>
+        @return: The frames that are being killed"""
+        now = rqd.rqscheduler.monotonic()
+        signum = rqd.rqconstants.KILL_SIGNAL if immediate else signal.SIGTERM
+        killing = []
+        signalled = []
+        for frame in frames:
+            if not frame.isKillable():
+                continue
+            frame.recordKill(message, exitStatus, now)
+            killing.append(frame)
+            with self.__lock:
+                pending = self.__pending.get(frame.frameId)
+                if pending is not None and (not immediate or pending[1] == signum):
+                    # Already signalled, its escalation is scheduled
+                    continue
+                self.__pending[frame.frameId] = (frame, signum)
+            if frame.suspendedTime is not None:
+                frame.resume()
+            signalFrame(frame, signum)
+            signalled.append(frame.frameId)
+
+        if signalled and immediate:
+            log.info('Sent signal %d to %d frames: %s' % (signum, len(signalled), message))
+        elif signalled:
+            log.info('Sent SIGTERM to %d frames: %s' % (len(signalled), message))
+            self.__scheduler.scheduleOnce(
+                'killEscalation', rqd.rqconstants.RQD_KILL_GRACE_SEC,
+                lambda: self.escalate(signalled))
+        return killing
+
+    def escalate(self, frameIds):
+        """Sends KILL_SIGNAL to the frames that have not exited
+        @type  frameIds: list<str>
+        @param frameIds: Frames signalled at the start of the grace period"""
+        with self.__lock:
+            frames = []
+            for frameId in frameIds:
+                pending = self.__pending.get(frameId)
+                if pending is not None and pending[1] != rqd.rqconstants.KILL_SIGNAL:
+                    self.__pending[frameId] = (pending[0], rqd.rqconstants.KILL_SIGNAL)
+                    frames.append(pending[0])
+        for frame in frames:
+            log.warning('frameId=%s did not exit within %ds, sending signal %d' % (
+                frame.frameId, rqd.rqconstants.RQD_KILL_GRACE_SEC,
+                rqd.rqconstants.KILL_SIGNAL))
+            signalFrame(frame, rqd.rqconstants.KILL_SIGNAL)
+
+    def onExit(self, frame):
+        """Called once a frame has exited, sets frame.killSeconds if it was
+        killed
+        @type  frame: rqd.rqnetwork.RunningFrame
+        @param frame: The exited frame"""
+        with self.__lock:
+            pending = self.__pending.pop(frame.frameId, None)
+        if frame.killTime is None:
+            return
+        frame.killSeconds = rqd.rqscheduler.monotonic() - frame.killTime
+        KILL_TIME.observe(frame.killSeconds)
+        if pending is None:
+            return
+        KILLED_FRAMES.inc(label='SIGKILL' if pending[1] == rqd.rqconstants.KILL_SIGNAL
+                          else 'SIGTERM')
+        if not frame.cgroup and platform.system() != 'Windows':
+            # Processes of the group that outlived the frame's own process,
+            # frame cgroups are emptied when they are removed
+            signalFrame(frame, rqd.rqconstants.KILL_SIGNAL)
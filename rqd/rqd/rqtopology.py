@@ -0,0 +1,311 @@
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+CPU topology of the host and the allocation of cores to frames.
+
+The topology is read from /sys/devices/system/cpu and
+/sys/devices/system/node, falling back to /proc/cpuinfo where sysfs is not
+available. Each physical core knows its hyper-threading siblings, the L3
+cache domain it shares and its NUMA node.
+
+Frames are given whole physical cores, including their siblings. A request is
+placed in the L3 domain, and failing that the NUMA node, whose free cores fit
+it most tightly, and takes the most compact run of cores there. This keeps a
+frame's threads sharing a cache and local memory, and leaves the larger free
+blocks for larger frames.
+"""
+
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
+
+from builtins import object
+import collections
+import ctypes
+import os
+import platform
+
+import rqd.rqconstants
+import rqd.rqutil
+
+
+# Physical core, identified by its position in the topology
+Core = collections.namedtuple('Core', ['index', 'node', 'cache', 'cpus'])
+
+# A frame's share of the host
+Allocation = collections.namedtuple('Allocation', ['cores', 'cpus', 'nodes'])
+
+MPOL_PREFERRED = 1
+MPOL_BIND = 2
+
+# set_mempolicy(2) is not wrapped by the standard library
+SYS_SET_MEMPOLICY = {
+    'x86_64': 238,
+    'aarch64': 237,
+    'ppc64le': 260,
+}
+
+
+def _readFile(path):
+    with open(path) as sysFile:
+        return sysFile.read().strip()
+
+
+def formatCpuList(cpus):
+    """Formats cpu ids as a comma separated list, the format of CPU_LIST
+    @type  cpus: iterable<int>
+    @param cpus: Cpu ids
+    @rtype:  str
+    @return: The cpu ids, sorted"""
+    return ','.join(str(cpu) for cpu in sorted(cpus))
+
+
+class CpuTopology(object):
+    """Physical cores of the host grouped by L3 domain and NUMA node, and the
+    cores reserved by running frames. Not thread safe, use with locking."""
+
+    def __init__(self, cores):
+        """CpuTopology class initialization
+        @type  cores: list<Core>
+        @param cores: The host's physical cores, in order"""
+        self.cores = cores
+        self.__free = set(core.index for core in cores)
+        self.__coreOfCpu = {}
+        for core in cores:
+            for cpu in core.cpus:
+                self.__coreOfCpu[cpu] = core.index
+
+    @classmethod
+    def fromSysfs(cls, cpuPath=None, nodePath=None):
+        """Reads the topology from sysfs
+        @type  cpuPath: str
+        @param cpuPath: Path of /sys/devices/system/cpu
+        @type  nodePath: str
+        @param nodePath: Path of /sys/devices/system/node
+        @rtype:  CpuTopology
+        @return: The host's topology"""
+        cpuPath = cpuPath or rqd.rqconstants.PATH_SYS_CPU
+        nodePath = nodePath or rqd.rqconstants.PATH_SYS_NODE
+
+        nodeOfCpu = {}
+        if os.path.isdir(nodePath):
+            for entry in os.listdir(nodePath):
+                if entry.startswith('node') and entry[4:].isdigit():
+                    for cpu in rqd.rqutil.parseCpuList(
+                            _readFile(os.path.join(nodePath, entry, 'cpulist'))):
+                        nodeOfCpu[cpu] = int(entry[4:])
+
+        cpus = sorted(rqd.rqutil.parseCpuList(_readFile(os.path.join(cpuPath, 'online'))))
+        siblings = collections.OrderedDict()
+        cacheOfCpu = {}
+        for cpu in cpus:
+            topologyPath = os.path.join(cpuPath, 'cpu%d' % cpu, 'topology')
+            threads = rqd.rqutil.parseCpuList(
+                _readFile(os.path.join(topologyPath, 'thread_siblings_list')))
+            siblings.setdefault(min(threads), set()).update(threads & set(cpus))
+            cacheOfCpu[cpu] = cls.__readL3Domain(os.path.join(cpuPath, 'cpu%d' % cpu), cpu)
+
+        cores = []
+        for first, threads in sorted(siblings.items()):
+            cores.append(Core(len(cores), nodeOfCpu.get(first, 0), cacheOfCpu[first],
+                              tuple(sorted(threads))))
+        return cls(cores)
+
+    @staticmethod
+    def __readL3Domain(cpuDir, cpu):
+        """Returns the lowest cpu sharing the last level cache with cpu"""
+        cacheDir = os.path.join(cpuDir, 'cache')
+        domain = None
+        level = 0
+        if os.path.isdir(cacheDir):
+            for index in os.listdir(cacheDir):
+                indexDir = os.path.join(cacheDir, index)
+                if not index.startswith('index'):
+                    continue
+                indexLevel = int(_readFile(os.path.join(indexDir, 'level')))
+                if indexLevel > level:
+                    level = indexLevel
+                    domain = min(rqd.rqutil.parseCpuList(
+                        _readFile(os.path.join(indexDir, 'shared_cpu_list'))))
+        if domain is None:
+            return cpu
+        return domain
+
+    @classmethod
+    def fromCpuinfo(cls, pathCpuInfo=None):
+        """Builds the topology from /proc/cpuinfo, with each socket taken as
+        one NUMA node and one L3 domain
+        @type  pathCpuInfo: str
+        @param pathCpuInfo: Path of the cpuinfo file
+        @rtype:  CpuTopology
+        @return: The host's topology"""
+        threads = collections.OrderedDict()
+        processor = {}
+        with open(pathCpuInfo or rqd.rqconstants.PATH_CPUINFO) as cpuinfoFile:
+            for line in list(cpuinfoFile) + ['']:
+                fields = line.strip().replace('\t', '').split(': ')
+                if len(fields) >= 2:
+                    processor[fields[0]] = fields[1]
+                elif fields == [''] and 'processor' in processor:
+                    cpu = int(processor['processor'])
+                    socket = int(processor.get('physical id', 0))
+                    coreId = int(processor.get('core id', cpu))
+                    threads.setdefault((socket, coreId), []).append(cpu)
+                    processor = {}
+
+        cores = []
+        for (socket, _), cpus in sorted(threads.items(), key=lambda item: min(item[1])):
+            cores.append(Core(len(cores), socket, socket, tuple(sorted(cpus))))
+        return cls(cores)
+
+    @classmethod
+    def load(cls, pathCpuInfo=None):
+        """Reads the host's topology, from sysfs if available
+        @type  pathCpuInfo: str
+        @param pathCpuInfo: cpuinfo file used when sysfs is not available
+        @rtype:  CpuTopology
+        @return: The host's topology"""
+        if pathCpuInfo is None and os.path.exists(
+                os.path.join(rqd.rqconstants.PATH_SYS_CPU, 'online')):
+            return cls.fromSysfs()
+        return cls.fromCpuinfo(pathCpuInfo)
+
+    def numaNodes(self):
+        return sorted(set(core.node for core in self.cores))
+
+    def freeCores(self):
+        return len(self.__free)
+
+    def reserve(self, numCores):
+        """Reserves whole physical cores for a frame
+        @type  numCores: int
+        @param numCores: Number of physical cores
+        @rtype:  Allocation
+        @return: The reserved cores, or None if not enough are free"""
+        if numCores <= 0 or numCores > len(self.__free):
+            return None
+
+        free = [core for core in self.cores if core.index in self.__free]
+        fit = self.__smallestFit(self.__group(free, lambda core: (core.node, core.cache)),
+                                 numCores)
+        if fit is not None:
+            chosen = self.__compactRun(fit, numCores)
+        else:
+            fit = self.__smallestFit(self.__group(free, lambda core: core.node), numCores)
+            if fit is not None:
+                # Spans L3 domains within the node
+                chosen = self.__fill(self.__group(fit, lambda core: core.cache), numCores)
+            else:
+                # Larger than any node's free cores
+                chosen = self.__fill(self.__group(free, lambda core: core.node), numCores)
+
+        for core in chosen:
+            self.__free.discard(core.index)
+        return Allocation(tuple(core.index for core in chosen),
+                          tuple(sorted(cpu for core in chosen for cpu in core.cpus)),
+                          tuple(sorted(set(core.node for core in chosen))))
+
+    def release(self, cpus):
+        """Returns the cores holding the given cpus to the free pool
+        @type  cpus: iterable<int>
+        @param cpus: Cpus of a previous allocation"""
+        for cpu in cpus:
+            if cpu in self.__coreOfCpu:
+                self.__free.add(self.__coreOfCpu[cpu])
+
+    @staticmethod
+    def __group(cores, keyFunc):
+        groups = collections.OrderedDict()
+        for core in cores:
+            groups.setdefault(keyFunc(core), []).append(core)
+        return groups
+
+    @staticmethod
+    def __smallestFit(groups, numCores):
+        """Returns the group with the fewest free cores that still fits the
+        request, leaving larger groups for larger frames"""
+        candidates = [cores for cores in groups.values() if len(cores) >= numCores]
+        if not candidates:
+            return None
+        return min(candidates, key=len)
+
+    def __fill(self, groups, numCores):
+        """Takes cores from the groups with the most free cores first, so
+        the request spans as few groups as possible"""
+        chosen = []
+        for cores in sorted(groups.values(), key=lambda cores: -len(cores)):
+            chosen.extend(self.__compactRun(cores, min(len(cores), numCores - len(chosen))))
+            if len(chosen) == numCores:
+                break
+        return chosen
+
+    @staticmethod
+    def __compactRun(cores, numCores):
+        """Returns numCores of the given cores spanning the fewest positions"""
+        best = 0
+        for start in range(1, len(cores) - numCores + 1):
+            if (cores[start + numCores - 1].index - cores[start].index <
+                    cores[best + numCores - 1].index - cores[best].index):
+                best = start
+        return cores[best:best + numCores]
+
+
+def memoryPolicy(nodes):
+    """Prepares the NUMA memory policy of a frame's nodes, as numactl
+    --preferred or --membind would set it. libc is loaded and the node mask
+    built here, before the fork: the returned function runs between fork and
+    exec, where loading a library can deadlock on a lock another thread held
+    at the fork. It does not log for the same reason.
+    @type  nodes: iterable<int>
+    @param nodes: NUMA nodes of the frame's cpus
+    @rtype:  callable
+    @return: Function setting the calling process's policy, inherited across
+             exec, and returning True if it was set. None if no policy
+             applies."""
+    nodes = sorted(nodes)
+    policy = rqd.rqconstants.RQD_NUMA_MEMORY_POLICY
+    syscall = SYS_SET_MEMPOLICY.get(platform.machine())
+    if not nodes or syscall is None or policy not in ('preferred', 'bind'):
+        return None
+    if policy == 'preferred':
+        if len(nodes) > 1:
+            return None
+        mode = MPOL_PREFERRED
+    else:
+        mode = MPOL_BIND
+
+    maskBits = 64 * (nodes[-1] // 64 + 1)
+    mask = (ctypes.c_ulong * (maskBits // 64))()
+    for node in nodes:
+        mask[node // 64] |= 1 << (node % 64)
+    maxNode = ctypes.c_ulong(maskBits + 1)
+    libcSyscall = ctypes.CDLL(None).syscall
+
+    def setPolicy():
+        return libcSyscall(syscall, mode, mask, maxNode) == 0
+    return setPolicy
+
+
+def setMemoryPolicy(nodes):
+    """Sets the calling process's NUMA memory policy to its frame's nodes,
+    see memoryPolicy. Not to be called between fork and exec.
+    @type  nodes: iterable<int>
+    @param nodes: NUMA nodes of the frame's cpus
+    @rtype:  bool
+    @return: True if the policy was set"""
+    setPolicy = memoryPolicy(nodes)
+    return setPolicy is not None and setPolicy()
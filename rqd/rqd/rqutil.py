@@ -33,6 +33,7 @@ import random
 import socket
 import subprocess
 import threading
+import time
 import uuid
 
 import rqd.rqconstants
@@ -71,6 +72,47 @@ class Memoize(object):
         return cache[key]
 
 
+class TtlCache(object):
+    """Keeps values for a limited number of seconds, safe to share between
+    threads."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.__lock = threading.Lock()
+        self.__values = {}
+
+    def get(self, key, default=None):
+        """Returns the value stored for key, or default if it has expired"""
+        with self.__lock:
+            entry = self.__values.get(key)
+            if entry is None:
+                return default
+            if entry[1] < time.time():
+                del self.__values[key]
+                return default
+            return entry[0]
+
+    def put(self, key, value):
+        with self.__lock:
+            self.__values[key] = (value, time.time() + self.ttl)
+
+    def getOrCompute(self, key, func):
+        """Returns the cached value for key, calling func to refresh it once it
+        has expired"""
+        value = self.get(key, self)
+        if value is self:
+            value = func()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.__lock:
+            self.__values.clear()
+
+
+KNOWN_USERS = TtlCache(rqd.rqconstants.RQD_USER_CACHE_TTL_SEC)
+
+
 def permissionsHigh():
     """Sets the effective gid/uid to processes original values (root)"""
     if platform.system() == "Windows":
@@ -125,18 +167,44 @@ def __becomeRoot():
             pass
 
 
+def isKnownUser(username):
+    """Returns True if the user was seen to exist within RQD_USER_CACHE_TTL_SEC"""
+    return KNOWN_USERS.get(username, False)
+
+
+def markKnownUser(username):
+    KNOWN_USERS.put(username, True)
+
+
 def checkAndCreateUser(username):
     """Check to see if the provided user exists, if not attempt to create it."""
     # TODO(gregdenton): Add Windows and Mac support here. (Issue #61)
+    if isKnownUser(username):
+        return
     try:
         pwd.getpwnam(username)
-        return
     except KeyError:
         subprocess.check_call([
             'useradd',
             '-p', str(uuid.uuid4()), # generate a random password
             username
         ])
+    markKnownUser(username)
+
+
+def parseCpuList(cpuList):
+    """Parses a cpu list such as "0-3,8,10" into a set of cpu ids"""
+    cpus = set()
+    for part in cpuList.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
 
 
 def getHostIp():
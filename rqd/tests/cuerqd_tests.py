@@ -189,6 +189,24 @@ class CueRqdTests(unittest.TestCase):
 
         frameStubMock.return_value.Kill.assert_called_with(run_frame=runFrame, message=mock.ANY)
 
+    def test_killFrames(self, stubMock, frameStubMock):
+        rqdHost = rqd.cuerqd.RqdHost(RQD_HOSTNAME)
+
+        rqdHost.killFrames(['frame-1', 'frame-2'], 'killed by test')
+
+        stubMock.return_value.KillRunningFrames.assert_called_with(
+            rqd.compiled_proto.rqd_pb2.RqdStaticKillRunningFramesRequest(
+                frame_ids=['frame-1', 'frame-2'], message='killed by test'))
+
+    @mock.patch('time.time', new=mock.MagicMock(return_value=1000.0))
+    def test_history(self, stubMock, frameStubMock):
+        sys.argv = [SCRIPT_NAME, RQD_HOSTNAME, '--history', '600']
+
+        rqd.cuerqd.main()
+
+        stubMock.return_value.GetMachineHistory.assert_called_with(
+            rqd.compiled_proto.rqd_pb2.RqdStaticGetMachineHistoryRequest(start_time=400.0))
+
     def test_testEduFrame(self, stubMock, frameStubMock):
         sys.argv = [SCRIPT_NAME, RQD_HOSTNAME, '--test_edu_frame']
 
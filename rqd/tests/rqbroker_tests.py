@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+from builtins import range
+import mock
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+import unittest
+
+import rqd.compiled_proto.rqd_pb2
+import rqd.rqbroker
+import rqd.rqconstants
+import rqd.rqlogrotate
+
+
+@unittest.skipUnless(rqd.rqbroker.LaunchBroker.isSupported(), 'Launch broker requires Linux')
+@mock.patch.object(rqd.rqconstants, 'RQD_CREATE_USER_IF_NOT_EXISTS', False)
+class LaunchBrokerTests(unittest.TestCase):
+    """Runs frames through a real broker process."""
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.broker = rqd.rqbroker.LaunchBroker()
+        self.broker.start()
+
+    def tearDown(self):
+        self.broker.stop()
+        shutil.rmtree(self.tempDir)
+
+    def __runFrame(self, name='frame'):
+        logDir = os.path.join(self.tempDir, 'logs')
+        return rqd.compiled_proto.rqd_pb2.RunFrame(
+            frame_id=name, user_name='nobody', log_dir=logDir,
+            log_dir_file=os.path.join(logDir, '%s.rqlog' % name))
+
+    def __launch(self, command, runFrame=None):
+        runFrame = runFrame or self.__runFrame()
+        session = self.broker.openSession()
+        rqlog = session.openLog(runFrame)
+        print('header', file=rqlog)
+        process = session.spawn(['/bin/sh', '-c', command], {'FRAME_VAR': 'value'},
+                                self.tempDir, rqlog)
+        rqlog.close()
+        return process, runFrame.log_dir_file
+
+    def test_launch(self):
+        process, logFile = self.__launch('echo $FRAME_VAR; pwd; exit 3')
+
+        self.assertEqual(3, process.wait())
+        with open(logFile) as rqlog:
+            self.assertEqual(['header', 'value', os.path.realpath(self.tempDir)],
+                             rqlog.read().split())
+
+    def test_signaledFrame(self):
+        process, _ = self.__launch('kill -TERM $$')
+
+        self.assertEqual(-signal.SIGTERM, process.wait())
+
+    def test_frameStartsNewSession(self):
+        process, _ = self.__launch('sleep 0.1')
+
+        self.assertEqual(process.pid, os.getsid(process.pid))
+        self.assertEqual(0, process.wait())
+
+    def test_logRotated(self):
+        runFrame = self.__runFrame()
+        os.makedirs(runFrame.log_dir)
+        with open(runFrame.log_dir_file, 'w') as previous:
+            previous.write('previous run')
+
+        process, logFile = self.__launch('true', runFrame)
+        process.wait()
+
+        with open(logFile + '.1') as rotated:
+            self.assertEqual('previous run', rotated.read())
+
+    def test_oldLogsPruned(self):
+        runFrame = self.__runFrame()
+        os.makedirs(runFrame.log_dir)
+        for generation in range(1, rqd.rqconstants.MAX_LOG_FILES + 1):
+            with open(runFrame.log_dir_file, 'w') as previous:
+                previous.write('run %d' % generation)
+            rqd.rqlogrotate.rotate(runFrame.log_dir_file, rqd.rqconstants.MAX_LOG_FILES)
+        with open(runFrame.log_dir_file, 'w') as previous:
+            previous.write('previous run')
+
+        process, logFile = self.__launch('true', runFrame)
+        process.wait()
+
+        # Deleted by the broker after replying to the spawn
+        deadline = time.time() + 5
+        while os.path.exists(logFile + '.1') and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertFalse(os.path.exists(logFile + '.1'))
+        self.assertEqual(rqd.rqconstants.MAX_LOG_FILES,
+                         len(rqd.rqlogrotate.readIndex(logFile)))
+        with open(logFile + '.%d' % (rqd.rqconstants.MAX_LOG_FILES + 1)) as rotated:
+            self.assertEqual('previous run', rotated.read())
+
+    def test_missingCommand(self):
+        session = self.broker.openSession()
+        rqlog = session.openLog(self.__runFrame())
+
+        with self.assertRaises(RuntimeError):
+            session.spawn(['/nonexistent/command'], {}, self.tempDir, rqlog)
+        rqlog.close()
+        session.close()
+
+    def test_unwritableLogDir(self):
+        runFrame = self.__runFrame()
+        runFrame.log_dir = os.path.join(self.tempDir, 'file')
+        open(runFrame.log_dir, 'w').close()
+        session = self.broker.openSession()
+
+        with self.assertRaises(RuntimeError):
+            session.openLog(runFrame)
+        session.close()
+
+    def test_parallelLaunches(self):
+        results = {}
+
+        def launch(index):
+            process, _ = self.__launch('exit %d' % index, self.__runFrame('frame%d' % index))
+            results[index] = process.wait()
+
+        threads = [threading.Thread(target=launch, args=(index,)) for index in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(dict((index, index) for index in range(10)), results)
+
+    def test_orphansReaped(self):
+        process, _ = self.__launch('sleep 0.2 & echo $! > orphan')
+        process.wait()
+        with open(os.path.join(self.tempDir, 'orphan')) as orphanFile:
+            orphan = int(orphanFile.read())
+        deadline = time.time() + 10
+        while orphan not in rqd.rqbroker.getZombieChildren(os.getpid()):
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.05)
+
+        # Left for its owner on the first sweep that sees it
+        self.broker.reapOrphans(set())
+        self.assertIn(orphan, rqd.rqbroker.getZombieChildren(os.getpid()))
+        self.assertGreaterEqual(self.broker.reapOrphans(set()), 1)
+        self.assertNotIn(orphan, rqd.rqbroker.getZombieChildren(os.getpid()))
+
+    def test_framesNotReaped(self):
+        process, _ = self.__launch('exit 5')
+        deadline = time.time() + 10
+        while process.pid not in rqd.rqbroker.getZombieChildren(os.getpid()):
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.05)
+
+        self.broker.reapOrphans(set([process.pid]))
+        self.broker.reapOrphans(set([process.pid]))
+
+        self.assertEqual(5, process.wait())
+
+    def test_stop(self):
+        self.broker.stop()
+
+        with self.assertRaises(RuntimeError):
+            self.broker.openSession()
+
+
+if __name__ == '__main__':
+    unittest.main()
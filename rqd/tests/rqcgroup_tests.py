@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import errno
+import mock
+import os
+import signal
+import unittest
+
+import pyfakefs.fake_filesystem_unittest
+
+import rqd.rqcgroup
+
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+CPU_STAT = '''usage_usec 2500000
+user_usec 2000000
+system_usec 500000
+nr_periods 0
+nr_throttled 0
+throttled_usec 0
+'''
+
+MEMORY_STAT = '''anon %d
+file %d
+kernel 4096
+file_mapped %d
+shmem 0
+'''
+
+IO_STAT = '''8:0 rbytes=4096 wbytes=1024 rios=1 wios=1 dbytes=0 dios=0
+0:52 rbytes=100 wbytes=200 rios=3 wios=4 dbytes=0 dios=0
+'''
+
+
+class CgroupManagerTests(pyfakefs.fake_filesystem_unittest.TestCase):
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_file(os.path.join(CGROUP_ROOT, 'cgroup.controllers'),
+                            contents='cpuset cpu io memory pids')
+        self.fs.create_file(os.path.join(CGROUP_ROOT, 'cgroup.subtree_control'))
+        self.cgroups = rqd.rqcgroup.CgroupManager(CGROUP_ROOT, 'opencue-rqd')
+
+    def __writeFrameFiles(self, frameId, current, peak=None, anon=0, mapped=0):
+        path = self.cgroups.framePath(frameId)
+        cache = current - anon - mapped
+        for name, contents in (('memory.current', str(current)),
+                               ('memory.stat', MEMORY_STAT % (anon, cache + mapped, mapped)),
+                               ('cpu.stat', CPU_STAT),
+                               ('io.stat', IO_STAT)):
+            filePath = os.path.join(path, name)
+            if os.path.exists(filePath):
+                os.remove(filePath)
+            self.fs.create_file(filePath, contents=contents)
+        if peak is not None:
+            self.fs.create_file(os.path.join(path, 'memory.peak'), contents=str(peak))
+
+    def test_setup(self):
+        self.assertTrue(self.cgroups.setup())
+
+        self.assertTrue(os.path.isdir(os.path.join(CGROUP_ROOT, 'opencue-rqd')))
+        with open(os.path.join(CGROUP_ROOT, 'opencue-rqd', 'cgroup.subtree_control')) as f:
+            self.assertEqual('+memory +cpu +io', f.read())
+
+    def test_setupWithoutCgroupV2(self):
+        cgroups = rqd.rqcgroup.CgroupManager('/not/mounted', 'opencue-rqd')
+
+        self.assertFalse(cgroups.setup())
+
+    def test_createFrameGroup(self):
+        self.cgroups.setup()
+
+        procsPath = self.cgroups.createFrameGroup('frame1')
+
+        self.assertEqual(
+            os.path.join(CGROUP_ROOT, 'opencue-rqd', 'frame-frame1', 'cgroup.procs'), procsPath)
+        self.assertTrue(os.path.isdir(os.path.dirname(procsPath)))
+
+    def test_readFrameStats(self):
+        self.cgroups.setup()
+        self.cgroups.createFrameGroup('frame1')
+        self.__writeFrameFiles('frame1', current=8192 * 1024, peak=16384 * 1024,
+                               anon=1024 * 1024, mapped=512 * 1024)
+
+        stats = self.cgroups.readFrameStats('frame1')
+
+        # Page cache is not counted as rss
+        self.assertEqual(1536, stats.rss)
+        self.assertEqual(1536, stats.maxRss)
+        self.assertEqual(8192, stats.memoryCurrent)
+        self.assertEqual(16384, stats.memoryPeak)
+        self.assertEqual(2500000, stats.usageUsec)
+        self.assertEqual(2000000, stats.userUsec)
+        self.assertEqual(500000, stats.systemUsec)
+        self.assertEqual(4196, stats.readBytes)
+        self.assertEqual(1224, stats.writeBytes)
+
+    def test_readFrameStatsWithoutPeak(self):
+        self.cgroups.setup()
+        self.cgroups.createFrameGroup('frame1')
+        self.__writeFrameFiles('frame1', current=8192 * 1024, anon=4096 * 1024)
+        self.cgroups.readFrameStats('frame1')
+        self.__writeFrameFiles('frame1', current=2048 * 1024, anon=1024 * 1024)
+
+        stats = self.cgroups.readFrameStats('frame1')
+
+        self.assertEqual(1024, stats.rss)
+        self.assertEqual(4096, stats.maxRss)
+        self.assertEqual(2048, stats.memoryPeak)
+
+    def test_removeFrameGroup(self):
+        self.cgroups.setup()
+        self.cgroups.createFrameGroup('frame1')
+
+        self.cgroups.removeFrameGroup('frame1')
+
+        self.assertFalse(os.path.exists(self.cgroups.framePath('frame1')))
+
+    def test_freezeCgroup(self):
+        self.cgroups.setup()
+        procsPath = self.cgroups.createFrameGroup('frame1')
+        freezePath = os.path.join(self.cgroups.framePath('frame1'), 'cgroup.freeze')
+
+        rqd.rqcgroup.freezeCgroup(procsPath, True)
+        with open(freezePath) as freezeFile:
+            self.assertEqual('1', freezeFile.read())
+
+        rqd.rqcgroup.freezeCgroup(procsPath, False)
+        with open(freezePath) as freezeFile:
+            self.assertEqual('0', freezeFile.read())
+
+
+class SignalCgroupTests(pyfakefs.fake_filesystem_unittest.TestCase):
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.procsPath = os.path.join(CGROUP_ROOT, 'opencue-rqd', 'frame-1', 'cgroup.procs')
+        self.fs.create_file(self.procsPath, contents='100\n101\n')
+
+    @mock.patch('os.kill')
+    def test_signalCgroup(self, killMock):
+        killMock.side_effect = [None, OSError(errno.ESRCH, 'No such process')]
+
+        rqd.rqcgroup.signalCgroup(self.procsPath, signal.SIGTERM)
+
+        killMock.assert_has_calls([mock.call(100, signal.SIGTERM),
+                                   mock.call(101, signal.SIGTERM)])
+
+    @mock.patch('os.kill')
+    def test_signalCgroupKill(self, killMock):
+        killPath = os.path.join(os.path.dirname(self.procsPath), 'cgroup.kill')
+        self.fs.create_file(killPath)
+
+        rqd.rqcgroup.signalCgroup(self.procsPath, signal.SIGKILL)
+
+        killMock.assert_not_called()
+        with open(killPath) as killFile:
+            self.assertEqual('1', killFile.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -22,6 +22,8 @@ from __future__ import absolute_import
 from builtins import str
 import mock
 import os.path
+import signal
+import sys
 import unittest
 
 import pyfakefs.fake_filesystem_unittest
@@ -34,17 +36,31 @@ import rqd.rqcore
 import rqd.rqexceptions
 import rqd.rqnetwork
 import rqd.rqnimby
+import rqd.rqreporter
+import rqd.rqtopology
+import rqd.rqutil
 
 
 class RqCoreTests(unittest.TestCase):
 
+    @mock.patch('rqd.rqscratch.ScratchCache', autospec=True)
+    @mock.patch('rqd.rqreporter.StatusReporter', autospec=True)
+    @mock.patch('rqd.rqspool.ReportSpool', autospec=True)
+    @mock.patch('rqd.rqscheduler.Scheduler', autospec=True)
     @mock.patch('rqd.rqnimby.Nimby', autospec=True)
     @mock.patch('rqd.rqnetwork.Network', autospec=True)
     @mock.patch('rqd.rqmachine.Machine', autospec=True)
-    def setUp(self, machineMock, networkMock, nimbyMock):
+    def setUp(self, machineMock, networkMock, nimbyMock, schedulerMock, spoolMock,
+              reporterMock, scratchMock):
         self.machineMock = machineMock
         self.networkMock = networkMock
         self.nimbyMock = nimbyMock
+        self.schedulerMock = schedulerMock
+        self.spoolMock = spoolMock
+        self.reporterMock = reporterMock
+        self.scratchMock = scratchMock
+        self.machineMock.return_value.getHostReport.return_value = \
+            rqd.compiled_proto.report_pb2.HostReport()
         self.rqcore = rqd.rqcore.RqCore()
 
     @mock.patch.object(rqd.rqcore.RqCore, 'nimbyOn')
@@ -97,6 +113,8 @@ class RqCoreTests(unittest.TestCase):
         self.networkMock.return_value.start_grpc.assert_called()
         nimbyOnMock.assert_not_called()
 
+    @mock.patch('rqd.rqscratch.ScratchCache', new=mock.MagicMock())
+    @mock.patch('rqd.rqspool.ReportSpool', new=mock.MagicMock())
     @mock.patch('rqd.rqnetwork.Network', autospec=True)
     @mock.patch('rqd.rqmachine.Machine', autospec=True)
     @mock.patch.object(rqd.rqcore.RqCore, 'nimbyOn')
@@ -110,37 +128,39 @@ class RqCoreTests(unittest.TestCase):
         networkMock.return_value.start_grpc.assert_called()
         nimbyOnMock.assert_not_called()
 
-    @mock.patch('threading.Timer')
-    def test_grpcConnected(self, timerMock):
-        update_rss_thread = mock.MagicMock()
-        interval_thread = mock.MagicMock()
-        timerMock.side_effect = [update_rss_thread, interval_thread]
-
+    def test_grpcConnected(self):
         self.rqcore.grpcConnected()
 
         self.networkMock.return_value.reportRqdStartup.assert_called()
-        update_rss_thread.start.assert_called()
-        interval_thread.start.assert_called()
+        scheduler = self.schedulerMock.return_value
+        scheduler.schedulePeriodic.assert_any_call(
+            'updateRss', rqd.rqconstants.RSS_UPDATE_INTERVAL, self.rqcore.updateRss)
+        self.reporterMock.return_value.start.assert_called_with()
 
     @mock.patch.object(rqd.rqcore.RqCore, 'sendStatusReport', autospec=True)
-    @mock.patch('threading.Timer')
-    def test_onInterval(self, timerMock, sendStatusReportMock):
+    def test_onInterval(self, sendStatusReportMock):
         self.rqcore.onInterval()
 
-        timerMock.return_value.start.assert_called()
         sendStatusReportMock.assert_called_with(self.rqcore)
 
-    @mock.patch('threading.Timer', autospec=True)
-    def test_onIntervalWithSleepTime(self, timerMock):
-        sleep_time = 72
+    def test_lockNotifiesStatusReporter(self):
+        self.rqcore.cores = rqd.compiled_proto.report_pb2.CoreDetail(
+            total_cores=800, idle_cores=800, locked_cores=0, booked_cores=0)
+
+        self.rqcore.lock(200)
+
+        self.reporterMock.return_value.notify.assert_called_with(
+            rqd.rqreporter.REASON_CORES_LOCKED)
+
+    def test_lockUnchangedDoesNotNotify(self):
+        self.rqcore.cores = rqd.compiled_proto.report_pb2.CoreDetail(
+            total_cores=800, idle_cores=0, locked_cores=800, booked_cores=0)
 
-        self.rqcore.onInterval(sleepTime=sleep_time)
+        self.rqcore.lock(200)
 
-        timerMock.assert_called_with(sleep_time, mock.ANY)
-        timerMock.return_value.start.assert_called()
+        self.reporterMock.return_value.notify.assert_not_called()
 
     @mock.patch.object(rqd.rqcore.RqCore, 'shutdownRqdNow')
-    @mock.patch('threading.Timer', new=mock.MagicMock())
     def test_onIntervalShutdown(self, shutdownRqdNowMock):
         self.rqcore.shutdownRqdIdle()
         self.machineMock.return_value.isUserLoggedIn.return_value = False
@@ -151,14 +171,17 @@ class RqCoreTests(unittest.TestCase):
 
         shutdownRqdNowMock.assert_called_with()
 
-    @mock.patch('threading.Timer')
-    def test_updateRss(self, timerMock):
+    def test_updateRss(self):
         self.rqcore.storeFrame('frame-id', mock.MagicMock(spec=rqd.rqnetwork.RunningFrame))
 
         self.rqcore.updateRss()
 
         self.machineMock.return_value.rssUpdate.assert_called()
-        timerMock.return_value.start.assert_called()
+
+    def test_updateRssWithoutFrames(self):
+        self.rqcore.updateRss()
+
+        self.machineMock.return_value.rssUpdate.assert_not_called()
 
     def test_getFrame(self):
         frame_id = 'arbitrary-frame-id'
@@ -244,6 +267,64 @@ class RqCoreTests(unittest.TestCase):
 
         self.assertEqual(frame2, self.rqcore.getFrame(frame2Id))
 
+    @mock.patch('rqd.rqteardown.signalFrame')
+    def test_killFrames(self, signalMock):
+        for frameId in ('frame1', 'frame2'):
+            frame = rqd.rqnetwork.RunningFrame(
+                self.rqcore, rqd.compiled_proto.rqd_pb2.RunFrame(frame_id=frameId))
+            frame.frameAttendantThread = mock.MagicMock()
+            frame.pid = 1000
+            self.rqcore.storeFrame(frameId, frame)
+
+        killed = self.rqcore.killFrames(['frame1', 'frame2', 'unknown'], 'killed by test')
+
+        self.assertEqual(['frame1', 'frame2'], killed)
+        self.assertEqual(2, signalMock.call_count)
+        self.assertEqual('killed by test', self.rqcore.getFrame('frame1').killMessage)
+
+    def test_preemptForMemory(self):
+        frames = {}
+        for frameId, reserved, rss in (('small', '4000000', 3000000),
+                                       ('over', '2000000', 6000000),
+                                       ('unreserved', None, 1000000)):
+            environment = {'CUE_MEMORY': reserved} if reserved else {}
+            frame = rqd.rqnetwork.RunningFrame(
+                self.rqcore,
+                rqd.compiled_proto.rqd_pb2.RunFrame(frame_id=frameId, environment=environment))
+            frame.rss = rss
+            frame.kill = mock.MagicMock()
+            frames[frameId] = frame
+            self.rqcore.storeFrame(frameId, frame)
+
+        self.assertTrue(self.rqcore.preemptForMemory())
+
+        frames['over'].kill.assert_called_with(
+            mock.ANY, rqd.rqconstants.EXITSTATUS_FOR_MEMORY_PREEMPT, immediate=True)
+        frames['small'].kill.assert_not_called()
+        frames['unreserved'].kill.assert_not_called()
+
+    def test_preemptForMemoryWithoutFrames(self):
+        self.assertFalse(self.rqcore.preemptForMemory())
+
+    def test_preemptForMemoryWithinReservation(self):
+        frames = {}
+        for frameId, reserved, rss in (('under', '4000000', 3000000),
+                                       ('unreserved', None, 8000000),
+                                       ('invalid', 'lots', 8000000)):
+            environment = {'CUE_MEMORY': reserved} if reserved else {}
+            frame = rqd.rqnetwork.RunningFrame(
+                self.rqcore,
+                rqd.compiled_proto.rqd_pb2.RunFrame(frame_id=frameId, environment=environment))
+            frame.rss = rss
+            frame.kill = mock.MagicMock()
+            frames[frameId] = frame
+            self.rqcore.storeFrame(frameId, frame)
+
+        self.assertFalse(self.rqcore.preemptForMemory())
+
+        for frame in frames.values():
+            frame.kill.assert_not_called()
+
     def test_releaseCores(self):
         num_idle_cores = 10
         num_booked_cores = 7
@@ -258,15 +339,16 @@ class RqCoreTests(unittest.TestCase):
 
     @mock.patch.object(rqd.rqcore.RqCore, 'nimbyOff')
     def test_shutdown(self, nimbyOffMock):
-        self.rqcore.onIntervalThread = mock.MagicMock()
-        self.rqcore.updateRssThread = mock.MagicMock()
+        self.rqcore.updateRssJob = mock.MagicMock()
 
         self.rqcore.shutdown()
 
         nimbyOffMock.assert_called()
-        self.rqcore.onIntervalThread.cancel.assert_called()
-        self.rqcore.updateRssThread.cancel.assert_called()
+        self.reporterMock.return_value.stop.assert_called_with()
+        self.rqcore.updateRssJob.cancel.assert_called()
 
+    @mock.patch('rqd.rqscratch.ScratchCache', new=mock.MagicMock())
+    @mock.patch('rqd.rqspool.ReportSpool', new=mock.MagicMock())
     @mock.patch('rqd.rqnetwork.Network', autospec=True)
     @mock.patch('sys.exit')
     def test_handleExit(self, networkMock, exitMock):
@@ -287,6 +369,22 @@ class RqCoreTests(unittest.TestCase):
 
         frameThreadMock.return_value.start.assert_called()
 
+    @mock.patch('rqd.rqcore.FrameAttendantThread')
+    def test_launchFramePinsCpus(self, frameThreadMock):
+        self.rqcore.cores = rqd.compiled_proto.report_pb2.CoreDetail(
+            total_cores=800, idle_cores=800)
+        self.machineMock.return_value.state = rqd.compiled_proto.host_pb2.UP
+        self.nimbyMock.return_value.locked = False
+        self.machineMock.return_value.reserveCpus.return_value = rqd.rqtopology.Allocation(
+            (0, 1), (0, 1, 8, 9), (0,))
+        frame = rqd.compiled_proto.rqd_pb2.RunFrame(uid=22, num_cores=200)
+
+        self.rqcore.launchFrame(frame)
+
+        self.machineMock.return_value.reserveCpus.assert_called_with(200)
+        self.assertEqual('0,1,8,9', frame.attributes['CPU_LIST'])
+        self.assertEqual('0', frame.attributes['NUMA_NODES'])
+
     def test_launchFrameOnDownHost(self):
         self.machineMock.return_value.state = rqd.compiled_proto.host_pb2.DOWN
         frame = rqd.compiled_proto.rqd_pb2.RunFrame()
@@ -303,6 +401,17 @@ class RqCoreTests(unittest.TestCase):
         with self.assertRaises(rqd.rqexceptions.CoreReservationFailureException):
             self.rqcore.launchFrame(frame)
 
+    def test_launchFrameUnderMemoryPressure(self):
+        self.rqcore.cores = rqd.compiled_proto.report_pb2.CoreDetail(total_cores=100, idle_cores=20)
+        self.machineMock.return_value.state = rqd.compiled_proto.host_pb2.UP
+        self.nimbyMock.return_value.locked = False
+        self.rqcore.memoryPressure = mock.MagicMock()
+        self.rqcore.memoryPressure.isLaunchAllowed.return_value = False
+        frame = rqd.compiled_proto.rqd_pb2.RunFrame(uid=22, num_cores=10)
+
+        with self.assertRaises(rqd.rqexceptions.CoreReservationFailureException):
+            self.rqcore.launchFrame(frame)
+
     @mock.patch('rqd.rqcore.FrameAttendantThread')
     def test_launchFrameOnNimbyHost(self, frameThreadMock):
         self.rqcore.cores = rqd.compiled_proto.report_pb2.CoreDetail(total_cores=100, idle_cores=20)
@@ -364,6 +473,19 @@ class RqCoreTests(unittest.TestCase):
         self.assertEqual(frame, self.rqcore.getRunningFrame(frameId))
         self.assertIsNone(self.rqcore.getRunningFrame('some-unknown-frame-id'))
 
+    def test_recordHistory(self):
+        frame = mock.MagicMock(spec=rqd.rqnetwork.RunningFrame)
+        frame.rss = 1024
+        self.rqcore.storeFrame('frame1', frame)
+        self.machineMock.return_value.getHistorySample.return_value = {'free_mem': 2048}
+
+        self.rqcore.recordHistory()
+
+        self.assertEqual([('free_mem', '', [mock.ANY], [2048.0])],
+                         self.rqcore.history.query(metrics=['free_mem']))
+        self.assertEqual([('rss', 'frame1', [mock.ANY], [1024.0])],
+                         self.rqcore.history.query(metrics=['rss']))
+
     @mock.patch.object(rqd.rqcore.RqCore, 'respawn_rqd', autospec=True)
     def test_restartRqdNowNoFrames(self, respawnMock):
         self.nimbyMock.return_value.active = False
@@ -457,12 +579,93 @@ class RqCoreTests(unittest.TestCase):
         self.rqcore.onNimbyLock()
 
         killAllFrameMock.assert_called_with(self.rqcore, mock.ANY)
+        self.reporterMock.return_value.notify.assert_called_with(
+            rqd.rqreporter.REASON_NIMBY_LOCK)
 
-    @mock.patch.object(rqd.rqcore.RqCore, 'sendStatusReport', autospec=True)
-    def test_onNimbyUnlock(self, sendStatusReportMock):
+    def test_onNimbyUnlock(self):
         self.rqcore.onNimbyUnlock()
 
-        sendStatusReportMock.assert_called_with(self.rqcore)
+        self.reporterMock.return_value.notify.assert_called_with(
+            rqd.rqreporter.REASON_NIMBY_UNLOCK)
+
+    def __storeSuspendableFrame(self, frameId, ignoreNimby=False):
+        frame = rqd.rqnetwork.RunningFrame(
+            self.rqcore,
+            rqd.compiled_proto.rqd_pb2.RunFrame(frame_id=frameId, ignore_nimby=ignoreNimby))
+        frame.pid = 1234
+        self.rqcore.storeFrame(frameId, frame)
+        return frame
+
+    @mock.patch('os.killpg')
+    @mock.patch('rqd.rqutil.permissionsHigh', new=mock.MagicMock())
+    @mock.patch('rqd.rqutil.permissionsLow', new=mock.MagicMock())
+    @mock.patch.object(rqd.rqconstants, 'RQD_NIMBY_SUSPEND', True)
+    @mock.patch.object(rqd.rqcore.RqCore, 'killAllFrame', autospec=True)
+    def test_onNimbyLockSuspends(self, killAllFrameMock, killpgMock):
+        frame = self.__storeSuspendableFrame('frame1')
+        ignoringFrame = self.__storeSuspendableFrame('frame2', ignoreNimby=True)
+
+        self.rqcore.onNimbyLock()
+
+        killAllFrameMock.assert_not_called()
+        killpgMock.assert_called_once_with(1234, signal.SIGSTOP)
+        self.assertIsNotNone(frame.suspendedTime)
+        self.assertIn('suspended', frame.runningFrameInfo().attributes)
+        self.assertIsNone(ignoringFrame.suspendedTime)
+        self.schedulerMock.return_value.scheduleOnce.assert_called_with(
+            'nimbySuspendTimeout', rqd.rqconstants.RQD_NIMBY_MAX_SUSPEND_SEC, mock.ANY,
+            blocking=True)
+
+        self.rqcore.onNimbyUnlock()
+
+        killpgMock.assert_called_with(1234, signal.SIGCONT)
+        self.assertIsNone(frame.suspendedTime)
+        self.assertNotIn('suspended', frame.runningFrameInfo().attributes)
+        self.schedulerMock.return_value.scheduleOnce.return_value.cancel.assert_called_with()
+
+    @mock.patch('os.killpg', new=mock.MagicMock())
+    @mock.patch('rqd.rqutil.permissionsHigh', new=mock.MagicMock())
+    @mock.patch('rqd.rqutil.permissionsLow', new=mock.MagicMock())
+    @mock.patch.object(rqd.rqconstants, 'RQD_NIMBY_SUSPEND', True)
+    @mock.patch.object(rqd.rqcore.RqCore, 'killAllFrame', autospec=True)
+    def test_suspendTimeoutKills(self, killAllFrameMock):
+        self.__storeSuspendableFrame('frame1')
+        self.nimbyMock.return_value.locked = True
+        self.rqcore.onNimbyLock()
+
+        onTimeout = self.schedulerMock.return_value.scheduleOnce.call_args[0][2]
+        onTimeout()
+
+        killAllFrameMock.assert_called_with(self.rqcore, mock.ANY)
+        self.assertTrue(killAllFrameMock.call_args[0][1].startswith('NIMBY'))
+
+    def test_sendStatusReportSendsDeltaAfterAcknowledgement(self):
+        report = rqd.compiled_proto.report_pb2.HostReport()
+        report.host.name = 'arbitrary-host-name'
+        self.machineMock.return_value.getHostReport.return_value = report
+        reportStatus = self.networkMock.return_value.reportStatus
+        reportStatus.return_value = rqd.compiled_proto.report_pb2.RqdReportStatusResponse(
+            acknowledged_version=1)
+
+        self.rqcore.sendStatusReport()
+        self.rqcore.sendStatusReport()
+
+        sent = reportStatus.call_args[0][0]
+        self.assertEqual(1, sent.base_version)
+        self.assertTrue(sent.host_unchanged)
+
+    def test_sendStatusReportFailureSendsFullReport(self):
+        reportStatus = self.networkMock.return_value.reportStatus
+        reportStatus.return_value = rqd.compiled_proto.report_pb2.RqdReportStatusResponse(
+            acknowledged_version=1)
+        self.rqcore.sendStatusReport()
+        reportStatus.side_effect = RuntimeError('unavailable')
+
+        self.assertRaises(RuntimeError, self.rqcore.sendStatusReport)
+        reportStatus.side_effect = None
+        self.rqcore.sendStatusReport()
+
+        self.assertEqual(0, reportStatus.call_args[0][0].base_version)
 
     def test_lock(self):
         self.rqcore.cores.total_cores = 50
@@ -554,7 +757,8 @@ class FrameAttendantThreadTests(pyfakefs.fake_filesystem_unittest.TestCase):
 
     @mock.patch('platform.system', new=mock.Mock(return_value='Linux'))
     @mock.patch('tempfile.gettempdir')
-    def test_runLinux(self, getTempDirMock, permsUser, timeMock, popenMock): # mkdirMock, openMock,
+    @mock.patch('os.wait4')
+    def test_runLinux(self, wait4Mock, getTempDirMock, permsUser, timeMock, popenMock): # mkdirMock, openMock,
         # given
         currentTime = 1568070634.3
         jobTempPath = '/job/temp/path/'
@@ -573,15 +777,20 @@ class FrameAttendantThreadTests(pyfakefs.fake_filesystem_unittest.TestCase):
 
         timeMock.return_value = currentTime
         getTempDirMock.return_value = tempDir
-        popenMock.return_value.wait.return_value = returnCode
+        popenMock.return_value.pid = 3456
+        wait4Mock.return_value = (3456, returnCode << 8, mock.MagicMock(
+            ru_utime=1.5, ru_stime=0.25, ru_maxrss=2048, ru_inblock=8, ru_oublock=2))
 
         rqCore = mock.MagicMock()
-        rqCore.intervalStartTime = 20
-        rqCore.intervalSleepTime = 40
+        rqCore.logWriter = None
         rqCore.machine.getTempPath.return_value = jobTempPath
         rqCore.machine.isDesktop.return_value = True
         rqCore.machine.getHostInfo.return_value = renderHost
         rqCore.nimby.locked = False
+        rqCore.launchBroker = None
+        rqCore.reaper = None
+        rqCore.scratch = None
+        rqCore.staticEnv = rqd.rqutil.TtlCache(60)
 
         runFrame = rqd.compiled_proto.rqd_pb2.RunFrame(
             frame_id=frameId,
@@ -601,8 +810,6 @@ class FrameAttendantThreadTests(pyfakefs.fake_filesystem_unittest.TestCase):
         permsUser.assert_called_with(frameUid, mock.ANY)
         popenMock.assert_called_with(
             [
-                '/bin/nice', '/usr/bin/time', '-p', '-o',
-                jobTempPath + 'rqd-stat-' + frameId + '-' + str(currentTime),
                 '/bin/su', frameUsername, '-c',
                 '"' + tempDir + '/rqd-cmd-' + frameId + '-' + str(currentTime) + '"'
             ],
@@ -619,14 +826,197 @@ class FrameAttendantThreadTests(pyfakefs.fake_filesystem_unittest.TestCase):
         _, kwargs = popenMock.call_args
         self.assertEqual(logFile, kwargs['stdout'].name)
         self.assertEqual(logFile, kwargs['stderr'].name)
-
-        rqCore.network.reportRunningFrameCompletion.assert_called_with(
+        self.assertEqual('True', kwargs['env']['CUE3'])
+        self.assertEqual(frameUsername, kwargs['env']['USER'])
+        wait4Mock.assert_called_with(3456, 0)
+        self.assertEqual('1.50', frameInfo.utime)
+        self.assertEqual('0.25', frameInfo.stime)
+        self.assertEqual(2048, frameInfo.maxRss)
+        with open(logFile) as rqlog:
+            self.assertIn('launchStages', rqlog.read())
+
+        ioAttributes = frameInfo.io.attributes()
+        self.assertEqual('4096', ioAttributes['io_read_bytes'])
+        self.assertEqual('1024', ioAttributes['io_write_bytes'])
+        rqCore.sendFrameCompleteReport.assert_called_with(
             rqd.compiled_proto.report_pb2.FrameCompleteReport(
                 host=renderHost,
                 frame=rqd.compiled_proto.report_pb2.RunningFrameInfo(
-                    job_name=jobName, frame_id=frameId, frame_name=frameName),
+                    job_name=jobName, frame_id=frameId, frame_name=frameName,
+                    max_rss=2048, attributes=ioAttributes),
                 exit_status=returnCode))
 
+    @mock.patch('platform.system', new=mock.Mock(return_value='Linux'))
+    @mock.patch('tempfile.gettempdir')
+    def test_runLinuxWithReaper(self, getTempDirMock, permsUser, timeMock, popenMock):
+        # given
+        logDir = '/path/to/log/dir/'
+        tempDir = '/some/random/temp/dir'
+        frameId = 'arbitrary-frame-id'
+        renderHost = rqd.compiled_proto.report_pb2.RenderHost(name='arbitrary-host-name')
+
+        self.fs.create_dir(tempDir)
+
+        timeMock.return_value = 1568070634.3
+        getTempDirMock.return_value = tempDir
+        popenMock.return_value.pid = 3456
+
+        rqCore = mock.MagicMock()
+        rqCore.logWriter = None
+        rqCore.machine.getTempPath.return_value = '/job/temp/path/'
+        rqCore.machine.getHostInfo.return_value = renderHost
+        rqCore.nimby.locked = False
+        rqCore.launchBroker = None
+
+        runFrame = rqd.compiled_proto.rqd_pb2.RunFrame(
+            frame_id=frameId, job_name='job', frame_name='frame', uid=928,
+            user_name='my-random-user', log_dir=logDir)
+        frameInfo = rqd.rqnetwork.RunningFrame(rqCore, runFrame)
+
+        # when
+        attendantThread = rqd.rqcore.FrameAttendantThread(rqCore, runFrame, frameInfo)
+        attendantThread.start()
+        attendantThread.join()
+
+        # then the wait is handed to the reaper and the frame is still running
+        popenMock.return_value.wait.assert_not_called()
+        rqCore.reaper.register.assert_called_with(3456, mock.ANY)
+        rqCore.sendFrameCompleteReport.assert_not_called()
+        self.assertTrue(attendantThread.isAlive())
+
+        # when the frame is preempted and the reaper reports the exit
+        frameInfo.killExitStatus = rqd.rqconstants.EXITSTATUS_FOR_MEMORY_PREEMPT
+        _, onReaped = rqCore.reaper.register.call_args[0]
+        onReaped(-9, None)
+
+        # then
+        self.assertFalse(attendantThread.isAlive())
+        self.assertEqual(1, frameInfo.exitStatus)
+        self.assertEqual(9, frameInfo.exitSignal)
+        rqCore.deleteFrame.assert_called_with(frameId)
+        report = rqCore.sendFrameCompleteReport.call_args[0][0]
+        self.assertEqual(rqd.rqconstants.EXITSTATUS_FOR_MEMORY_PREEMPT, report.exit_status)
+
+    @mock.patch('platform.system', new=mock.Mock(return_value='Linux'))
+    @mock.patch('tempfile.gettempdir')
+    def test_runLinuxWithoutSchedSetaffinity(self, getTempDirMock, permsUser, timeMock,
+                                             popenMock):
+        # given Python 2, which has no os.sched_setaffinity
+        realOs = getattr(sys.modules['os'], 'os_module', sys.modules['os'])
+        if hasattr(realOs, 'sched_setaffinity'):
+            self.addCleanup(setattr, realOs, 'sched_setaffinity', realOs.sched_setaffinity)
+            del realOs.sched_setaffinity
+        currentTime = 1568070634.3
+        tempDir = '/some/random/temp/dir'
+        frameId = 'arbitrary-frame-id'
+
+        self.fs.create_dir(tempDir)
+
+        timeMock.return_value = currentTime
+        getTempDirMock.return_value = tempDir
+        popenMock.return_value.pid = 3456
+
+        rqCore = mock.MagicMock()
+        rqCore.logWriter = None
+        rqCore.machine.getTempPath.return_value = '/job/temp/path/'
+        rqCore.machine.isDesktop.return_value = False
+        rqCore.machine.createFrameCgroup.return_value = None
+        rqCore.machine.getHostInfo.return_value = \
+            rqd.compiled_proto.report_pb2.RenderHost(name='arbitrary-host-name')
+        rqCore.nimby.locked = False
+        rqCore.launchBroker = None
+        rqCore.scratch = None
+
+        runFrame = rqd.compiled_proto.rqd_pb2.RunFrame(
+            frame_id=frameId, job_name='job', frame_name='frame', uid=928,
+            user_name='my-random-user', log_dir='/path/to/log/dir/',
+            attributes={'CPU_LIST': '0-1,4'})
+        frameInfo = rqd.rqnetwork.RunningFrame(rqCore, runFrame)
+
+        # when
+        with mock.patch.object(rqd.rqcore.FrameAttendantThread,
+                               '_FrameAttendantThread__linuxPreexec') as preexec:
+            attendantThread = rqd.rqcore.FrameAttendantThread(rqCore, runFrame, frameInfo)
+            attendantThread.start()
+            attendantThread.join(0.5)
+
+        # then the affinity is set by taskset
+        popenMock.assert_called_with(
+            [
+                'taskset', '-c', '0-1,4', '/bin/su', 'my-random-user', '-c',
+                '"' + tempDir + '/rqd-cmd-' + frameId + '-' + str(currentTime) + '"'
+            ],
+            env=mock.ANY,
+            cwd=mock.ANY,
+            stdin=mock.ANY,
+            stdout=mock.ANY,
+            stderr=mock.ANY,
+            close_fds=mock.ANY,
+            preexec_fn=preexec.return_value)
+        # and not by the child before exec
+        preexec.assert_called_with(None, None, 0, None)
+
+    @mock.patch('platform.system', new=mock.Mock(return_value='Linux'))
+    @mock.patch('tempfile.gettempdir')
+    @mock.patch('os.wait4', new=mock.Mock(return_value=(3456, 0, None)))
+    def test_runLinuxWithLaunchBroker(self, getTempDirMock, permsUser, timeMock, popenMock):
+        # given
+        currentTime = 1568070634.3
+        jobTempPath = '/job/temp/path/'
+        logDir = '/path/to/log/dir/'
+        tempDir = '/some/random/temp/dir'
+        frameId = 'arbitrary-frame-id'
+        frameUsername = 'my-random-user'
+        logFile = os.path.join(logDir, 'job.frame.rqlog')
+
+        self.fs.create_dir(tempDir)
+        self.fs.create_dir(jobTempPath)
+        self.fs.create_dir(logDir)
+        timeMock.return_value = currentTime
+        getTempDirMock.return_value = tempDir
+
+        rqCore = mock.MagicMock()
+        rqCore.logWriter = None
+        rqCore.machine.getTempPath.return_value = jobTempPath
+        rqCore.machine.isDesktop.return_value = True
+        rqCore.machine.createFrameCgroup.return_value = None
+        rqCore.machine.getHostInfo.return_value = \
+            rqd.compiled_proto.report_pb2.RenderHost(name='arbitrary-host-name')
+        rqCore.nimby.locked = False
+        rqCore.reaper = None
+        rqCore.scratch = None
+        session = rqCore.launchBroker.openSession.return_value
+        session.openLog.side_effect = lambda runFrame: open(runFrame.log_dir_file, 'w', 1)
+        session.spawn.return_value.pid = 3456
+        session.spawn.return_value.wait.return_value = 0
+
+        runFrame = rqd.compiled_proto.rqd_pb2.RunFrame(
+            frame_id=frameId, job_name='job', frame_name='frame', uid=928,
+            user_name=frameUsername, log_dir=logDir, attributes={'CPU_LIST': '0-1,4', 'NUMA_NODES': '0'})
+        frameInfo = rqd.rqnetwork.RunningFrame(rqCore, runFrame)
+
+        # when
+        attendantThread = rqd.rqcore.FrameAttendantThread(rqCore, runFrame, frameInfo)
+        attendantThread.start()
+        attendantThread.join()
+
+        # then
+        permsUser.assert_not_called()
+        popenMock.assert_not_called()
+        session.openLog.assert_called_with(runFrame)
+        self.assertEqual(rqd.rqconstants.LAUNCH_FRAME_USER_GID, runFrame.gid)
+        session.spawn.assert_called_with(
+            [
+                '/bin/su', frameUsername, '-c',
+                '"' + tempDir + '/rqd-cmd-' + frameId + '-' + str(currentTime) + '"'
+            ],
+            mock.ANY, jobTempPath, mock.ANY, None, {0, 1, 4},
+            rqd.rqconstants.RQD_DESKTOP_FRAME_NICENESS, {0})
+        self.assertEqual(logFile, session.spawn.call_args[0][3].name)
+        session.close.assert_called_with()
+        self.assertEqual(0, frameInfo.exitStatus)
+        rqCore.sendFrameCompleteReport.assert_called()
+
     # TODO(bcipriano) Re-enable this test once Windows is supported. The main sticking point here
     #   is that the log directory is always overridden on Windows which makes mocking difficult.
     @mock.patch('platform.system', new=mock.Mock(return_value='Windows'))
@@ -648,12 +1038,12 @@ class FrameAttendantThreadTests(pyfakefs.fake_filesystem_unittest.TestCase):
         popenMock.return_value.returncode = returnCode
 
         rqCore = mock.MagicMock()
-        rqCore.intervalStartTime = 20
-        rqCore.intervalSleepTime = 40
+        rqCore.logWriter = None
         rqCore.machine.getTempPath.return_value = jobTempPath
         rqCore.machine.isDesktop.return_value = True
         rqCore.machine.getHostInfo.return_value = renderHost
         rqCore.nimby.locked = False
+        rqCore.launchBroker = None
 
         runFrame = rqd.compiled_proto.rqd_pb2.RunFrame(
             frame_id=frameId,
@@ -678,7 +1068,7 @@ class FrameAttendantThreadTests(pyfakefs.fake_filesystem_unittest.TestCase):
             stderr=mock.ANY)
         # TODO(bcipriano) Verify the log directory was created and used for stdout/stderr.
 
-        rqCore.network.reportRunningFrameCompletion.assert_called_with(
+        rqCore.sendFrameCompleteReport.assert_called_with(
             rqd.compiled_proto.report_pb2.FrameCompleteReport(
                 host=renderHost,
                 frame=rqd.compiled_proto.report_pb2.RunningFrameInfo(
@@ -709,12 +1099,12 @@ class FrameAttendantThreadTests(pyfakefs.fake_filesystem_unittest.TestCase):
         popenMock.return_value.returncode = returnCode
 
         rqCore = mock.MagicMock()
-        rqCore.intervalStartTime = 20
-        rqCore.intervalSleepTime = 40
+        rqCore.logWriter = None
         rqCore.machine.getTempPath.return_value = jobTempPath
         rqCore.machine.isDesktop.return_value = True
         rqCore.machine.getHostInfo.return_value = renderHost
         rqCore.nimby.locked = False
+        rqCore.launchBroker = None
 
         runFrame = rqd.compiled_proto.rqd_pb2.RunFrame(
             frame_id=frameId,
@@ -750,7 +1140,7 @@ class FrameAttendantThreadTests(pyfakefs.fake_filesystem_unittest.TestCase):
         self.assertEqual(logFile, kwargs['stdout'].name)
         self.assertEqual(logFile, kwargs['stderr'].name)
 
-        rqCore.network.reportRunningFrameCompletion.assert_called_with(
+        rqCore.sendFrameCompleteReport.assert_called_with(
             rqd.compiled_proto.report_pb2.FrameCompleteReport(
                 host=renderHost,
                 frame=rqd.compiled_proto.report_pb2.RunningFrameInfo(
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import mock
+import threading
+import unittest
+
+import grpc
+
+import rqd.compiled_proto.rqd_pb2
+import rqd.rqconstants
+import rqd.rqdservicers
+import rqd.rqhistory
+import rqd.rqlogwriter
+
+
+FRAME_ID = 'arbitrary-frame-id'
+
+
+class FrameLogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rqCore = mock.MagicMock()
+        self.frame = mock.MagicMock()
+        self.frame.logBuffer = rqd.rqlogwriter.LogBuffer(1024)
+        self.rqCore.getRunningFrame.side_effect = \
+            lambda frameId: self.frame if frameId == FRAME_ID else None
+        self.servicer = rqd.rqdservicers.RqdInterfaceServicer(self.rqCore)
+        self.context = mock.MagicMock()
+        self.context.is_active.return_value = True
+
+    def test_tail(self):
+        self.frame.logBuffer.append(b'line 1\nline 2\nline 3\n')
+
+        response = self.servicer.TailFrameLog(
+            rqd.compiled_proto.rqd_pb2.RqdStaticTailFrameLogRequest(frame_id=FRAME_ID, lines=2),
+            self.context)
+
+        self.assertEqual(b'line 2\nline 3\n', response.data)
+        self.assertEqual(7, response.offset)
+        self.assertEqual(21, response.log_size)
+
+    def test_tailNotRunning(self):
+        self.servicer.TailFrameLog(
+            rqd.compiled_proto.rqd_pb2.RqdStaticTailFrameLogRequest(frame_id='other-frame'),
+            self.context)
+
+        self.context.set_code.assert_called_with(grpc.StatusCode.NOT_FOUND)
+
+    def test_stream(self):
+        self.frame.logBuffer.append(b'header\n')
+        threading.Timer(0.05, self.frame.logBuffer.append, [b'output\n']).start()
+        threading.Timer(0.1, self.frame.logBuffer.close).start()
+
+        responses = list(self.servicer.StreamFrameLog(
+            rqd.compiled_proto.rqd_pb2.RqdStaticStreamFrameLogRequest(
+                frame_id=FRAME_ID, offset=3),
+            self.context))
+
+        self.assertEqual(b'der\noutput\n', b''.join(response.data for response in responses))
+        self.assertEqual(3, responses[0].offset)
+        self.assertTrue(responses[-1].finished)
+        self.assertFalse(any(response.finished for response in responses[:-1]))
+
+    @mock.patch.object(rqd.rqconstants, 'RQD_LOG_STREAM_MAX_SEC', 0)
+    def test_streamEndsAfterMaxTime(self):
+        self.frame.logBuffer.append(b'header\n')
+
+        responses = list(self.servicer.StreamFrameLog(
+            rqd.compiled_proto.rqd_pb2.RqdStaticStreamFrameLogRequest(frame_id=FRAME_ID),
+            self.context))
+
+        self.assertEqual([b'header\n'], [response.data for response in responses])
+        self.assertFalse(responses[-1].finished)
+
+
+class MachineHistoryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rqCore = mock.MagicMock()
+        self.rqCore.history = rqd.rqhistory.MachineHistory(capacity=4, frameCapacity=2)
+        self.servicer = rqd.rqdservicers.RqdInterfaceServicer(self.rqCore)
+
+    def test_history(self):
+        self.rqCore.history.record(100.0, {'free_mem': 10, 'load': 50}, {FRAME_ID: {'rss': 5}})
+        self.rqCore.history.record(130.0, {'free_mem': 20, 'load': 75}, {FRAME_ID: {'rss': 6}})
+
+        response = self.servicer.GetMachineHistory(
+            rqd.compiled_proto.rqd_pb2.RqdStaticGetMachineHistoryRequest(
+                start_time=110.0, metrics=['free_mem', 'rss']),
+            mock.MagicMock())
+
+        self.assertEqual(
+            [('free_mem', '', [130.0], [20.0]), ('rss', FRAME_ID, [130.0], [6.0])],
+            [(history.name, history.frame_id, list(history.times), list(history.values))
+             for history in response.histories])
+
+    def test_noHistory(self):
+        self.rqCore.history = None
+
+        response = self.servicer.GetMachineHistory(
+            rqd.compiled_proto.rqd_pb2.RqdStaticGetMachineHistoryRequest(), mock.MagicMock())
+
+        self.assertEqual(0, len(response.histories))
+
+
+if __name__ == '__main__':
+    unittest.main()
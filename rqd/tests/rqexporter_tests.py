@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import mock
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+try:
+    from urllib.request import urlopen
+    from urllib.error import HTTPError
+except ImportError:
+    from urllib2 import urlopen, HTTPError
+
+import rqd.rqexporter
+import rqd.rqmetrics
+
+
+def freePort():
+    sock = socket.socket()
+    try:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+class MetricsExporterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = rqd.rqmetrics.Registry()
+        self.registry.counter('reports_total', 'Reports').inc(3)
+        self.scheduler = mock.MagicMock()
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def __exporter(self, **kwargs):
+        exporter = rqd.rqexporter.MetricsExporter(
+            self.scheduler, registry=self.registry, **kwargs)
+        self.addCleanup(exporter.stop)
+        return exporter
+
+    def test_serve(self):
+        exporter = self.__exporter(port=freePort(), address='localhost')
+        exporter.start()
+
+        self.assertTrue(rqd.rqmetrics.isEnabled())
+        response = urlopen('http://localhost:%d/metrics' % exporter.port, timeout=5)
+        self.assertEqual(rqd.rqexporter.CONTENT_TYPE, response.headers['Content-Type'])
+        self.assertIn(b'reports_total 3\n', response.read())
+
+    def test_serveUnknownPath(self):
+        exporter = self.__exporter(port=freePort(), address='localhost')
+        exporter.start()
+
+        self.assertRaises(HTTPError, urlopen,
+                          'http://localhost:%d/other' % exporter.port, timeout=5)
+
+    def test_textfile(self):
+        path = os.path.join(self.tmpDir, 'rqd.prom')
+        exporter = self.__exporter(port=0, textfile=path)
+        exporter.start()
+
+        self.scheduler.schedulePeriodic.assert_called_with(
+            'metricsTextfile', mock.ANY, exporter.writeTextfile, initialDelay=0, blocking=True)
+        exporter.writeTextfile()
+
+        with open(path) as textfile:
+            self.assertIn('reports_total 3\n', textfile.read())
+        self.assertEqual(['rqd.prom'], os.listdir(self.tmpDir))
+
+    def test_stop(self):
+        exporter = self.__exporter(port=0, textfile=os.path.join(self.tmpDir, 'rqd.prom'))
+        exporter.start()
+
+        exporter.stop()
+
+        self.assertFalse(rqd.rqmetrics.isEnabled())
+        self.scheduler.schedulePeriodic.return_value.cancel.assert_called_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
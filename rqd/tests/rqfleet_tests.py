@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import mock
+import time
+import unittest
+
+import grpc
+
+import rqd.compiled_proto.host_pb2
+import rqd.compiled_proto.report_pb2
+import rqd.compiled_proto.rqd_pb2
+import rqd.compiled_proto.rqd_pb2_grpc
+import rqd.rqconstants
+import rqd.rqdservicers
+import rqd.rqexceptions
+import rqd.rqfleet
+import rqd.rqscheduler
+
+
+SCRIPT = rqd.rqfleet.FrameScript(30.0, 4000000, 10.0, 0)
+
+
+class FunctionTests(unittest.TestCase):
+
+    def test_rssAt(self):
+        self.assertEqual(0, rqd.rqfleet.rssAt(SCRIPT, 0))
+        self.assertEqual(2000000, rqd.rqfleet.rssAt(SCRIPT, 5))
+        self.assertEqual(4000000, rqd.rqfleet.rssAt(SCRIPT, 20))
+        self.assertEqual(4000000, rqd.rqfleet.rssAt(SCRIPT._replace(rampSeconds=0), 0))
+
+    def test_hostAddress(self):
+        self.assertEqual('127.1.0.1', rqd.rqfleet.hostAddress('127.1.0.1', 0))
+        self.assertEqual('127.1.1.0', rqd.rqfleet.hostAddress('127.1.0.1', 255))
+
+
+class SimulatedHostTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('rqd.rqscheduler.monotonic', new=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.fleet = mock.MagicMock()
+        self.fleet.frameScript.return_value = SCRIPT
+        self.host = rqd.rqfleet.SimulatedHost(
+            self.fleet, '127.1.0.1', '127.1.0.1:8444', 4, 16 * 1024 * 1024, ['general'],
+            'test')
+
+    def __launch(self, frameId='frame-1', numCores=200):
+        self.host.launchFrame(rqd.compiled_proto.rqd_pb2.RunFrame(
+            frame_id=frameId, job_name='job', num_cores=numCores))
+        return self.fleet.scheduler.scheduleOnce.call_args[0][2]
+
+    def test_bootReport(self):
+        report = self.host.getBootReport()
+
+        self.assertEqual('127.1.0.1', report.host.name)
+        self.assertEqual(['general'], list(report.host.tags))
+        self.assertEqual('127.1.0.1:8444',
+                         report.host.attributes[rqd.rqfleet.ADDRESS_ATTRIBUTE])
+        self.assertEqual(400, report.core_info.idle_cores)
+
+    def test_bootRetried(self):
+        self.fleet.network.reportRqdStartup.side_effect = Exception('unavailable')
+
+        self.host.boot()
+
+        self.fleet.scheduler.scheduleOnce.assert_called_with(
+            'simulatedBoot', rqd.rqconstants.RQD_RETRY_STARTUP_CONNECT_DELAY, self.host.boot,
+            blocking=True)
+
+    def test_launchFrame(self):
+        launched = rqd.rqfleet.FRAMES_LAUNCHED.value()
+
+        self.__launch()
+
+        self.assertEqual(200, self.host.cores.booked_cores)
+        self.assertEqual(200, self.host.cores.idle_cores)
+        self.assertEqual(30.0, self.fleet.scheduler.scheduleOnce.call_args[0][1])
+        self.assertEqual(launched + 1, rqd.rqfleet.FRAMES_LAUNCHED.value())
+        self.assertIsNotNone(self.host.getRunningFrame('frame-1'))
+
+    def test_launchRefused(self):
+        self.__launch()
+
+        self.assertRaises(rqd.rqexceptions.DuplicateFrameViolationException,
+                          self.__launch)
+        self.assertRaises(rqd.rqexceptions.CoreReservationFailureException,
+                          self.__launch, 'frame-2', 300)
+
+        self.host.lockAll()
+        self.assertRaises(rqd.rqexceptions.CoreReservationFailureException,
+                          self.__launch, 'frame-3', 100)
+
+    def test_memoryCurve(self):
+        self.__launch()
+
+        self.now += 5
+        report = self.host.getHostReport()
+
+        self.assertEqual(2000000, report.frames[0].rss)
+        self.assertEqual(16 * 1024 * 1024 - rqd.rqfleet.RESERVED_MEMORY - 2000000,
+                         report.host.free_mem)
+        self.assertEqual(200, report.host.load)
+
+    def test_frameCompletes(self):
+        complete = self.__launch()
+
+        self.now += 30
+        complete()
+
+        report = self.fleet.network.reportRunningFrameCompletion.call_args[0][0]
+        self.assertEqual('frame-1', report.frame.frame_id)
+        self.assertEqual(0, report.exit_status)
+        self.assertEqual(0, report.exit_signal)
+        self.assertEqual(30, report.run_time)
+        self.assertEqual(4000000, report.frame.max_rss)
+        self.assertEqual(400, self.host.cores.idle_cores)
+        self.assertIsNone(self.host.getRunningFrame('frame-1'))
+
+    def test_kill(self):
+        self.__launch()
+        job = self.fleet.scheduler.scheduleOnce.return_value
+
+        self.host.getRunningFrame('frame-1').kill(message='killed by test')
+
+        job.cancel.assert_called_with()
+        report = self.fleet.network.reportRunningFrameCompletion.call_args[0][0]
+        self.assertEqual(1, report.exit_status)
+        self.assertEqual(rqd.rqconstants.KILL_SIGNAL, report.exit_signal)
+
+    def test_shutdownIdle(self):
+        complete = self.__launch()
+
+        self.host.shutdownRqdIdle()
+
+        self.assertEqual(rqd.compiled_proto.host_pb2.UP, self.host.renderHost.state)
+        self.assertEqual(400, self.host.cores.locked_cores)
+        self.assertRaises(rqd.rqexceptions.CoreReservationFailureException,
+                          self.__launch, 'frame-2', 100)
+
+        complete()
+
+        self.assertEqual(rqd.compiled_proto.host_pb2.DOWN, self.host.renderHost.state)
+        self.assertEqual(0, self.host.cores.idle_cores)
+
+    def test_unlockCancelsShutdown(self):
+        complete = self.__launch()
+        self.host.shutdownRqdIdle()
+
+        self.host.unlockAll()
+        complete()
+
+        self.assertEqual(rqd.compiled_proto.host_pb2.UP, self.host.renderHost.state)
+        self.assertEqual(400, self.host.cores.idle_cores)
+
+    def test_deltaStatusReports(self):
+        def acknowledge(report):
+            return rqd.compiled_proto.report_pb2.RqdReportStatusResponse(
+                acknowledged_version=report.report_version)
+        self.fleet.network.reportStatus.side_effect = acknowledge
+        self.__launch()
+
+        self.host.sendStatusReport()
+        self.now += 20
+        self.host.sendStatusReport()
+        self.host.sendStatusReport()
+
+        reports = [call[0][0] for call in self.fleet.network.reportStatus.call_args_list]
+        self.assertEqual(0, reports[0].base_version)
+        self.assertEqual(1, reports[1].base_version)
+        self.assertEqual(['frame-1'], list(reports[2].unchanged_frame_ids))
+
+
+class VirtualFleetTests(unittest.TestCase):
+
+    def test_addresses(self):
+        fleet = rqd.rqfleet.VirtualFleet(3, address='127.1.0.254', port=8444)
+
+        self.assertEqual(['127.1.0.254:8444', '127.1.0.255:8444', '127.1.1.0:8444'],
+                         [host.address for host in fleet.hosts])
+        self.assertEqual('127.1.0.255', fleet.hosts[1].name)
+
+    def test_portPerHost(self):
+        fleet = rqd.rqfleet.VirtualFleet(2, address='127.0.0.1', port=9000, portPerHost=True)
+
+        self.assertEqual(['127.0.0.1:9000', '127.0.0.1:9001'],
+                         [host.address for host in fleet.hosts])
+
+    def test_frameScript(self):
+        fleet = rqd.rqfleet.VirtualFleet(0, script=SCRIPT, jitter=0.1, seed=1)
+
+        script = fleet.frameScript(rqd.compiled_proto.rqd_pb2.RunFrame(
+            environment={rqd.rqfleet.ENV_DURATION: '5', rqd.rqfleet.ENV_EXIT_STATUS: '3'}))
+
+        self.assertEqual(5.0, script.duration)
+        self.assertEqual(3, script.exitStatus)
+        self.assertTrue(3600000 <= script.rssKb <= 4400000)
+        self.assertEqual(10.0, script.rampSeconds)
+
+    def test_everyRqdInterfaceMethod(self):
+        """Calls every RqdInterface method on a simulated host, so it keeps
+        providing everything the servicer uses of RqCore"""
+        standIn = rqd.rqfleet.StandInCuebot(dispatch=False, maxWorkers=4)
+        standIn.start()
+        self.addCleanup(standIn.stop)
+        fleet = rqd.rqfleet.VirtualFleet(
+            1, address='127.0.0.1', port=0, portPerHost=True, cuebotHostnames=['127.0.0.1'],
+            cuebotPort=standIn.port, maxWorkers=4)
+        fleet.start()
+        self.addCleanup(fleet.stop)
+        channel = grpc.insecure_channel(fleet.hosts[0].address)
+        self.addCleanup(channel.close)
+        stub = rqd.compiled_proto.rqd_pb2_grpc.RqdInterfaceStub(channel)
+        requests = {
+            'LaunchFrame': rqd.compiled_proto.rqd_pb2.RqdStaticLaunchFrameRequest(
+                run_frame=rqd.compiled_proto.rqd_pb2.RunFrame(
+                    frame_id='frame-1', job_name='job', num_cores=100)),
+        }
+
+        service = rqd.compiled_proto.rqd_pb2.DESCRIPTOR.services_by_name['RqdInterface']
+        for method in service.methods:
+            if method.name not in vars(rqd.rqdservicers.RqdInterfaceServicer):
+                continue
+            request = requests.get(method.name) or getattr(
+                rqd.compiled_proto.rqd_pb2, method.input_type.name)()
+            call = getattr(stub, method.name)
+            try:
+                if method.server_streaming:
+                    list(call(request, timeout=10))
+                else:
+                    call(request, timeout=10)
+            except grpc.RpcError as e:
+                # Unknown frames are expected, anything else is not
+                self.assertEqual(grpc.StatusCode.NOT_FOUND, e.code(),
+                                 '%s failed: %s' % (method.name, e.details()))
+
+    def test_standInKeepsHostsBusy(self):
+        standIn = rqd.rqfleet.StandInCuebot(frameCores=200, maxWorkers=8)
+        standIn.start()
+        self.addCleanup(standIn.stop)
+        fleet = rqd.rqfleet.VirtualFleet(
+            2, cores=4, address='127.0.0.1', port=0, portPerHost=True,
+            cuebotHostnames=['127.0.0.1'], cuebotPort=standIn.port,
+            script=rqd.rqfleet.FrameScript(0.2, 1000, 0.1, 0), maxWorkers=8)
+        completed = sum(rqd.rqfleet.FRAMES_COMPLETED.values().values())
+        fleet.start()
+        self.addCleanup(fleet.stop)
+
+        deadline = time.time() + 10
+        while time.time() < deadline and \
+                sum(rqd.rqfleet.FRAMES_COMPLETED.values().values()) < completed + 8:
+            time.sleep(0.05)
+
+        self.assertEqual(2, standIn.hostCount())
+        self.assertGreaterEqual(
+            sum(rqd.rqfleet.FRAMES_COMPLETED.values().values()), completed + 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
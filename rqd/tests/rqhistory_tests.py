@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import unittest
+
+import rqd.rqhistory
+
+
+class RingBufferTests(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = rqd.rqhistory.RingBuffer(3, ('free_mem', 'load'))
+
+    def test_query(self):
+        self.ring.append(1.0, {'free_mem': 10, 'load': 100})
+        self.ring.append(2.0, {'free_mem': 20, 'load': 200})
+
+        self.assertEqual({'free_mem': ([1.0, 2.0], [10.0, 20.0]),
+                          'load': ([1.0, 2.0], [100.0, 200.0])},
+                         self.ring.query())
+
+    def test_oldestOverwritten(self):
+        for sample in range(1, 6):
+            self.ring.append(float(sample), {'free_mem': sample * 10})
+
+        self.assertEqual(3, len(self.ring))
+        self.assertEqual(([3.0, 4.0, 5.0], [30.0, 40.0, 50.0]), self.ring.query()['free_mem'])
+
+    def test_timeRange(self):
+        for sample in range(1, 6):
+            self.ring.append(float(sample), {'free_mem': sample * 10})
+
+        self.assertEqual(([4.0], [40.0]), self.ring.query(start=3.5, end=4.5)['free_mem'])
+
+    def test_missingValues(self):
+        self.ring.append(1.0, {'free_mem': 10})
+        self.ring.append(2.0, {'free_mem': 20, 'load': 200})
+
+        self.assertEqual(([2.0], [200.0]), self.ring.query()['load'])
+
+    def test_fixedSize(self):
+        self.assertEqual(3 * 3 * 8, self.ring.nbytes())
+
+
+class MachineHistoryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.history = rqd.rqhistory.MachineHistory(capacity=10, frameCapacity=2)
+
+    def test_frames(self):
+        self.history.record(1.0, {'free_mem': 10}, {'frame-1': {'rss': 100}})
+        self.history.record(2.0, {'free_mem': 20}, {'frame-1': {'rss': 200},
+                                                    'frame-2': {'rss': 300}})
+        self.history.record(3.0, {'free_mem': 30}, {'frame-1': {'rss': 400},
+                                                    'frame-2': {'rss': 500}})
+
+        self.assertEqual([('rss', 'frame-1', [2.0, 3.0], [200.0, 400.0]),
+                          ('rss', 'frame-2', [2.0, 3.0], [300.0, 500.0])],
+                         self.history.query(metrics=['rss']))
+
+    def test_finishedFrameDropped(self):
+        self.history.record(1.0, {}, {'frame-1': {'rss': 100}})
+        self.history.record(2.0, {}, {})
+
+        self.assertEqual([], self.history.query(metrics=['rss']))
+        self.assertEqual(self.history.host.nbytes(), self.history.nbytes())
+
+    def test_hostMetrics(self):
+        self.history.record(1.0, {'free_mem': 10, 'free_swap': 5}, {})
+
+        self.assertEqual([('free_mem', '', [1.0], [10.0]), ('free_swap', '', [1.0], [5.0])],
+                         [series for series in self.history.query() if series[2]])
+
+
+if __name__ == '__main__':
+    unittest.main()
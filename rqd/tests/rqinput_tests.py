@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import mock
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import rqd.rqconstants
+import rqd.rqinput
+
+
+def waitFor(condition, timeout=5):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+class ParseInotifyEventsTests(unittest.TestCase):
+
+    def test_parseInotifyEvents(self):
+        data = (rqd.rqinput.INOTIFY_EVENT.pack(1, rqd.rqinput.IN_CREATE, 0, 16)
+                + b'event3'.ljust(16, b'\0')
+                + rqd.rqinput.INOTIFY_EVENT.pack(1, rqd.rqinput.IN_DELETE, 0, 8)
+                + b'mouse0'.ljust(8, b'\0'))
+
+        self.assertEqual([(rqd.rqinput.IN_CREATE, 'event3'), (rqd.rqinput.IN_DELETE, 'mouse0')],
+                         rqd.rqinput.parseInotifyEvents(data))
+
+
+@unittest.skipUnless(rqd.rqinput.InputWatcher.isSupported(), 'requires epoll')
+@mock.patch('rqd.rqutil.permissionsHigh', new=mock.MagicMock())
+@mock.patch('rqd.rqutil.permissionsLow', new=mock.MagicMock())
+@mock.patch.object(rqd.rqconstants, 'RQD_INPUT_ACTIVITY_RESOLUTION_SEC', 0)
+class InputWatcherTests(unittest.TestCase):
+    """Input devices are stood in for by fifos."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.writers = []
+        self.activity = threading.Event()
+
+    def tearDown(self):
+        for writer in self.writers:
+            os.close(writer)
+
+    def __createDevice(self, name):
+        devicePath = os.path.join(self.path, name)
+        os.mkfifo(devicePath)
+        return devicePath
+
+    def __startWatcher(self):
+        watcher = rqd.rqinput.InputWatcher(self.activity.set, path=self.path)
+        watcher.open()
+        watcher.start()
+        self.addCleanup(watcher.stop)
+        return watcher
+
+    def __connect(self, devicePath):
+        writer = os.open(devicePath, os.O_WRONLY | os.O_NONBLOCK)
+        self.writers.append(writer)
+        return writer
+
+    def test_activity(self):
+        devicePath = self.__createDevice('event0')
+        self.__createDevice('js0')
+        watcher = self.__startWatcher()
+        writer = self.__connect(devicePath)
+        watcher.lastActivity -= 100
+
+        self.assertEqual(1, watcher.deviceCount())
+        self.assertGreater(watcher.idleSeconds(), 99)
+
+        os.write(writer, b'mouse event')
+
+        self.assertTrue(self.activity.wait(5))
+        self.assertLess(watcher.idleSeconds(), 5)
+
+    def test_hotPluggedDevice(self):
+        watcher = self.__startWatcher()
+        self.assertEqual(0, watcher.deviceCount())
+
+        devicePath = self.__createDevice('event1')
+
+        self.assertTrue(waitFor(lambda: watcher.deviceCount() == 1))
+        writer = self.__connect(devicePath)
+        os.write(writer, b'key event')
+        self.assertTrue(self.activity.wait(5))
+
+    def test_removedDevice(self):
+        devicePath = self.__createDevice('event0')
+        watcher = self.__startWatcher()
+        self.assertEqual(1, watcher.deviceCount())
+
+        os.remove(devicePath)
+
+        self.assertTrue(waitFor(lambda: watcher.deviceCount() == 0))
+
+    def test_stop(self):
+        self.__createDevice('event0')
+        watcher = self.__startWatcher()
+
+        watcher.stop()
+
+        self.assertFalse(watcher.is_alive())
+        self.assertEqual(0, watcher.deviceCount())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import os
+import unittest
+
+import mock
+import pyfakefs.fake_filesystem_unittest
+
+import rqd.rqlogrotate
+
+
+LOG_DIR = '/shots/show/logs'
+LOG_PATH = os.path.join(LOG_DIR, 'job.0001-frame.rqlog')
+
+
+class RotateTests(pyfakefs.fake_filesystem_unittest.TestCase):
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_dir(LOG_DIR)
+
+    def __runFrame(self, contents, maxFiles=15, suffix=''):
+        pruned = rqd.rqlogrotate.rotate(LOG_PATH, maxFiles)
+        self.fs.create_file(LOG_PATH + suffix, contents=contents)
+        return pruned
+
+    @staticmethod
+    def __read(path):
+        with open(path) as logFile:
+            return logFile.read()
+
+    def test_firstRun(self):
+        self.assertEqual([], rqd.rqlogrotate.rotate(LOG_PATH, 15))
+
+        self.assertEqual([], os.listdir(LOG_DIR))
+
+    def test_firstRunOnlyRenames(self):
+        with mock.patch('rqd.rqlogrotate.readIndex') as readIndexMock, \
+                mock.patch('rqd.rqlogrotate.writeIndex') as writeIndexMock, \
+                mock.patch('os.rename', wraps=os.rename) as renameMock:
+            self.assertEqual([], rqd.rqlogrotate.rotate(LOG_PATH, 15))
+
+        self.assertEqual(len(rqd.rqlogrotate.LOG_SUFFIXES), renameMock.call_count)
+        readIndexMock.assert_not_called()
+        writeIndexMock.assert_not_called()
+
+    def test_rotate(self):
+        self.__runFrame('run 1')
+        self.__runFrame('run 2')
+        self.__runFrame('run 3')
+
+        self.assertEqual('run 1', self.__read(LOG_PATH + '.1'))
+        self.assertEqual('run 2', self.__read(LOG_PATH + '.2'))
+        self.assertEqual('run 3', self.__read(LOG_PATH))
+        self.assertEqual(['job.0001-frame.rqlog.1', 'job.0001-frame.rqlog.2'],
+                         rqd.rqlogrotate.readIndex(LOG_PATH))
+
+    def test_prune(self):
+        for run in range(1, 5):
+            self.assertEqual([], self.__runFrame('run %d' % run, maxFiles=3))
+
+        pruned = self.__runFrame('run 5', maxFiles=3)
+
+        self.assertEqual([LOG_PATH + '.1'], pruned)
+        self.assertEqual(['job.0001-frame.rqlog.2', 'job.0001-frame.rqlog.3',
+                          'job.0001-frame.rqlog.4'],
+                         rqd.rqlogrotate.readIndex(LOG_PATH))
+        # Deleted by the caller
+        self.assertTrue(os.path.exists(LOG_PATH + '.1'))
+        rqd.rqlogrotate.prune(pruned)
+        self.assertFalse(os.path.exists(LOG_PATH + '.1'))
+        self.assertEqual('run 4', self.__read(LOG_PATH + '.4'))
+
+    def test_pruneMissing(self):
+        rqd.rqlogrotate.prune([LOG_PATH + '.1'])
+
+    def test_legacyGenerations(self):
+        self.fs.create_file(LOG_PATH + '.1', contents='run 1')
+        self.fs.create_file(LOG_PATH + '.2', contents='run 2')
+        self.fs.create_file(LOG_PATH + '.10', contents='run 10')
+        self.fs.create_file(LOG_PATH + '.old', contents='unrelated')
+        self.fs.create_file(LOG_PATH, contents='run 11')
+
+        pruned = rqd.rqlogrotate.rotate(LOG_PATH, 3)
+
+        self.assertEqual([LOG_PATH + '.1'], pruned)
+        self.assertEqual('run 11', self.__read(LOG_PATH + '.11'))
+        self.assertEqual(['job.0001-frame.rqlog.2', 'job.0001-frame.rqlog.10',
+                          'job.0001-frame.rqlog.11'],
+                         rqd.rqlogrotate.readIndex(LOG_PATH))
+
+    def test_compressedLog(self):
+        self.__runFrame('run 1', suffix='.gz')
+        self.__runFrame('run 2')
+        self.__runFrame('run 3')
+
+        self.assertEqual('run 1', self.__read(LOG_PATH + '.1.gz'))
+        self.assertEqual('run 2', self.__read(LOG_PATH + '.2'))
+        self.assertEqual(['job.0001-frame.rqlog.1.gz', 'job.0001-frame.rqlog.2'],
+                         rqd.rqlogrotate.readIndex(LOG_PATH))
+
+    def test_indexEntriesOutsideLog(self):
+        self.fs.create_file('/etc/shadow', contents='secret')
+        self.fs.create_file(LOG_PATH, contents='run 2')
+        rqd.rqlogrotate.writeIndex(LOG_PATH, [
+            '/etc/shadow', '../../x', 'other.rqlog.1', 'job.0001-frame.rqlog.1/../x',
+            'job.0001-frame.rqlog.1'])
+
+        pruned = rqd.rqlogrotate.rotate(LOG_PATH, 1)
+
+        self.assertEqual([LOG_PATH + '.1'], pruned)
+        self.assertEqual(['job.0001-frame.rqlog.2'], rqd.rqlogrotate.readIndex(LOG_PATH))
+
+    def test_indexNotWorldWritable(self):
+        self.__runFrame('run 1')
+        self.__runFrame('run 2')
+
+        mode = os.stat(rqd.rqlogrotate.indexPath(LOG_PATH)).st_mode & 0o777
+        self.assertEqual(0, mode & 0o022)
+        # No temporary index left behind
+        self.assertEqual(['job.0001-frame.rqlog', 'job.0001-frame.rqlog.1',
+                          'job.0001-frame.rqlog.index'], sorted(os.listdir(LOG_DIR)))
+
+    def test_noLogSinceLastRotation(self):
+        self.__runFrame('run 1')
+        rqd.rqlogrotate.rotate(LOG_PATH, 15)
+
+        # The last launch failed before its log was opened
+        self.assertEqual([], rqd.rqlogrotate.rotate(LOG_PATH, 15))
+        self.assertEqual(['job.0001-frame.rqlog.1'], rqd.rqlogrotate.readIndex(LOG_PATH))
+        self.assertEqual(['job.0001-frame.rqlog.1', 'job.0001-frame.rqlog.index'],
+                         sorted(os.listdir(LOG_DIR)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import gzip
+import mock
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+
+import rqd.rqconstants
+import rqd.rqlogwriter
+
+
+@unittest.skipUnless(rqd.rqlogwriter.FrameLogWriter.isSupported(), 'epoll is required')
+class FrameLogWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.logPath = os.path.join(self.tempDir, 'job.frame.rqlog')
+        self.writer = rqd.rqlogwriter.FrameLogWriter()
+        self.writer.start()
+
+    def tearDown(self):
+        self.writer.stop()
+        shutil.rmtree(self.tempDir)
+
+    def __open(self, **options):
+        return self.writer.open(open(self.logPath, 'w', 1), self.logPath, **options)
+
+    def __runFrame(self, stream, script):
+        proc = subprocess.Popen(['/bin/sh', '-c', script], stdout=stream, stderr=stream)
+        proc.wait()
+
+    @staticmethod
+    def __waitFor(condition):
+        deadline = time.time() + 10
+        while not condition() and time.time() < deadline:
+            time.sleep(0.02)
+
+    def __read(self):
+        with open(self.logPath, 'rb') as logFile:
+            return logFile.read()
+
+    def test_batchedWrites(self):
+        stream = self.__open()
+        print('header', file=stream)
+
+        self.__runFrame(stream, 'for i in $(seq 1 500); do echo "line $i"; done; echo err >&2')
+        print('footer', file=stream)
+        stream.close()
+
+        lines = self.__read().decode('ascii').splitlines()
+        self.assertEqual('header', lines[0])
+        self.assertEqual('line 1', lines[1])
+        self.assertEqual('line 500', lines[500])
+        self.assertEqual(['err', 'footer'], lines[501:])
+        # 500 echo calls, written to the log at most a few times
+        self.assertLessEqual(stream.writes, 5)
+        self.assertEqual(0, self.writer.streamCount())
+
+    def test_flushedAfterInterval(self):
+        stream = self.__open()
+
+        with mock.patch.object(rqd.rqconstants, 'RQD_LOG_WRITER_FLUSH_SEC', 0.05):
+            self.__runFrame(stream, 'echo started')
+            self.__waitFor(lambda: self.__read())
+
+        self.assertEqual(b'started\n', self.__read())
+        stream.close()
+
+    def test_cap(self):
+        stream = self.__open(maxBytes=100)
+
+        self.__runFrame(stream, 'for i in $(seq 1000 1099); do echo "line $i"; done')
+        stream.close()
+
+        log = self.__read()
+        self.assertTrue(log.startswith(b'line 1000\n'))
+        self.assertTrue(log.endswith(b'line 1099\n'))
+        self.assertIn(b'[rqd: 900 bytes of output dropped', log)
+        self.assertEqual(900, stream.dropped)
+
+    def test_capKeepsSmallTail(self):
+        stream = self.__open(maxBytes=500, tailBytes=100)
+
+        self.__runFrame(stream, 'for i in $(seq 1000 1099); do echo "line $i"; done')
+        stream.close()
+
+        log = self.__read()
+        # 400 bytes of the head, 100 of the tail
+        self.assertTrue(log.startswith(b'line 1000\n'))
+        self.assertIn(b'line 1039\n\n[rqd: 500 bytes of output dropped', log)
+        self.assertTrue(log.endswith(b'bytes]\n\n' + b''.join(
+            b'line %d\n' % i for i in range(1090, 1100))))
+        self.assertEqual(500, stream.dropped)
+
+    def test_filters(self):
+        stream = self.__open(timestamps=True, stripAnsi=True)
+
+        self.__runFrame(stream, r'printf "\033[1;31mred\033[0m\nno newline"')
+        stream.close()
+
+        lines = self.__read().decode('ascii').splitlines()
+        self.assertRegex(lines[0], r'^\[\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\] red$')
+        self.assertTrue(lines[1].endswith('] no newline'))
+
+    def test_buffered(self):
+        stream = self.__open(bufferBytes=1024)
+        print('header', file=stream)
+
+        self.__runFrame(stream, 'echo output')
+
+        self.assertEqual((0, b'header\noutput\n'), stream.buffer.read(0, 1024))
+        self.assertFalse(stream.buffer.closed)
+        stream.close()
+        self.assertTrue(stream.buffer.closed)
+
+    def test_notBuffered(self):
+        self.assertIsNone(self.__open(bufferBytes=0).buffer)
+
+    @mock.patch('rqd.rqutil.permissionsLow', new=mock.MagicMock())
+    @mock.patch('rqd.rqutil.permissionsUser')
+    def test_compress(self, permissionsUserMock):
+        stream = self.__open()
+        print('compressed', file=stream)
+
+        with mock.patch.object(rqd.rqconstants, 'RQD_LOG_COMPRESS', True):
+            stream.close()
+
+        self.assertFalse(os.path.exists(self.logPath))
+        with gzip.open(self.logPath + '.gz', 'rb') as logFile:
+            self.assertEqual(b'compressed\n', logFile.read())
+        # As the log's owner
+        stat = os.stat(self.logPath + '.gz')
+        permissionsUserMock.assert_called_with(stat.st_uid, stat.st_gid)
+
+    def test_compressOnWorkerPool(self):
+        scheduler = mock.MagicMock()
+        writer = rqd.rqlogwriter.FrameLogWriter(scheduler)
+        stream = writer.open(open(self.logPath, 'w', 1), self.logPath)
+
+        with mock.patch.object(rqd.rqconstants, 'RQD_LOG_COMPRESS', True), \
+                mock.patch('rqd.rqlogwriter.compress') as compressMock:
+            stream.close()
+            compressMock.assert_not_called()
+            self.assertTrue(scheduler.runSoon.call_args[1]['blocking'])
+            scheduler.runSoon.call_args[0][1]()
+
+        compressMock.assert_called_once_with(self.logPath)
+        writer.stop()
+
+    @mock.patch('rqd.rqutil.permissionsLow', new=mock.MagicMock())
+    @mock.patch('rqd.rqutil.permissionsUser', new=mock.MagicMock())
+    def test_compressDoesNotFollowSymlink(self):
+        victim = os.path.join(self.tempDir, 'victim')
+        with open(victim, 'w') as victimFile:
+            victimFile.write('precious')
+        os.symlink(victim, self.logPath + '.gz')
+        with open(self.logPath, 'w') as logFile:
+            logFile.write('log')
+
+        rqd.rqlogwriter.compress(self.logPath)
+
+        with open(victim) as victimFile:
+            self.assertEqual('precious', victimFile.read())
+        # The log is kept when it could not be compressed
+        self.assertTrue(os.path.exists(self.logPath))
+
+
+class LogBufferTests(unittest.TestCase):
+
+    def setUp(self):
+        self.buffer = rqd.rqlogwriter.LogBuffer(16)
+
+    def test_read(self):
+        self.buffer.append(b'line 1\n')
+        self.buffer.append(b'line 2\n')
+
+        self.assertEqual((0, b'line 1\nline 2\n'), self.buffer.read(0, 100))
+        self.assertEqual((7, b'line'), self.buffer.read(7, 4))
+        self.assertEqual((14, b''), self.buffer.read(20, 100))
+        self.assertEqual(14, self.buffer.size())
+
+    def test_oldestDropped(self):
+        for line in range(1, 5):
+            self.buffer.append(b'line %d\n' % line)
+
+        self.assertEqual(28, self.buffer.size())
+        # The bytes before offset 12 are gone
+        self.assertEqual((12, b'2\nline 3\nline 4\n'), self.buffer.read(0, 100))
+
+    def test_tail(self):
+        self.buffer.append(b'a\nbb\nccc\n')
+
+        self.assertEqual((5, b'ccc\n'), self.buffer.tail(1))
+        self.assertEqual((2, b'bb\nccc\n'), self.buffer.tail(2))
+        self.assertEqual((0, b'a\nbb\nccc\n'), self.buffer.tail(10))
+        self.assertEqual((9, b''), self.buffer.tail(0))
+
+        self.buffer.append(b'dd')
+        self.assertEqual((5, b'ccc\ndd'), self.buffer.tail(2))
+
+    def test_wait(self):
+        threading.Timer(0.05, self.buffer.append, [b'output']).start()
+
+        self.buffer.wait(0, 10)
+
+        self.assertEqual(6, self.buffer.size())
+
+    def test_waitEndsOnClose(self):
+        self.buffer.close()
+
+        start = time.time()
+        self.buffer.wait(0, 10)
+        self.assertLess(time.time() - start, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
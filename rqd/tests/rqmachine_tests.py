@@ -30,6 +30,7 @@ import rqd.rqcore
 import rqd.rqmachine
 import rqd.rqnetwork
 import rqd.rqnimby
+import rqd.rqscheduler
 import rqd.rqutil
 import rqd.compiled_proto.host_pb2
 import rqd.compiled_proto.report_pb2
@@ -150,6 +151,9 @@ PROC_PID_STAT = ('105 (time) S 7 105 105 0 -1 4210688 317 0 1 0 31 13 0 0 20 0 1
                  '16781318 0 0 0 0 17 4 0 0 0 0 0 6303248 6304296 23932928 140725890743234 '
                  '140725890743420 140725890743420 140725890744298 0')
 
+PROC_PID_IO = ('rchar: 16384\nwchar: 4096\nsyscr: 12\nsyscw: 3\nread_bytes: 8192\n'
+               'write_bytes: 4096\ncancelled_write_bytes: 0\n')
+
 CUDAINFO = ' TotalMem 1023 Mb  FreeMem 968 Mb'
 
 
@@ -158,6 +162,8 @@ CUDAINFO = ' TotalMem 1023 Mb  FreeMem 968 Mb'
 @mock.patch('platform.system', new=mock.MagicMock(return_value='Linux'))
 @mock.patch('os.statvfs', new=mock.MagicMock())
 @mock.patch('rqd.rqutil.getHostname', new=mock.MagicMock(return_value='arbitrary-hostname'))
+@mock.patch('rqd.rqutil.permissionsLow', new=mock.MagicMock())
+@mock.patch('rqd.rqutil.permissionsHigh', new=mock.MagicMock())
 class MachineTests(pyfakefs.fake_filesystem_unittest.TestCase):
 
     @mock.patch('subprocess.getoutput', new=mock.MagicMock(return_value=CUDAINFO))
@@ -171,6 +177,8 @@ class MachineTests(pyfakefs.fake_filesystem_unittest.TestCase):
         self.meminfo = self.fs.create_file('/proc/meminfo', contents=MEMINFO_MODERATE_USAGE)
 
         self.rqCore = mock.MagicMock(spec=rqd.rqcore.RqCore)
+        self.rqCore.scratch = None
+        self.rqCore.scheduler = mock.MagicMock(spec=rqd.rqscheduler.Scheduler)
         self.nimby = mock.MagicMock(spec=rqd.rqnimby.Nimby)
         self.rqCore.nimby = self.nimby
         self.nimby.active = False
@@ -282,6 +290,7 @@ class MachineTests(pyfakefs.fake_filesystem_unittest.TestCase):
         pid = 105
         frameId = 'unused-frame-id'
         self.fs.create_file('/proc/%d/stat' % pid, contents=PROC_PID_STAT)
+        self.fs.create_file('/proc/%d/io' % pid, contents=PROC_PID_IO)
         runningFrame = rqd.rqnetwork.RunningFrame(self.rqCore,
                                                   rqd.compiled_proto.rqd_pb2.RunFrame())
         runningFrame.pid = pid
@@ -295,9 +304,50 @@ class MachineTests(pyfakefs.fake_filesystem_unittest.TestCase):
         self.assertEqual(4356, updatedFrameInfo.max_vsize)
         self.assertEqual(4356, updatedFrameInfo.vsize)
         self.assertAlmostEqual(0.034444696691, float(updatedFrameInfo.attributes['pcpu']))
-        self.assertEqual(
-            {'list': [{'seconds': 1277.4100000000035, 'total_time': 44, 'pid': '105'}]},
-            eval(updatedFrameInfo.attributes['ptree']))
+        self.assertEqual(1, len(updatedFrameInfo.processes))
+        process = updatedFrameInfo.processes[0]
+        self.assertEqual(105, process.pid)
+        self.assertEqual(7, process.ppid)
+        self.assertEqual('time', process.cmd)
+        self.assertEqual(616, process.rss)
+        self.assertAlmostEqual(0.44, process.cpu_seconds, places=5)
+        self.assertEqual(1570056609, process.start_time)
+        self.assertNotIn('ptree', updatedFrameInfo.attributes)
+        self.assertEqual('8192', updatedFrameInfo.attributes['io_read_bytes'])
+        self.assertEqual('4096', updatedFrameInfo.attributes['io_write_bytes'])
+        self.assertEqual('12', updatedFrameInfo.attributes['io_syscr'])
+
+    @mock.patch('time.time', new=mock.MagicMock(return_value=1570057887.61))
+    def test_rssUpdateCgroup(self):
+        rqd.rqconstants.RQD_ACCOUNTING_BACKEND = 'cgroup'
+        self.fs.create_file('/sys/fs/cgroup/cgroup.controllers', contents='cpu io memory')
+        self.fs.create_file('/sys/fs/cgroup/cgroup.subtree_control')
+        try:
+            machine = rqd.rqmachine.Machine(self.rqCore, self.coreDetail)
+        finally:
+            rqd.rqconstants.RQD_ACCOUNTING_BACKEND = 'proc'
+        frameId = 'unused-frame-id'
+        procsPath = machine.createFrameCgroup(frameId)
+        cgroupPath = os.path.dirname(procsPath)
+        self.fs.create_file(os.path.join(cgroupPath, 'memory.current'), contents='4194304')
+        self.fs.create_file(os.path.join(cgroupPath, 'memory.peak'), contents='8388608')
+        self.fs.create_file(os.path.join(cgroupPath, 'memory.stat'),
+                            contents='anon 1048576\nfile 3145728\nfile_mapped 0\n')
+        self.fs.create_file(os.path.join(cgroupPath, 'cpu.stat'),
+                            contents='usage_usec 0\nuser_usec 0\nsystem_usec 0\n')
+        runningFrame = rqd.rqnetwork.RunningFrame(
+            self.rqCore, rqd.compiled_proto.rqd_pb2.RunFrame(frame_id=frameId))
+        runningFrame.pid = 105
+        runningFrame.cgroup = procsPath
+
+        machine.rssUpdate({frameId: runningFrame})
+
+        updatedFrameInfo = runningFrame.runningFrameInfo()
+        self.assertEqual(1024, updatedFrameInfo.rss)
+        self.assertEqual(1024, updatedFrameInfo.max_rss)
+        self.assertEqual('4096', updatedFrameInfo.attributes['memory_current'])
+        self.assertEqual('8192', updatedFrameInfo.attributes['memory_peak'])
+        self.assertEqual('0', updatedFrameInfo.attributes['io_read_bytes'])
 
     @mock.patch.object(
         rqd.rqmachine.Machine, '_Machine__enabledHT', new=mock.MagicMock(return_value=False))
@@ -380,6 +430,23 @@ class MachineTests(pyfakefs.fake_filesystem_unittest.TestCase):
         self.assertEqual(False, hostInfo.nimby_locked)
         self.assertEqual(rqd.compiled_proto.host_pb2.UP, hostInfo.state)
 
+    def test_getHistorySample(self):
+        with mock.patch('os.statvfs') as statvfsMock:
+            statvfsMock.return_value = mock.MagicMock(f_bavail=2048, f_bsize=4096)
+
+            self.assertEqual(
+                {'free_mem': 25699176, 'free_swap': 4105212, 'free_mcp': 8192, 'load': 25,
+                 'pgout_rate': 0},
+                self.machine.getHistorySample())
+
+    def test_getHostInfoScratch(self):
+        self.rqCore.scratch = mock.MagicMock()
+        self.rqCore.scratch.attributes.return_value = {'scratchHits': '3'}
+
+        hostInfo = self.machine.getHostInfo()
+
+        self.assertEqual('3', hostInfo.attributes['scratchHits'])
+
     def test_getHostReport(self):
         frame1 = mock.MagicMock(spec=rqd.rqnetwork.RunningFrame)
         frame1Info = rqd.compiled_proto.report_pb2.RunningFrameInfo(resource_id='arbitrary-id-1')
@@ -416,23 +483,44 @@ class MachineTests(pyfakefs.fake_filesystem_unittest.TestCase):
         self.assertEqual(4105212, bootReport.host.free_swap)
         self.assertEqual(25699176, bootReport.host.free_mem)
 
-    def test_reserveHT(self):
+    def test_reserveCpus(self):
         cpuInfo = os.path.join(os.path.dirname(__file__), 'cpuinfo', '_cpuinfo_shark_ht_8-4-2-2')
         self.fs.add_real_file(cpuInfo)
         self.machine.testInitMachineStats(cpuInfo)
 
-        self.machine.setupHT()
-        tasksets = self.machine.reserveHT(300)
+        self.machine.setupTopology(cpuInfo)
+        allocation = self.machine.reserveCpus(300)
+
+        # Three cores of the first socket with their hyper-threading siblings
+        self.assertEqual((0, 1, 2, 8, 9, 10), allocation.cpus)
+        self.assertEqual((0,), allocation.nodes)
+
+        # Too large for the rest of the first socket, placed on the second
+        self.assertEqual((4, 5, 6, 12, 13, 14), self.machine.reserveCpus(300).cpus)
+
+        self.machine.releaseCpus('0,1,2,8,9,10')
 
-        self.assertEqual('0,8,1,9,2,10', tasksets)
+        self.assertEqual((0, 1, 2, 3, 8, 9, 10, 11), self.machine.reserveCpus(400).cpus)
 
-        self.machine.releaseHT(tasksets)
+    def test_reserveCpusFractionalCores(self):
+        cpuInfo = os.path.join(os.path.dirname(__file__), 'cpuinfo', '_cpuinfo_shark_ht_8-4-2-2')
+        self.fs.add_real_file(cpuInfo)
+        self.machine.setupTopology(cpuInfo)
+
+        self.assertIsNone(self.machine.reserveCpus(150))
+
+    def test_reserveCpusWithoutHyperthreading(self):
+        cpuInfo = os.path.join(os.path.dirname(__file__), 'cpuinfo', '_cpuinfo_shark_8-4-2')
+        self.fs.add_real_file(cpuInfo)
+        self.machine.setupTopology(cpuInfo)
 
-        self.assertEqual({0, 1, 2, 3, 4, 5, 6, 7}, self.machine._Machine__tasksets)
+        self.assertEqual((0, 1), self.machine.reserveCpus(200).cpus)
 
 
 class CpuinfoTests(unittest.TestCase):
 
+    @mock.patch('rqd.rqscratch.ScratchCache', new=mock.MagicMock())
+    @mock.patch('rqd.rqspool.ReportSpool', new=mock.MagicMock())
     def setUp(self):
         self.rqd = rqd.rqcore.RqCore()
 
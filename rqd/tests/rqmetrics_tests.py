@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import mock
+import unittest
+
+import rqd.rqmetrics
+
+
+class RegistryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = rqd.rqmetrics.Registry()
+
+    def test_counter(self):
+        counter = self.registry.counter('requests_total', 'Requests')
+
+        counter.inc()
+        counter.inc(2, label='cuebot1')
+
+        self.assertEqual(1, counter.value())
+        self.assertEqual(2, counter.value(label='cuebot1'))
+        self.assertIs(counter, self.registry.counter('requests_total', 'Requests'))
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        self.assertEqual(3, histogram.count())
+        self.assertAlmostEqual(5.55, histogram.sum())
+        self.assertEqual({None: ([1, 2, 3], histogram.sum())}, histogram.values())
+
+    def test_typeMismatch(self):
+        self.registry.counter('metric', 'A counter')
+
+        self.assertRaises(ValueError, self.registry.histogram, 'metric', 'A histogram')
+
+    def test_metricsSorted(self):
+        self.registry.counter('b', 'B')
+        self.registry.histogram('a', 'A')
+
+        self.assertEqual(['a', 'b'], [metric.name for metric in self.registry.metrics()])
+
+    def test_gauge(self):
+        gauge = self.registry.gauge('frames', 'Frames')
+        gauge.set(3)
+
+        self.assertEqual(3, gauge.value())
+
+        self.registry.gauge('frames', 'Frames', func=lambda: {'a': 1, 'b': 2})
+
+        self.assertEqual(2, gauge.value(label='b'))
+
+
+class RenderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = rqd.rqmetrics.Registry()
+
+    def test_counter(self):
+        counter = self.registry.counter('calls_total', 'Calls, by "method"', labelName='method')
+        counter.inc()
+        counter.inc(2, label='Report\\Status')
+
+        self.assertEqual(
+            '# HELP calls_total Calls, by "method"\n'
+            '# TYPE calls_total counter\n'
+            'calls_total 1\n'
+            'calls_total{method="Report\\\\Status"} 2\n',
+            rqd.rqmetrics.render(self.registry))
+
+    def test_histogram(self):
+        histogram = self.registry.histogram(
+            'latency_seconds', 'Latency', buckets=(0.1, 1.0), labelName='stage')
+        histogram.observe(0.5, label='spawn')
+        histogram.observe(5, label='spawn')
+
+        self.assertEqual(
+            '# HELP latency_seconds Latency\n'
+            '# TYPE latency_seconds histogram\n'
+            'latency_seconds_bucket{stage="spawn",le="0.1"} 0\n'
+            'latency_seconds_bucket{stage="spawn",le="1.0"} 1\n'
+            'latency_seconds_bucket{stage="spawn",le="+Inf"} 2\n'
+            'latency_seconds_sum{stage="spawn"} 5.5\n'
+            'latency_seconds_count{stage="spawn"} 2\n',
+            rqd.rqmetrics.render(self.registry))
+
+    def test_failingGauge(self):
+        self.registry.gauge('broken', 'Broken', func=lambda: 1 // 0)
+        self.registry.gauge('threads', 'Threads', func=lambda: 12)
+
+        self.assertEqual(
+            '# HELP threads Threads\n'
+            '# TYPE threads gauge\n'
+            'threads 12\n',
+            rqd.rqmetrics.render(self.registry))
+
+
+class TimedTests(unittest.TestCase):
+
+    def setUp(self):
+        self.histogram = rqd.rqmetrics.Registry().histogram('run_seconds', 'Run time')
+
+        @rqd.rqmetrics.timed(self.histogram)
+        def run(value):
+            return value
+        self.run = run
+
+    @mock.patch.object(rqd.rqmetrics, 'ENABLED', True)
+    def test_enabled(self):
+        self.assertEqual(5, self.run(5))
+
+        self.assertEqual(1, self.histogram.count())
+
+    def test_disabled(self):
+        self.assertEqual(5, self.run(5))
+
+        self.assertEqual(0, self.histogram.count())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+from builtins import range
+import collections
+import mock
+import threading
+import time
+import unittest
+
+import grpc
+
+import rqd.compiled_proto.report_pb2
+import rqd.rqconstants
+import rqd.rqcore
+import rqd.rqnetwork
+
+
+class FakeRpcError(grpc.RpcError):
+
+    def __init__(self, code):
+        super(FakeRpcError, self).__init__()
+        self.__code = code
+
+    def code(self):
+        return self.__code
+
+
+def fakeStub(channel):
+    return channel.stub
+
+
+def fakeChannel(address, options=None):
+    channel = mock.MagicMock()
+    channel.address = address
+    channel.stub = mock.MagicMock()
+    return channel
+
+
+@mock.patch('rqd.compiled_proto.report_pb2_grpc.RqdReportInterfaceStub',
+            new=mock.MagicMock(side_effect=fakeStub))
+@mock.patch('grpc.insecure_channel', new=mock.MagicMock(side_effect=fakeChannel))
+class CuebotChannelPoolTests(unittest.TestCase):
+
+    def test_rankingIsStable(self):
+        hosts = ['cuebot1', 'cuebot2', 'cuebot3']
+
+        first = rqd.rqnetwork.CuebotChannelPool(hosts, 8443, localName='render01')
+        second = rqd.rqnetwork.CuebotChannelPool(list(reversed(hosts)), 8443,
+                                                 localName='render01')
+
+        self.assertEqual([endpoint.hostname for endpoint in first.endpoints],
+                         [endpoint.hostname for endpoint in second.endpoints])
+
+    def test_rankingSpreadsHosts(self):
+        hosts = ['cuebot1', 'cuebot2', 'cuebot3']
+        preferred = collections.Counter()
+
+        for index in range(3000):
+            pool = rqd.rqnetwork.CuebotChannelPool(hosts, 8443, localName='render%04d' % index)
+            preferred[pool.endpoints[0].hostname] += 1
+
+        self.assertEqual(set(hosts), set(preferred))
+        for count in preferred.values():
+            self.assertGreater(count, 800)
+
+    def test_callReusesStub(self):
+        pool = rqd.rqnetwork.CuebotChannelPool(['cuebot1'], 8443)
+        request = rqd.compiled_proto.report_pb2.RqdReportStatusRequest()
+
+        pool.call('ReportStatus', request, 10)
+        pool.call('ReportStatus', request, 10)
+
+        endpoint = pool.endpoints[0]
+        self.assertEqual(2, endpoint.stub.ReportStatus.call_count)
+        endpoint.channel.subscribe.assert_called_once_with(endpoint.onStateChange,
+                                                           try_to_connect=True)
+
+    def test_keepaliveWithinServerPolicy(self):
+        pool = rqd.rqnetwork.CuebotChannelPool(['cuebot1'], 8443)
+
+        pool.endpoints[0].getStub()
+
+        options = dict(grpc.insecure_channel.call_args[1]['options'])
+        # grpc-java's defaults, permitKeepAliveTime of 5 minutes and no
+        # pings without calls
+        self.assertGreaterEqual(options['grpc.keepalive_time_ms'], 5 * 60 * 1000)
+        self.assertEqual(0, options['grpc.keepalive_permit_without_calls'])
+
+    def test_callFailsOver(self):
+        pool = rqd.rqnetwork.CuebotChannelPool(['cuebot1', 'cuebot2'], 8443)
+        request = rqd.compiled_proto.report_pb2.RqdReportStatusRequest()
+        first, second = pool.endpoints
+        first.getStub().ReportStatus.side_effect = FakeRpcError(grpc.StatusCode.UNAVAILABLE)
+        failovers = rqd.rqnetwork.FAILOVER_COUNT.value(label=first.hostname)
+
+        pool.call('ReportStatus', request, 10)
+
+        second.stub.ReportStatus.assert_called_with(request, timeout=10)
+        self.assertEqual(1, first.failures)
+        self.assertFalse(first.isHealthy(rqd.rqnetwork.monotonic()))
+        self.assertEqual(failovers + 1, rqd.rqnetwork.FAILOVER_COUNT.value(label=first.hostname))
+
+        # The failing cuebot is skipped while it backs off
+        pool.call('ReportStatus', request, 10)
+
+        self.assertEqual(1, first.stub.ReportStatus.call_count)
+        self.assertEqual(2, second.stub.ReportStatus.call_count)
+
+    def test_callRaisesWhenAllFail(self):
+        pool = rqd.rqnetwork.CuebotChannelPool(['cuebot1', 'cuebot2'], 8443)
+        for endpoint in pool.endpoints:
+            endpoint.getStub().ReportStatus.side_effect = FakeRpcError(
+                grpc.StatusCode.UNAVAILABLE)
+
+        with self.assertRaises(grpc.RpcError):
+            pool.call('ReportStatus', rqd.compiled_proto.report_pb2.RqdReportStatusRequest(), 10)
+
+    def test_callDoesNotFailOverOnRejection(self):
+        pool = rqd.rqnetwork.CuebotChannelPool(['cuebot1', 'cuebot2'], 8443)
+        first, second = pool.endpoints
+        first.getStub().ReportStatus.side_effect = FakeRpcError(
+            grpc.StatusCode.INVALID_ARGUMENT)
+
+        with self.assertRaises(grpc.RpcError):
+            pool.call('ReportStatus', rqd.compiled_proto.report_pb2.RqdReportStatusRequest(), 10)
+
+        self.assertIsNone(second.stub)
+        self.assertEqual(0, first.failures)
+
+    def test_backoffGrows(self):
+        endpoint = rqd.rqnetwork.CuebotEndpoint('cuebot1', 8443)
+
+        endpoint.markFailed()
+        firstRetry = endpoint.retryAt - rqd.rqnetwork.monotonic()
+        for _ in range(5):
+            endpoint.markFailed()
+        laterRetry = endpoint.retryAt - rqd.rqnetwork.monotonic()
+
+        self.assertLessEqual(firstRetry, rqd.rqconstants.RQD_GRPC_FAILOVER_BACKOFF_BASE_SEC)
+        self.assertGreater(laterRetry, rqd.rqconstants.RQD_GRPC_FAILOVER_BACKOFF_BASE_SEC)
+        self.assertLessEqual(laterRetry, rqd.rqconstants.RQD_GRPC_FAILOVER_BACKOFF_MAX_SEC)
+
+        endpoint.markSucceeded()
+
+        self.assertTrue(endpoint.isHealthy(rqd.rqnetwork.monotonic()))
+
+    def test_connectTimeRecordedWhenReady(self):
+        endpoint = rqd.rqnetwork.CuebotEndpoint('cuebot-connect', 8443)
+        endpoint.getStub()
+
+        endpoint.onStateChange(grpc.ChannelConnectivity.CONNECTING)
+        endpoint.onStateChange(grpc.ChannelConnectivity.READY)
+
+        self.assertEqual(1, rqd.rqnetwork.CONNECT_TIME.count(label='cuebot-connect'))
+
+    def test_unhealthyWhileDisconnected(self):
+        endpoint = rqd.rqnetwork.CuebotEndpoint('cuebot1', 8443)
+
+        endpoint.onStateChange(grpc.ChannelConnectivity.TRANSIENT_FAILURE)
+
+        self.assertFalse(endpoint.isHealthy(rqd.rqnetwork.monotonic()))
+
+    def test_close(self):
+        pool = rqd.rqnetwork.CuebotChannelPool(['cuebot1'], 8443)
+        endpoint = pool.endpoints[0]
+        endpoint.getStub()
+        channel = endpoint.channel
+
+        pool.close()
+
+        channel.close.assert_called()
+        self.assertIsNone(endpoint.channel)
+
+
+class NetworkTests(unittest.TestCase):
+
+    @mock.patch('atexit.register')
+    @mock.patch.object(rqd.rqnetwork, 'CuebotChannelPool', autospec=True)
+    def test_reportStatus(self, poolMock, atexitMock):
+        network = rqd.rqnetwork.Network(mock.MagicMock(spec=rqd.rqcore.RqCore))
+        report = rqd.compiled_proto.report_pb2.HostReport()
+
+        network.reportStatus(report)
+        network.reportStatus(report)
+        network.closeChannel()
+
+        poolMock.assert_called_once()
+        poolMock.return_value.call.assert_called_with(
+            'ReportStatus', rqd.compiled_proto.report_pb2.RqdReportStatusRequest(
+                host_report=report), rqd.rqconstants.RQD_TIMEOUT)
+        poolMock.return_value.close.assert_called_once()
+        atexitMock.assert_called_once_with(network.closeChannel)
+
+
+class TimedSemaphoreTests(unittest.TestCase):
+
+    def test_acquireTimesOut(self):
+        slots = rqd.rqnetwork.TimedSemaphore(1)
+        self.assertTrue(slots.acquire(False))
+        self.assertFalse(slots.acquire(False))
+
+        start = time.time()
+        self.assertFalse(slots.acquire(True, 0.05))
+        self.assertGreaterEqual(time.time() - start, 0.04)
+
+    def test_acquireWokenByRelease(self):
+        slots = rqd.rqnetwork.TimedSemaphore(1)
+        slots.acquire()
+        releaser = threading.Timer(0.05, slots.release)
+        releaser.start()
+
+        self.assertTrue(slots.acquire(True, 5))
+        releaser.join()
+
+    def test_releasedTooOften(self):
+        slots = rqd.rqnetwork.TimedSemaphore(1)
+        self.assertRaises(ValueError, slots.release)
+
+
+class CallLimiterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.limiter = rqd.rqnetwork.CallLimiter(maxControlCalls=1, maxQueryCalls=1,
+                                                 maxQueuedControlCalls=1, controlCallWait=0.05)
+        self.context = mock.MagicMock()
+        self.context.abort.side_effect = FakeRpcError(grpc.StatusCode.RESOURCE_EXHAUSTED)
+
+    def __call(self, method, behavior):
+        handler = self.limiter.intercept_service(
+            lambda details: grpc.unary_unary_rpc_method_handler(behavior),
+            mock.MagicMock(method='/rqd.RqdInterface/%s' % method))
+        return handler.unary_unary(None, self.context)
+
+    def test_shedsOverLimit(self):
+        shed = rqd.rqnetwork.SHED_CALLS.value(label='KillRunningFrame')
+
+        def launch(request, context):
+            self.assertRaises(FakeRpcError, self.__call, 'KillRunningFrame',
+                              lambda request, context: 'killed')
+            # Queries have their own limit
+            return self.__call('ReportStatus', lambda request, context: 'status')
+
+        self.assertEqual('status', self.__call('LaunchFrame', launch))
+        self.context.abort.assert_called_once_with(
+            grpc.StatusCode.RESOURCE_EXHAUSTED, mock.ANY)
+        self.assertEqual(shed + 1, rqd.rqnetwork.SHED_CALLS.value(label='KillRunningFrame'))
+
+        self.assertEqual('killed', self.__call('KillRunningFrame',
+                                               lambda request, context: 'killed'))
+
+    def __holdSlot(self, method, seconds):
+        """Serves a call taking seconds on another thread, once it has started"""
+        started = threading.Event()
+        results = []
+
+        def behavior(request, context):
+            started.set()
+            time.sleep(seconds)
+            return method
+
+        thread = threading.Thread(target=lambda: results.append(self.__call(method, behavior)))
+        thread.start()
+        started.wait()
+        return thread, results
+
+    def test_controlCallsQueued(self):
+        queued = rqd.rqnetwork.QUEUED_CALLS.value(label='KillRunningFrame')
+        thread, results = self.__holdSlot('LaunchFrame', 0.2)
+
+        with mock.patch.object(self.limiter, '_CallLimiter__controlCallWait', 5):
+            self.assertEqual('killed', self.__call('KillRunningFrame',
+                                                   lambda request, context: 'killed'))
+        thread.join()
+
+        self.assertEqual(['LaunchFrame'], results)
+        self.context.abort.assert_not_called()
+        self.assertEqual(queued + 1, rqd.rqnetwork.QUEUED_CALLS.value(label='KillRunningFrame'))
+
+    def test_shedsWhenQueueFull(self):
+        with mock.patch.object(self.limiter, '_CallLimiter__controlCallWait', 5):
+            launch, _ = self.__holdSlot('LaunchFrame', 0.3)
+            waiting = threading.Thread(
+                target=self.__call, args=('KillRunningFrame', lambda request, context: None))
+            waiting.start()
+            time.sleep(0.1)
+
+            start = time.time()
+            self.assertRaises(FakeRpcError, self.__call, 'KillRunningFrame',
+                              lambda request, context: 'killed')
+            # Refused without waiting
+            self.assertLess(time.time() - start, 0.2)
+            launch.join()
+            waiting.join()
+
+        self.context.abort.assert_called_once_with(
+            grpc.StatusCode.RESOURCE_EXHAUSTED, mock.ANY)
+
+    def test_logTailsLimitedSeparately(self):
+        def tail(request, context):
+            # Queries have their own limit
+            self.assertEqual('status', self.__call('ReportStatus',
+                                                   lambda request, context: 'status'))
+            self.assertRaises(FakeRpcError, self.__call, 'TailFrameLog',
+                              lambda request, context: 'tail')
+            return 'tail'
+
+        self.limiter = rqd.rqnetwork.CallLimiter(maxQueryCalls=1, maxLogTails=1)
+        self.assertEqual('tail', self.__call('TailFrameLog', tail))
+        self.context.abort.assert_called_once_with(
+            grpc.StatusCode.RESOURCE_EXHAUSTED, mock.ANY)
+
+    def test_slotReleasedOnError(self):
+        def fail(request, context):
+            raise RuntimeError('launch failed')
+
+        self.assertRaises(RuntimeError, self.__call, 'LaunchFrame', fail)
+
+        self.assertEqual('launched', self.__call('LaunchFrame',
+                                                 lambda request, context: 'launched'))
+
+    def test_callsTimedByMethod(self):
+        calls = rqd.rqnetwork.CALL_TIME.count(label='GetRunningFrameStatus')
+
+        self.__call('GetRunningFrameStatus', lambda request, context: None)
+
+        self.assertEqual(calls + 1, rqd.rqnetwork.CALL_TIME.count(label='GetRunningFrameStatus'))
+
+    def test_streamsLimited(self):
+        limiter = rqd.rqnetwork.CallLimiter(maxStreams=1)
+        handler = limiter.intercept_service(
+            lambda details: grpc.unary_stream_rpc_method_handler(
+                lambda request, context: iter(['first', 'second'])),
+            mock.MagicMock(method='/rqd.RqdInterface/StreamFrameLog'))
+
+        stream = handler.unary_stream(None, self.context)
+        self.assertEqual('first', next(stream))
+        self.assertRaises(FakeRpcError, list, handler.unary_stream(None, self.context))
+        self.assertEqual(['second'], list(stream))
+
+        # The slot is released once the stream ends
+        self.assertEqual(['first', 'second'], list(handler.unary_stream(None, self.context)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -23,100 +23,142 @@ import unittest
 
 import pyfakefs.fake_filesystem_unittest
 
+import rqd.rqconstants
 import rqd.rqcore
+import rqd.rqinput
 import rqd.rqmachine
 import rqd.rqnimby
+import rqd.rqscheduler
 
 
 @mock.patch('rqd.rqutil.permissionsHigh', new=mock.MagicMock())
 @mock.patch('rqd.rqutil.permissionsLow', new=mock.MagicMock())
+@mock.patch.object(rqd.rqconstants, 'MINIMUM_IDLE', 900)
+@mock.patch.object(rqd.rqconstants, 'CHECK_INTERVAL_LOCKED', 60)
 class RqNimbyTests(pyfakefs.fake_filesystem_unittest.TestCase):
     def setUp(self):
         self.setUpPyfakefs()
         self.inputDevice = self.fs.create_file('/dev/input/event0', contents='mouse event')
 
+        self.now = 1000.0
+        patcher = mock.patch('rqd.rqscheduler.monotonic', new=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
         self.rqMachine = mock.MagicMock(spec=rqd.rqmachine.Machine)
         self.rqCore = mock.MagicMock(spec=rqd.rqcore.RqCore)
         self.rqCore.machine = self.rqMachine
+        self.rqCore.scheduler = mock.MagicMock(spec=rqd.rqscheduler.Scheduler)
         self.nimby = rqd.rqnimby.Nimby(self.rqCore)
-        self.nimby.daemon = True
+        self.nimby.watcher = mock.MagicMock(spec=rqd.rqinput.InputWatcher)
+        self.nimby.watcher.idleSeconds.side_effect = lambda: self.now - self.lastActivity
+        self.lastActivity = self.now
 
-    @mock.patch.object(rqd.rqnimby.Nimby, 'unlockedIdle')
-    def test_initialState(self, unlockedIdleMock):
-        self.nimby.daemon = True
+    @mock.patch('rqd.rqinput.InputWatcher', autospec=True)
+    def test_run(self, watcherMock):
+        watcherMock.isSupported.return_value = True
 
-        self.nimby.start()
-        self.nimby.join()
+        self.nimby.run()
 
         # Initial state should be "unlocked and idle".
-        unlockedIdleMock.assert_called()
+        self.assertTrue(self.nimby.active)
+        self.assertFalse(self.nimby.locked)
+        watcherMock.assert_called_with(self.nimby.onActivity)
+        watcherMock.return_value.open.assert_called()
+        watcherMock.return_value.start.assert_called()
+        self.rqCore.scheduler.schedulePeriodic.assert_called_with(
+            'nimbyResources', rqd.rqconstants.CHECK_INTERVAL_RESOURCES,
+            self.nimby.checkResources, initialDelay=0, blocking=True)
 
         self.nimby.stop()
 
-    @mock.patch('select.select', new=mock.MagicMock(return_value=[['a new mouse event'], [], []]))
-    @mock.patch('threading.Timer')
-    def test_unlockedIdle(self, timerMock):
+        watcherMock.return_value.stop.assert_called()
+        self.assertIsNone(self.nimby.watcher)
+        self.rqCore.scheduler.schedulePeriodic.return_value.cancel.assert_called()
+
+    def test_activityWhenUnlocked(self):
         self.nimby.active = True
-        self.nimby.results = [[]]
-        self.rqCore.machine.isNimbySafeToRunJobs.return_value = True
 
-        self.nimby.unlockedIdle()
+        self.nimby.onActivity()
 
-        # Given a mouse event, Nimby should transition to "locked and in use".
-        timerMock.assert_called_with(mock.ANY, self.nimby.lockedInUse)
-        timerMock.return_value.start.assert_called()
+        self.rqCore.scheduler.runSoon.assert_called_with(
+            'nimbyLock', self.nimby.lockedInUse, blocking=True)
 
-    @mock.patch('select.select', new=mock.MagicMock(return_value=[[], [], []]))
-    @mock.patch.object(rqd.rqnimby.Nimby, 'unlockedIdle')
-    @mock.patch('threading.Timer')
-    def test_lockedIdleWhenIdle(self, timerMock, unlockedIdleMock):
+    def test_activityWhenLocked(self):
         self.nimby.active = True
-        self.nimby.results = [[]]
-        self.rqCore.machine.isNimbySafeToRunJobs.return_value = True
+        self.nimby.locked = True
 
-        self.nimby.lockedIdle()
+        self.nimby.onActivity()
 
-        # Given no events, Nimby should transition to "unlocked and idle".
-        unlockedIdleMock.assert_called()
+        self.rqCore.scheduler.runSoon.assert_not_called()
 
-    @mock.patch('select.select', new=mock.MagicMock(return_value=[['a new mouse event'], [], []]))
-    @mock.patch('threading.Timer')
-    def test_lockedIdleWhenInUse(self, timerMock):
+    def test_lockedInUse(self):
         self.nimby.active = True
-        self.nimby.results = [[]]
-        self.rqCore.machine.isNimbySafeToRunJobs.return_value = True
 
-        self.nimby.lockedIdle()
+        self.nimby.lockedInUse()
 
-        # Given a mouse event, Nimby should transition to "locked and in use".
-        timerMock.assert_called_with(mock.ANY, self.nimby.lockedInUse)
-        timerMock.return_value.start.assert_called()
+        # Nimby should lock and check again once the host could be idle.
+        self.assertTrue(self.nimby.locked)
+        self.rqCore.onNimbyLock.assert_called()
+        self.rqCore.scheduler.scheduleOnce.assert_called_with(
+            'nimby', 900, self.nimby.checkIdle, blocking=True)
 
-    @mock.patch('select.select', new=mock.MagicMock(return_value=[[], [], []]))
-    @mock.patch.object(rqd.rqnimby.Nimby, 'lockedIdle')
-    @mock.patch('threading.Timer')
-    def test_lockedInUseWhenIdle(self, timerMock, lockedIdleMock):
+    def test_checkIdleWhenInUse(self):
         self.nimby.active = True
-        self.nimby.results = [[]]
-        self.rqCore.machine.isNimbySafeToRunJobs.return_value = True
+        self.nimby.locked = True
+        self.lastActivity = self.now - 600
 
-        self.nimby.lockedInUse()
+        self.nimby.checkIdle()
 
-        # Given no events, Nimby should transition to "locked and idle".
-        lockedIdleMock.assert_called()
+        # Given activity 600 seconds ago, Nimby should stay locked for 300 more.
+        self.assertTrue(self.nimby.locked)
+        self.rqCore.scheduler.scheduleOnce.assert_called_with(
+            'nimby', 300, self.nimby.checkIdle, blocking=True)
 
-    @mock.patch('select.select', new=mock.MagicMock(return_value=[['a new mouse event'], [], []]))
-    @mock.patch('threading.Timer')
-    def test_lockedInUseWhenInUse(self, timerMock):
+    @mock.patch('time.time', new=mock.MagicMock(return_value=5000.0))
+    def test_checkIdleWhenIdle(self):
+        self.nimby.active = True
+        self.nimby.locked = True
+        self.lastActivity = self.now - 1000
+        self.rqCore.machine.isNimbySafeToUnlock.return_value = True
+
+        self.nimby.checkIdle()
+
+        # Given no activity for MINIMUM_IDLE, Nimby should unlock.
+        self.assertFalse(self.nimby.locked)
+        self.rqCore.onNimbyUnlock.assert_called_with(asOf=4000.0)
+        self.rqCore.scheduler.scheduleOnce.assert_not_called()
+
+    def test_checkIdleWhenUnsafe(self):
+        self.nimby.active = True
+        self.nimby.locked = True
+        self.lastActivity = self.now - 1000
+        self.rqCore.machine.isNimbySafeToUnlock.return_value = False
+
+        self.nimby.checkIdle()
+
+        self.assertTrue(self.nimby.locked)
+        self.rqCore.scheduler.scheduleOnce.assert_called_with(
+            'nimby', 60, self.nimby.checkIdle, blocking=True)
+
+    def test_checkResourcesLowMemory(self):
+        self.nimby.active = True
+        self.rqCore.machine.isNimbySafeToRunJobs.return_value = False
+
+        self.nimby.checkResources()
+
+        self.assertTrue(self.nimby.locked)
+        self.rqCore.scheduler.scheduleOnce.assert_called_with(
+            'nimby', 60, self.nimby.checkIdle, blocking=True)
+
+    def test_checkResources(self):
         self.nimby.active = True
-        self.nimby.results = [[]]
         self.rqCore.machine.isNimbySafeToRunJobs.return_value = True
 
-        self.nimby.lockedInUse()
+        self.nimby.checkResources()
 
-        # Given a mouse event, Nimby should stay in state "locked and in use".
-        timerMock.assert_called_with(mock.ANY, self.nimby.lockedInUse)
-        timerMock.return_value.start.assert_called()
+        self.assertFalse(self.nimby.locked)
+        self.rqCore.onNimbyLock.assert_not_called()
 
     def test_lockNimby(self):
         self.nimby.active = True
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import mock
+import unittest
+
+import pyfakefs.fake_filesystem_unittest
+
+import rqd.rqconstants
+import rqd.rqpressure
+import rqd.rqscheduler
+
+
+PSI_QUIET = """some avg10=0.00 avg60=0.00 avg300=0.00 total=1000
+full avg10=0.00 avg60=0.00 avg300=0.00 total=500
+"""
+
+PSI_HIGH = """some avg10=35.10 avg60=12.00 avg300=3.00 total=91000000
+full avg10=4.20 avg60=1.00 avg300=0.20 total=12000000
+"""
+
+PSI_CRITICAL = """some avg10=80.00 avg60=40.00 avg300=10.00 total=191000000
+full avg10=45.00 avg60=20.00 avg300=5.00 total=92000000
+"""
+
+MEMINFO_PLENTY = """MemTotal:       32942144 kB
+MemFree:         5339060 kB
+MemAvailable:   20000000 kB
+Cached:         20360116 kB
+"""
+
+MEMINFO_LOW = """MemTotal:       32942144 kB
+MemFree:          400000 kB
+MemAvailable:     500000 kB
+Cached:           200000 kB
+"""
+
+MEMINFO_NO_AVAILABLE = """MemTotal:       32942144 kB
+MemFree:         5339060 kB
+Cached:         20360116 kB
+"""
+
+
+class SampleTests(pyfakefs.fake_filesystem_unittest.TestCase):
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_file(rqd.rqconstants.PATH_MEMINFO, contents=MEMINFO_PLENTY)
+
+    def test_sample(self):
+        self.fs.create_file(rqd.rqconstants.PATH_PRESSURE_MEMORY, contents=PSI_HIGH)
+
+        self.assertEqual(rqd.rqpressure.PressureSample(35.1, 4.2, 20000000, 32942144),
+                         rqd.rqpressure.sample())
+
+    def test_sampleWithoutPsi(self):
+        self.assertEqual(rqd.rqpressure.PressureSample(None, None, 20000000, 32942144),
+                         rqd.rqpressure.sample())
+
+    def test_readMemInfoWithoutMemAvailable(self):
+        self.fs.create_file('/tmp/meminfo', contents=MEMINFO_NO_AVAILABLE)
+
+        self.assertEqual((25699176, 32942144), rqd.rqpressure.readMemInfo('/tmp/meminfo'))
+
+    def test_pressureLevel(self):
+        for psi, meminfo, level in (
+                (PSI_QUIET, MEMINFO_PLENTY, rqd.rqpressure.LEVEL_OK),
+                (PSI_HIGH, MEMINFO_PLENTY, rqd.rqpressure.LEVEL_HIGH),
+                (PSI_CRITICAL, MEMINFO_PLENTY, rqd.rqpressure.LEVEL_CRITICAL),
+                (PSI_QUIET, MEMINFO_LOW, rqd.rqpressure.LEVEL_CRITICAL)):
+            self.fs.create_file(rqd.rqconstants.PATH_PRESSURE_MEMORY, contents=psi)
+            self.fs.remove_object(rqd.rqconstants.PATH_MEMINFO)
+            self.fs.create_file(rqd.rqconstants.PATH_MEMINFO, contents=meminfo)
+
+            self.assertEqual(level, rqd.rqpressure.pressureLevel(rqd.rqpressure.sample()))
+
+            self.fs.remove_object(rqd.rqconstants.PATH_PRESSURE_MEMORY)
+
+
+QUIET = rqd.rqpressure.PressureSample(0.0, 0.0, 20000000, 32942144)
+HIGH = rqd.rqpressure.PressureSample(35.1, 4.2, 20000000, 32942144)
+CRITICAL = rqd.rqpressure.PressureSample(80.0, 45.0, 20000000, 32942144)
+
+
+@mock.patch.object(rqd.rqconstants, 'RQD_PRESSURE_SUSTAIN_SEC', 10)
+@mock.patch.object(rqd.rqconstants, 'RQD_PRESSURE_PREEMPT_COOLDOWN_SEC', 30)
+class MemoryPressureMonitorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('rqd.rqscheduler.monotonic', new=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.pressure = QUIET
+        self.preemptFunc = mock.MagicMock(return_value=True)
+        self.scheduler = mock.MagicMock(spec=rqd.rqscheduler.Scheduler)
+        self.monitor = rqd.rqpressure.MemoryPressureMonitor(
+            self.scheduler, self.preemptFunc, lambda: self.pressure)
+
+    def __sampleAt(self, pressure, seconds):
+        self.pressure = pressure
+        self.now += seconds
+        self.monitor.update()
+
+    def test_start(self):
+        self.monitor.start()
+
+        self.scheduler.schedulePeriodic.assert_called_with(
+            'memoryPressure', rqd.rqconstants.RQD_PRESSURE_SAMPLE_SEC, self.monitor.update,
+            initialDelay=0)
+
+    def test_launchRefusedUnderSustainedPressure(self):
+        self.__sampleAt(HIGH, 0)
+        self.assertTrue(self.monitor.isLaunchAllowed())
+
+        self.__sampleAt(HIGH, 5)
+        self.assertTrue(self.monitor.isLaunchAllowed())
+
+        self.__sampleAt(HIGH, 5)
+        self.assertFalse(self.monitor.isLaunchAllowed())
+        self.preemptFunc.assert_not_called()
+
+        self.__sampleAt(QUIET, 2)
+        self.assertTrue(self.monitor.isLaunchAllowed())
+
+    def test_shortSpikeAllowed(self):
+        self.__sampleAt(HIGH, 0)
+        self.__sampleAt(QUIET, 5)
+        self.__sampleAt(HIGH, 5)
+
+        self.assertTrue(self.monitor.isLaunchAllowed())
+
+    def test_preemptUnderCriticalPressure(self):
+        preemptions = rqd.rqpressure.PREEMPTIONS.value()
+
+        self.__sampleAt(CRITICAL, 0)
+
+        self.preemptFunc.assert_called_once_with()
+        self.assertEqual(rqd.rqpressure.LEVEL_CRITICAL, self.monitor.level)
+        self.assertEqual(preemptions + 1, rqd.rqpressure.PREEMPTIONS.value())
+
+    def test_preemptCooldown(self):
+        self.__sampleAt(CRITICAL, 0)
+        self.__sampleAt(CRITICAL, 10)
+        self.assertEqual(1, self.preemptFunc.call_count)
+
+        self.__sampleAt(CRITICAL, 20)
+        self.assertEqual(2, self.preemptFunc.call_count)
+
+    def test_sampleFailure(self):
+        def failingSample():
+            raise IOError('no meminfo')
+        monitor = rqd.rqpressure.MemoryPressureMonitor(
+            self.scheduler, self.preemptFunc, failingSample)
+
+        monitor.update()
+
+        self.assertTrue(monitor.isLaunchAllowed())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import errno
+import unittest
+
+import mock
+import pyfakefs.fake_filesystem_unittest
+
+import rqd.rqproc
+
+
+def statLine(pid, session, comm='render', ppid=1, rss=10, vsize=4096):
+    return ('%d (%s) S %d %d %d 0 -1 4210688 317 0 1 0 31 13 2 1 20 0 1 0 17385159 '
+            '%d %d 18446744073709551615 4194304 4204692 140725890735264 0 0 0 0 '
+            '16781318 0 0 0 0 17 4 0 0 0 0 0' % (pid, comm, ppid, session, session, vsize, rss))
+
+
+def ioText(readBytes=0, writeBytes=0, syscr=0, syscw=0):
+    return ('rchar: %d\nwchar: %d\nsyscr: %d\nsyscw: %d\nread_bytes: %d\nwrite_bytes: %d\n'
+            'cancelled_write_bytes: 0\n' % (
+                readBytes * 2, writeBytes, syscr, syscw, readBytes, writeBytes))
+
+
+class ParseStatTests(unittest.TestCase):
+
+    def test_parseStat(self):
+        proc = rqd.rqproc.parseStat(105, statLine(105, 100, ppid=7))
+
+        self.assertEqual(105, proc.pid)
+        self.assertEqual(7, proc.ppid)
+        self.assertEqual(100, proc.session)
+        self.assertEqual('render', proc.comm)
+        self.assertEqual(31, proc.utime)
+        self.assertEqual(13, proc.stime)
+        self.assertEqual(2, proc.cutime)
+        self.assertEqual(1, proc.cstime)
+        self.assertEqual(17385159, proc.startTime)
+        self.assertEqual(4096, proc.vsize)
+        self.assertEqual(10, proc.rss)
+
+    def test_parseStatCommWithSpaces(self):
+        proc = rqd.rqproc.parseStat(106, statLine(106, 100, comm='my (odd) cmd'))
+
+        self.assertEqual('my (odd) cmd', proc.comm)
+        self.assertEqual(100, proc.session)
+
+
+class ParseIoTests(unittest.TestCase):
+
+    def test_parseIo(self):
+        self.assertEqual(rqd.rqproc.ProcIo(2000, 500, 1000, 500, 7, 3),
+                         rqd.rqproc.parseIo(ioText(1000, 500, 7, 3)))
+
+
+class IoAccountingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.io = rqd.rqproc.IoAccounting()
+
+    def test_update(self):
+        self.io.update({100: rqd.rqproc.parseIo(ioText(1000, 100))}, 10.0)
+        self.io.update({100: rqd.rqproc.parseIo(ioText(3000, 100)),
+                        101: rqd.rqproc.parseIo(ioText(1000, 0))}, 12.0)
+
+        self.assertEqual(4000, self.io.totals.readBytes)
+        self.assertEqual(100, self.io.totals.writeBytes)
+        self.assertEqual(1500, self.io.rates.readBytes)
+        self.assertEqual(0, self.io.rates.writeBytes)
+
+    def test_exitedProcessKeepsTotals(self):
+        self.io.update({100: rqd.rqproc.parseIo(ioText(1000))}, 10.0)
+        self.io.update({}, 12.0)
+
+        self.assertEqual(1000, self.io.totals.readBytes)
+        self.assertEqual(0, self.io.rates.readBytes)
+
+    def test_reusedPid(self):
+        self.io.update({100: rqd.rqproc.parseIo(ioText(5000))}, 10.0)
+        self.io.update({100: rqd.rqproc.parseIo(ioText(1000))}, 12.0)
+
+        self.assertEqual(6000, self.io.totals.readBytes)
+
+    def test_addExited(self):
+        self.io.update({100: rqd.rqproc.parseIo(ioText(1000, 1000))}, 10.0)
+
+        self.io.addExited(4096, 512)
+
+        self.assertEqual(4096, self.io.totals.readBytes)
+        self.assertEqual(1000, self.io.totals.writeBytes)
+
+    def test_attributes(self):
+        self.io.update({100: rqd.rqproc.parseIo(ioText(1000, 100, 10, 1))}, 10.0)
+        self.io.update({100: rqd.rqproc.parseIo(ioText(2000, 100, 20, 1))}, 20.0)
+
+        attributes = self.io.attributes()
+
+        self.assertEqual('2000', attributes['io_read_bytes'])
+        self.assertEqual('100', attributes['io_read_bytes_per_sec'])
+        self.assertEqual('100', attributes['io_write_bytes'])
+        self.assertEqual('4000', attributes['io_read_chars'])
+        self.assertEqual('20', attributes['io_syscr'])
+        self.assertEqual('1', attributes['io_syscr_per_sec'])
+
+
+@mock.patch('rqd.rqutil.permissionsLow', new=mock.MagicMock())
+@mock.patch('rqd.rqutil.permissionsHigh', new=mock.MagicMock())
+class ProcScannerTests(pyfakefs.fake_filesystem_unittest.TestCase):
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.fs.create_dir('/proc/self')
+        self.fs.create_file('/proc/meminfo')
+        self.scanner = rqd.rqproc.ProcScanner('/proc')
+
+    def __addPid(self, pid, session, **kwargs):
+        self.fs.create_file('/proc/%d/stat' % pid, contents=statLine(pid, session, **kwargs))
+
+    def test_scanGroupsBySession(self):
+        self.__addPid(100, 100)
+        self.__addPid(101, 100)
+        self.__addPid(200, 200)
+        self.__addPid(300, 300)
+
+        procs = self.scanner.scan([100, 200])
+
+        self.assertEqual([100, 101], sorted(proc.pid for proc in procs[100]))
+        self.assertEqual([200], [proc.pid for proc in procs[200]])
+        self.assertNotIn(300, procs)
+
+    def test_scanMissingSession(self):
+        self.__addPid(100, 100)
+
+        procs = self.scanner.scan([500])
+
+        self.assertEqual({500: []}, procs)
+
+    def test_scanNoSessions(self):
+        self.__addPid(100, 100)
+
+        self.assertEqual({}, self.scanner.scan([]))
+
+    def test_scanSkipsExitedPid(self):
+        self.__addPid(100, 100)
+        self.fs.create_dir('/proc/101')
+
+        procs = self.scanner.scan([100])
+
+        self.assertEqual([100], [proc.pid for proc in procs[100]])
+
+    def test_readIoOf(self):
+        self.__addPid(100, 100)
+        self.fs.create_file('/proc/100/io', contents=ioText(1000, 500))
+        self.__addPid(101, 100)
+
+        samples = self.scanner.readIoOf([100, 101])
+
+        self.assertEqual([100], list(samples))
+        self.assertEqual(1000, samples[100].readBytes)
+
+
+    def test_readIoOfAsRoot(self):
+        self.fs.create_file('/proc/100/io', contents=ioText(1000, 500))
+
+        with mock.patch('rqd.rqutil.permissionsHigh') as highMock, \
+                mock.patch('rqd.rqutil.permissionsLow') as lowMock:
+            self.scanner.readIoOf([100])
+
+        highMock.assert_called_once_with()
+        lowMock.assert_called_once_with()
+
+    @mock.patch('rqd.rqproc.log.warning')
+    def test_readIoDeniedLoggedOnce(self, warningMock):
+        denied = IOError(errno.EACCES, 'Permission denied')
+        with mock.patch('rqd.rqproc.open', create=True, side_effect=denied):
+            self.assertEqual({}, self.scanner.readIoOf([100, 101]))
+            self.assertEqual({}, self.scanner.readIoOf([100]))
+
+        warningMock.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import subprocess
+import threading
+import unittest
+
+import rqd.rqreaper
+
+
+@unittest.skipUnless(rqd.rqreaper.FrameReaper.isSupported(), 'pidfd and epoll are required')
+class FrameReaperTests(unittest.TestCase):
+
+    def setUp(self):
+        self.reaper = rqd.rqreaper.FrameReaper(maxWorkers=2)
+        self.reaper.start()
+        self.results = {}
+        self.done = threading.Event()
+
+    def tearDown(self):
+        self.reaper.stop()
+
+    def __callback(self, name, expected):
+        def callback(returncode, rusage):
+            self.results[name] = (returncode, rusage)
+            if len(self.results) == expected:
+                self.done.set()
+        return callback
+
+    def test_exitStatus(self):
+        proc = subprocess.Popen(['/bin/sh', '-c', 'exit 3'])
+
+        self.reaper.register(proc.pid, self.__callback('proc', 1))
+
+        self.assertTrue(self.done.wait(10))
+        returncode, rusage = self.results['proc']
+        self.assertEqual(3, returncode)
+        self.assertIsNotNone(rusage)
+        self.assertEqual(0, self.reaper.waitingCount())
+
+    def test_exitSignal(self):
+        proc = subprocess.Popen(['/bin/sleep', '30'])
+        self.reaper.register(proc.pid, self.__callback('proc', 1))
+
+        proc.kill()
+
+        self.assertTrue(self.done.wait(10))
+        self.assertEqual(-9, self.results['proc'][0])
+
+    def test_manyProcesses(self):
+        procs = [subprocess.Popen(['/bin/true']) for _ in range(20)]
+
+        for i, proc in enumerate(procs):
+            self.reaper.register(proc.pid, self.__callback(i, len(procs)))
+
+        self.assertTrue(self.done.wait(10))
+        self.assertEqual(set([0]), set(result[0] for result in self.results.values()))
+
+    def test_exitCode(self):
+        self.assertEqual(0, rqd.rqreaper.exitCode(0))
+        self.assertEqual(2, rqd.rqreaper.exitCode(2 << 8))
+        self.assertEqual(-15, rqd.rqreaper.exitCode(15))
+
+
+if __name__ == '__main__':
+    unittest.main()
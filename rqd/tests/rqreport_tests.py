@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import unittest
+
+import rqd.compiled_proto.report_pb2
+import rqd.rqconstants
+import rqd.rqreport
+
+
+def makeReport(rss=1000000, freeMem=4000000, frameAttributes=None, processes=()):
+    report = rqd.compiled_proto.report_pb2.HostReport()
+    report.host.name = 'render01'
+    report.host.free_mem = freeMem
+    report.host.total_mem = 8000000
+    report.host.attributes['SP_OS'] = 'Linux'
+    report.core_info.total_cores = 800
+    for frameId in ('frame1', 'frame2'):
+        frame = report.frames.add(frame_id=frameId, job_name='job', rss=rss, max_rss=rss)
+        frame.attributes.update(frameAttributes or {'pcpu': '1.0'})
+        for pid, cmd in processes:
+            frame.processes.add(pid=pid, ppid=1, cmd=cmd, rss=rss // 10)
+    return report
+
+
+def acknowledge(version):
+    return rqd.compiled_proto.report_pb2.RqdReportStatusResponse(acknowledged_version=version)
+
+
+class HostReportEncoderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = rqd.rqreport.HostReportEncoder()
+
+    def __sendAcknowledged(self, report):
+        sent = self.encoder.encode(report)
+        self.encoder.acknowledge(sent.report_version, acknowledge(sent.report_version))
+        return sent
+
+    def test_firstReportIsFull(self):
+        sent = self.encoder.encode(makeReport())
+
+        self.assertEqual(1, sent.report_version)
+        self.assertEqual(0, sent.base_version)
+        self.assertEqual(2, len(sent.frames))
+        self.assertEqual('Linux', sent.host.attributes['SP_OS'])
+
+    def test_unchangedReportIsCompact(self):
+        first = self.__sendAcknowledged(makeReport())
+
+        sent = self.encoder.encode(makeReport(rss=1000001, freeMem=4000100))
+
+        self.assertEqual(first.report_version, sent.base_version)
+        self.assertTrue(sent.host_unchanged)
+        self.assertEqual('render01', sent.host.name)
+        self.assertEqual(0, sent.host.total_mem)
+        self.assertEqual(0, len(sent.frames))
+        self.assertEqual(['frame1', 'frame2'], list(sent.unchanged_frame_ids))
+        self.assertEqual(800, sent.core_info.total_cores)
+        self.assertLess(sent.ByteSize(), first.ByteSize())
+
+    def test_changedFrameWithoutAttributes(self):
+        self.__sendAcknowledged(makeReport())
+
+        sent = self.encoder.encode(makeReport(rss=2000000))
+
+        self.assertEqual(2, len(sent.frames))
+        self.assertEqual(2000000, sent.frames[0].rss)
+        self.assertTrue(sent.frames[0].attributes_unchanged)
+        self.assertEqual(0, len(sent.frames[0].attributes))
+
+    def test_changedAttributesAreSent(self):
+        self.__sendAcknowledged(makeReport())
+
+        sent = self.encoder.encode(makeReport(frameAttributes={'pcpu': '2.0'}))
+
+        self.assertEqual(2, len(sent.frames))
+        self.assertFalse(sent.frames[0].attributes_unchanged)
+        self.assertEqual('2.0', sent.frames[0].attributes['pcpu'])
+
+    def test_volatileAttributesWithinThreshold(self):
+        self.__sendAcknowledged(makeReport(
+            frameAttributes={'pcpu': '100.0', 'io_read_bytes': '1000000', 'CPU_LIST': '0'}))
+
+        sent = self.encoder.encode(makeReport(
+            frameAttributes={'pcpu': '100.5', 'io_read_bytes': '1005000', 'CPU_LIST': '0'}))
+
+        self.assertEqual(0, len(sent.frames))
+        self.assertEqual(['frame1', 'frame2'], list(sent.unchanged_frame_ids))
+
+    def test_otherAttributesCompareExactly(self):
+        self.__sendAcknowledged(makeReport(frameAttributes={'pcpu': '1.0', 'CPU_LIST': '0'}))
+
+        sent = self.encoder.encode(makeReport(frameAttributes={'pcpu': '1.0', 'CPU_LIST': '1'}))
+
+        self.assertEqual(2, len(sent.frames))
+        self.assertEqual('1', sent.frames[0].attributes['CPU_LIST'])
+
+    def test_suspendedComparedExactly(self):
+        # An epoch timestamp, a few seconds are well within the threshold
+        self.__sendAcknowledged(makeReport(frameAttributes={'suspended': '1700000000'}))
+
+        sent = self.encoder.encode(makeReport(frameAttributes={'suspended': '1700000005'}))
+
+        self.assertEqual(2, len(sent.frames))
+        self.assertEqual('1700000005', sent.frames[0].attributes['suspended'])
+
+    def test_suppressedAttributesAccumulate(self):
+        self.__sendAcknowledged(makeReport(frameAttributes={'pcpu': '100.0'}))
+        sent = self.__sendAcknowledged(
+            makeReport(rss=2000000, frameAttributes={'pcpu': '100.8'}))
+        self.assertTrue(sent.frames[0].attributes_unchanged)
+
+        sent = self.encoder.encode(makeReport(rss=2000000, frameAttributes={'pcpu': '101.2'}))
+
+        # 1.2% away from the pcpu the cuebot still holds
+        self.assertEqual(2, len(sent.frames))
+        self.assertEqual('101.2', sent.frames[0].attributes['pcpu'])
+
+    def test_unchangedProcessTreeIsLeftOut(self):
+        self.__sendAcknowledged(makeReport(processes=[(100, 'render')]))
+
+        sent = self.encoder.encode(makeReport(rss=2000000, processes=[(100, 'render')]))
+
+        self.assertEqual(2, len(sent.frames))
+        self.assertTrue(sent.frames[0].processes_unchanged)
+        self.assertEqual(0, len(sent.frames[0].processes))
+
+    def test_changedProcessTreeIsSent(self):
+        self.__sendAcknowledged(makeReport(processes=[(100, 'render')]))
+
+        sent = self.encoder.encode(
+            makeReport(processes=[(100, 'render'), (101, 'python')]))
+
+        self.assertEqual(2, len(sent.frames))
+        self.assertFalse(sent.frames[0].processes_unchanged)
+        self.assertTrue(sent.frames[0].attributes_unchanged)
+        self.assertEqual([100, 101], [process.pid for process in sent.frames[0].processes])
+
+    def test_changedHostWithoutAttributes(self):
+        self.__sendAcknowledged(makeReport())
+
+        sent = self.encoder.encode(makeReport(freeMem=1000000))
+
+        self.assertFalse(sent.host_unchanged)
+        self.assertTrue(sent.host_attributes_unchanged)
+        self.assertEqual(1000000, sent.host.free_mem)
+        self.assertEqual(0, len(sent.host.attributes))
+
+    def test_deltaAgainstAcknowledgedReport(self):
+        first = self.__sendAcknowledged(makeReport())
+        # Lost report, never acknowledged
+        self.encoder.encode(makeReport(rss=2000000))
+
+        sent = self.encoder.encode(makeReport(rss=2000000))
+
+        self.assertEqual(first.report_version, sent.base_version)
+        self.assertEqual(2, len(sent.frames))
+
+    def test_suppressedChangesAccumulate(self):
+        self.__sendAcknowledged(makeReport(rss=1000000))
+        self.__sendAcknowledged(makeReport(rss=1005000))
+
+        sent = self.encoder.encode(makeReport(rss=1011000))
+
+        # 1.1% away from what the cuebot holds, even though each step was smaller
+        self.assertEqual(2, len(sent.frames))
+
+    def test_fullReportRequested(self):
+        self.__sendAcknowledged(makeReport())
+        sent = self.encoder.encode(makeReport())
+        self.encoder.acknowledge(
+            sent.report_version,
+            rqd.compiled_proto.report_pb2.RqdReportStatusResponse(request_full_report=True))
+
+        sent = self.encoder.encode(makeReport())
+
+        self.assertEqual(0, sent.base_version)
+        self.assertEqual(2, len(sent.frames))
+
+    def test_olderCuebotGetsFullReports(self):
+        sent = self.encoder.encode(makeReport())
+        self.encoder.acknowledge(sent.report_version,
+                                 rqd.compiled_proto.report_pb2.RqdReportStatusResponse())
+
+        sent = self.encoder.encode(makeReport())
+
+        self.assertEqual(0, sent.base_version)
+
+    def test_reset(self):
+        self.__sendAcknowledged(makeReport())
+
+        self.encoder.reset()
+        sent = self.encoder.encode(makeReport())
+
+        self.assertEqual(0, sent.base_version)
+
+    def test_periodicFullReport(self):
+        self.__sendAcknowledged(makeReport())
+        for _ in range(rqd.rqconstants.RQD_DELTA_REPORTS_BETWEEN_FULL):
+            self.assertNotEqual(0, self.__sendAcknowledged(makeReport()).base_version)
+
+        sent = self.encoder.encode(makeReport())
+
+        self.assertEqual(0, sent.base_version)
+
+
+if __name__ == '__main__':
+    unittest.main()
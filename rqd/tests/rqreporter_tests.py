@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import mock
+import unittest
+
+import rqd.rqconstants
+import rqd.rqreporter
+import rqd.rqscheduler
+
+
+@mock.patch('random.uniform', new=mock.MagicMock(side_effect=lambda low, high: high))
+@mock.patch.object(rqd.rqconstants, 'RQD_MIN_PING_INTERVAL_SEC', 4)
+@mock.patch.object(rqd.rqconstants, 'RQD_MAX_PING_INTERVAL_SEC', 30)
+@mock.patch.object(rqd.rqconstants, 'RQD_REPORT_COALESCE_SEC', 1)
+@mock.patch.object(rqd.rqconstants, 'RQD_REPORT_BACKOFF_FACTOR', 2)
+class StatusReporterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('rqd.rqscheduler.monotonic', new=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.scheduler = mock.MagicMock(spec=rqd.rqscheduler.Scheduler)
+        self.job = mock.MagicMock(spec=rqd.rqscheduler.Job)
+        self.job.timeUntilDue.return_value = 4
+        self.scheduler.scheduleOnce.return_value = self.job
+        self.sendFunc = mock.MagicMock()
+        self.reporter = rqd.rqreporter.StatusReporter(self.scheduler, self.sendFunc)
+
+    def __runReport(self):
+        """Runs the scheduled report the way the scheduler would"""
+        report = self.scheduler.scheduleOnce.call_args[0][2]
+        report()
+        return self.scheduler.reschedule.call_args[0][1]
+
+    def test_start(self):
+        self.reporter.start()
+
+        self.scheduler.scheduleOnce.assert_called_with(
+            'statusReport', 4, mock.ANY, blocking=True)
+
+    def test_backoffWhenQuiet(self):
+        self.reporter.start()
+
+        delays = [self.__runReport() for _ in range(4)]
+
+        self.assertEqual([8, 16, 30, 30], delays)
+        self.assertEqual(4, self.sendFunc.call_count)
+
+    def test_eventSendsImmediately(self):
+        self.reporter.start()
+        self.job.timeUntilDue.return_value = 20
+
+        self.reporter.notify(rqd.rqreporter.REASON_FRAME_EXIT)
+
+        self.scheduler.reschedule.assert_called_with(self.job, 0)
+
+    def test_eventsCoalesced(self):
+        sent = rqd.rqreporter.REPORTS_SENT.value(rqd.rqreporter.REASON_FRAME_EXIT)
+        self.reporter.start()
+        self.__runReport()
+        self.job.timeUntilDue.return_value = 20
+        self.now += 0.25
+
+        self.reporter.notify(rqd.rqreporter.REASON_FRAME_EXIT)
+        self.reporter.notify(rqd.rqreporter.REASON_CORES_UNLOCKED)
+
+        self.scheduler.reschedule.assert_called_with(self.job, 0.75)
+        self.assertEqual([rqd.rqreporter.REASON_FRAME_EXIT, rqd.rqreporter.REASON_CORES_UNLOCKED],
+                         self.reporter.pendingReasons())
+
+        self.__runReport()
+
+        self.assertEqual(2, self.sendFunc.call_count)
+        self.assertEqual([], self.reporter.pendingReasons())
+        self.assertEqual(sent + 1,
+                         rqd.rqreporter.REPORTS_SENT.value(rqd.rqreporter.REASON_FRAME_EXIT))
+
+    def test_eventResetsInterval(self):
+        self.reporter.start()
+        self.__runReport()
+        self.__runReport()
+        self.assertEqual(16, self.reporter.interval)
+
+        self.reporter.notify(rqd.rqreporter.REASON_NIMBY_LOCK)
+
+        self.assertEqual(4, self.reporter.interval)
+
+    def test_eventWhileSending(self):
+        self.reporter.start()
+
+        def notifyWhileSending():
+            self.reporter.notify(rqd.rqreporter.REASON_FRAME_EXIT)
+        self.sendFunc.side_effect = notifyWhileSending
+
+        delay = self.__runReport()
+
+        # Sent once the coalesce window has passed
+        self.assertEqual(1, delay)
+        self.assertEqual(1, self.scheduler.reschedule.call_count)
+
+    def test_failureBacksOff(self):
+        failures = rqd.rqreporter.REPORT_FAILURES.value()
+        self.reporter.start()
+        self.reporter.notify(rqd.rqreporter.REASON_FRAME_EXIT)
+        self.sendFunc.side_effect = RuntimeError('cuebot unavailable')
+
+        delay = self.__runReport()
+
+        self.assertEqual(8, delay)
+        self.assertEqual(failures + 1, rqd.rqreporter.REPORT_FAILURES.value())
+
+    def test_notifyBeforeStart(self):
+        self.reporter.notify(rqd.rqreporter.REASON_CORES_LOCKED)
+
+        self.reporter.start()
+
+        self.scheduler.scheduleOnce.assert_called_with(
+            'statusReport', 0, mock.ANY, blocking=True)
+
+    def test_stop(self):
+        self.reporter.start()
+
+        self.reporter.stop()
+
+        self.job.cancel.assert_called_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import threading
+import time
+import unittest
+
+import rqd.rqscheduler
+
+
+WAIT_TIMEOUT = 5
+
+
+class SchedulerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = rqd.rqscheduler.Scheduler(maxWorkers=2)
+        self.scheduler.start()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_scheduleOnce(self):
+        done = threading.Event()
+
+        job = self.scheduler.scheduleOnce('once', 0.01, done.set)
+
+        self.assertTrue(done.wait(WAIT_TIMEOUT))
+        time.sleep(0.05)
+        self.assertEqual(1, job.runs)
+        self.assertGreaterEqual(job.lastDrift, 0)
+
+    def test_schedulePeriodic(self):
+        calls = []
+        done = threading.Event()
+
+        def count():
+            calls.append(rqd.rqscheduler.monotonic())
+            if len(calls) == 3:
+                done.set()
+
+        job = self.scheduler.schedulePeriodic('periodic', 0.01, count)
+
+        self.assertTrue(done.wait(WAIT_TIMEOUT))
+        self.assertEqual(['periodic'], [stat['name'] for stat in self.scheduler.getStats()])
+        job.cancel()
+
+    def test_cancel(self):
+        calls = []
+
+        job = self.scheduler.scheduleOnce('cancelled', 0.05, lambda: calls.append(1))
+        job.cancel()
+        time.sleep(0.1)
+
+        self.assertEqual([], calls)
+        self.assertEqual([], self.scheduler.getStats())
+
+    def test_runSoonCoalesces(self):
+        calls = []
+        done = threading.Event()
+
+        def report():
+            calls.append(1)
+            done.set()
+
+        first = self.scheduler.runSoon('report', report, delay=0.05)
+        second = self.scheduler.runSoon('report', report, delay=0.05)
+
+        self.assertIs(first, second)
+        self.assertTrue(done.wait(WAIT_TIMEOUT))
+        time.sleep(0.1)
+        self.assertEqual([1], calls)
+
+    def test_reschedule(self):
+        done = threading.Event()
+        job = self.scheduler.scheduleOnce('later', 60, done.set)
+
+        self.scheduler.reschedule(job, 0)
+
+        self.assertTrue(done.wait(WAIT_TIMEOUT))
+
+    def test_blockingJobDoesNotOverlap(self):
+        release = threading.Event()
+        started = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(WAIT_TIMEOUT)
+
+        job = self.scheduler.schedulePeriodic('blocking', 0.01, block, blocking=True)
+        self.assertTrue(started.wait(WAIT_TIMEOUT))
+        time.sleep(0.1)
+        job.cancel()
+        release.set()
+
+        self.assertGreater(job.skipped, 0)
+
+    def test_blockingJobDoesNotDelayOthers(self):
+        release = threading.Event()
+        done = threading.Event()
+
+        self.scheduler.scheduleOnce('slow', 0, lambda: release.wait(WAIT_TIMEOUT), blocking=True)
+        self.scheduler.scheduleOnce('fast', 0.01, done.set)
+
+        self.assertTrue(done.wait(WAIT_TIMEOUT))
+        release.set()
+
+    def test_failingJobKeepsSchedule(self):
+        calls = []
+        done = threading.Event()
+
+        def fail():
+            calls.append(1)
+            if len(calls) == 2:
+                done.set()
+            raise RuntimeError('failed')
+
+        job = self.scheduler.schedulePeriodic('failing', 0.01, fail)
+
+        self.assertTrue(done.wait(WAIT_TIMEOUT))
+        job.cancel()
+
+    def test_variableInterval(self):
+        intervals = []
+        done = threading.Event()
+
+        def nextInterval():
+            intervals.append(0.01)
+            return 0.01
+
+        job = self.scheduler.schedulePeriodic('variable', nextInterval, done.set)
+
+        self.assertTrue(done.wait(WAIT_TIMEOUT))
+        job.cancel()
+        self.assertGreaterEqual(len(intervals), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
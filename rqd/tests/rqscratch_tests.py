@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import mock
+import os
+import unittest
+
+import pyfakefs.fake_filesystem_unittest
+
+import rqd.compiled_proto.rqd_pb2
+import rqd.rqscratch
+
+
+SCRATCH_ROOT = '/mcp/rqd-scratch'
+GIGABYTE = 1024 * 1024 * 1024
+
+
+def makeRunFrame(jobId):
+    return rqd.compiled_proto.rqd_pb2.RunFrame(
+        job_id=jobId, frame_id='%s-frame' % jobId, uid=928, gid=20)
+
+
+class ScratchCacheTests(pyfakefs.fake_filesystem_unittest.TestCase):
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.freeKb = 100 * 1024 * 1024
+        for patcher in (mock.patch('rqd.rqutil.permissionsHigh'),
+                        mock.patch('rqd.rqutil.permissionsLow'),
+                        mock.patch('os.lchown'),
+                        mock.patch('rqd.rqscratch.freeKb', new=lambda path: self.freeKb)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.fs.create_dir(SCRATCH_ROOT, perm_bits=0o755).st_uid = 0
+        self.cache = rqd.rqscratch.ScratchCache(
+            SCRATCH_ROOT, maxBytes=GIGABYTE, maxAgeSeconds=3600, minFreeKb=1024 * 1024)
+
+    def __runFrame(self, jobId, size=0):
+        """Acquires the job's directory, writes size bytes in it and releases it"""
+        path = self.cache.acquire(makeRunFrame(jobId))
+        if size:
+            self.fs.create_file(os.path.join(path, 'input-%d' % size), st_size=size)
+        self.cache.release(jobId)
+        return path
+
+    def test_acquire(self):
+        path = self.cache.acquire(makeRunFrame('job-1'))
+
+        self.assertEqual(os.path.join(SCRATCH_ROOT, 'job-1'), path)
+        self.assertTrue(os.path.isdir(path))
+        os.lchown.assert_called_with(path, 928, 20)
+
+    def test_acquireRefusesSymlink(self):
+        self.fs.create_dir('/etc')
+        os.symlink('/etc', os.path.join(SCRATCH_ROOT, 'job-1'))
+
+        self.assertRaises(OSError, self.cache.acquire, makeRunFrame('job-1'))
+        os.lchown.assert_not_called()
+
+    def test_rootOwnedByUser(self):
+        self.fs.get_object(SCRATCH_ROOT).st_uid = 928
+
+        self.assertRaises(OSError, rqd.rqscratch.ScratchCache, SCRATCH_ROOT)
+
+    def test_rootWritableByOthers(self):
+        self.fs.chmod(SCRATCH_ROOT, 0o777)
+
+        self.assertRaises(OSError, rqd.rqscratch.ScratchCache, SCRATCH_ROOT)
+
+    def test_rootSymlink(self):
+        os.symlink(SCRATCH_ROOT, '/mcp/link')
+
+        self.assertRaises(OSError, rqd.rqscratch.ScratchCache, '/mcp/link')
+
+    def test_hitsAndMisses(self):
+        self.__runFrame('job-1', 4096)
+        self.__runFrame('job-1')
+        self.__runFrame('job-2')
+
+        attributes = self.cache.attributes()
+        self.assertEqual('1', attributes['scratchHits'])
+        self.assertEqual('2', attributes['scratchMisses'])
+        self.assertEqual('2', attributes['scratchJobs'])
+        self.assertEqual(attributes['scratchBytes'], attributes['scratchReusedBytes'])
+
+    def test_evictAge(self):
+        self.__runFrame('job-1')
+
+        self.cache.evict(now=os.path.getmtime(os.path.join(SCRATCH_ROOT, 'job-1')) + 7200)
+
+        self.assertFalse(os.path.exists(os.path.join(SCRATCH_ROOT, 'job-1')))
+        self.assertEqual('1', self.cache.attributes()['scratchEvictions'])
+
+    def test_evictLeastRecentlyUsed(self):
+        self.cache.maxBytes = 0
+        old = self.__runFrame('job-old', 4096)
+        recent = self.__runFrame('job-recent', 4096)
+        self.cache.maxBytes = 6000
+
+        self.cache.evict()
+
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(recent))
+
+    def test_evictForFreeSpace(self):
+        evictions = rqd.rqscratch.SCRATCH_EVICTIONS.value('free_space')
+        self.__runFrame('job-1', 4096)
+        self.freeKb = 1024
+
+        self.cache.evict()
+
+        self.assertEqual('0', self.cache.attributes()['scratchJobs'])
+        self.assertEqual(evictions + 1, rqd.rqscratch.SCRATCH_EVICTIONS.value('free_space'))
+
+    def test_inUseNotEvicted(self):
+        path = self.cache.acquire(makeRunFrame('job-1'))
+        self.freeKb = 0
+
+        self.cache.evict(now=os.path.getmtime(path) + 7200)
+
+        self.assertTrue(os.path.isdir(path))
+
+    def test_evictRenamesUnderLock(self):
+        path = self.__runFrame('job-1')
+        evictingPath = os.path.join(SCRATCH_ROOT, rqd.rqscratch.EVICTING_PREFIX + 'job-1')
+        acquired = []
+
+        def remove(removed):
+            # A frame of the job launched while the old directory is removed
+            acquired.append(self.cache.acquire(makeRunFrame('job-1')))
+            self.assertTrue(os.path.isdir(removed))
+
+        with mock.patch.object(rqd.rqscratch.ScratchCache, '_ScratchCache__remove',
+                               side_effect=remove):
+            self.cache.evict(now=os.path.getmtime(path) + 7200)
+
+        # A new directory, the old one was already out of the way
+        self.assertEqual([path], acquired)
+        self.assertTrue(os.path.isdir(path))
+        self.assertTrue(os.path.isdir(evictingPath))
+        self.assertEqual('2', self.cache.attributes()['scratchMisses'])
+
+    def test_evictRenameFails(self):
+        path = self.__runFrame('job-1')
+
+        with mock.patch('os.rename', side_effect=OSError('busy')):
+            self.cache.evict(now=os.path.getmtime(path) + 7200)
+
+        self.assertTrue(os.path.isdir(path))
+        self.assertEqual('1', self.cache.attributes()['scratchJobs'])
+        self.assertEqual('0', self.cache.attributes()['scratchEvictions'])
+
+    def test_releaseAsRoot(self):
+        self.cache.acquire(makeRunFrame('job-1'))
+        rqd.rqutil.permissionsHigh.reset_mock()
+
+        with mock.patch('rqd.rqscratch.directorySize',
+                        side_effect=lambda path: rqd.rqutil.permissionsHigh.call_count):
+            self.cache.release('job-1')
+
+        self.assertEqual('1', self.cache.attributes()['scratchBytes'])
+
+    def test_reload(self):
+        self.__runFrame('job-1', 4096)
+        self.fs.create_dir(os.path.join(SCRATCH_ROOT, rqd.rqscratch.EVICTING_PREFIX + 'job-2'))
+
+        cache = rqd.rqscratch.ScratchCache(SCRATCH_ROOT)
+
+        self.assertEqual('1', cache.attributes()['scratchJobs'])
+        self.assertEqual(self.cache.attributes()['scratchBytes'],
+                         cache.attributes()['scratchBytes'])
+        self.assertEqual(['job-1'], os.listdir(SCRATCH_ROOT))
+
+
+if __name__ == '__main__':
+    unittest.main()
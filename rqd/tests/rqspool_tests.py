@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+from builtins import range
+from concurrent import futures
+import mock
+import os
+import shutil
+import tempfile
+import unittest
+
+import grpc
+
+import rqd.compiled_proto.report_pb2
+import rqd.compiled_proto.report_pb2_grpc
+import rqd.rqconstants
+import rqd.rqcore
+import rqd.rqnetwork
+import rqd.rqspool
+
+
+MAX_BYTES = 64 * 1024
+
+
+def makeReport(frameId):
+    return rqd.compiled_proto.report_pb2.FrameCompleteReport(
+        host=rqd.compiled_proto.report_pb2.RenderHost(name='render01'),
+        frame=rqd.compiled_proto.report_pb2.RunningFrameInfo(frame_id=frameId),
+        exit_status=0)
+
+
+class FakeReportServicer(rqd.compiled_proto.report_pb2_grpc.RqdReportInterfaceServicer):
+    """Records completion reports, or refuses them while unavailable."""
+
+    def __init__(self):
+        self.available = True
+        self.completions = []
+
+    def ReportRunningFrameCompletion(self, request, context):
+        if not self.available:
+            context.abort(grpc.StatusCode.UNAVAILABLE, 'cuebot is restarting')
+        self.completions.append(request.frame_complete_report.frame.frame_id)
+        return rqd.compiled_proto.report_pb2.RqdReportRunningFrameCompletionResponse()
+
+    def ReportRqdStartup(self, request, context):
+        return rqd.compiled_proto.report_pb2.RqdReportRqdStartupResponse()
+
+
+class ReportSpoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempDir, 'spool', 'frame-complete.spool')
+        self.spool = self.__openSpool()
+
+    def tearDown(self):
+        self.spool.close()
+        shutil.rmtree(self.tempDir)
+
+    def __openSpool(self, maxBytes=MAX_BYTES):
+        return rqd.rqspool.ReportSpool(
+            self.path, rqd.compiled_proto.report_pb2.FrameCompleteReport, maxBytes)
+
+    def __reopen(self, maxBytes=MAX_BYTES):
+        self.spool.close()
+        self.spool = self.__openSpool(maxBytes)
+
+    def test_claimInOrder(self):
+        for index in range(3):
+            self.spool.append(makeReport('frame%d' % index))
+
+        claimed = self.spool.claim(2)
+
+        self.assertEqual(['frame0', 'frame1'], [report.frame.frame_id for _, report in claimed])
+        self.assertEqual(['frame2'], [report.frame.frame_id for _, report in self.spool.claim(2)])
+        self.assertEqual([], self.spool.claim(2))
+
+    def test_inFlightNotClaimedUntilReleased(self):
+        seq = self.spool.append(makeReport('frame0'), inFlight=True)
+
+        self.assertEqual([], self.spool.claim(10))
+
+        self.spool.release([seq])
+
+        self.assertEqual([seq], [claimedSeq for claimedSeq, _ in self.spool.claim(10)])
+
+    def test_acknowledgeEmptiesLog(self):
+        seqs = [self.spool.append(makeReport('frame%d' % index)) for index in range(3)]
+
+        self.spool.acknowledge(seqs)
+
+        self.assertEqual(0, self.spool.pendingCount())
+        self.assertEqual(0, os.path.getsize(self.path))
+
+    def test_replayAfterRestart(self):
+        first = self.spool.append(makeReport('frame0'))
+        self.spool.append(makeReport('frame1'))
+        self.spool.acknowledge([first])
+
+        self.__reopen()
+
+        claimed = self.spool.claim(10)
+        self.assertEqual(['frame1'], [report.frame.frame_id for _, report in claimed])
+        self.assertGreater(self.spool.append(makeReport('frame2')), claimed[0][0])
+
+    def test_truncatedRecordDiscarded(self):
+        self.spool.append(makeReport('frame0'))
+        self.spool.append(makeReport('frame1'))
+        self.spool.close()
+        with open(self.path, 'r+b') as spoolFile:
+            spoolFile.truncate(os.path.getsize(self.path) - 3)
+
+        self.spool = self.__openSpool()
+
+        self.assertEqual(['frame0'], [report.frame.frame_id
+                                      for _, report in self.spool.claim(10)])
+
+    def test_boundedSize(self):
+        maxBytes = 1024
+        self.__reopen(maxBytes)
+
+        for index in range(100):
+            self.spool.append(makeReport('frame%03d' % index))
+
+        self.assertLessEqual(os.path.getsize(self.path), maxBytes)
+        claimed = self.spool.claim(100)
+        self.assertEqual('frame099', claimed[-1][1].frame.frame_id)
+        self.assertLess(len(claimed), 100)
+
+
+class FrameCompleteSpoolTests(unittest.TestCase):
+    """Sends completion reports through the spool to a local fake cuebot."""
+
+    def setUp(self):
+        for target in ('rqd.rqscheduler.Scheduler', 'rqd.rqnimby.Nimby',
+                       'rqd.rqmachine.Machine', 'atexit.register'):
+            patcher = mock.patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.tempDir = tempfile.mkdtemp()
+        self.servicer = FakeReportServicer()
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+        rqd.compiled_proto.report_pb2_grpc.add_RqdReportInterfaceServicer_to_server(
+            self.servicer, self.server)
+        self.port = self.server.add_insecure_port('localhost:0')
+        self.server.start()
+        self.spoolPath = os.path.join(self.tempDir, 'frame-complete.spool')
+        self.rqCore = self.__startRqCore()
+
+    def tearDown(self):
+        self.rqCore.network.closeChannel()
+        self.rqCore.reportSpool.close()
+        self.server.stop(0)
+        shutil.rmtree(self.tempDir)
+
+    def __startRqCore(self):
+        with mock.patch.object(rqd.rqconstants, 'RQD_SPOOL_PATH', self.spoolPath), \
+                mock.patch.object(rqd.rqconstants, 'RQD_USE_SCRATCH_CACHE', False):
+            rqCore = rqd.rqcore.RqCore()
+        rqCore.machine.getBootReport.return_value = rqd.compiled_proto.report_pb2.BootReport()
+        rqCore.network.channelPool = rqd.rqnetwork.CuebotChannelPool(['localhost'], self.port)
+        return rqCore
+
+    def test_sendFrameCompleteReport(self):
+        self.rqCore.sendFrameCompleteReport(makeReport('frame0'))
+
+        self.assertEqual(['frame0'], self.servicer.completions)
+        self.assertEqual(0, self.rqCore.reportSpool.pendingCount())
+
+    def test_spooledWhileUnavailable(self):
+        self.servicer.available = False
+
+        self.rqCore.sendFrameCompleteReport(makeReport('frame0'))
+        self.rqCore.sendFrameCompleteReport(makeReport('frame1'))
+
+        self.assertEqual([], self.servicer.completions)
+        self.assertEqual(2, self.rqCore.reportSpool.pendingCount())
+        self.rqCore.scheduler.runSoon.assert_called_with(
+            'drainReportSpool', self.rqCore.drainReportSpool,
+            delay=rqd.rqconstants.RQD_RETRY_CRITICAL_REPORT_DELAY, blocking=True)
+
+        self.servicer.available = True
+        self.rqCore.drainReportSpool()
+
+        self.assertEqual(['frame0', 'frame1'], self.servicer.completions)
+        self.assertEqual(0, self.rqCore.reportSpool.pendingCount())
+
+    def test_replayAfterRestart(self):
+        self.servicer.available = False
+        self.rqCore.sendFrameCompleteReport(makeReport('frame0'))
+        self.rqCore.network.closeChannel()
+        self.rqCore.reportSpool.close()
+        self.servicer.available = True
+
+        self.rqCore = self.__startRqCore()
+        self.rqCore.grpcConnected()
+
+        self.rqCore.scheduler.runSoon.assert_called_with(
+            'drainReportSpool', self.rqCore.drainReportSpool, delay=0, blocking=True)
+        self.rqCore.drainReportSpool()
+        self.assertEqual(['frame0'], self.servicer.completions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import errno
+import mock
+import signal
+import unittest
+
+import rqd.rqconstants
+import rqd.rqscheduler
+import rqd.rqteardown
+
+
+def frameMock(frameId, pid=1000, cgroup=None, killable=True, suspended=False):
+    frame = mock.MagicMock()
+    frame.frameId = frameId
+    frame.pid = pid
+    frame.cgroup = cgroup
+    frame.killTime = None
+    frame.suspendedTime = 1000.0 if suspended else None
+    frame.isKillable.return_value = killable
+
+    def recordKill(message, exitStatus, now):
+        if frame.killTime is None:
+            frame.killTime = now
+    frame.recordKill.side_effect = recordKill
+    return frame
+
+
+@mock.patch('platform.system', new=mock.MagicMock(return_value='Linux'))
+@mock.patch('rqd.rqutil.permissionsLow', new=mock.MagicMock())
+@mock.patch('rqd.rqutil.permissionsHigh', new=mock.MagicMock())
+class SignalFrameTests(unittest.TestCase):
+
+    @mock.patch('os.killpg')
+    def test_processGroup(self, killpgMock):
+        self.assertTrue(rqd.rqteardown.signalFrame(frameMock('frame-1'), signal.SIGTERM))
+
+        killpgMock.assert_called_with(1000, signal.SIGTERM)
+
+    @mock.patch('rqd.rqcgroup.signalCgroup')
+    def test_cgroup(self, signalCgroupMock):
+        rqd.rqteardown.signalFrame(frameMock('frame-1', cgroup='/cg/cgroup.procs'), signal.SIGTERM)
+
+        signalCgroupMock.assert_called_with('/cg/cgroup.procs', signal.SIGTERM)
+
+    @mock.patch('os.killpg')
+    def test_exited(self, killpgMock):
+        killpgMock.side_effect = OSError(errno.ESRCH, 'No such process')
+
+        self.assertFalse(rqd.rqteardown.signalFrame(frameMock('frame-1'), signal.SIGTERM))
+
+
+@mock.patch('platform.system', new=mock.MagicMock(return_value='Linux'))
+@mock.patch('rqd.rqteardown.signalFrame')
+class FrameTeardownTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('rqd.rqscheduler.monotonic', new=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.scheduler = mock.MagicMock(spec=rqd.rqscheduler.Scheduler)
+        self.teardown = rqd.rqteardown.FrameTeardown(self.scheduler)
+
+    def test_kill(self, signalMock):
+        frames = [frameMock('frame-1'), frameMock('frame-2'), frameMock('frame-3', killable=False)]
+
+        killing = self.teardown.kill(frames, 'killed by test')
+
+        self.assertEqual(frames[:2], killing)
+        signalMock.assert_has_calls([mock.call(frames[0], signal.SIGTERM),
+                                     mock.call(frames[1], signal.SIGTERM)])
+        self.assertEqual(2, self.teardown.pendingCount())
+        self.assertEqual(1, self.scheduler.scheduleOnce.call_count)
+        self.assertEqual(rqd.rqconstants.RQD_KILL_GRACE_SEC,
+                         self.scheduler.scheduleOnce.call_args[0][1])
+
+    def test_killPending(self, signalMock):
+        frame = frameMock('frame-1')
+        self.teardown.kill([frame], 'first')
+
+        self.assertEqual([frame], self.teardown.kill([frame], 'second'))
+
+        self.assertEqual(1, signalMock.call_count)
+        self.assertEqual(1, self.scheduler.scheduleOnce.call_count)
+
+    def test_killImmediate(self, signalMock):
+        frame = frameMock('frame-1')
+
+        self.teardown.kill([frame], 'preempted', immediate=True)
+
+        signalMock.assert_called_once_with(frame, rqd.rqconstants.KILL_SIGNAL)
+        self.scheduler.scheduleOnce.assert_not_called()
+        self.assertEqual(1, self.teardown.pendingCount())
+
+    def test_killImmediateDuringGrace(self, signalMock):
+        frame = frameMock('frame-1')
+        self.teardown.kill([frame], 'killed by test')
+
+        self.teardown.kill([frame], 'preempted', immediate=True)
+        self.teardown.kill([frame], 'preempted', immediate=True)
+
+        signalMock.assert_has_calls([mock.call(frame, signal.SIGTERM),
+                                     mock.call(frame, rqd.rqconstants.KILL_SIGNAL)])
+        self.assertEqual(2, signalMock.call_count)
+
+    def test_killSuspended(self, signalMock):
+        frames = [frameMock('frame-1', suspended=True), frameMock('frame-2')]
+        calls = mock.MagicMock()
+        frames[0].resume.side_effect = lambda: calls.resume()
+        signalMock.side_effect = lambda frame, signum: calls.signal(frame.frameId, signum)
+
+        self.teardown.kill(frames, 'killed by test')
+
+        # Resumed before it is sent SIGTERM
+        self.assertEqual([mock.call.resume(), mock.call.signal('frame-1', signal.SIGTERM),
+                          mock.call.signal('frame-2', signal.SIGTERM)], calls.mock_calls)
+        frames[1].resume.assert_not_called()
+
+    def test_escalate(self, signalMock):
+        exited = frameMock('frame-1')
+        running = frameMock('frame-2')
+        self.teardown.kill([exited, running], 'killed by test')
+        escalate = self.scheduler.scheduleOnce.call_args[0][2]
+        self.teardown.onExit(exited)
+        signalMock.reset_mock()
+
+        escalate()
+        escalate()
+
+        signalMock.assert_called_once_with(running, rqd.rqconstants.KILL_SIGNAL)
+
+    def test_onExit(self, signalMock):
+        terminated = rqd.rqteardown.KILLED_FRAMES.value('SIGTERM')
+        killed = rqd.rqteardown.KILLED_FRAMES.value('SIGKILL')
+        count = rqd.rqteardown.KILL_TIME.count()
+        frames = [frameMock('frame-1'), frameMock('frame-2', cgroup='/cg/cgroup.procs')]
+        self.teardown.kill(frames, 'killed by test')
+        self.scheduler.scheduleOnce.call_args[0][2]()
+        signalMock.reset_mock()
+
+        self.now += 2.5
+        self.teardown.onExit(frames[0])
+        self.teardown.onExit(frames[1])
+
+        self.assertEqual(2.5, frames[0].killSeconds)
+        self.assertEqual(0, self.teardown.pendingCount())
+        self.assertEqual(count + 2, rqd.rqteardown.KILL_TIME.count())
+        self.assertEqual(terminated, rqd.rqteardown.KILLED_FRAMES.value('SIGTERM'))
+        self.assertEqual(killed + 2, rqd.rqteardown.KILLED_FRAMES.value('SIGKILL'))
+        # Only the frame without a cgroup has its process group swept
+        signalMock.assert_called_once_with(frames[0], rqd.rqconstants.KILL_SIGNAL)
+
+    def test_onExitNotKilled(self, signalMock):
+        frame = frameMock('frame-1')
+
+        self.teardown.onExit(frame)
+
+        signalMock.assert_not_called()
+        self.assertEqual(0, self.teardown.pendingCount())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import mock
+import os
+import unittest
+
+import pyfakefs.fake_filesystem_unittest
+
+import rqd.rqconstants
+import rqd.rqtopology
+
+
+def createSysfs(fs, sockets, coresPerSocket, threadsPerCore, cachesPerSocket=1):
+    """Creates the sysfs cpu and node trees of a host. Cpus are numbered the
+    way Linux does, first threads of every core before their siblings."""
+    numCores = sockets * coresPerSocket
+    coresPerCache = coresPerSocket // cachesPerSocket
+    cpuPath = rqd.rqconstants.PATH_SYS_CPU
+    nodePath = rqd.rqconstants.PATH_SYS_NODE
+    nodeCpus = dict((socket, []) for socket in range(sockets))
+    for core in range(numCores):
+        socket = core // coresPerSocket
+        threads = [core + thread * numCores for thread in range(threadsPerCore)]
+        cacheFirst = core - core % coresPerCache
+        cacheCpus = [cacheFirst + offset + thread * numCores
+                     for offset in range(coresPerCache) for thread in range(threadsPerCore)]
+        nodeCpus[socket].extend(threads)
+        for cpu in threads:
+            cpuDir = os.path.join(cpuPath, 'cpu%d' % cpu)
+            fs.create_file(os.path.join(cpuDir, 'topology', 'physical_package_id'),
+                           contents=str(socket))
+            fs.create_file(os.path.join(cpuDir, 'topology', 'thread_siblings_list'),
+                           contents=','.join(str(thread) for thread in threads))
+            fs.create_file(os.path.join(cpuDir, 'cache', 'index0', 'level'), contents='1')
+            fs.create_file(os.path.join(cpuDir, 'cache', 'index0', 'shared_cpu_list'),
+                           contents=','.join(str(thread) for thread in threads))
+            fs.create_file(os.path.join(cpuDir, 'cache', 'index3', 'level'), contents='3')
+            fs.create_file(os.path.join(cpuDir, 'cache', 'index3', 'shared_cpu_list'),
+                           contents=','.join(str(cacheCpu) for cacheCpu in sorted(cacheCpus)))
+    fs.create_file(os.path.join(cpuPath, 'online'),
+                   contents='0-%d' % (numCores * threadsPerCore - 1))
+    for socket, cpus in nodeCpus.items():
+        fs.create_file(os.path.join(nodePath, 'node%d' % socket, 'cpulist'),
+                       contents=','.join(str(cpu) for cpu in sorted(cpus)))
+
+
+class TwoSocketTopologyTests(pyfakefs.fake_filesystem_unittest.TestCase):
+    """Two sockets of four cores with hyper-threading, one L3 per socket."""
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        createSysfs(self.fs, sockets=2, coresPerSocket=4, threadsPerCore=2)
+        self.topology = rqd.rqtopology.CpuTopology.load()
+
+    def test_fromSysfs(self):
+        self.assertEqual(8, len(self.topology.cores))
+        self.assertEqual([0, 1], self.topology.numaNodes())
+        self.assertEqual((0, 8), self.topology.cores[0].cpus)
+        self.assertEqual(1, self.topology.cores[4].node)
+        self.assertEqual((4, 12), self.topology.cores[4].cpus)
+
+    def test_reserveIncludesSiblings(self):
+        allocation = self.topology.reserve(2)
+
+        self.assertEqual((0, 1), allocation.cores)
+        self.assertEqual((0, 1, 8, 9), allocation.cpus)
+        self.assertEqual((0,), allocation.nodes)
+
+    def test_reservePacksNodes(self):
+        self.topology.reserve(3)
+
+        # Fills the partly used socket rather than breaking into the free one
+        self.assertEqual((3, 11), self.topology.reserve(1).cpus)
+        self.assertEqual((1,), self.topology.reserve(4).nodes)
+
+    def test_reserveCompactRun(self):
+        self.topology.reserve(1)
+        self.topology.reserve(1)
+        self.topology.release([0, 8])
+
+        self.assertEqual((2, 3), self.topology.reserve(2).cores)
+
+    def test_reserveSpansNodes(self):
+        allocation = self.topology.reserve(6)
+
+        self.assertEqual((0, 1), allocation.nodes)
+        self.assertEqual(6, len(allocation.cores))
+
+    def test_reserveTooMany(self):
+        self.topology.reserve(6)
+
+        self.assertIsNone(self.topology.reserve(3))
+        self.assertEqual(2, self.topology.freeCores())
+
+    def test_release(self):
+        allocation = self.topology.reserve(8)
+
+        self.topology.release(allocation.cpus)
+
+        self.assertEqual(8, self.topology.freeCores())
+
+
+class FourSocketTopologyTests(pyfakefs.fake_filesystem_unittest.TestCase):
+    """Four sockets of four cores without hyper-threading, two L3 domains of
+    two cores per socket."""
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        createSysfs(self.fs, sockets=4, coresPerSocket=4, threadsPerCore=1, cachesPerSocket=2)
+        self.topology = rqd.rqtopology.CpuTopology.load()
+
+    def test_fromSysfs(self):
+        self.assertEqual(16, len(self.topology.cores))
+        self.assertEqual([0, 1, 2, 3], self.topology.numaNodes())
+        self.assertEqual([0, 0, 2, 2], [core.cache for core in self.topology.cores[:4]])
+
+    def test_reserveWithinCache(self):
+        self.assertEqual((0, 1), self.topology.reserve(2).cpus)
+        self.assertEqual((2, 3), self.topology.reserve(2).cpus)
+
+    def test_reserveWithinNode(self):
+        self.topology.reserve(2)
+
+        # Does not fit the rest of the first node, spans the caches of the second
+        allocation = self.topology.reserve(3)
+
+        self.assertEqual((4, 5, 6), allocation.cpus)
+        self.assertEqual((1,), allocation.nodes)
+
+        # The single core left in a cache is the tightest fit
+        self.assertEqual((7,), self.topology.reserve(1).cpus)
+
+    def test_reserveAcrossNodes(self):
+        allocation = self.topology.reserve(6)
+
+        self.assertEqual((0, 1), allocation.nodes)
+
+
+class CpuinfoTopologyTests(pyfakefs.fake_filesystem_unittest.TestCase):
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.cpuInfo = os.path.join(
+            os.path.dirname(__file__), 'cpuinfo', '_cpuinfo_srdsvr05_ht_12-6-2-2')
+        self.fs.add_real_file(self.cpuInfo)
+
+    def test_fromCpuinfo(self):
+        topology = rqd.rqtopology.CpuTopology.load(self.cpuInfo)
+
+        self.assertEqual(12, len(topology.cores))
+        self.assertEqual([0, 1], topology.numaNodes())
+        self.assertEqual(2, len(topology.reserve(1).cpus))
+
+
+@mock.patch('platform.machine', new=mock.MagicMock(return_value='x86_64'))
+@mock.patch('ctypes.CDLL')
+class SetMemoryPolicyTests(unittest.TestCase):
+
+    @mock.patch.object(rqd.rqconstants, 'RQD_NUMA_MEMORY_POLICY', 'preferred')
+    def test_preferred(self, cdllMock):
+        cdllMock.return_value.syscall.return_value = 0
+
+        self.assertTrue(rqd.rqtopology.setMemoryPolicy([1]))
+
+        syscall, mode, mask, maxNode = cdllMock.return_value.syscall.call_args[0]
+        self.assertEqual(238, syscall)
+        self.assertEqual(rqd.rqtopology.MPOL_PREFERRED, mode)
+        self.assertEqual([2], list(mask))
+
+    @mock.patch.object(rqd.rqconstants, 'RQD_NUMA_MEMORY_POLICY', 'preferred')
+    def test_preferredSpanningNodes(self, cdllMock):
+        self.assertFalse(rqd.rqtopology.setMemoryPolicy([0, 1]))
+
+        cdllMock.return_value.syscall.assert_not_called()
+
+    @mock.patch.object(rqd.rqconstants, 'RQD_NUMA_MEMORY_POLICY', 'bind')
+    def test_bind(self, cdllMock):
+        cdllMock.return_value.syscall.return_value = 0
+
+        self.assertTrue(rqd.rqtopology.setMemoryPolicy([0, 2]))
+
+        _, mode, mask, _ = cdllMock.return_value.syscall.call_args[0]
+        self.assertEqual(rqd.rqtopology.MPOL_BIND, mode)
+        self.assertEqual([5], list(mask))
+
+    @mock.patch.object(rqd.rqconstants, 'RQD_NUMA_MEMORY_POLICY', 'bind')
+    def test_preparedBeforeFork(self, cdllMock):
+        cdllMock.return_value.syscall.return_value = 0
+
+        setPolicy = rqd.rqtopology.memoryPolicy([0])
+        cdllMock.assert_called_once_with(None)
+        cdllMock.reset_mock()
+
+        self.assertTrue(setPolicy())
+        cdllMock.assert_not_called()
+        cdllMock.return_value.syscall.assert_called_once()
+
+    @mock.patch.object(rqd.rqconstants, 'RQD_NUMA_MEMORY_POLICY', 'none')
+    def test_none(self, cdllMock):
+        self.assertFalse(rqd.rqtopology.setMemoryPolicy([0]))
+        self.assertIsNone(rqd.rqtopology.memoryPolicy([0]))
+
+        cdllMock.return_value.syscall.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
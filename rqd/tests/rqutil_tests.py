@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+#  Copyright Contributors to the OpenCue Project
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import mock
+import unittest
+
+import rqd.rqutil
+
+
+@mock.patch('time.time')
+class TtlCacheTests(unittest.TestCase):
+
+    def test_expires(self, timeMock):
+        cache = rqd.rqutil.TtlCache(60)
+        timeMock.return_value = 1000
+
+        cache.put('key', 'value')
+        timeMock.return_value = 1059
+        self.assertEqual('value', cache.get('key'))
+
+        timeMock.return_value = 1061
+        self.assertIsNone(cache.get('key'))
+
+    def test_getOrCompute(self, timeMock):
+        cache = rqd.rqutil.TtlCache(60)
+        timeMock.return_value = 1000
+        func = mock.MagicMock(side_effect=['first', 'second'])
+
+        self.assertEqual('first', cache.getOrCompute('key', func))
+        self.assertEqual('first', cache.getOrCompute('key', func))
+        timeMock.return_value = 1100
+        self.assertEqual('second', cache.getOrCompute('key', func))
+
+
+class CheckAndCreateUserTests(unittest.TestCase):
+
+    def setUp(self):
+        rqd.rqutil.KNOWN_USERS.clear()
+        self.addCleanup(rqd.rqutil.KNOWN_USERS.clear)
+
+    @mock.patch('subprocess.check_call')
+    @mock.patch('pwd.getpwnam')
+    def test_knownUserNotLookedUpAgain(self, getpwnamMock, checkCallMock):
+        rqd.rqutil.checkAndCreateUser('someone')
+        rqd.rqutil.checkAndCreateUser('someone')
+
+        getpwnamMock.assert_called_once_with('someone')
+        checkCallMock.assert_not_called()
+        self.assertTrue(rqd.rqutil.isKnownUser('someone'))
+
+    @mock.patch('subprocess.check_call')
+    @mock.patch('pwd.getpwnam', new=mock.MagicMock(side_effect=KeyError))
+    def test_missingUserCreatedOnce(self, checkCallMock):
+        rqd.rqutil.checkAndCreateUser('someone')
+        rqd.rqutil.checkAndCreateUser('someone')
+
+        checkCallMock.assert_called_once_with(['useradd', '-p', mock.ANY, 'someone'])
+
+
+class ParseCpuListTests(unittest.TestCase):
+
+    def test_parseCpuList(self):
+        self.assertEqual({0, 1, 2, 3, 8, 10}, rqd.rqutil.parseCpuList('0-3,8,10'))
+        self.assertEqual({5}, rqd.rqutil.parseCpuList('5'))
+        self.assertEqual(set(), rqd.rqutil.parseCpuList(''))
+
+
+if __name__ == '__main__':
+    unittest.main()